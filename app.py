@@ -2,7 +2,9 @@ import streamlit as st
 import os
 import shutil
 from src.core.ingestion import create_vector_store
-from src.core.rag_pipeline import setup_rag_chain, generate_test_plan
+from src.core.rag_pipeline import setup_rag_chain
+from src.core.admission import GenerationGate, AdmissionRejected
+from src.core.deadline import DEFAULT_DEADLINE_S
 from dotenv import load_dotenv
 
 # Carrega variáveis de ambiente
@@ -15,6 +17,10 @@ CODE_FILE = os.path.join(DATA_DIR, "code_example.py")
 DOC_FILE = os.path.join(DATA_DIR, "doc_example.md")
 DB_DIR = os.path.join(PROJECT_ROOT, "chroma_db")
 
+# Prazo total de cada geração (fila, retrieval e LLM); esgotado o prazo,
+# é exibido um plano do cache ou o plano parcial com as regras recuperadas
+GENERATION_DEADLINE_S = DEFAULT_DEADLINE_S
+
 # --- Funções de Estado e Cache ---
 
 @st.cache_resource
@@ -33,6 +39,15 @@ def get_rag_components():
         st.error(f"Erro ao configurar a cadeia RAG: {e}")
         return None, None
 
+@st.cache_resource
+def get_generation_gate():
+    """
+    Controle de admissão compartilhado por todas as sessões: consultas
+    idênticas em voo viram uma única chamada ao LLM, com limite de
+    gerações simultâneas.
+    """
+    return GenerationGate(DB_DIR)
+
 def run_ingestion_ui():
     """
     Executa a fase de Descoberta e Indexação e atualiza o estado da aplicação.
@@ -50,6 +65,10 @@ def run_ingestion_ui():
         st.session_state.ingestion_status = "Concluída com Sucesso!"
         st.session_state.db_ready = True
         st.cache_resource.clear() # Limpa o cache para recarregar o novo DB
+        # Consultas populares são pré-geradas em segundo plano no cache de planos
+        qa_chain, retriever = get_rag_components()
+        if qa_chain and retriever:
+            get_generation_gate().prefetch(qa_chain, retriever)
     except Exception as e:
         st.session_state.ingestion_status = f"Erro: {e}"
         st.error(f"Erro durante a ingestão: {e}")
@@ -91,44 +110,71 @@ if st.session_state.db_ready:
         )
         
         if st.button("Gerar Plano de Testes"):
-            with st.spinner("Buscando regras e gerando plano de testes..."):
-                try:
-                    plan_result = generate_test_plan(query, qa_chain, retriever)
-                    
-                    st.subheader("📋 Plano de Testes BDD Gerado")
-                    st.code(plan_result['test_plan'], language='gherkin')
-                    
-                    st.subheader("🔗 Regras de Negócio Utilizadas (Contexto RAG)")
-                    st.info(f"Total de {len(plan_result['source_rules'])} regras recuperadas do banco de dados vetorial")
-                    
-                    # Separar regras por tipo
-                    code_rules = []
-                    doc_rules = []
-                    
-                    for rule in plan_result['source_rules']:
-                        if '[TIPO: CÓDIGO]' in rule:
-                            code_rules.append(rule)
-                        elif '[TIPO: DOC]' in rule:
-                            doc_rules.append(rule)
-                    
-                    # Exibir regras de código
-                    if code_rules:
-                        with st.expander(f"🔹 Regras Extraídas do CÓDIGO ({len(code_rules)} regras)", expanded=True):
-                            for i, rule in enumerate(code_rules, 1):
-                                # Remove o prefixo para exibição mais limpa
-                                clean_rule = rule.replace('- [TIPO: CÓDIGO] Regra de Negócio: ', '')
-                                st.markdown(f"**{i}.** {clean_rule}")
+            try:
+                with st.spinner("Buscando regras de negócio..."):
+                    plan_result, tokens = get_generation_gate().stream(
+                        query, qa_chain, retriever, deadline_s=GENERATION_DEADLINE_S
+                    )
+                
+                st.subheader("📋 Plano de Testes BDD Gerado")
+                # Renderiza o plano incrementalmente conforme os tokens chegam
+                plan_placeholder = st.empty()
+                plan_text = ""
+                for token in tokens:
+                    plan_text += token
+                    plan_placeholder.code(plan_text, language='gherkin')
+                
+                metrics = plan_result['metrics']
+                if metrics.get('served_by') == 'lexical_match':
+                    st.warning(f"Prazo de {GENERATION_DEADLINE_S:.0f}s esgotado: exibindo o plano da consulta "
+                               f"com termos em comum \"{metrics['matched_query']}\"")
+                elif metrics.get('served_by') == 'partial':
+                    st.warning(f"Prazo de {GENERATION_DEADLINE_S:.0f}s esgotado: plano parcial. "
+                               f"As regras recuperadas estão listadas abaixo.")
+                st.caption(
+                    f"Tokens do prompt: {metrics.get('prompt_tokens')} · "
+                    f"contexto: {metrics.get('context_tokens')} (antes do empacotamento: {metrics.get('context_tokens_raw')}) · "
+                    f"resposta: {metrics.get('completion_tokens')} · "
+                    f"primeiro token: {metrics.get('time_to_first_token_s')}s · "
+                    f"total: {metrics['total_time_s']}s · "
+                    f"fila: {metrics.get('queue_time_s', 0)}s · "
+                    f"servido por: {metrics.get('served_by', 'generated')}"
+                    + (" · compartilhado com uma geração em andamento" if metrics.get('coalesced') else "")
+                )
+                
+                st.subheader("🔗 Regras de Negócio Utilizadas (Contexto RAG)")
+                st.info(f"Total de {len(plan_result['source_rules'])} regras recuperadas do banco de dados vetorial")
+                
+                # Separar regras por tipo
+                code_rules = []
+                doc_rules = []
+                
+                for rule in plan_result['source_rules']:
+                    if '[TIPO: CÓDIGO]' in rule:
+                        code_rules.append(rule)
+                    elif '[TIPO: DOC]' in rule:
+                        doc_rules.append(rule)
+                
+                # Exibir regras de código
+                if code_rules:
+                    with st.expander(f"🔹 Regras Extraídas do CÓDIGO ({len(code_rules)} regras)", expanded=True):
+                        for i, rule in enumerate(code_rules, 1):
+                            # Remove o prefixo para exibição mais limpa
+                            clean_rule = rule.replace('- [TIPO: CÓDIGO] Regra de Negócio: ', '')
+                            st.markdown(f"**{i}.** {clean_rule}")
+                
+                # Exibir regras de documentação
+                if doc_rules:
+                    with st.expander(f"📄 Regras da DOCUMENTAÇÃO ({len(doc_rules)} regras)", expanded=True):
+                        for i, rule in enumerate(doc_rules, 1):
+                            # Remove o prefixo para exibição mais limpa
+                            clean_rule = rule.replace('- [TIPO: DOC] Regra Documentada: ', '')
+                            st.markdown(f"**{i}.** {clean_rule}")
                     
-                    # Exibir regras de documentação
-                    if doc_rules:
-                        with st.expander(f"📄 Regras da DOCUMENTAÇÃO ({len(doc_rules)} regras)", expanded=True):
-                            for i, rule in enumerate(doc_rules, 1):
-                                # Remove o prefixo para exibição mais limpa
-                                clean_rule = rule.replace('- [TIPO: DOC] Regra Documentada: ', '')
-                                st.markdown(f"**{i}.** {clean_rule}")
-                        
-                except Exception as e:
-                    st.error(f"Erro na Geração de Testes. Verifique a chave de API e o status do DB. Erro: {e}")
+            except AdmissionRejected as e:
+                st.warning(f"Muitas gerações em andamento. Tente novamente em instantes. ({e})")
+            except Exception as e:
+                st.error(f"Erro na Geração de Testes. Verifique a chave de API e o status do DB. Erro: {e}")
     else:
         st.warning("Não foi possível configurar a cadeia RAG. Verifique o status na barra lateral.")
 else:
@@ -0,0 +1,219 @@
+"""
+Benchmark de latência das estratégias de retrieval.
+Usa embeddings sintéticos (sem chamadas à API) para medir o custo das etapas
+de re-ranqueamento executadas localmente.
+
+Uso:
+    python benchmark_retrieval.py
+    python benchmark_retrieval.py --repeats 200 --dim 1536
+    python benchmark_retrieval.py --corpus-size 20000
+"""
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import itertools
+import tempfile
+
+import numpy as np
+
+# Adiciona o diretório src ao path
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src'))
+
+from core.retrieval import mmr_rerank, normalize_rows
+
+
+def time_call(func, repeats: int) -> float:
+    """Executa a função `repeats` vezes e retorna a latência média em milissegundos."""
+    func()  # aquecimento
+    start = time.perf_counter()
+    for _ in range(repeats):
+        func()
+    return (time.perf_counter() - start) * 1000 / repeats
+
+
+def synthetic_embeddings(n: int, dim: int, seed: int = 42) -> np.ndarray:
+    """Gera embeddings normalizados com grupos de vetores quase duplicados."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((max(n // 4, 1), dim)).astype(np.float32)
+    noise = 0.05 * rng.standard_normal((n, dim)).astype(np.float32)
+    return normalize_rows(centers[rng.integers(0, len(centers), n)] + noise)
+
+
+def benchmark_mmr(dim: int, repeats: int, k: int):
+    """Compara top-k simples, MMR vetorizado e MMR de referência do LangChain."""
+    from langchain_community.vectorstores.utils import maximal_marginal_relevance
+
+    print("=" * 80)
+    print(f"BENCHMARK: RE-RANQUEAMENTO MMR (k={k}, dim={dim}, repetições={repeats})")
+    print("=" * 80)
+    print(f"\n{'fetch_k':>8} | {'top-k (ms)':>11} | {'MMR NumPy (ms)':>15} | {'MMR LangChain (ms)':>19}")
+    print("-" * 62)
+
+    rng = np.random.default_rng(7)
+    for fetch_k in (20, 50, 100, 200):
+        candidates = synthetic_embeddings(fetch_k, dim)
+        query = normalize_rows(rng.standard_normal((1, dim)))[0]
+
+        topk_ms = time_call(lambda: np.argsort(-(candidates @ query))[:k], repeats)
+        numpy_ms = time_call(lambda: mmr_rerank(query, candidates, k), repeats)
+        reference_ms = time_call(
+            lambda: maximal_marginal_relevance(query, list(candidates), k=k), repeats
+        )
+        print(f"{fetch_k:>8} | {topk_ms:>11.3f} | {numpy_ms:>15.3f} | {reference_ms:>19.3f}")
+
+    print()
+
+
+def benchmark_backends(n: int, dim: int, repeats: int, k: int):
+    """Compara carga e consulta top-k do ChromaDB e do índice flat memory-mapped."""
+    import chromadb
+    from core.flat_index import write_flat_index, FlatVectorStore
+
+    print("=" * 80)
+    print(f"BENCHMARK: BACKENDS VETORIAIS (n={n}, k={k}, dim={dim}, repetições={repeats})")
+    print("=" * 80)
+
+    vectors = synthetic_embeddings(n, dim)
+    ids = [f"regra-{i}" for i in range(n)]
+    documents = [f"Regra de negócio sintética {i}" for i in range(n)]
+    metadatas = [{'source': f"arquivo_{i // 10}.py", 'chunk_index': i % 10} for i in range(n)]
+    queries = normalize_rows(np.random.default_rng(7).standard_normal((repeats, dim)))
+
+    workdir = tempfile.mkdtemp(prefix="bench_backends_")
+    try:
+        chroma_path = os.path.join(workdir, "chroma")
+        client = chromadb.PersistentClient(path=chroma_path)
+        collection = client.create_collection("bench", metadata={"hnsw:space": "cosine"})
+        batch = 5000
+        for start in range(0, n, batch):
+            collection.add(
+                ids=ids[start:start + batch],
+                documents=documents[start:start + batch],
+                metadatas=metadatas[start:start + batch],
+                embeddings=vectors[start:start + batch].tolist()
+            )
+        del collection, client
+
+        flat_path = os.path.join(workdir, "flat")
+        write_flat_index(flat_path, ids, documents, metadatas, vectors)
+
+        start = time.perf_counter()
+        collection = chromadb.PersistentClient(path=chroma_path).get_collection("bench")
+        collection.query(query_embeddings=[queries[0].tolist()], n_results=k)
+        chroma_load_ms = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        flat = FlatVectorStore(flat_path)
+        flat.query_candidates([queries[0]], k)
+        flat_load_ms = (time.perf_counter() - start) * 1000
+
+        query_cycle = itertools.cycle(queries)
+        chroma_ms = time_call(lambda: collection.query(
+            query_embeddings=[next(query_cycle).tolist()], n_results=k,
+            include=['documents', 'metadatas', 'embeddings']
+        ), repeats)
+        flat_ms = time_call(lambda: flat.query_candidates([next(query_cycle)], k), repeats)
+
+        # Recall do HNSW (Chroma) frente à busca exata do índice flat
+        exact = [
+            set(np.argpartition(-(vectors @ q), k - 1)[:k].tolist()) for q in queries
+        ]
+        approximate = collection.query(query_embeddings=queries.tolist(), n_results=k)['ids']
+        recall = np.mean([
+            len(truth & {int(i.split('-')[1]) for i in found}) / k
+            for truth, found in zip(exact, approximate)
+        ])
+        flat.close()
+
+        print(f"\n{'backend':>8} | {'carga + 1ª consulta (ms)':>25} | {'consulta (ms)':>14} | {'recall@k':>9}")
+        print("-" * 66)
+        print(f"{'chroma':>8} | {chroma_load_ms:>25.1f} | {chroma_ms:>14.3f} | {recall:>9.3f}")
+        print(f"{'flat':>8} | {flat_load_ms:>25.1f} | {flat_ms:>14.3f} | {1.0:>9.3f}")
+        print()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def benchmark_ivf(n: int, dim: int, k: int):
+    """Recall@k e latência do índice IVF frente à busca exata, variando nprobe."""
+    from core.ivf_index import IVFPartitions, build_ivf_partitions, evaluate_ivf, sample_queries
+
+    print("=" * 80)
+    print(f"BENCHMARK: ÍNDICE IVF (n={n}, k={k}, dim={dim})")
+    print("=" * 80)
+
+    vectors = synthetic_embeddings(n, dim)
+    queries = sample_queries(vectors)
+
+    workdir = tempfile.mkdtemp(prefix="bench_ivf_")
+    try:
+        manifest = build_ivf_partitions(workdir, vectors)
+        partitions = IVFPartitions(workdir)
+
+        print(f"\n{'nprobe':>7} | {'recall@k':>9} | {'exata (ms)':>11} | {'IVF (ms)':>9}")
+        print("-" * 46)
+        for nprobe in (1, 4, 8, 16, 32):
+            if nprobe > manifest['n_partitions']:
+                break
+            report = evaluate_ivf(vectors, partitions, queries, k, nprobe)
+            print(f"{nprobe:>7} | {report['recall_at_k']:>9.3f} | "
+                  f"{report['exact_ms']:>11.3f} | {report['ivf_ms']:>9.3f}")
+        print()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def benchmark_quantization(n: int, dim: int, k: int):
+    """Memória por vetor, recall@k e latência das representações quantizadas."""
+    from core.ivf_index import sample_queries
+    from core.quantization import build_quantized_vectors
+
+    print("=" * 80)
+    print(f"BENCHMARK: QUANTIZAÇÃO (n={n}, dim={dim})")
+    print("=" * 80)
+
+    vectors = synthetic_embeddings(n, dim)
+    workdir = tempfile.mkdtemp(prefix="bench_quant_")
+    try:
+        build_quantized_vectors(workdir, vectors, sample_queries(vectors))
+        print()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def benchmark_pca(n: int, dim: int):
+    """Curva de recall@k e latência da busca com vetores reduzidos por PCA."""
+    from core.ivf_index import sample_queries
+    from core.pca_index import build_pca_index
+
+    print("=" * 80)
+    print(f"BENCHMARK: PCA (n={n}, dim={dim})")
+    print("=" * 80)
+
+    vectors = synthetic_embeddings(n, dim)
+    workdir = tempfile.mkdtemp(prefix="bench_pca_")
+    try:
+        build_pca_index(workdir, vectors, sample_queries(vectors))
+        print()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark das estratégias de retrieval')
+    parser.add_argument('--dim', type=int, default=1536, help='Dimensão dos embeddings')
+    parser.add_argument('--repeats', type=int, default=50, help='Repetições por medição')
+    parser.add_argument('--k', type=int, default=5, help='Documentos selecionados')
+    parser.add_argument('--corpus-size', type=int, default=10000,
+                        help='Vetores sintéticos no benchmark de backends')
+
+    args = parser.parse_args()
+
+    benchmark_mmr(args.dim, args.repeats, args.k)
+    benchmark_backends(args.corpus_size, args.dim, args.repeats, args.k)
+    benchmark_ivf(args.corpus_size, args.dim, args.k)
+    benchmark_quantization(args.corpus_size, args.dim, args.k)
+    benchmark_pca(args.corpus_size, args.dim)
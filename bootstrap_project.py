@@ -17,17 +17,21 @@ Uso:
 import os
 import sys
 from pathlib import Path
-from typing import List, Dict, Tuple
+from typing import List, Dict, Tuple, TYPE_CHECKING
 from datetime import datetime
 import argparse
 
-from langchain_community.document_loaders import TextLoader
-from langchain_text_splitters import CharacterTextSplitter
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
-from langchain_chroma import Chroma
-from langchain_core.prompts import PromptTemplate
 from dotenv import load_dotenv
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src'))
+from core.file_index import build_file_index
+from core.symbol_index import SymbolIndex, extract_symbols, source_key, project_root, SYMBOL_INDEX_FILE
+from core.symbol_translation import translate_symbols
+from core.clients import get_chat_model, get_embeddings
+
+if TYPE_CHECKING:
+    from langchain_text_splitters import CharacterTextSplitter
+
 # Carregar variáveis de ambiente
 load_dotenv()
 
@@ -55,28 +59,6 @@ IGNORE_DIRS = {
 }
 
 
-# ================================
-# PROMPT DE TRADUÇÃO
-# ================================
-CODE_TO_RULE_PROMPT = PromptTemplate(
-    template="""Você é um analista de negócios especializado em extrair regras de negócio de código-fonte.
-
-Analise o seguinte trecho de código e extraia TODAS as regras de negócio (explícitas e implícitas).
-
-Arquivo: {filename}
-Tipo: {filetype}
-
-Código:
-{code}
-
-Para cada regra identificada, retorne no formato:
-"Regra [N]: [Descrição clara da regra em português]"
-
-Regras:""",
-    input_variables=["code", "filename", "filetype"]
-)
-
-
 # ================================
 # FUNÇÕES DE DESCOBERTA
 # ================================
@@ -140,35 +122,28 @@ def categorize_files(files: List[str]) -> Dict[str, List[str]]:
 # ================================
 # FUNÇÕES DE PROCESSAMENTO
 # ================================
-def translate_code_to_rules(code: str, filename: str, filetype: str, llm: ChatOpenAI) -> str:
-    """Traduz código em regras de negócio usando LLM."""
-    try:
-        chain = CODE_TO_RULE_PROMPT | llm
-        response = chain.invoke({
-            "code": code,
-            "filename": filename,
-            "filetype": filetype
-        })
-        return response.content
-    except Exception as e:
-        print(f"  ⚠️  Erro na tradução de {filename}: {e}")
-        return code  # Fallback: usa o código original
-
-
 def process_file(
     file_path: str, 
     category: str,
-    llm: ChatOpenAI, 
-    splitter: CharacterTextSplitter
+    llm, 
+    splitter: "CharacterTextSplitter",
+    symbol_index: SymbolIndex = None,
+    root: str = None
 ) -> Tuple[List[str], List[Dict]]:
     """
     Processa um único arquivo e retorna chunks + metadados.
     
+    Código é traduzido por símbolo (função/classe, vários por chamada ao
+    LLM), e cada chunk registra o símbolo de origem.
+    
     Args:
         file_path: Caminho do arquivo
         category: Categoria (code, doc, config)
         llm: Modelo LLM para tradução
         splitter: Divisor de texto
+        symbol_index: Índice de símbolos que registra a origem dos chunks
+        root: Raiz do repositório (o metadado 'source' é relativo a ela,
+            como na ingestão delta)
         
     Returns:
         Tupla (chunks, metadados)
@@ -183,24 +158,31 @@ def process_file(
         
         filename = os.path.basename(file_path)
         filetype = Path(file_path).suffix
+        relative_path = source_key(file_path, root)
+        symbols = extract_symbols(content, relative_path)
         
-        # Se for código, traduz em regras
+        # Se for código, traduz em regras (vários símbolos por chamada)
         if category == 'code':
-            print(f"    🔄 Traduzindo {filename}...")
-            content = translate_code_to_rules(content, filename, filetype, llm)
+            texts = translate_symbols(symbols, filename, filetype, llm)
+        else:
+            texts = [symbol['code'] for symbol in symbols]
         
-        # Divide em chunks
-        chunks = splitter.split_text(content)
+        # Divide em chunks, preservando o símbolo de origem
+        chunks = [
+            (symbol['name'], chunk)
+            for symbol, text in zip(symbols, texts)
+            for chunk in splitter.split_text(text)
+        ]
         
         # Cria metadados para cada chunk
         chunks_with_metadata = []
         metadatas = []
+        symbol_chunks = {symbol['name']: [] for symbol in symbols}
         
-        relative_path = file_path.replace('\\', '/')
-        
-        for i, chunk in enumerate(chunks):
+        for i, (symbol_name, chunk) in enumerate(chunks):
             # Adiciona cabeçalho ao chunk
-            header = f"[Arquivo: {filename} | Tipo: {category} | Chunk: {i+1}/{len(chunks)}]\n"
+            origin = f" | Símbolo: {symbol_name}" if category == 'code' else ""
+            header = f"[Arquivo: {filename} | Tipo: {category} | Chunk: {i+1}/{len(chunks)}{origin}]\n"
             full_chunk = header + chunk
             
             # Metadados
@@ -209,6 +191,7 @@ def process_file(
                 'filename': filename,
                 'type': category,
                 'filetype': filetype,
+                'symbol': symbol_name,
                 'chunk_index': i,
                 'total_chunks': len(chunks),
                 'timestamp': datetime.now().isoformat()
@@ -216,6 +199,10 @@ def process_file(
             
             chunks_with_metadata.append(full_chunk)
             metadatas.append(metadata)
+            symbol_chunks[symbol_name].append(i)
+        
+        if symbol_index is not None:
+            symbol_index.update_file(relative_path, symbols, symbol_chunks, len(chunks))
         
         print(f"    ✅ {filename}: {len(chunks)} chunks")
         return chunks_with_metadata, metadatas
@@ -305,8 +292,11 @@ def bootstrap_project(
     print("2️⃣ INICIALIZANDO COMPONENTES LANGCHAIN...")
     print("-" * 80)
     
-    llm = ChatOpenAI(model=TRANSLATION_MODEL, temperature=0.1)
-    embeddings = OpenAIEmbeddings(model=EMBEDDING_MODEL)
+    # Imports pesados apenas quando há ingestão (--help e erros de argumento são imediatos)
+    from langchain_chroma import Chroma
+    from langchain_text_splitters import CharacterTextSplitter
+    llm = get_chat_model(TRANSLATION_MODEL, temperature=0.1)
+    embeddings = get_embeddings(EMBEDDING_MODEL)
     splitter = CharacterTextSplitter(
         separator="\n\n",
         chunk_size=CHUNK_SIZE,
@@ -323,6 +313,8 @@ def bootstrap_project(
     
     all_chunks = []
     all_metadatas = []
+    symbol_index = SymbolIndex(os.path.join(db_path, SYMBOL_INDEX_FILE))
+    root = project_root(project_path)
     
     # Processar cada categoria
     for category, files in categorized_files.items():
@@ -341,7 +333,7 @@ def bootstrap_project(
         
         for file_path in files:
             try:
-                chunks, metadatas = process_file(file_path, category, llm, splitter)
+                chunks, metadatas = process_file(file_path, category, llm, splitter, symbol_index, root)
                 
                 if chunks:
                     all_chunks.extend(chunks)
@@ -381,7 +373,14 @@ def bootstrap_project(
             )
             
             print(f"   ✅ Banco criado com sucesso!")
-            print(f"   📍 Localização: {db_path}\n")
+            print(f"   📍 Localização: {db_path}")
+            
+            # Vetores-resumo por arquivo (retrieval hierárquico arquivo -> chunk)
+            build_file_index(vector_store, db_path)
+            # Proveniência das regras: símbolo -> arquivo, linhas e chunks
+            symbol_index.save()
+            print(f"   🔎 Índice de símbolos: {len(symbol_index)} símbolo(s)")
+            print()
             
         except Exception as e:
             print(f"   ❌ Erro ao criar banco: {e}\n")
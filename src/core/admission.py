@@ -0,0 +1,616 @@
+"""
+Módulo de Controle de Admissão - Coalescência e Limite de Gerações
+==================================================================
+
+Em implantações compartilhadas (Streamlit, serviço HTTP), vários
+usuários costumam enviar a mesma consulta padrão ao mesmo tempo, e cada
+um dispararia seu próprio retrieval e sua própria chamada ao LLM. Este
+módulo:
+
+1. Coalesce gerações idênticas em voo (single-flight): a chave é a
+   consulta normalizada + a versão do índice; a primeira requisição
+   executa e as demais recebem o mesmo resultado (no streaming, os
+   mesmos tokens, conforme chegam)
+2. Limita as gerações simultâneas (max_inflight) com uma fila de
+   admissão limitada (max_queue); requisições além da fila, ou que
+   esperam mais que queue_timeout_s, são rejeitadas (AdmissionRejected)
+3. Mede o tempo de fila (média, p50, p95, máximo) e os contadores de
+   admitidas, rejeitadas e coalescidas
+
+Com deadline_s, o prazo da requisição começa a contar antes da fila e a
+geração segue deadline.py; se o prazo se esgota na fila (ou a fila está
+cheia), um plano do cache é servido no lugar da rejeição, quando houver.
+
+Cada consulta recebida é anotada no log de consultas anonimizadas
+(query_log.py). Depois de uma ingestão, prefetch() gera em segundo plano,
+pela mesma fila e coalescência, os planos das consultas mais frequentes
+que ainda não têm plano na nova versão do índice; um plano do cache para
+a mesma consulta e versão do índice é servido sem retrieval nem LLM.
+"""
+
+import os
+import time
+import hashlib
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from typing import Dict, Any, Callable, Iterator, List, Optional
+
+try:
+    from .rag_pipeline import generate_test_plan, stream_test_plan, generation_profile
+    from .map_reduce import generate_test_plan_map_reduce
+    from .context_packing import CONTEXT_TOKEN_BUDGET
+    from .flat_index import flat_index_path, MANIFEST_FILE
+    from .plan_cache import PlanCache
+    from .query_log import QueryLog, query_log_path, PREFETCH_TOP_N
+    from .deadline import Deadline, generate_with_deadline, stream_with_deadline, fallback_result, serve_cached
+except ImportError:
+    # Execução direta (src/core no sys.path)
+    from rag_pipeline import generate_test_plan, stream_test_plan, generation_profile
+    from map_reduce import generate_test_plan_map_reduce
+    from context_packing import CONTEXT_TOKEN_BUDGET
+    from flat_index import flat_index_path, MANIFEST_FILE
+    from plan_cache import PlanCache
+    from query_log import QueryLog, query_log_path, PREFETCH_TOP_N
+    from deadline import Deadline, generate_with_deadline, stream_with_deadline, fallback_result, serve_cached
+
+# ================================
+# CONFIGURAÇÕES
+# ================================
+DEFAULT_MAX_INFLIGHT = 4
+DEFAULT_MAX_QUEUE = 32
+DEFAULT_QUEUE_TIMEOUT_S = 30.0
+# Amostras de tempo de fila mantidas para as estatísticas
+QUEUE_TIME_SAMPLES = 1000
+# Modo de geração do map-reduce (chave de coalescência e do cache de planos)
+MAP_REDUCE_MODE = "map_reduce"
+# Gerações simultâneas da pré-geração (o restante das vagas fica para os usuários)
+PREFETCH_CONCURRENCY = 2
+
+
+class AdmissionRejected(RuntimeError):
+    """Fila de admissão cheia ou tempo máximo de espera excedido."""
+
+
+# ================================
+# VERSÃO DO ÍNDICE
+# ================================
+def index_version(db_path: str) -> str:
+    """
+    Identificador da versão atual do índice (tamanho e mtime dos arquivos).
+
+    Muda a cada ingestão, então gerações de versões diferentes do
+    índice nunca são coalescidas.
+    """
+    parts = []
+    for path in (
+        os.path.join(db_path, "chroma.sqlite3"),
+        os.path.join(flat_index_path(db_path), MANIFEST_FILE)
+    ):
+        try:
+            stat = os.stat(path)
+            parts.append(f"{path}:{stat.st_size}:{stat.st_mtime_ns}")
+        except OSError:
+            continue
+    return hashlib.sha1("|".join(parts).encode('utf-8')).hexdigest()[:12]
+
+
+def coalescing_key(query: str, version: str, profile: str) -> str:
+    """
+    Chave de coalescência: versão do índice + perfil de geração
+    (rag_pipeline.generation_profile: orçamento e opções de retrieval) +
+    consulta normalizada; as mesmas entradas da chave do cache de planos.
+    """
+    normalized = " ".join(query.lower().split())
+    return f"{version}:{profile}:{normalized}"
+
+
+# ================================
+# FILA DE ADMISSÃO
+# ================================
+class AdmissionController:
+    """
+    Limita as gerações simultâneas, com fila de espera limitada.
+
+    Args:
+        max_inflight: Máximo de gerações (chamadas ao LLM) simultâneas
+        max_queue: Máximo de requisições aguardando uma vaga
+        queue_timeout_s: Tempo máximo de espera na fila
+    """
+
+    def __init__(
+        self,
+        max_inflight: int = DEFAULT_MAX_INFLIGHT,
+        max_queue: int = DEFAULT_MAX_QUEUE,
+        queue_timeout_s: float = DEFAULT_QUEUE_TIMEOUT_S
+    ):
+        self.max_inflight = max_inflight
+        self.max_queue = max_queue
+        self.queue_timeout_s = queue_timeout_s
+        self._slots = threading.BoundedSemaphore(max_inflight)
+        self._lock = threading.Lock()
+        self._queue_times = deque(maxlen=QUEUE_TIME_SAMPLES)
+        self.inflight = 0
+        self.queued = 0
+        self.admitted = 0
+        self.rejected = 0
+
+    def acquire(self, timeout: Optional[float] = None) -> float:
+        """
+        Aguarda uma vaga.
+
+        Args:
+            timeout: Espera máxima desta requisição (limitada a queue_timeout_s)
+
+        Returns:
+            Tempo de fila em segundos
+
+        Raises:
+            AdmissionRejected: fila cheia ou espera maior que queue_timeout_s
+        """
+        with self._lock:
+            if self.queued >= self.max_queue:
+                self.rejected += 1
+                raise AdmissionRejected(f"Fila de admissão cheia ({self.max_queue} requisições aguardando)")
+            self.queued += 1
+
+        timeout = self.queue_timeout_s if timeout is None else min(timeout, self.queue_timeout_s)
+        start = time.perf_counter()
+        acquired = self._slots.acquire(timeout=timeout)
+        wait = time.perf_counter() - start
+
+        with self._lock:
+            self.queued -= 1
+            if not acquired:
+                self.rejected += 1
+                raise AdmissionRejected(f"Tempo de espera na fila excedido ({timeout:.2f}s)")
+            self.inflight += 1
+            self.admitted += 1
+            self._queue_times.append(wait)
+        return wait
+
+    def release(self):
+        with self._lock:
+            self.inflight -= 1
+        self._slots.release()
+
+    @contextmanager
+    def slot(self, timeout: Optional[float] = None):
+        """Context manager: ocupa uma vaga durante o bloco (retorna o tempo de fila)."""
+        wait = self.acquire(timeout)
+        try:
+            yield wait
+        finally:
+            self.release()
+
+    def stats(self) -> Dict[str, Any]:
+        """Ocupação atual, contadores e distribuição do tempo de fila (ms)."""
+        with self._lock:
+            times = sorted(self._queue_times)
+            stats = {
+                'max_inflight': self.max_inflight,
+                'max_queue': self.max_queue,
+                'inflight': self.inflight,
+                'queued': self.queued,
+                'admitted': self.admitted,
+                'rejected': self.rejected
+            }
+        if times:
+            stats['queue_time_ms'] = {
+                'mean': round(sum(times) / len(times) * 1000, 1),
+                'p50': round(times[len(times) // 2] * 1000, 1),
+                'p95': round(times[min(len(times) - 1, int(len(times) * 0.95))] * 1000, 1),
+                'max': round(times[-1] * 1000, 1)
+            }
+        return stats
+
+
+# ================================
+# COALESCÊNCIA (SINGLE-FLIGHT)
+# ================================
+class _Flight:
+    """Uma geração em voo e os tokens já produzidos (para o streaming)."""
+
+    def __init__(self):
+        self.ready = threading.Event()
+        self.changed = threading.Condition()
+        self.result: Optional[Dict[str, Any]] = None
+        self.tokens = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """Executa uma única vez as chamadas idênticas em voo (mesma chave)."""
+
+    def __init__(self):
+        self._flights: Dict[str, _Flight] = {}
+        self._lock = threading.Lock()
+        self.coalesced = 0
+
+    def _join(self, key: str) -> tuple:
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                self.coalesced += 1
+                return flight, False
+            flight = self._flights[key] = _Flight()
+            return flight, True
+
+    def _finish(self, key: str, flight: _Flight):
+        with self._lock:
+            self._flights.pop(key, None)
+        with flight.changed:
+            flight.done = True
+            flight.changed.notify_all()
+        flight.ready.set()
+
+    def do(self, key: str, fn: Callable[[], Dict[str, Any]]) -> tuple:
+        """
+        Executa fn (ou aguarda a execução em voo com a mesma chave).
+
+        Returns:
+            Tupla (resultado, coalescido?)
+        """
+        flight, leader = self._join(key)
+        if not leader:
+            flight.ready.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result, True
+
+        try:
+            flight.result = fn()
+            return flight.result, False
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            self._finish(key, flight)
+
+    def stream(self, key: str, fn: Callable[[], tuple]) -> tuple:
+        """
+        Variante para streaming: fn retorna (resultado, iterador de tokens).
+
+        Quem chega com a geração em voo recebe os tokens já produzidos e
+        os seguintes, conforme o primeiro consumidor os recebe do LLM.
+
+        Returns:
+            Tupla (resultado, iterador de tokens, coalescido?). O resultado
+            é completado quando o iterador termina.
+        """
+        flight, leader = self._join(key)
+        if not leader:
+            flight.ready.wait()
+            if flight.error is not None and flight.result is None:
+                raise flight.error
+            view = dict(flight.result)
+            return view, self._follow(flight, view), True
+
+        try:
+            flight.result, upstream = fn()
+        except BaseException as e:
+            flight.error = e
+            self._finish(key, flight)
+            raise
+        flight.ready.set()
+        return flight.result, self._pump(key, flight, upstream), False
+
+    def _pump(self, key: str, flight: _Flight, upstream: Iterator[str]) -> Iterator[str]:
+        """Tokens do LLM para o primeiro consumidor, registrados para os demais."""
+        consumed = False
+        try:
+            for token in upstream:
+                with flight.changed:
+                    flight.tokens.append(token)
+                    flight.changed.notify_all()
+                yield token
+            consumed = True
+        except GeneratorExit:
+            # O primeiro consumidor desistiu: completa a geração para os demais
+            for token in upstream:
+                with flight.changed:
+                    flight.tokens.append(token)
+                    flight.changed.notify_all()
+            consumed = True
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            if not consumed and flight.error is None:
+                flight.error = RuntimeError("Geração interrompida")
+            self._finish(key, flight)
+
+    @staticmethod
+    def _follow(flight: _Flight, view: Dict[str, Any]) -> Iterator[str]:
+        position = 0
+        while True:
+            with flight.changed:
+                while position >= len(flight.tokens) and not flight.done:
+                    flight.changed.wait()
+                if position < len(flight.tokens):
+                    token = flight.tokens[position]
+                    position += 1
+                elif flight.error is not None:
+                    raise flight.error
+                else:
+                    break
+            yield token
+        view.update(flight.result)
+        view['metrics'] = {**flight.result['metrics'], 'coalesced': True}
+
+
+# ================================
+# PORTÃO DE GERAÇÃO
+# ================================
+class GenerationGate:
+    """
+    Geração de planos com coalescência e controle de admissão.
+
+    Args:
+        db_path: Caminho do banco de dados ChromaDB (versão do índice e
+            cache de planos)
+        max_inflight: Máximo de gerações simultâneas
+        max_queue: Máximo de requisições aguardando uma vaga
+        queue_timeout_s: Tempo máximo de espera na fila
+        rag_options: Opções de retrieval da cadeia usada (setup_rag_chain);
+            entram, com o orçamento de contexto, nas chaves do cache e da
+            coalescência
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        max_inflight: int = DEFAULT_MAX_INFLIGHT,
+        max_queue: int = DEFAULT_MAX_QUEUE,
+        queue_timeout_s: float = DEFAULT_QUEUE_TIMEOUT_S,
+        rag_options: Optional[Dict[str, Any]] = None
+    ):
+        self.db_path = db_path
+        self.rag_options = dict(rag_options or {})
+        self.admission = AdmissionController(max_inflight, max_queue, queue_timeout_s)
+        self.flights = SingleFlight()
+        self.cache = PlanCache(db_path)
+        self.query_log = QueryLog(query_log_path(db_path))
+        self._lock = threading.Lock()
+        self.served_by: Dict[str, int] = {}
+        self.prefetch_stats: Optional[Dict[str, Any]] = None
+
+    def _profile(self, context_token_budget: int) -> str:
+        return generation_profile(context_token_budget, self.rag_options)
+
+    def _record(self, result: Dict[str, Any], version: str, profile: str, mode: Optional[str] = None) -> None:
+        """Conta o caminho de atendimento e guarda no cache os planos completos gerados."""
+        metrics = result['metrics']
+        served_by = metrics.setdefault('served_by', 'generated')
+        with self._lock:
+            self.served_by[served_by] = self.served_by.get(served_by, 0) + 1
+        # Com prazo, o próprio deadline.py grava o plano gerado; um map-reduce
+        # com grupos que falharam é parcial e não é guardado
+        partial = any('error' in group for group in metrics.get('groups', []))
+        if served_by == 'generated' and 'deadline_s' not in metrics and not partial:
+            self.cache.put(result['query'], version, result, mode, profile)
+
+    def _warm(self, query: str, version: str, profile: str, mode: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Plano do cache para a mesma consulta, modo, perfil e versão do índice (ex.: pré-gerado)."""
+        entry = self.cache.get(query, version, mode, profile)
+        if entry is None:
+            return None
+        result = {
+            "query": query,
+            "test_plan": "",
+            "source_rules": [],
+            "rule_ids": [],
+            "retrieval": {},
+            "metrics": {'total_time_s': 0.0}
+        }
+        serve_cached(result, entry, 'cache')
+        return result
+
+    def _fallback(self, query: str, deadline: Deadline, version: str, profile: str,
+                  error: AdmissionRejected) -> Dict[str, Any]:
+        """Plano do cache no lugar da rejeição (prazo esgotado ou fila cheia)."""
+        result = fallback_result(query, deadline, self.cache, version, profile)
+        if result is None:
+            raise error
+        result['metrics']['admission_rejected'] = str(error)
+        return result
+
+    def generate(
+        self,
+        query: str,
+        qa_chain,
+        retriever,
+        context_token_budget: int = CONTEXT_TOKEN_BUDGET,
+        map_reduce: bool = False,
+        deadline_s: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """
+        generate_test_plan coalescido e admitido pela fila.
+
+        Com map_reduce=True usa generate_test_plan_map_reduce (uma vaga
+        para todas as gerações por grupo da requisição). Com deadline_s
+        (modo comum) usa generate_with_deadline, com o prazo contado desde
+        a entrada na fila.
+
+        O resultado traz metrics['queue_time_s'], metrics['served_by'] e,
+        para requisições atendidas por uma geração já em voo,
+        metrics['coalesced'] = True.
+        """
+        self.query_log.record(query)
+        version, profile = index_version(self.db_path), self._profile(context_token_budget)
+        key = coalescing_key(query, version, profile)
+        mode = MAP_REDUCE_MODE if map_reduce else None
+        if map_reduce:
+            key = f"{MAP_REDUCE_MODE}:" + key
+        elif deadline_s:
+            key = "deadline:" + key
+
+        def run() -> Dict[str, Any]:
+            if deadline_s and not map_reduce:
+                deadline = Deadline(deadline_s)
+                try:
+                    with self.admission.slot(deadline.remaining()) as wait:
+                        result = generate_with_deadline(
+                            query, qa_chain, retriever, deadline, context_token_budget, self.cache, version, profile
+                        )
+                except AdmissionRejected as e:
+                    result, wait = self._fallback(query, deadline, version, profile, e), deadline.elapsed()
+            else:
+                result = self._warm(query, version, profile, mode)
+                wait = 0.0
+                if result is None:
+                    generate = generate_test_plan_map_reduce if map_reduce else generate_test_plan
+                    with self.admission.slot() as wait:
+                        result = generate(query, qa_chain, retriever, context_token_budget)
+            result['metrics']['queue_time_s'] = round(wait, 3)
+            self._record(result, version, profile, mode)
+            return result
+
+        result, coalesced = self.flights.do(key, run)
+        if coalesced:
+            result = {**result, 'metrics': {**result['metrics'], 'coalesced': True}}
+        return result
+
+    def stream(
+        self,
+        query: str,
+        qa_chain,
+        retriever,
+        context_token_budget: int = CONTEXT_TOKEN_BUDGET,
+        deadline_s: Optional[float] = None
+    ) -> tuple:
+        """
+        stream_test_plan coalescido; a vaga fica ocupada até o fim do stream.
+
+        Com deadline_s usa stream_with_deadline, com o prazo contado desde
+        a entrada na fila.
+
+        Returns:
+            Tupla (dicionário do resultado, iterador de tokens)
+        """
+        self.query_log.record(query)
+        version, profile = index_version(self.db_path), self._profile(context_token_budget)
+        key = coalescing_key(query, version, profile)
+        if deadline_s:
+            key = "deadline:" + key
+
+        def run() -> tuple:
+            deadline = Deadline(deadline_s) if deadline_s else None
+            warm = self._warm(query, version, profile) if deadline is None else None
+            if warm is not None:
+                warm['metrics']['queue_time_s'] = 0.0
+                self._record(warm, version, profile)
+                return warm, iter([warm['test_plan']])
+            try:
+                wait = self.admission.acquire(deadline.remaining() if deadline else None)
+            except AdmissionRejected as e:
+                if deadline is None:
+                    raise
+                result = self._fallback(query, deadline, version, profile, e)
+                result['metrics']['queue_time_s'] = round(deadline.elapsed(), 3)
+                self._record(result, version, profile)
+                return result, iter([result['test_plan']])
+            try:
+                if deadline is not None:
+                    result, tokens = stream_with_deadline(
+                        query, qa_chain, retriever, deadline, context_token_budget, self.cache, version, profile
+                    )
+                else:
+                    result, tokens = stream_test_plan(query, qa_chain, retriever, context_token_budget)
+            except BaseException:
+                self.admission.release()
+                raise
+            result['metrics']['queue_time_s'] = round(wait, 3)
+
+            def guarded() -> Iterator[str]:
+                try:
+                    yield from tokens
+                finally:
+                    self.admission.release()
+                if result['test_plan'] or 'served_by' in result['metrics']:
+                    self._record(result, version, profile)
+
+            return result, guarded()
+
+        result, tokens, _ = self.flights.stream(key, run)
+        return result, tokens
+
+    def prefetch(
+        self,
+        qa_chain,
+        retriever,
+        queries: Optional[List[str]] = None,
+        top_n: int = PREFETCH_TOP_N,
+        context_token_budget: int = CONTEXT_TOKEN_BUDGET,
+        max_concurrency: int = PREFETCH_CONCURRENCY
+    ) -> threading.Thread:
+        """
+        Gera em segundo plano os planos das consultas populares (após a ingestão).
+
+        As gerações passam pela fila de admissão e pela coalescência, como
+        as dos usuários: uma requisição da mesma consulta durante a
+        pré-geração aguarda o plano em voo em vez de gerar outro.
+
+        Args:
+            qa_chain: Cadeia de geração retornada por setup_rag_chain
+            retriever: Retriever retornado por setup_rag_chain
+            queries: Consultas a pré-gerar (padrão: top_n do log de consultas, sem as
+                que tiveram dados pessoais mascarados)
+            top_n: Quantidade de consultas mais frequentes
+            context_token_budget: Máximo de tokens do CONTEXTO de cada plano
+            max_concurrency: Máximo de pré-gerações simultâneas
+
+        Returns:
+            Thread da pré-geração (daemon); as estatísticas ficam em prefetch_stats
+        """
+        if queries is None:
+            queries = [item['query'] for item in self.query_log.top_queries(top_n, skip_masked=True)]
+        thread = threading.Thread(
+            target=self._prefetch, args=(queries, qa_chain, retriever, context_token_budget, max_concurrency),
+            name="plan-prefetch", daemon=True
+        )
+        thread.start()
+        return thread
+
+    def _prefetch(self, queries: List[str], qa_chain, retriever, context_token_budget: int,
+                  max_concurrency: int) -> None:
+        version, profile = index_version(self.db_path), self._profile(context_token_budget)
+        pending = [query for query in queries if self.cache.get(query, version, profile=profile) is None]
+        stats = {'queries': len(queries), 'warm': len(queries) - len(pending), 'generated': 0, 'errors': 0}
+        print(f"🔥 Pré-geração: {len(pending)} de {len(queries)} consulta(s) popular(es) "
+              f"sem plano na versão atual do índice")
+
+        def warm(query: str) -> None:
+            def run() -> Dict[str, Any]:
+                with self.admission.slot() as wait:
+                    result = generate_test_plan(query, qa_chain, retriever, context_token_budget)
+                result['metrics']['queue_time_s'] = round(wait, 3)
+                self.cache.put(query, version, result, profile=profile)
+                return result
+            self.flights.do(coalescing_key(query, version, profile), run)
+
+        with ThreadPoolExecutor(max_workers=max(1, max_concurrency)) as executor:
+            futures = {executor.submit(warm, query): query for query in pending}
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                    stats['generated'] += 1
+                except Exception as e:
+                    stats['errors'] += 1
+                    print(f"   ❌ Pré-geração de '{futures[future]}': {type(e).__name__}: {e}")
+        self.prefetch_stats = stats
+        print(f"🔥 Pré-geração concluída: {stats['generated']} gerado(s), {stats['warm']} já no cache, "
+              f"{stats['errors']} falha(s)")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            served_by = dict(self.served_by)
+        return {
+            **self.admission.stats(),
+            'coalesced': self.flights.coalesced,
+            'served_by': served_by,
+            'cached_plans': len(self.cache),
+            'prefetch': self.prefetch_stats
+        }
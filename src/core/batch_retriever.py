@@ -0,0 +1,47 @@
+"""
+Módulo do Retriever em Lote - Runnable do LangChain
+===================================================
+
+Embrulha a função de busca em lote do build_retriever (retrieval.py)
+como Runnable do LangChain. Fica em módulo separado porque importar a
+classe Runnable carrega boa parte do langchain_core; o retrieval.py só
+importa este módulo ao criar o retriever, e comandos como
+`python src/main.py --help` não pagam esse custo.
+"""
+
+from typing import List
+
+from langchain_core.documents import Document
+from langchain_core.runnables import Runnable
+from langchain_core.runnables.config import run_in_executor
+
+
+class BatchRetriever(Runnable):
+    """
+    Retriever (query -> List[Document]) com suporte nativo a lote.
+
+    invoke() trata uma consulta; batch()/abatch() tratam N consultas com
+    uma única requisição de embeddings e uma única consulta ao ChromaDB,
+    em vez de N chamadas independentes.
+    """
+
+    def __init__(self, retrieve_many):
+        self._retrieve_many = retrieve_many
+
+    def invoke(self, input: str, config=None, **kwargs) -> List[Document]:
+        return self._retrieve_many([input])[0]
+
+    def batch(self, inputs: List[str], config=None, *, return_exceptions: bool = False, **kwargs):
+        if not inputs:
+            return []
+        try:
+            return self._retrieve_many(list(inputs))
+        except Exception as e:
+            if not return_exceptions:
+                raise
+            return [e] * len(inputs)
+
+    async def abatch(self, inputs: List[str], config=None, *, return_exceptions: bool = False, **kwargs):
+        return await run_in_executor(
+            None, self.batch, inputs, config, return_exceptions=return_exceptions
+        )
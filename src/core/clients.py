@@ -0,0 +1,228 @@
+"""
+Módulo de Clientes - LLM e Embeddings Compartilhados no Processo
+================================================================
+
+Cada ChatOpenAI/OpenAIEmbeddings criado sem http_client abre o seu
+próprio pool de conexões HTTP, e cada pool paga de novo o handshake TLS
+e o aquecimento das conexões. Este módulo entrega clientes criados sob
+demanda (na primeira chamada) e reutilizados por todo o processo:
+
+- Um único httpx.Client com pool keep-alive ajustado, compartilhado por
+  todos os modelos. No lado assíncrono, as conexões de um AsyncClient
+  ficam presas ao event loop em que foram abertas (e cada
+  generate_test_plans_batch roda um asyncio.run novo); por isso o
+  cliente assíncrono dos modelos delega cada requisição a um pool
+  próprio do event loop em execução, fechado (aclose) no encerramento
+  do loop
+- Um cliente por configuração (modelo, temperatura, opções): chamadas
+  repetidas de get_chat_model/get_embeddings devolvem a mesma instância
+
+Timeouts e tamanho do pool são configuráveis por variáveis de ambiente
+(lidas na criação do primeiro cliente, depois do load_dotenv):
+
+    OPENAI_TIMEOUT_S            tempo máximo de leitura da resposta (padrão: 60)
+    OPENAI_CONNECT_TIMEOUT_S    tempo máximo de conexão (padrão: 10)
+    OPENAI_MAX_RETRIES          novas tentativas do SDK (padrão: 2)
+    OPENAI_MAX_CONNECTIONS      conexões simultâneas do pool (padrão: 20)
+    OPENAI_MAX_KEEPALIVE        conexões ociosas mantidas abertas (padrão: 10)
+    OPENAI_KEEPALIVE_EXPIRY_S   tempo de vida de uma conexão ociosa (padrão: 120)
+
+O SDK da OpenAI, o langchain_openai e o httpx só são importados na
+criação do primeiro cliente: importar este módulo é barato.
+"""
+
+import os
+import json
+import asyncio
+import threading
+from typing import Dict, Any
+
+# ================================
+# CONFIGURAÇÕES
+# ================================
+CHAT_MODEL = "gpt-4o-mini"
+EMBEDDING_MODEL = "text-embedding-ada-002"
+
+DEFAULT_TIMEOUT_S = 60.0
+DEFAULT_CONNECT_TIMEOUT_S = 10.0
+DEFAULT_MAX_RETRIES = 2
+DEFAULT_MAX_CONNECTIONS = 20
+DEFAULT_MAX_KEEPALIVE = 10
+DEFAULT_KEEPALIVE_EXPIRY_S = 120.0
+
+_lock = threading.Lock()
+_http_clients: Dict[str, Any] = {}
+_models: Dict[tuple, Any] = {}
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    return float(value) if value else default
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+def client_settings() -> Dict[str, Any]:
+    """Timeouts, novas tentativas e limites do pool (variáveis de ambiente ou padrão)."""
+    return {
+        'timeout_s': _env_float("OPENAI_TIMEOUT_S", DEFAULT_TIMEOUT_S),
+        'connect_timeout_s': _env_float("OPENAI_CONNECT_TIMEOUT_S", DEFAULT_CONNECT_TIMEOUT_S),
+        'max_retries': _env_int("OPENAI_MAX_RETRIES", DEFAULT_MAX_RETRIES),
+        'max_connections': _env_int("OPENAI_MAX_CONNECTIONS", DEFAULT_MAX_CONNECTIONS),
+        'max_keepalive': _env_int("OPENAI_MAX_KEEPALIVE", DEFAULT_MAX_KEEPALIVE),
+        'keepalive_expiry_s': _env_float("OPENAI_KEEPALIVE_EXPIRY_S", DEFAULT_KEEPALIVE_EXPIRY_S)
+    }
+
+
+# ================================
+# POOL HTTP
+# ================================
+def _pool_options(settings: Dict[str, Any]) -> Dict[str, Any]:
+    import httpx
+    return {
+        'timeout': httpx.Timeout(settings['timeout_s'], connect=settings['connect_timeout_s']),
+        'limits': httpx.Limits(
+            max_connections=settings['max_connections'],
+            max_keepalive_connections=settings['max_keepalive'],
+            keepalive_expiry=settings['keepalive_expiry_s']
+        )
+    }
+
+
+async def _close_on_loop_shutdown(client):
+    """
+    Gerador assíncrono que fecha o pool quando o event loop é encerrado.
+
+    O loop guarda os geradores iniciados nele e os fecha em
+    shutdown_asyncgens(), chamado pelo asyncio.run antes de fechar o
+    loop: o finally roda ainda dentro do loop dono das conexões.
+    """
+    try:
+        yield
+    finally:
+        await client.aclose()
+
+
+def _per_loop_async_client(settings: Dict[str, Any]):
+    """
+    httpx.AsyncClient que usa um pool por event loop.
+
+    É uma subclasse (o SDK da OpenAI exige um httpx.AsyncClient) cujo
+    send() pega o pool do loop em execução, criado na primeira requisição
+    do loop e fechado no encerramento dele (_close_on_loop_shutdown). O
+    cliente em si não abre pool: o transporte base só existe para
+    satisfazer o construtor e nunca é usado.
+    """
+    import httpx
+
+    class UnusedTransport(httpx.AsyncBaseTransport):
+        async def handle_async_request(self, request):
+            raise RuntimeError("PerLoopAsyncClient envia pelo pool do event loop (for_loop)")
+
+    class PerLoopAsyncClient(httpx.AsyncClient):
+        def __init__(self):
+            super().__init__(transport=UnusedTransport(), trust_env=False,
+                             timeout=_pool_options(settings)['timeout'])
+            # loop -> (pool, gerador que o fecha no encerramento do loop)
+            self._loop_clients: Dict[Any, tuple] = {}
+            self._loop_lock = threading.Lock()
+
+        def for_loop(self) -> "httpx.AsyncClient":
+            loop = asyncio.get_running_loop()
+            with self._loop_lock:
+                for closed in [l for l in self._loop_clients if l.is_closed()]:
+                    # Já fechado no shutdown_asyncgens do loop; um loop fechado
+                    # sem ele não permite mais aclose (o pool é só descartado)
+                    del self._loop_clients[closed]
+                if loop not in self._loop_clients:
+                    pool = httpx.AsyncClient(**_pool_options(settings))
+                    closer = _close_on_loop_shutdown(pool)
+                    # Inicia o gerador no loop: a partir daqui o loop o conhece
+                    loop.create_task(closer.__anext__())
+                    self._loop_clients[loop] = (pool, closer)
+                return self._loop_clients[loop][0]
+
+        async def send(self, request, **kwargs):
+            return await self.for_loop().send(request, **kwargs)
+
+    return PerLoopAsyncClient()
+
+
+def _http_client(kind: str):
+    """httpx.Client ('sync') ou cliente assíncrono por event loop ('async') do processo. Chamar com _lock."""
+    if kind not in _http_clients:
+        import httpx
+        settings = client_settings()
+        _http_clients[kind] = (
+            httpx.Client(**_pool_options(settings)) if kind == 'sync' else _per_loop_async_client(settings)
+        )
+    return _http_clients[kind]
+
+
+# ================================
+# FÁBRICA DE CLIENTES
+# ================================
+def _options_key(kwargs: Dict[str, Any]) -> str:
+    """Chave das opções do cliente (aceita valores não-hashable, ex.: model_kwargs={...})."""
+    return json.dumps(kwargs, sort_keys=True, default=repr)
+
+
+def get_chat_model(model: str = CHAT_MODEL, temperature: float = 0.0, **kwargs) -> "ChatOpenAI":
+    """
+    ChatOpenAI compartilhado para a configuração (criado na primeira chamada).
+
+    Args:
+        model: Nome do modelo
+        temperature: Temperatura de amostragem
+        **kwargs: Demais opções do ChatOpenAI (ex.: stream_usage=True)
+
+    Returns:
+        Instância única por (model, temperature, kwargs), usando o pool HTTP
+        do processo
+    """
+    key = ('chat', model, temperature, _options_key(kwargs))
+    with _lock:
+        if key not in _models:
+            from langchain_openai import ChatOpenAI
+            settings = client_settings()
+            _models[key] = ChatOpenAI(
+                model=model,
+                temperature=temperature,
+                timeout=settings['timeout_s'],
+                max_retries=settings['max_retries'],
+                http_client=_http_client('sync'),
+                http_async_client=_http_client('async'),
+                **kwargs
+            )
+        return _models[key]
+
+
+def get_embeddings(model: str = EMBEDDING_MODEL, **kwargs) -> "OpenAIEmbeddings":
+    """
+    OpenAIEmbeddings compartilhado para o modelo (criado na primeira chamada).
+
+    Args:
+        model: Nome do modelo de embeddings
+        **kwargs: Demais opções do OpenAIEmbeddings
+
+    Returns:
+        Instância única por (model, kwargs), usando o pool HTTP do processo
+    """
+    key = ('embeddings', model, _options_key(kwargs))
+    with _lock:
+        if key not in _models:
+            from langchain_openai import OpenAIEmbeddings
+            settings = client_settings()
+            _models[key] = OpenAIEmbeddings(
+                model=model,
+                timeout=settings['timeout_s'],
+                max_retries=settings['max_retries'],
+                http_client=_http_client('sync'),
+                http_async_client=_http_client('async'),
+                **kwargs
+            )
+        return _models[key]
+
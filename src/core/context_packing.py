@@ -0,0 +1,215 @@
+"""
+Módulo de Empacotamento de Contexto - Orçamento de Tokens do Prompt
+===================================================================
+
+Transforma os documentos recuperados no CONTEXTO enviado ao LLM,
+respeitando um orçamento de tokens:
+
+1. Remove os cabeçalhos de proveniência repetidos em cada chunk
+   ([Fonte: ...] / [Arquivo: ...]) e emite um único cabeçalho por fonte
+2. Remove trechos sobrepostos (chunk_overlap do splitter) e duplicados
+3. Ordena as regras por score (fontes pela melhor regra); os acertos
+   exatos do índice de símbolos (metadata['resolved_by']) vêm antes de
+   qualquer score, na ordem do retriever
+4. Trunca o contexto para caber no orçamento
+"""
+
+import re
+from typing import List, Dict, Any, Optional, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from langchain_core.documents import Document
+
+# ================================
+# CONFIGURAÇÕES
+# ================================
+CONTEXT_TOKEN_BUDGET = 1500
+TOKENIZER_MODEL = "gpt-4o-mini"
+MIN_OVERLAP_CHARS = 30
+MIN_TRUNCATED_TOKENS = 40
+
+# Cabeçalhos gerados pela ingestão delta e pelo bootstrap
+HEADER_PATTERN = re.compile(
+    r"^\[(?:Fonte|Arquivo): (?P<file>[^|\]]+?) \| Tipo: (?P<type>[^|\]]+?) \| Chunk: [^\]]+\]\s*\n?"
+)
+
+_encoding = None
+
+
+# ================================
+# CONTAGEM DE TOKENS
+# ================================
+def _get_encoding():
+    """Carrega o tokenizer do modelo (tiktoken); None se indisponível."""
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+            try:
+                _encoding = tiktoken.encoding_for_model(TOKENIZER_MODEL)
+            except KeyError:
+                _encoding = tiktoken.get_encoding("o200k_base")
+        except Exception:
+            # Sem tiktoken (ou sem acesso aos arquivos BPE): usa estimativa
+            _encoding = False
+    return _encoding or None
+
+
+def count_tokens(text: str) -> int:
+    """Conta tokens do texto (estimativa de 4 caracteres/token sem tiktoken)."""
+    encoding = _get_encoding()
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text))
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Trunca o texto para no máximo max_tokens tokens."""
+    encoding = _get_encoding()
+    if encoding is None:
+        return text[:max_tokens * 4]
+    return encoding.decode(encoding.encode(text)[:max_tokens])
+
+
+# ================================
+# FUNÇÕES AUXILIARES
+# ================================
+def split_header(content: str, metadata: Optional[Dict[str, Any]] = None) -> tuple:
+    """
+    Separa o cabeçalho de proveniência do texto do chunk.
+
+    Returns:
+        Tupla (rótulo da fonte ou None se desconhecida, texto sem cabeçalho)
+    """
+    metadata = metadata or {}
+    match = HEADER_PATTERN.match(content)
+    if match:
+        label = f"{match.group('file').strip()} | Tipo: {match.group('type').strip()}"
+        return label, content[match.end():].strip()
+
+    source = metadata.get('filename') or metadata.get('source')
+    if source:
+        label = f"{source} | Tipo: {metadata.get('type', 'desconhecido')}"
+    else:
+        label = None
+    return label, content.strip()
+
+
+def overlap_length(left: str, right: str, min_overlap: int = MIN_OVERLAP_CHARS) -> int:
+    """Tamanho do maior sufixo de `left` que também é prefixo de `right`."""
+    probe = right[:min_overlap]
+    if len(probe) < min_overlap:
+        return 0
+
+    start = left.find(probe)
+    while start != -1:
+        if right.startswith(left[start:]):
+            return len(left) - start
+        start = left.find(probe, start + 1)
+    return 0
+
+
+def remove_overlap(text: str, kept: List[str]) -> str:
+    """
+    Remove de `text` os trechos já presentes nas passagens mantidas.
+
+    Retorna string vazia se o texto estiver inteiramente contido em
+    alguma passagem já mantida.
+    """
+    for previous in kept:
+        if text in previous:
+            return ""
+        cut = overlap_length(previous, text)
+        if cut:
+            text = text[cut:].lstrip()
+        cut = overlap_length(text, previous)
+        if cut:
+            text = text[:len(text) - cut].rstrip()
+        if not text:
+            return ""
+    return text
+
+
+# ================================
+# EMPACOTAMENTO
+# ================================
+def pack_context(docs: List["Document"], token_budget: int = CONTEXT_TOKEN_BUDGET) -> Dict[str, Any]:
+    """
+    Monta o contexto do prompt a partir dos documentos recuperados.
+
+    Args:
+        docs: Documentos recuperados (score opcional em metadata['score'])
+        token_budget: Máximo de tokens do contexto
+
+    Returns:
+        Dicionário com o texto empacotado e estatísticas de tokens
+    """
+    stats = {
+        'text': "",
+        'tokens': 0,
+        'raw_tokens': count_tokens("\n\n".join(doc.page_content for doc in docs)),
+        'passages': 0,
+        'dropped': 0,
+        'truncated': False
+    }
+
+    # 1. Agrupa passagens (sem cabeçalho) por fonte, preservando o score
+    groups: Dict[Optional[str], List[tuple]] = {}
+    for position, doc in enumerate(docs):
+        label, text = split_header(doc.page_content, doc.metadata)
+        metadata = doc.metadata or {}
+        score = metadata.get('score')
+        # Rank (prioridade, relevância): acertos de símbolo primeiro; sem
+        # score, a ordem do retriever é usada como relevância
+        if metadata.get('resolved_by'):
+            rank = (1, -float(position))
+        else:
+            rank = (0, float(score) if score is not None else -float(position))
+        groups.setdefault(label, []).append((rank, text))
+
+    # 2. Ordena fontes pela melhor regra e regras por score
+    ordered = sorted(groups.items(), key=lambda item: max(r for r, _ in item[1]), reverse=True)
+
+    # 3. Remove sobreposições e aplica o orçamento
+    sections = []
+    used_tokens = 0
+    budget_exhausted = False
+
+    for label, passages in ordered:
+        if budget_exhausted:
+            stats['dropped'] += len(passages)
+            continue
+
+        # Regras sem proveniência conhecida são listadas sem cabeçalho
+        header = f"[Fonte: {label}]\n" if label else ""
+        header_tokens = count_tokens(header)
+        kept: List[str] = []
+
+        for _, text in sorted(passages, key=lambda p: p[0], reverse=True):
+            text = remove_overlap(text, kept)
+            if not text or budget_exhausted:
+                stats['dropped'] += 1
+                continue
+
+            cost = count_tokens(text + "\n") + (0 if kept else header_tokens)
+            remaining = token_budget - used_tokens
+            if cost > remaining:
+                available = remaining - (0 if kept else header_tokens)
+                budget_exhausted = True
+                if available < MIN_TRUNCATED_TOKENS:
+                    stats['dropped'] += 1
+                    continue
+                text = truncate_to_tokens(text, available - 1).rstrip() + "…"
+                cost = remaining
+                stats['truncated'] = True
+
+            kept.append(text)
+            used_tokens += cost
+
+        if kept:
+            sections.append(header + "\n".join(kept))
+            stats['passages'] += len(kept)
+
+    stats['text'] = "\n\n".join(sections)
+    stats['tokens'] = count_tokens(stats['text'])
+    return stats
@@ -0,0 +1,260 @@
+"""
+Módulo de Varredura de Cobertura - Um Plano BDD por Unidade do Índice
+=====================================================================
+
+Em vez de rodar --query à mão para cada serviço, a varredura enumera
+todas as unidades indexadas e gera um plano para cada uma:
+
+- Símbolos do índice de símbolos (ingestão delta/bootstrap): cada função,
+  classe ou método de nível superior de um arquivo de código (ex.: cada
+  função de data/code_example.py) e o símbolo <module> dos documentos
+- Documentos-pai da ingestão completa (parent_store) dos arquivos que
+  não estão no índice de símbolos. Em um banco small-to-big com índice
+  de símbolos, as regras de cada símbolo são os pais dos seus chunks
+
+O contexto de cada unidade são as próprias regras dela (sem retrieval),
+empacotadas no orçamento de tokens; unidades cujas regras não estão mais
+no banco são puladas, sem chamada ao LLM. As gerações rodam com no máximo
+max_concurrency em voo e cada resultado é escrito no JSONL assim que
+termina.
+
+O progresso fica em SWEEP_CHECKPOINT_FILE, no diretório do banco:
+para cada unidade concluída, o hash das suas regras. Uma varredura
+interrompida retoma de onde parou, e uma unidade cujas regras não
+mudaram desde o último plano (no checkpoint ou no .feature gravado) é
+pulada.
+"""
+
+import os
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+try:
+    from .symbol_index import SymbolIndex, MODULE_SYMBOL
+    from .parent_store import ParentStore
+    from .context_packing import pack_context, CONTEXT_TOKEN_BUDGET
+    from .rag_pipeline import token_metrics, build_plan_result, DEFAULT_MAX_CONCURRENCY
+    from .plan_store import load_rules, content_hash, plan_filename, read_plan, save_plan
+except ImportError:
+    # Execução direta (src/core no sys.path)
+    from symbol_index import SymbolIndex, MODULE_SYMBOL
+    from parent_store import ParentStore
+    from context_packing import pack_context, CONTEXT_TOKEN_BUDGET
+    from rag_pipeline import token_metrics, build_plan_result, DEFAULT_MAX_CONCURRENCY
+    from plan_store import load_rules, content_hash, plan_filename, read_plan, save_plan
+
+# ================================
+# CONFIGURAÇÕES
+# ================================
+SWEEP_CHECKPOINT_FILE = "sweep_checkpoint.json"
+
+
+# ================================
+# UNIDADES
+# ================================
+def unit_query(label: str) -> str:
+    """Solicitação de geração de uma unidade (estável: é a chave do .feature)."""
+    return f"Gere cenários de teste BDD para as regras de negócio de {label}."
+
+
+def enumerate_units(db_path: str) -> List[Dict[str, Any]]:
+    """
+    Lista as unidades do índice (símbolos e documentos-pai).
+
+    Os documentos-pai de um arquivo com símbolos não viram unidades
+    próprias: as regras já estão nas unidades dos símbolos.
+
+    Returns:
+        Lista de dicionários com 'unit' (id estável), 'label', 'source',
+        'query' e 'rule_ids' (ids de retrieval.rule_ids)
+    """
+    units = []
+    parent_store = ParentStore.load(db_path)
+    parents = parent_store.parents if parent_store else {}
+
+    def chunk_rule_id(source: str, index: int) -> str:
+        # Banco small-to-big: o chunk do símbolo é um documento-pai
+        parent_id = f"{source}#{index}"
+        return f"parent:{parent_id}" if parent_id in parents else f"chunk:{parent_id}"
+
+    symbol_index = SymbolIndex.load(db_path)
+    for source, entry in sorted(symbol_index.files.items()):
+        filename = os.path.basename(source)
+        for name, symbol in entry['symbols'].items():
+            if not symbol.get('chunks'):
+                continue
+            label = filename if name == MODULE_SYMBOL else f"`{name}` em {filename}"
+            units.append({
+                'unit': f"symbol:{source}::{name}",
+                'label': label,
+                'source': source,
+                'query': unit_query(label),
+                'rule_ids': [chunk_rule_id(source, i) for i in symbol['chunks']]
+            })
+
+    covered = {unit['source'] for unit in units}
+    for parent_id, parent in sorted(parents.items()):
+        metadata = parent['metadata']
+        if metadata.get('source') in covered:
+            continue
+        filename = metadata.get('filename') or os.path.basename(metadata.get('source', parent_id))
+        part = parent_id.rsplit("#", 1)[-1]
+        label = f"{filename} (parte {int(part) + 1})" if part.isdigit() else filename
+        units.append({
+            'unit': f"parent:{parent_id}",
+            'label': label,
+            'source': metadata.get('source'),
+            'query': unit_query(label),
+            'rule_ids': [f"parent:{parent_id}"]
+        })
+    return units
+
+
+def unit_hash(rule_hashes: Dict[str, Optional[str]], ids: List[str]) -> str:
+    """Hash combinado das regras de uma unidade."""
+    return content_hash("|".join(f"{rule_id}={rule_hashes.get(rule_id) or '-'}" for rule_id in ids))
+
+
+# ================================
+# CHECKPOINT
+# ================================
+def load_checkpoint(path: str) -> Dict[str, Dict[str, Any]]:
+    """Unidades concluídas em varreduras anteriores (unit -> hash, horário)."""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f).get('units', {})
+    except (OSError, ValueError):
+        return {}
+
+
+def save_checkpoint(path: str, units: Dict[str, Dict[str, Any]]) -> None:
+    """Grava o checkpoint (arquivo temporário + os.replace)."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'updated_at': datetime.now().isoformat(), 'units': units}, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def is_current(unit: Dict[str, Any], current_hash: str, rule_hashes: Dict[str, Optional[str]],
+               checkpoint: Dict[str, Dict[str, Any]], plans_dir: Optional[str]) -> bool:
+    """A unidade já tem plano gerado com as regras atuais (checkpoint ou .feature)?"""
+    if checkpoint.get(unit['unit'], {}).get('hash') == current_hash:
+        return True
+    if plans_dir:
+        path = os.path.join(plans_dir, plan_filename(unit['query']))
+        plan = read_plan(path) if os.path.exists(path) else None
+        if plan and plan['rules'] == {rule_id: rule_hashes.get(rule_id) for rule_id in unit['rule_ids']}:
+            return True
+    return False
+
+
+# ================================
+# VARREDURA
+# ================================
+def generate_unit_plan(unit: Dict[str, Any], docs: List, qa_chain,
+                       context_token_budget: int = CONTEXT_TOKEN_BUDGET) -> Dict[str, Any]:
+    """Gera o plano de uma unidade com as regras dela como contexto."""
+    start = time.perf_counter()
+    packed = pack_context(docs, token_budget=context_token_budget)
+    result = qa_chain.invoke({"context": packed['text'], "question": unit['query']})
+
+    metrics = token_metrics(unit['query'], packed, result)
+    metrics["total_time_s"] = round(time.perf_counter() - start, 3)
+    return build_plan_result(unit['query'], docs, result, metrics)
+
+
+def run_sweep(
+    db_path: str,
+    qa_chain,
+    output,
+    plans_dir: Optional[str] = None,
+    max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+    context_token_budget: int = CONTEXT_TOKEN_BUDGET,
+    checkpoint_path: Optional[str] = None
+) -> Dict[str, int]:
+    """
+    Gera um plano para cada unidade do índice que ainda não tem plano atual.
+
+    Args:
+        db_path: Caminho do banco de dados
+        qa_chain: Cadeia de geração retornada por setup_rag_chain
+        output: Stream de saída (uma linha JSON por unidade gerada ou com falha)
+        plans_dir: Se informado, grava cada plano como .feature
+        max_concurrency: Máximo de gerações simultâneas
+        context_token_budget: Máximo de tokens do CONTEXTO de cada unidade
+        checkpoint_path: Arquivo de progresso (padrão: db_path/SWEEP_CHECKPOINT_FILE)
+
+    Returns:
+        Dicionário com estatísticas ('units', 'current', 'empty' (sem
+        regras no banco), 'generated', 'errors', 'interrupted')
+    """
+    checkpoint_path = checkpoint_path or os.path.join(db_path, SWEEP_CHECKPOINT_FILE)
+    checkpoint = load_checkpoint(checkpoint_path)
+
+    units = enumerate_units(db_path)
+    rules = load_rules(db_path, sorted({rule_id for unit in units for rule_id in unit['rule_ids']}))
+    rule_hashes = {rule_id: content_hash(doc.page_content) if doc is not None else None
+                   for rule_id, doc in rules.items()}
+
+    pending = []
+    empty = []
+    for unit in units:
+        current_hash = unit_hash(rule_hashes, unit['rule_ids'])
+        if is_current(unit, current_hash, rule_hashes, checkpoint, plans_dir):
+            continue
+        docs = [rules[rule_id] for rule_id in unit['rule_ids'] if rules.get(rule_id) is not None]
+        if docs:
+            pending.append((unit, current_hash, docs))
+        else:
+            empty.append(unit)
+
+    stats = {'units': len(units), 'current': len(units) - len(pending) - len(empty), 'empty': len(empty),
+             'generated': 0, 'errors': 0, 'interrupted': 0}
+    print(f"🧭 Unidades: {stats['units']} | atuais: {stats['current']} | a gerar: {len(pending)} "
+          f"(concorrência: {max_concurrency})")
+    for unit in empty:
+        print(f"   ⚠️  {unit['label']}: nenhuma regra no banco (reexecute a ingestão); unidade pulada")
+    if not pending:
+        return stats
+
+    executor = None
+    try:
+        executor = ThreadPoolExecutor(max_workers=max_concurrency)
+        futures = {}
+        for unit, current_hash, docs in pending:
+            future = executor.submit(generate_unit_plan, unit, docs, qa_chain, context_token_budget)
+            futures[future] = (unit, current_hash)
+
+        for done, future in enumerate(as_completed(futures), 1):
+            unit, current_hash = futures[future]
+            record = {'unit': unit['unit'], 'label': unit['label'], 'source': unit['source']}
+            try:
+                result = future.result()
+            except Exception as e:
+                stats['errors'] += 1
+                record.update(query=unit['query'], error=f"{type(e).__name__}: {e}")
+                print(f"   ❌ [{done}/{len(pending)}] {unit['label']}: {record['error']}")
+            else:
+                stats['generated'] += 1
+                if plans_dir:
+                    result['plan_path'] = save_plan(plans_dir, result, db_path, rule_hashes)
+                record.update(result)
+                checkpoint[unit['unit']] = {'hash': current_hash, 'generated_at': datetime.now().isoformat()}
+                save_checkpoint(checkpoint_path, checkpoint)
+                print(f"   ✅ [{done}/{len(pending)}] {unit['label']}")
+            output.write(json.dumps(record, ensure_ascii=False) + "\n")
+            output.flush()
+    except KeyboardInterrupt:
+        stats['interrupted'] = len(pending) - stats['generated'] - stats['errors']
+        print(f"\n⏸️  Varredura interrompida: {stats['interrupted']} unidade(s) pendente(s). "
+              f"Execute de novo para retomar.")
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=not stats['interrupted'], cancel_futures=True)
+
+    print(f"✅ {stats['generated']}/{len(pending)} plano(s) gerado(s)"
+          + (f" | ❌ Falhas: {stats['errors']}" if stats['errors'] else ""))
+    return stats
@@ -0,0 +1,362 @@
+"""
+Módulo de Prazo por Requisição - Geração com Latência Limitada
+==============================================================
+
+Sem prazo, uma requisição espera o LLM pelo tempo que ele levar (até o
+timeout do cliente HTTP e as novas tentativas do SDK). Aqui cada
+requisição carrega um prazo total (Deadline), dividido entre as etapas:
+
+1. Retrieval: até STAGE_SHARES['retrieval'] do prazo
+2. Empacotamento do contexto: local, apenas medido
+3. Geração: o que sobrar, menos uma reserva para montar a resposta;
+   o plano é lido em streaming e a leitura para no prazo
+
+Quando o prazo se esgota (ou não sobra tempo para gerar), a resposta cai
+para o melhor caminho disponível, registrado em metrics['served_by']:
+
+    'cache'          plano da mesma consulta (e perfil de geração) na
+                     versão atual do índice
+    'generated'      geração completa dentro do prazo
+    'lexical_match'  plano da consulta com mais termos em comum no cache
+                     (comparação lexical, sem embeddings; plan_cache.py)
+    'partial'        regras recuperadas + o trecho do plano gerado até o prazo
+
+Etapas interrompidas continuam em uma thread daemon até terminarem, e o
+resultado delas é descartado; a geração em streaming é encerrada no
+próximo chunk.
+"""
+
+import time
+import queue
+import threading
+from typing import Dict, Any, Callable, Iterator, Optional, Union
+
+try:
+    from .rag_pipeline import token_metrics
+    from .retrieval import score_distribution, rule_ids
+    from .context_packing import pack_context, CONTEXT_TOKEN_BUDGET
+    from .plan_cache import PlanCache
+except ImportError:
+    # Execução direta (src/core no sys.path)
+    from rag_pipeline import token_metrics
+    from retrieval import score_distribution, rule_ids
+    from context_packing import pack_context, CONTEXT_TOKEN_BUDGET
+    from plan_cache import PlanCache
+
+# ================================
+# CONFIGURAÇÕES
+# ================================
+DEFAULT_DEADLINE_S = 30.0
+# Fração do prazo total reservada a cada etapa; a geração fica com o restante
+STAGE_SHARES = {'retrieval': 0.3}
+# Abaixo deste tempo restante a geração nem começa (vai direto ao fallback)
+MIN_GENERATION_S = 2.0
+# Tempo reservado ao fim do prazo para montar a resposta de fallback
+FALLBACK_RESERVE_S = 0.5
+
+PARTIAL_NOTE = "\n\n# ⚠️ Plano parcial: prazo de {deadline}s esgotado durante a geração\n"
+
+
+class DeadlineExceeded(TimeoutError):
+    """Etapa não concluída dentro do tempo disponível."""
+
+
+class Deadline:
+    """
+    Prazo total de uma requisição, contado a partir da criação.
+
+    Args:
+        total_s: Prazo total em segundos
+    """
+
+    def __init__(self, total_s: float):
+        self.total_s = total_s
+        self.start = time.perf_counter()
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.start
+
+    def remaining(self) -> float:
+        return max(0.0, self.total_s - self.elapsed())
+
+    def stage_budget(self, stage: str) -> float:
+        """Tempo disponível para a etapa ('retrieval' ou 'generation')."""
+        if stage in STAGE_SHARES:
+            return min(self.remaining(), self.total_s * STAGE_SHARES[stage])
+        return max(0.0, self.remaining() - FALLBACK_RESERVE_S)
+
+
+def as_deadline(deadline: Union[Deadline, float]) -> Deadline:
+    """Aceita um Deadline já em curso (ex.: iniciado antes da fila) ou o prazo em segundos."""
+    return deadline if isinstance(deadline, Deadline) else Deadline(deadline)
+
+
+# ================================
+# EXECUÇÃO LIMITADA
+# ================================
+def run_with_timeout(fn: Callable[[], Any], timeout_s: float) -> Any:
+    """
+    Executa fn em uma thread daemon e espera no máximo timeout_s.
+
+    Raises:
+        DeadlineExceeded: fn não terminou a tempo (o resultado tardio é descartado)
+    """
+    box: Dict[str, Any] = {}
+    done = threading.Event()
+
+    def target():
+        try:
+            box['result'] = fn()
+        except BaseException as e:
+            box['error'] = e
+        finally:
+            done.set()
+
+    threading.Thread(target=target, name="deadline-stage", daemon=True).start()
+    if not done.wait(timeout_s):
+        raise DeadlineExceeded(f"Etapa não concluída em {timeout_s:.2f}s")
+    if 'error' in box:
+        raise box['error']
+    return box['result']
+
+
+def bounded_stream(qa_chain, inputs: Dict[str, Any], timeout_s: float, state: Dict[str, Any]) -> Iterator[str]:
+    """
+    Trechos do plano gerado até timeout_s.
+
+    O streaming roda em uma thread daemon; ao fim, state['message'] traz a
+    mensagem completa (com usage_metadata) ou state['timed_out'] = True.
+    """
+    chunks: "queue.Queue[tuple]" = queue.Queue()
+    stop = threading.Event()
+
+    def produce():
+        full_message = None
+        try:
+            for chunk in qa_chain.stream(inputs):
+                if stop.is_set():
+                    return
+                full_message = chunk if full_message is None else full_message + chunk
+                chunks.put(('token', chunk.content))
+            chunks.put(('done', full_message))
+        except BaseException as e:
+            chunks.put(('error', e))
+
+    threading.Thread(target=produce, name="deadline-generation", daemon=True).start()
+    end = time.perf_counter() + timeout_s
+    try:
+        while True:
+            try:
+                kind, value = chunks.get(timeout=max(0.0, end - time.perf_counter()))
+            except queue.Empty:
+                state['timed_out'] = True
+                return
+            if kind == 'token':
+                if value:
+                    yield value
+            elif kind == 'done':
+                state['message'] = value
+                return
+            else:
+                raise value
+    finally:
+        stop.set()
+
+
+# ================================
+# FALLBACK
+# ================================
+def serve_cached(result: Dict[str, Any], entry: Dict[str, Any], served_by: str) -> None:
+    """Preenche o resultado com um plano do cache ('cache' ou 'lexical_match')."""
+    result['test_plan'] = entry['test_plan']
+    result['source_rules'] = entry['source_rules']
+    result['rule_ids'] = entry.get('rule_ids', [])
+    result['metrics']['served_by'] = served_by
+    if served_by == 'lexical_match':
+        result['metrics']['matched_query'] = entry['query']
+        result['metrics']['term_overlap'] = entry['term_overlap']
+        result['metrics']['stale'] = entry['stale']
+
+
+def fallback_result(
+    query: str,
+    deadline: Deadline,
+    cache: Optional[PlanCache] = None,
+    version: Optional[str] = None,
+    profile: Optional[str] = None
+) -> Optional[Dict[str, Any]]:
+    """
+    Resultado de fallback sem retrieval nem LLM (ex.: prazo esgotado na fila).
+
+    Returns:
+        Resultado servido pelo cache ('cache' ou 'lexical_match'), ou None
+    """
+    if cache is None:
+        return None
+    entry = cache.get(query, version, profile=profile)
+    served_by = 'cache'
+    if entry is None:
+        entry, served_by = cache.lexical_match(query, version), 'lexical_match'
+    if entry is None:
+        return None
+    result = _new_result(query, deadline)
+    serve_cached(result, entry, served_by)
+    _close(result, deadline)
+    return result
+
+
+def _new_result(query: str, deadline: Deadline) -> Dict[str, Any]:
+    return {
+        "query": query,
+        "test_plan": "",
+        "source_rules": [],
+        "rule_ids": [],
+        "retrieval": {},
+        "metrics": {'deadline_s': deadline.total_s, 'stages': {}}
+    }
+
+
+def _close(result: Dict[str, Any], deadline: Deadline) -> None:
+    """Tempo total e caminho de atendimento (impresso)."""
+    metrics = result['metrics']
+    metrics['total_time_s'] = round(deadline.elapsed(), 3)
+    metrics['deadline_exceeded'] = metrics['served_by'] not in ('cache', 'generated')
+    print(f"⏳ Servido por '{metrics['served_by']}' em {metrics['total_time_s']}s "
+          f"(prazo: {deadline.total_s}s)")
+
+
+# ================================
+# GERAÇÃO COM PRAZO
+# ================================
+def stream_with_deadline(
+    query: str,
+    qa_chain,
+    retriever,
+    deadline: Union[Deadline, float] = DEFAULT_DEADLINE_S,
+    context_token_budget: int = CONTEXT_TOKEN_BUDGET,
+    cache: Optional[PlanCache] = None,
+    version: Optional[str] = None,
+    profile: Optional[str] = None,
+    prefer_match: bool = False
+) -> tuple:
+    """
+    Variante de stream_test_plan com prazo total e fallback.
+
+    Args:
+        query: Pergunta/solicitação do usuário
+        qa_chain: Cadeia de geração retornada por setup_rag_chain
+        retriever: Retriever retornado por setup_rag_chain
+        deadline: Prazo em segundos ou Deadline já em curso
+        context_token_budget: Máximo de tokens do CONTEXTO enviado ao LLM
+        cache: Cache de planos (acerto exato, plano por termos em comum e
+            gravação do plano gerado); None desativa os caminhos de cache
+        version: Versão atual do índice (admission.index_version)
+        profile: Perfil de geração do acerto exato e da gravação
+            (rag_pipeline.generation_profile)
+        prefer_match: No prazo esgotado durante a geração, prefere o plano
+            da consulta com termos em comum ao trecho parcial já gerado
+            (modo sem streaming)
+
+    Returns:
+        Tupla (dicionário do resultado, iterador de trechos de texto); o
+        resultado traz metrics['served_by'], 'stages' (orçamento e tempo
+        de cada etapa) e 'deadline_exceeded'
+    """
+    deadline = as_deadline(deadline)
+    print(f"\nExecutando consulta (prazo: {deadline.total_s}s): '{query}'")
+    result = _new_result(query, deadline)
+    stages = result['metrics']['stages']
+
+    entry = cache.get(query, version, profile=profile) if cache is not None else None
+    if entry is not None:
+        serve_cached(result, entry, 'cache')
+        _close(result, deadline)
+        return result, iter([entry['test_plan']])
+
+    def fallback(partial: str = "", allow_match: bool = True) -> str:
+        match = cache.lexical_match(query, version) if cache is not None and allow_match else None
+        if match is not None:
+            serve_cached(result, match, 'lexical_match')
+            text = match['test_plan']
+        else:
+            result['metrics']['served_by'] = 'partial'
+            text = PARTIAL_NOTE.format(deadline=deadline.total_s)
+            result['test_plan'] = partial + text
+        _close(result, deadline)
+        return text
+
+    # 1. Retrieval
+    budget = deadline.stage_budget('retrieval')
+    start = time.perf_counter()
+    try:
+        source_docs = run_with_timeout(lambda: retriever.invoke(query), budget)
+    except DeadlineExceeded:
+        stages['retrieval'] = {'budget_s': round(budget, 3), 'elapsed_s': round(budget, 3), 'timed_out': True}
+        return result, iter([fallback()])
+    stages['retrieval'] = {'budget_s': round(budget, 3), 'elapsed_s': round(time.perf_counter() - start, 3)}
+    result['source_rules'] = [doc.page_content for doc in source_docs]
+    result['rule_ids'] = rule_ids(source_docs)
+    result['retrieval'] = score_distribution(source_docs)
+
+    # 2. Empacotamento do contexto (local)
+    start = time.perf_counter()
+    packed = pack_context(source_docs, token_budget=context_token_budget)
+    stages['packing'] = {'elapsed_s': round(time.perf_counter() - start, 3)}
+    result['metrics'].update(token_metrics(query, packed))
+
+    # 3. Geração
+    budget = deadline.stage_budget('generation')
+    stages['generation'] = {'budget_s': round(budget, 3)}
+    if budget < MIN_GENERATION_S:
+        stages['generation']['skipped'] = True
+        return result, iter([fallback()])
+
+    def tokens() -> Iterator[str]:
+        state: Dict[str, Any] = {}
+        parts = []
+        start = time.perf_counter()
+        for token in bounded_stream(qa_chain, {"context": packed['text'], "question": query}, budget, state):
+            if not parts:
+                result['metrics']['time_to_first_token_s'] = round(deadline.elapsed(), 3)
+            parts.append(token)
+            yield token
+        stages['generation']['elapsed_s'] = round(time.perf_counter() - start, 3)
+
+        if state.get('timed_out'):
+            stages['generation']['timed_out'] = True
+            # No streaming, o trecho já exibido só é trocado se ainda não houver nenhum
+            yield fallback("".join(parts), allow_match=prefer_match or not parts)
+            return
+
+        result['test_plan'] = "".join(parts)
+        result['metrics'].update(token_metrics(query, packed, state.get('message')))
+        result['metrics']['served_by'] = 'generated'
+        if cache is not None:
+            cache.put(query, version, result, profile=profile)
+        _close(result, deadline)
+
+    return result, tokens()
+
+
+def generate_with_deadline(
+    query: str,
+    qa_chain,
+    retriever,
+    deadline: Union[Deadline, float] = DEFAULT_DEADLINE_S,
+    context_token_budget: int = CONTEXT_TOKEN_BUDGET,
+    cache: Optional[PlanCache] = None,
+    version: Optional[str] = None,
+    profile: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Variante de generate_test_plan com prazo total e fallback.
+
+    No prazo esgotado durante a geração, o plano do cache com termos em
+    comum (lexical_match) tem preferência sobre o trecho parcial. Ver stream_with_deadline.
+    """
+    result, tokens = stream_with_deadline(
+        query, qa_chain, retriever, deadline, context_token_budget, cache, version, profile, prefer_match=True
+    )
+    for _ in tokens:
+        pass
+    return result
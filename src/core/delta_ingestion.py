@@ -11,16 +11,33 @@ Ideal para integração CI/CD onde apenas deltas são ingeridos.
 import os
 import sys
 from pathlib import Path
-from typing import List, Dict, Tuple
+from typing import List, Dict, Tuple, TYPE_CHECKING
 from datetime import datetime
 
-from langchain_community.document_loaders import TextLoader
-from langchain_text_splitters import CharacterTextSplitter
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
-from langchain_chroma import Chroma
-from langchain_core.prompts import PromptTemplate
 from dotenv import load_dotenv
 
+try:
+    from .flat_index import update_flat_index
+    from .file_index import update_file_index
+    from .symbol_index import SymbolIndex, extract_symbols, source_key, SYMBOL_INDEX_FILE
+    from .symbol_translation import translate_symbols
+    from .parent_store import ParentStore
+    from .ingestion import index_parent, split_rules
+    from .clients import get_chat_model, get_embeddings
+except ImportError:
+    # Execução direta (src/core no sys.path)
+    from flat_index import update_flat_index
+    from file_index import update_file_index
+    from symbol_index import SymbolIndex, extract_symbols, source_key, SYMBOL_INDEX_FILE
+    from symbol_translation import translate_symbols
+    from parent_store import ParentStore
+    from ingestion import index_parent, split_rules
+    from clients import get_chat_model, get_embeddings
+
+if TYPE_CHECKING:
+    from langchain_chroma import Chroma
+    from langchain_text_splitters import CharacterTextSplitter
+
 # Carregar variáveis de ambiente
 load_dotenv()
 
@@ -34,25 +51,6 @@ CHUNK_SIZE = 1000
 CHUNK_OVERLAP = 200
 
 
-# ================================
-# PROMPT DE TRADUÇÃO (REUTILIZADO)
-# ================================
-CODE_TO_RULE_PROMPT = PromptTemplate(
-    template="""Você é um analista de negócios especializado em extrair regras de negócio de código-fonte.
-
-Analise o seguinte trecho de código Python e extraia TODAS as regras de negócio (explícitas e implícitas).
-
-Código:
-{code}
-
-Para cada regra identificada, retorne no formato:
-"Regra [N]: [Descrição clara da regra em português]"
-
-Regras:""",
-    input_variables=["code"]
-)
-
-
 # ================================
 # FUNÇÕES AUXILIARES
 # ================================
@@ -76,48 +74,96 @@ def load_document(file_path: str) -> str:
         return ""
 
 
-def translate_code_to_rules(code: str, llm: ChatOpenAI) -> str:
-    """Traduz código Python em regras de negócio usando LLM."""
-    try:
-        chain = CODE_TO_RULE_PROMPT | llm
-        response = chain.invoke({"code": code})
-        return response.content
-    except Exception as e:
-        print(f"❌ Erro na tradução: {e}")
-        return code
-
-
-def process_single_file(file_path: str, llm: ChatOpenAI, splitter: CharacterTextSplitter) -> Tuple[List[str], str]:
-    """Processa um único arquivo e retorna os chunks e o tipo."""
+def process_single_file(
+    file_path: str,
+    llm,
+    splitter: "CharacterTextSplitter",
+    symbols: List[Dict],
+    first_chunk: int = 0
+) -> Tuple[List[str], str, List[str]]:
+    """
+    Processa os símbolos de um arquivo e retorna os chunks, o tipo e o
+    símbolo de origem de cada chunk.
+    
+    Args:
+        file_path: Caminho do arquivo
+        llm: Modelo usado na tradução de código
+        splitter: Divisor de texto
+        symbols: Símbolos a processar (extract_symbols); em código, as
+            regras de cada símbolo são traduzidas separadamente (ver
+            symbol_translation.translate_symbols)
+        first_chunk: chunk_index do primeiro chunk gerado
+    """
     print(f"  📄 Processando: {file_path}")
     
     file_type = get_file_type(file_path)
-    content = load_document(file_path)
     
-    if not content:
-        return [], file_type
-    
-    # Se for código, traduz primeiro
+    # Se for código, traduz primeiro (vários símbolos por chamada)
     if file_type == 'code':
-        print(f"    🔄 Traduzindo código em regras de negócio...")
-        content = translate_code_to_rules(content, llm)
-    
-    # Divide em chunks
-    chunks = splitter.split_text(content)
+        texts = translate_symbols(symbols, os.path.basename(file_path), Path(file_path).suffix, llm)
+    else:
+        texts = [symbol['code'] for symbol in symbols]
     
-    # Adiciona metadados aos chunks
+    # Divide em chunks e adiciona o cabeçalho com a origem de cada chunk
     chunks_with_metadata = []
-    for i, chunk in enumerate(chunks):
-        metadata_prefix = f"[Fonte: {os.path.basename(file_path)} | Tipo: {file_type} | Chunk: {i+1}]\n"
-        chunks_with_metadata.append(metadata_prefix + chunk)
+    chunk_symbols = []
+    for symbol, text in zip(symbols, texts):
+        for chunk in splitter.split_text(text):
+            number = first_chunk + len(chunks_with_metadata) + 1
+            origin = f" | Símbolo: {symbol['name']}" if file_type == 'code' else ""
+            metadata_prefix = f"[Fonte: {os.path.basename(file_path)} | Tipo: {file_type} | Chunk: {number}{origin}]\n"
+            chunks_with_metadata.append(metadata_prefix + chunk)
+            chunk_symbols.append(symbol['name'])
     
     print(f"    ✅ {len(chunks_with_metadata)} chunks criados")
-    return chunks_with_metadata, file_type
+    return chunks_with_metadata, file_type, chunk_symbols
 
 
 # ================================
 # FUNÇÃO PRINCIPAL DE INGESTÃO DELTA
 # ================================
+def remove_file_chunks(vector_store: "Chroma", sources: List[str]) -> int:
+    """
+    Remove do banco os chunks gerados anteriormente para os arquivos.
+    
+    Args:
+        vector_store: Banco vetorial carregado
+        sources: Caminhos dos arquivos (metadado 'source')
+        
+    Returns:
+        Quantidade de chunks removidos
+    """
+    where = {"source": {"$in": list(sources)}}
+    existing = vector_store._collection.get(where=where, include=[])
+    if existing['ids']:
+        vector_store._collection.delete(ids=existing['ids'])
+    return len(existing['ids'])
+
+
+def remove_symbol_chunks(vector_store: "Chroma", stale_chunks: Dict[str, List[int]]) -> int:
+    """
+    Remove do banco apenas os chunks dos símbolos alterados ou removidos.
+    
+    Args:
+        vector_store: Banco vetorial carregado
+        stale_chunks: chunk_index obsoletos por arquivo (metadado 'source')
+        
+    Returns:
+        Quantidade de chunks removidos
+    """
+    conditions = [
+        {"$and": [{"source": {"$eq": source}}, {"chunk_index": {"$in": list(indices)}}]}
+        for source, indices in stale_chunks.items() if indices
+    ]
+    if not conditions:
+        return 0
+    where = conditions[0] if len(conditions) == 1 else {"$or": conditions}
+    existing = vector_store._collection.get(where=where, include=[])
+    if existing['ids']:
+        vector_store._collection.delete(ids=existing['ids'])
+    return len(existing['ids'])
+
+
 def process_changed_files(
     changed_files: List[str],
     db_path: str = CHROMA_PERSIST_DIR,
@@ -149,13 +195,18 @@ def process_changed_files(
         'code_chunks': 0,
         'doc_chunks': 0,
         'total_chunks': 0,
+        'removed_chunks': 0,
+        'reused_symbols': 0,
         'errors': 0
     }
     
     # Inicializar componentes
     print("🔧 Inicializando componentes LangChain...")
-    llm = ChatOpenAI(model=TRANSLATION_MODEL, temperature=0.1)
-    embeddings = OpenAIEmbeddings(model=EMBEDDING_MODEL)
+    # Imports pesados apenas quando há ingestão (inicialização rápida da CLI)
+    from langchain_chroma import Chroma
+    from langchain_text_splitters import CharacterTextSplitter
+    llm = get_chat_model(TRANSLATION_MODEL, temperature=0.1)
+    embeddings = get_embeddings(EMBEDDING_MODEL)
     splitter = CharacterTextSplitter(
         separator="\n\n",
         chunk_size=CHUNK_SIZE,
@@ -179,16 +230,41 @@ def process_changed_files(
             print("   🆕 Criando novo banco...")
             vector_store = None
     
+    # Índice de símbolos: proveniência das regras e invalidação por símbolo
+    if vector_store is None:
+        symbol_index = SymbolIndex(os.path.join(db_path, SYMBOL_INDEX_FILE))
+    else:
+        symbol_index = SymbolIndex.load(db_path)
+    
+    # Banco da ingestão completa (small-to-big): cada chunk vira um documento-pai
+    # com vetores-filho, como em create_vector_store, e os pais são mantidos
+    parent_store = ParentStore.load(db_path) if vector_store is not None else None
+    if parent_store is not None:
+        print(f"   👪 Documentos-pai: {len(parent_store)} (os chunks novos seguem o formato small-to-big)")
+    
     # Processar cada arquivo alterado
     all_chunks = []
     all_metadatas = []
+    # Arquivos cujos chunks antigos devem ser removidos (alterados ou deletados)
+    stale_sources = []
+    # Arquivos já indexados por símbolo: apenas os chunks dos símbolos alterados saem
+    stale_chunks = {}
+    touched_sources = []
     
     print(f"\n📥 Processando {len(changed_files)} arquivo(s)...")
     
     for file_path in changed_files:
+        # Chave do arquivo no banco e no índice de símbolos (a mesma do bootstrap)
+        source = source_key(file_path)
+        
         # Ignorar arquivos que não existem mais (deletados)
         if not os.path.exists(file_path):
-            print(f"  ⏭️  Ignorando arquivo deletado: {file_path}")
+            print(f"  🗑️  Arquivo deletado (chunks antigos serão removidos): {file_path}")
+            stale_sources.append(source)
+            touched_sources.append(source)
+            symbol_index.remove_files([source])
+            if parent_store is not None:
+                parent_store.remove(source)
             continue
         
         # Ignorar arquivos de tipos não suportados
@@ -198,18 +274,63 @@ def process_changed_files(
             continue
         
         try:
-            chunks, chunk_type = process_single_file(file_path, llm, splitter)
+            content = load_document(file_path)
+            if not content:
+                continue
+            symbols = extract_symbols(content, source)
+            
+            if symbol_index.file_symbols(source):
+                # Compara o hash de cada símbolo com o registrado
+                diff = symbol_index.diff_file(source, symbols)
+                changed, first_chunk = diff['changed'], symbol_index.next_chunk(source)
+                stats['reused_symbols'] += len(diff['unchanged'])
+                if diff['stale_chunks']:
+                    stale_chunks[source] = diff['stale_chunks']
+                    if parent_store is not None:
+                        parent_store.remove(source, diff['stale_chunks'])
+            else:
+                changed, first_chunk = symbols, 0
+                stale_sources.append(source)
+                if parent_store is not None:
+                    parent_store.remove(source)
+            touched_sources.append(source)
+            
+            if not changed:
+                print(f"  ⏭️  Nenhum símbolo alterado: {file_path}")
+                symbol_index.update_file(source, symbols, {}, first_chunk)
+                continue
             
+            chunks, chunk_type, chunk_symbols = process_single_file(file_path, llm, splitter, changed, first_chunk)
+            
+            symbol_chunks = {symbol['name']: [] for symbol in changed}
             if chunks:
                 # Criar metadados para cada chunk
-                for chunk in chunks:
-                    all_chunks.append(chunk)
-                    all_metadatas.append({
-                        'source': file_path,
+                # (chunk_index/total_chunks permitem costurar chunks vizinhos no retrieval;
+                # os índices continuam a numeração do arquivo e não são reutilizados)
+                next_chunk = first_chunk + len(chunks)
+                for i, (chunk, symbol_name) in enumerate(zip(chunks, chunk_symbols)):
+                    metadata = {
+                        'source': source,
                         'type': chunk_type,
+                        'symbol': symbol_name,
+                        'chunk_index': first_chunk + i,
+                        'total_chunks': next_chunk,
                         'timestamp': datetime.now().isoformat()
-                    })
-                
+                    }
+                    if parent_store is None:
+                        all_chunks.append(chunk)
+                        all_metadatas.append(metadata)
+                    else:
+                        # Chunk = documento-pai; regras agrupadas nos vetores-filho
+                        metadata['filename'] = os.path.basename(file_path)
+                        rules = split_rules(chunk.split("\n", 1)[1] if "\n" in chunk else "")
+                        children, child_metadatas = index_parent(parent_store, chunk, rules, metadata)
+                        all_chunks.extend(children)
+                        all_metadatas.extend(child_metadatas)
+                    symbol_chunks[symbol_name].append(first_chunk + i)
+            symbol_index.update_file(source, symbols, symbol_chunks, first_chunk + len(chunks))
+            
+            if chunks:
                 # Atualizar estatísticas
                 stats['processed_files'] += 1
                 if chunk_type == 'code':
@@ -223,6 +344,21 @@ def process_changed_files(
     
     stats['total_chunks'] = len(all_chunks)
     
+    # Remover chunks antigos dos arquivos alterados/deletados (evita duplicatas)
+    index_consistent = True
+    if vector_store is not None and (stale_sources or stale_chunks):
+        try:
+            if stale_sources:
+                stats['removed_chunks'] += remove_file_chunks(vector_store, stale_sources)
+            if stale_chunks:
+                stats['removed_chunks'] += remove_symbol_chunks(vector_store, stale_chunks)
+            if stats['removed_chunks']:
+                print(f"\n🗑️  {stats['removed_chunks']} chunk(s) antigo(s) removido(s)")
+        except Exception as e:
+            print(f"   ❌ Erro ao remover chunks antigos: {e}")
+            stats['errors'] += 1
+            index_consistent = False
+    
     # Adicionar chunks ao banco vetorial
     if all_chunks:
         print(f"\n💾 Adicionando {len(all_chunks)} chunks ao banco vetorial...")
@@ -248,9 +384,37 @@ def process_changed_files(
         except Exception as e:
             print(f"   ❌ Erro ao salvar no banco: {e}")
             stats['errors'] += 1
+            index_consistent = False
     else:
         print("\n⚠️  Nenhum chunk foi gerado. Nada para adicionar ao banco.")
     
+    # Mantém o índice flat/IVF (se usado) consistente com o ChromaDB,
+    # trocando apenas as linhas dos arquivos alterados/deletados
+    if vector_store is not None and (all_chunks or stats['removed_chunks']):
+        try:
+            update_flat_index(vector_store, db_path, touched_sources)
+        except Exception as e:
+            print(f"   ❌ Erro ao atualizar o índice flat: {e}")
+            stats['errors'] += 1
+        
+        # Recalcula apenas os vetores-resumo dos arquivos alterados/deletados
+        try:
+            update_file_index(vector_store, db_path, touched_sources)
+        except Exception as e:
+            print(f"   ❌ Erro ao atualizar o índice de arquivos: {e}")
+            stats['errors'] += 1
+    
+    # Os índices de símbolos e de documentos-pai só são gravados se o banco
+    # refletir as mudanças; caso contrário, a próxima execução reprocessa os arquivos
+    if vector_store is not None and index_consistent:
+        try:
+            symbol_index.save()
+            if parent_store is not None:
+                parent_store.save()
+        except Exception as e:
+            print(f"   ❌ Erro ao gravar o índice de símbolos/documentos-pai: {e}")
+            stats['errors'] += 1
+    
     # Relatório final
     print("\n" + "="*60)
     print("📊 RELATÓRIO DA INGESTÃO DELTA")
@@ -259,6 +423,10 @@ def process_changed_files(
     print(f"📦 Total de chunks: {stats['total_chunks']}")
     print(f"   └─ Código: {stats['code_chunks']} chunks")
     print(f"   └─ Docs:   {stats['doc_chunks']} chunks")
+    if stats['removed_chunks']:
+        print(f"🗑️  Chunks antigos removidos: {stats['removed_chunks']}")
+    if stats['reused_symbols']:
+        print(f"♻️  Símbolos inalterados (sem nova tradução): {stats['reused_symbols']}")
     if stats['errors'] > 0:
         print(f"❌ Erros: {stats['errors']}")
     print(f"⏰ Fim: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
@@ -0,0 +1,179 @@
+"""
+Módulo de Índice de Arquivos - Retrieval Hierárquico (Arquivo -> Chunk)
+=======================================================================
+
+Os chunks pertencem a arquivos com forte coesão temática
+(payment_service.py, a seção de frete da documentação...). Este módulo
+guarda um vetor-resumo por arquivo de origem (média normalizada dos
+vetores dos seus chunks) e permite a busca em dois estágios:
+
+1. A consulta é comparada aos vetores-resumo e escolhe os n_files
+   arquivos mais próximos (matriz pequena: um vetor por arquivo)
+2. A busca de chunks fica restrita aos arquivos escolhidos
+
+O índice é gravado em FILE_INDEX_FILE, dentro do diretório do ChromaDB,
+e é atualizado pela ingestão (bootstrap e delta).
+"""
+
+import os
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Iterable
+
+import numpy as np
+
+try:
+    from .retrieval import normalize_rows, top_k_indices, DEFAULT_N_FILES
+except ImportError:
+    # Execução direta (src/core no sys.path)
+    from retrieval import normalize_rows, top_k_indices, DEFAULT_N_FILES
+
+# ================================
+# CONFIGURAÇÕES
+# ================================
+FILE_INDEX_FILE = "file_summaries.npz"
+
+
+# ================================
+# CONSTRUÇÃO
+# ================================
+def _stored_vectors(vector_store, sources: Optional[List[str]] = None) -> tuple:
+    """
+    Lê embeddings e metadados do banco (ChromaDB ou índice flat).
+
+    Returns:
+        Tupla (matriz de embeddings, lista de metadados)
+    """
+    if hasattr(vector_store, 'vectors'):
+        # FlatVectorStore: lê metadados do próprio índice
+        metadatas = [vector_store.record(row)['metadata'] for row in range(len(vector_store))]
+        rows = [
+            row for row, metadata in enumerate(metadatas)
+            if sources is None or metadata.get('source') in sources
+        ]
+        return np.asarray(vector_store.vectors[rows], dtype=np.float32), [metadatas[row] for row in rows]
+
+    where = {"source": {"$in": list(sources)}} if sources is not None else None
+    data = vector_store._collection.get(where=where, include=['embeddings', 'metadatas'])
+    embeddings = data['embeddings'] if data['embeddings'] is not None else []
+    return np.asarray(embeddings, dtype=np.float32), [m or {} for m in data['metadatas']]
+
+
+def summarize_sources(embeddings: np.ndarray, metadatas: List[Dict[str, Any]]) -> Dict[str, tuple]:
+    """
+    Agrupa os vetores por arquivo de origem e calcula o vetor-resumo.
+
+    Returns:
+        Dicionário source -> (vetor-resumo normalizado, quantidade de chunks)
+    """
+    groups: Dict[str, List[int]] = {}
+    for row, metadata in enumerate(metadatas):
+        source = metadata.get('source')
+        if source is not None:
+            groups.setdefault(str(source), []).append(row)
+
+    vectors = normalize_rows(embeddings) if len(embeddings) else embeddings
+    return {
+        source: (normalize_rows(vectors[rows].mean(axis=0).reshape(1, -1))[0], len(rows))
+        for source, rows in groups.items()
+    }
+
+
+def _save(db_path: str, summaries: Dict[str, tuple]) -> Dict[str, Any]:
+    """Grava os vetores-resumo e retorna as estatísticas do índice."""
+    sources = sorted(summaries)
+    vectors = np.stack([summaries[s][0] for s in sources]) if sources else np.empty((0, 0), dtype=np.float32)
+    chunk_counts = np.asarray([summaries[s][1] for s in sources], dtype=np.int64)
+
+    path = os.path.join(db_path, FILE_INDEX_FILE)
+    tmp_path = path + ".tmp.npz"
+    np.savez(tmp_path, sources=np.asarray(sources, dtype=object), vectors=vectors.astype(np.float32),
+             chunk_counts=chunk_counts, built_at=datetime.now().isoformat())
+    os.replace(tmp_path, path)
+    return {'files': len(sources), 'chunks': int(chunk_counts.sum())}
+
+
+def build_file_index(vector_store, db_path: str) -> Dict[str, Any]:
+    """
+    (Re)constrói o índice de arquivos a partir de todos os vetores do banco.
+
+    Args:
+        vector_store: Instância Chroma ou FlatVectorStore
+        db_path: Diretório do banco de dados ChromaDB
+
+    Returns:
+        Estatísticas (arquivos e chunks resumidos)
+    """
+    embeddings, metadatas = _stored_vectors(vector_store)
+    stats = _save(db_path, summarize_sources(embeddings, metadatas))
+    print(f"   🗂️  Índice de arquivos: {stats['files']} arquivo(s), {stats['chunks']} chunk(s)")
+    return stats
+
+
+def update_file_index(vector_store, db_path: str, sources: Iterable[str]) -> Dict[str, Any]:
+    """
+    Atualiza apenas os vetores-resumo dos arquivos alterados.
+
+    Arquivos sem chunks restantes (ex.: deletados) saem do índice. Sem
+    índice prévio, constrói o índice completo.
+
+    Returns:
+        Estatísticas (arquivos e chunks resumidos)
+    """
+    index = FileIndex.load(db_path)
+    if index is None:
+        return build_file_index(vector_store, db_path)
+
+    sources = {str(s) for s in sources}
+    summaries = {
+        source: (vector, int(count))
+        for source, vector, count in zip(index.sources, index.vectors, index.chunk_counts)
+        if source not in sources
+    }
+    embeddings, metadatas = _stored_vectors(vector_store, sorted(sources))
+    summaries.update(summarize_sources(embeddings, metadatas))
+
+    stats = _save(db_path, summaries)
+    print(f"   🗂️  Índice de arquivos atualizado: {len(sources)} arquivo(s) recalculado(s), "
+          f"{stats['files']} no total")
+    return stats
+
+
+# ================================
+# BUSCA DE ARQUIVOS
+# ================================
+class FileIndex:
+    """Vetores-resumo por arquivo de origem (primeiro estágio da busca)."""
+
+    def __init__(self, sources: List[str], vectors: np.ndarray, chunk_counts: np.ndarray):
+        self.sources = list(sources)
+        self.vectors = vectors
+        self.chunk_counts = chunk_counts
+
+    @classmethod
+    def load(cls, db_path: str) -> Optional["FileIndex"]:
+        """Carrega o índice de arquivos do banco (None se não existir)."""
+        path = os.path.join(db_path, FILE_INDEX_FILE)
+        if not os.path.exists(path):
+            return None
+        with np.load(path, allow_pickle=True) as data:
+            return cls(data['sources'].tolist(), data['vectors'], data['chunk_counts'])
+
+    def __len__(self) -> int:
+        return len(self.sources)
+
+    def top_files(self, query_embedding, n_files: int = DEFAULT_N_FILES) -> List[str]:
+        """Arquivos cujos vetores-resumo são mais próximos da consulta."""
+        if not self.sources:
+            return []
+        query = normalize_rows(np.asarray(query_embedding).reshape(1, -1))[0]
+        return [self.sources[i] for i in top_k_indices(self.vectors @ query, n_files)]
+
+
+def load_file_index(vector_store, db_path: str) -> FileIndex:
+    """Carrega o índice de arquivos, construindo-o a partir do banco se necessário."""
+    index = FileIndex.load(db_path)
+    if index is None:
+        print(f"🗂️  Construindo índice de arquivos de: {db_path}")
+        build_file_index(vector_store, db_path)
+        index = FileIndex.load(db_path)
+    return index
@@ -0,0 +1,558 @@
+"""
+Módulo de Índice Vetorial Local (Flat) - Busca Exata em Matriz Memory-mapped
+============================================================================
+
+Backend alternativo ao ChromaDB para o retrieval. Para corpora de
+dezenas de milhares de regras, a inicialização do cliente persistente
+do Chroma e o overhead por consulta dominam a latência; aqui a busca é
+exata e feita com um único produto matriz-vetor.
+
+Layout do índice (diretório FLAT_INDEX_DIR dentro do banco ChromaDB):
+- vectors.npy: matriz float32 (n, dim) com embeddings normalizados,
+  aberta com memory-map (páginas compartilhadas entre processos)
+- records.jsonl: uma linha JSON por vetor com id, documento e metadados
+- offsets.npy: offsets de cada linha de records.jsonl (leitura sob demanda
+  apenas dos documentos retornados)
+- manifest.json: dimensão, quantidade de vetores e data de construção
+
+O índice é exportado a partir do ChromaDB (fonte da verdade da ingestão)
+e pode ser reconstruído a qualquer momento com build_flat_index_from_chroma.
+A ingestão delta usa update_flat_index, que troca apenas as linhas dos
+arquivos alterados em vez de reexportar a coleção inteira.
+Com nprobe > 0, a busca usa as partições IVF (ver ivf_index.py) em vez
+da busca exata; com quantization, a primeira passada usa vetores int8
+ou binários re-pontuados em precisão maior (ver quantization.py); com
+pca, a primeira passada usa vetores de dimensão reduzida (ver pca_index.py).
+"""
+
+import os
+import json
+import mmap
+import shutil
+from datetime import datetime
+from typing import List, Dict, Any, Iterable, Iterator, Optional
+
+import numpy as np
+
+try:
+    from .retrieval import normalize_rows, top_k_indices
+    from .ivf_index import (
+        IVFPartitions, build_ivf_partitions, extend_ivf_partitions, needs_retraining,
+        load_previous_centroids, sample_queries, DEFAULT_NPROBE
+    )
+    from .quantization import (
+        QuantizedVectors, build_quantized_vectors, extend_quantized_vectors, load_quantization_stats
+    )
+    from .pca_index import PCAProjection, build_pca_index, extend_pca_index, load_pca_manifest
+except ImportError:
+    # Execução direta (src/core no sys.path)
+    from retrieval import normalize_rows, top_k_indices
+    from ivf_index import (
+        IVFPartitions, build_ivf_partitions, extend_ivf_partitions, needs_retraining,
+        load_previous_centroids, sample_queries, DEFAULT_NPROBE
+    )
+    from quantization import (
+        QuantizedVectors, build_quantized_vectors, extend_quantized_vectors, load_quantization_stats
+    )
+    from pca_index import PCAProjection, build_pca_index, extend_pca_index, load_pca_manifest
+
+# ================================
+# CONFIGURAÇÕES
+# ================================
+FLAT_INDEX_DIR = "flat_index"
+VECTORS_FILE = "vectors.npy"
+RECORDS_FILE = "records.jsonl"
+OFFSETS_FILE = "offsets.npy"
+MANIFEST_FILE = "manifest.json"
+
+
+# ================================
+# CONSTRUÇÃO DO ÍNDICE
+# ================================
+def flat_index_path(db_path: str) -> str:
+    """Caminho do índice flat associado a um banco ChromaDB."""
+    return os.path.join(db_path, FLAT_INDEX_DIR)
+
+
+def write_flat_index(
+    index_path: str,
+    ids: List[str],
+    documents: List[str],
+    metadatas: List[Dict[str, Any]],
+    embeddings
+) -> Dict[str, Any]:
+    """
+    Grava o índice flat em disco.
+
+    A gravação é feita em um diretório temporário que substitui o índice
+    anterior ao final (swap_index_dir), para que leitores nunca vejam um
+    índice parcial.
+
+    Returns:
+        Manifesto do índice gravado
+    """
+    vectors = normalize_rows(np.asarray(embeddings, dtype=np.float32).reshape(len(ids), -1))
+
+    tmp_path = f"{index_path}.tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    manifest = _write_index_files(tmp_path, vectors, record_lines(ids, documents, metadatas))
+
+    swap_index_dir(tmp_path, index_path)
+    return manifest
+
+
+def swap_index_dir(tmp_path: str, index_path: str) -> None:
+    """
+    Troca o índice pelo diretório recém-gravado.
+
+    O índice anterior é renomeado para o lado e só apagado depois da
+    troca: entre as duas renomeações (operações atômicas e instantâneas)
+    não há cópia nem remoção de arquivos, e leitores que ainda mapeiam os
+    arquivos antigos continuam válidos até fechá-los.
+    """
+    old_path = f"{index_path}.old"
+    shutil.rmtree(old_path, ignore_errors=True)
+    if os.path.exists(index_path):
+        os.replace(index_path, old_path)
+    os.replace(tmp_path, index_path)
+    shutil.rmtree(old_path, ignore_errors=True)
+
+
+def record_lines(ids: List[str], documents: List[str], metadatas: List[Dict[str, Any]]) -> Iterator[bytes]:
+    """Linhas de records.jsonl (id, documento e metadados de cada vetor)."""
+    for record_id, document, metadata in zip(ids, documents, metadatas):
+        yield json.dumps(
+            {"id": record_id, "document": document, "metadata": metadata or {}},
+            ensure_ascii=False
+        ).encode('utf-8') + b"\n"
+
+
+def _write_index_files(tmp_path: str, vectors: np.ndarray, lines: Iterable[bytes]) -> Dict[str, Any]:
+    """Grava vetores, registros, offsets e manifesto em um diretório temporário."""
+    np.save(os.path.join(tmp_path, VECTORS_FILE), vectors)
+
+    offsets = [0]
+    with open(os.path.join(tmp_path, RECORDS_FILE), 'wb') as f:
+        for line in lines:
+            f.write(line)
+            offsets.append(offsets[-1] + len(line))
+    np.save(os.path.join(tmp_path, OFFSETS_FILE), np.asarray(offsets, dtype=np.int64))
+
+    manifest = {
+        'count': int(vectors.shape[0]),
+        'dim': int(vectors.shape[1]) if vectors.size else 0,
+        'dtype': 'float32',
+        'built_at': datetime.now().isoformat()
+    }
+    with open(os.path.join(tmp_path, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def build_flat_index_from_chroma(vector_store, index_path: str) -> Dict[str, Any]:
+    """
+    Exporta todos os vetores do ChromaDB para o índice flat.
+
+    Args:
+        vector_store: Instância Chroma carregada
+        index_path: Diretório de destino do índice
+
+    Returns:
+        Manifesto do índice gravado
+    """
+    data = vector_store._collection.get(include=['documents', 'metadatas', 'embeddings'])
+    return write_flat_index(
+        index_path,
+        data['ids'],
+        data['documents'],
+        data['metadatas'],
+        data['embeddings'] if data['embeddings'] is not None else []
+    )
+
+
+# ================================
+# BACKEND DE BUSCA
+# ================================
+class FlatVectorStore:
+    """
+    Índice vetorial exato sobre uma matriz float32 memory-mapped.
+
+    Implementa a interface de backend usada pelo módulo de retrieval:
+    query_candidates() (busca top-k) e get_chunks() (busca por
+    source + chunk_index para a expansão de vizinhos).
+
+    Args:
+        index_path: Diretório do índice flat
+        nprobe: Partições IVF sondadas por consulta (0 = busca exata)
+        quantization: 'int8' ou 'binary' para a primeira passada quantizada
+            (None = precisão total)
+        rescore_dtype: Precisão da re-pontuação: 'float32' ou 'float16'
+            (com 'float16', a busca quantizada não lê vectors.npy, que
+            segue aberto para reconstruções e para a ingestão delta)
+        pca: Primeira passada com os vetores reduzidos por PCA (ignorado
+            se quantization estiver definido)
+    """
+
+    def __init__(
+        self,
+        index_path: str,
+        nprobe: int = 0,
+        quantization: Optional[str] = None,
+        rescore_dtype: str = "float32",
+        pca: bool = False
+    ):
+        self.index_path = index_path
+        self.nprobe = nprobe
+        with open(os.path.join(index_path, MANIFEST_FILE), 'r', encoding='utf-8') as f:
+            self.manifest = json.load(f)
+
+        # mmap_mode='r': nada é copiado para a memória do processo; o page
+        # cache do sistema operacional é compartilhado entre processos
+        self.vectors = np.load(os.path.join(index_path, VECTORS_FILE), mmap_mode='r')
+        self.offsets = np.load(os.path.join(index_path, OFFSETS_FILE))
+
+        self._records_file = open(os.path.join(index_path, RECORDS_FILE), 'rb')
+        self._records = (
+            mmap.mmap(self._records_file.fileno(), 0, access=mmap.ACCESS_READ)
+            if self.offsets[-1] > 0 else b""
+        )
+        self._chunk_rows: Optional[Dict[tuple, int]] = None
+        self._source_rows: Optional[Dict[str, np.ndarray]] = None
+
+        self.partitions = None
+        if nprobe > 0:
+            if IVFPartitions.exists(index_path):
+                self.partitions = IVFPartitions(index_path)
+            else:
+                print("⚠️  Partições IVF não encontradas; usando busca exata.")
+
+        # Primeira passada aproximada (quantizada ou reduzida) + re-pontuação
+        self.first_pass = None
+        if quantization:
+            if QuantizedVectors.exists(index_path, quantization, rescore_dtype):
+                self.first_pass = QuantizedVectors(index_path, self.vectors, quantization, rescore_dtype)
+            else:
+                print("⚠️  Vetores quantizados não encontrados; usando precisão total.")
+        elif pca:
+            if PCAProjection.exists(index_path):
+                self.first_pass = PCAProjection(index_path, self.vectors)
+            else:
+                print("⚠️  Vetores PCA não encontrados; usando dimensão completa.")
+
+    def __len__(self) -> int:
+        return int(self.vectors.shape[0])
+
+    def record(self, row: int) -> Dict[str, Any]:
+        """Lê o registro (id, documento, metadados) de uma linha do índice."""
+        start, end = int(self.offsets[row]), int(self.offsets[row + 1])
+        return json.loads(self._records[start:end])
+
+    def query_candidates(
+        self,
+        query_embeddings: List[List[float]],
+        n_results: int,
+        sources: Optional[List[Optional[List[str]]]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Busca exata top-k para várias consultas.
+
+        Um único produto matriz-matriz calcula todos os scores; argpartition
+        seleciona os n_results melhores sem ordenar a coleção inteira. Com
+        partições IVF, cada consulta pontua apenas as nprobe partições
+        mais próximas.
+
+        Args:
+            query_embeddings: Embeddings das consultas
+            n_results: Quantidade de candidatos por consulta
+            sources: Arquivos de origem permitidos por consulta (retrieval
+                hierárquico); pontua apenas as linhas desses arquivos
+
+        Returns:
+            Um dicionário por consulta com 'documents', 'metadatas' e
+            'embeddings' (mesmo formato de retrieval.fetch_candidates_batch)
+        """
+        queries = normalize_rows(np.asarray(query_embeddings, dtype=np.float32).reshape(len(query_embeddings), -1))
+        n = len(self)
+        n_results = min(n_results, n)
+        if n_results <= 0:
+            return [{'documents': [], 'metadatas': [], 'embeddings': np.empty((0, queries.shape[1]), dtype=np.float32)}
+                    for _ in range(len(queries))]
+
+        if sources is not None:
+            tops = [self._search_sources(query, n_results, allowed) for query, allowed in zip(queries, sources)]
+        elif self.first_pass is not None:
+            tops = [
+                self.first_pass.search(
+                    query, n_results,
+                    self.partitions.probe(query, self.nprobe) if self.partitions is not None else None
+                )
+                for query in queries
+            ]
+        elif self.partitions is not None:
+            tops = [self.partitions.search(self.vectors, query, n_results, self.nprobe) for query in queries]
+        else:
+            scores = self.vectors @ queries.T  # (n, q)
+            tops = [top_k_indices(column, n_results) for column in scores.T]
+
+        embeddings = self.first_pass.rescore_vectors if self.first_pass is not None else self.vectors
+        results = []
+        for top in tops:
+            records = [self.record(int(row)) for row in top]
+            results.append({
+                'documents': [r['document'] for r in records],
+                'metadatas': [r['metadata'] for r in records],
+                'embeddings': np.asarray(embeddings[top], dtype=np.float32)
+            })
+        return results
+
+    def _search_sources(self, query: np.ndarray, n_results: int, allowed: Optional[List[str]]) -> np.ndarray:
+        """Top-k restrito às linhas dos arquivos permitidos."""
+        if allowed is None:
+            if self.first_pass is not None:
+                return self.first_pass.search(query, n_results)
+            return top_k_indices(self.vectors @ query, n_results)
+        self._scan_records()
+        parts = [self._source_rows[s] for s in allowed if s in self._source_rows]
+        if not parts:
+            return np.empty(0, dtype=np.int64)
+        rows = np.sort(np.concatenate(parts))
+        if self.first_pass is not None:
+            return self.first_pass.search(query, min(n_results, len(rows)), rows)
+        return rows[top_k_indices(np.asarray(self.vectors[rows]) @ query, n_results)]
+
+    def _scan_records(self):
+        """
+        Monta as tabelas (source, chunk_index) -> linha e source -> linhas.
+
+        Leitura sequencial dos metadados feita uma única vez, na primeira
+        busca que precisar delas.
+        """
+        if self._chunk_rows is not None:
+            return
+        chunk_rows, source_rows = {}, {}
+        for row in range(len(self)):
+            metadata = self.record(row)['metadata']
+            source = metadata.get('source')
+            if source is None:
+                continue
+            source_rows.setdefault(source, []).append(row)
+            if metadata.get('chunk_index') is not None:
+                chunk_rows[(source, int(metadata['chunk_index']))] = row
+        self._source_rows = {s: np.asarray(rows, dtype=np.int64) for s, rows in source_rows.items()}
+        self._chunk_rows = chunk_rows
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Estatísticas do índice: manifesto, partições IVF, quantização e PCA.
+
+        Inclui a memória por vetor e o recall@k de cada representação
+        quantizada e a curva de recall do PCA (medidos na construção).
+        """
+        return {
+            **self.manifest,
+            'nprobe': self.nprobe if self.partitions is not None else 0,
+            'first_pass': self.first_pass.mode if self.first_pass is not None else None,
+            'ivf': self.partitions.manifest if self.partitions is not None else None,
+            'quantization_stats': load_quantization_stats(self.index_path),
+            'pca': load_pca_manifest(self.index_path)
+        }
+
+    def get_chunks(self, positions: List[tuple]) -> List[tuple]:
+        """
+        Busca chunks por (source, chunk_index).
+
+        A tabela de posições é montada na primeira chamada (leitura
+        sequencial dos metadados) e reutilizada nas seguintes.
+
+        Returns:
+            Lista de tuplas (documento, metadados) dos chunks encontrados
+        """
+        self._scan_records()
+
+        found = []
+        for position in positions:
+            row = self._chunk_rows.get(position)
+            if row is not None:
+                record = self.record(row)
+                found.append((record['document'], record['metadata']))
+        return found
+
+    def close(self):
+        """Libera os arquivos mapeados em memória."""
+        if isinstance(self._records, mmap.mmap):
+            self._records.close()
+        self._records_file.close()
+
+
+def load_flat_index(
+    db_path: str,
+    rebuild: bool = False,
+    embeddings=None,
+    nprobe: int = 0,
+    n_partitions: Optional[int] = None,
+    quantization: Optional[str] = None,
+    rescore_dtype: str = "float32",
+    pca: bool = False
+) -> FlatVectorStore:
+    """
+    Carrega o índice flat de um banco ChromaDB, exportando-o se necessário.
+
+    Args:
+        db_path: Caminho do banco de dados ChromaDB
+        rebuild: Se True, reexporta o índice mesmo que ele já exista
+        embeddings: Função de embeddings usada para abrir o ChromaDB na exportação
+        nprobe: Partições IVF sondadas por consulta (0 = busca exata); as
+            partições são treinadas na primeira carga se não existirem
+        n_partitions: Quantidade de partições IVF no treino (padrão: ~sqrt(n))
+        quantization: 'int8' ou 'binary' (None = precisão total); os vetores
+            quantizados são gerados na primeira carga se não existirem ou se
+            a representação gravada for outra
+        rescore_dtype: Precisão da re-pontuação ('float32' ou 'float16')
+        pca: Primeira passada com vetores reduzidos por PCA; o ajuste é feito
+            na primeira carga se não existir (ver pca_index.py)
+
+    Returns:
+        Instância FlatVectorStore pronta para consultas
+    """
+    index_path = flat_index_path(db_path)
+    if rebuild or not os.path.exists(os.path.join(index_path, MANIFEST_FILE)):
+        from langchain_chroma import Chroma
+
+        print(f"📦 Exportando índice flat de: {db_path}")
+        vector_store = Chroma(persist_directory=db_path, embedding_function=embeddings)
+        manifest = build_flat_index_from_chroma(vector_store, index_path)
+        print(f"   ✅ {manifest['count']} vetores (dim={manifest['dim']}) em: {index_path}")
+
+    vectors = np.load(os.path.join(index_path, VECTORS_FILE), mmap_mode='r')
+    if nprobe > 0 and (rebuild or not IVFPartitions.exists(index_path)):
+        build_ivf_partitions(index_path, vectors, n_partitions, nprobe)
+    if quantization and (rebuild or not QuantizedVectors.exists(index_path, quantization, rescore_dtype)):
+        build_quantized_vectors(index_path, vectors, sample_queries(vectors), quantization, rescore_dtype)
+    if pca and not quantization and (rebuild or not PCAProjection.exists(index_path)):
+        build_pca_index(index_path, vectors, sample_queries(vectors))
+
+    return FlatVectorStore(index_path, nprobe, quantization, rescore_dtype, pca)
+
+
+def refresh_flat_index(vector_store, db_path: str) -> Optional[Dict[str, Any]]:
+    """
+    Reexporta o índice flat após alterações no ChromaDB, se ele existir.
+
+    Se o índice tiver partições IVF, elas são reconstruídas de forma
+    incremental a partir dos centróides anteriores; vetores quantizados e
+    o PCA existentes são regenerados (mantendo a representação e a
+    dimensão escolhidas).
+
+    Returns:
+        Manifesto do novo índice ou None se não houver índice flat
+    """
+    index_path = flat_index_path(db_path)
+    if not os.path.exists(index_path):
+        return None
+
+    centroids, ivf_manifest = load_previous_centroids(index_path)
+    quantized = QuantizedVectors.stored_representation(index_path)
+    pca_manifest = load_pca_manifest(index_path)
+    manifest = build_flat_index_from_chroma(vector_store, index_path)
+    print(f"   🔄 Índice flat atualizado: {manifest['count']} vetores")
+    if manifest['count'] == 0:
+        return manifest
+
+    vectors = np.load(os.path.join(index_path, VECTORS_FILE), mmap_mode='r')
+    if quantized:
+        manifest['quantization'] = build_quantized_vectors(index_path, vectors, sample_queries(vectors), *quantized)
+    if pca_manifest:
+        manifest['pca'] = build_pca_index(
+            index_path, vectors, sample_queries(vectors), pca_manifest['n_components'],
+            [entry['dim'] for entry in pca_manifest['recall_curve']]
+        )
+    if centroids is not None:
+        manifest['ivf'] = build_ivf_partitions(
+            index_path, vectors,
+            nprobe=ivf_manifest.get('nprobe', DEFAULT_NPROBE),
+            init_centroids=centroids,
+            trained_count=ivf_manifest.get('trained_count')
+        )
+    return manifest
+
+
+def update_flat_index(vector_store, db_path: str, sources: List[str]) -> Optional[Dict[str, Any]]:
+    """
+    Atualiza o índice flat apenas nas linhas dos arquivos alterados, se ele existir.
+
+    As linhas dos arquivos em `sources` (metadado 'source') são removidas
+    e os chunks atuais desses arquivos são lidos do ChromaDB e anexados ao
+    final; as demais linhas são copiadas do índice anterior, sem passar
+    pelo ChromaDB. Vetores quantizados, PCA e partições IVF existentes
+    recebem as linhas novas com a escala, a projeção e os centróides já
+    treinados; as partições só são retreinadas (build_ivf_partitions)
+    quando o corpus muda além de RETRAIN_GROWTH_FACTOR.
+
+    Args:
+        vector_store: Instância Chroma já atualizada
+        db_path: Caminho do banco de dados ChromaDB
+        sources: Arquivos adicionados, alterados ou removidos
+
+    Returns:
+        Manifesto do novo índice ou None se não houver índice flat
+    """
+    index_path = flat_index_path(db_path)
+    if not sources or not os.path.exists(os.path.join(index_path, MANIFEST_FILE)):
+        return None
+
+    data = vector_store._collection.get(
+        where={"source": {"$in": list(sources)}}, include=['documents', 'metadatas', 'embeddings']
+    )
+    store = FlatVectorStore(index_path)
+    embeddings = data['embeddings'] if data['embeddings'] is not None else []
+    new_vectors = normalize_rows(np.asarray(embeddings, dtype=np.float32).reshape(len(data['ids']), -1))
+    if len(store) == 0 or (len(new_vectors) and new_vectors.shape[1] != store.vectors.shape[1]):
+        # Índice vazio ou de outra dimensão: exportação completa
+        store.close()
+        return refresh_flat_index(vector_store, db_path)
+
+    tmp_path = f"{index_path}.tmp"
+    try:
+        store._scan_records()
+        removed = [store._source_rows[source] for source in set(sources) if source in store._source_rows]
+        keep = np.ones(len(store), dtype=bool)
+        if removed:
+            keep[np.concatenate(removed)] = False
+        kept = np.flatnonzero(keep)
+
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        lines = [bytes(store._records[int(store.offsets[row]):int(store.offsets[row + 1])]) for row in kept]
+        lines.extend(record_lines(data['ids'], data['documents'], data['metadatas']))
+        manifest = _write_index_files(
+            tmp_path, np.concatenate([np.asarray(store.vectors[kept]), new_vectors]), lines
+        )
+        manifest['replaced_rows'] = int(len(store) - len(kept))
+
+        if QuantizedVectors.exists(index_path):
+            manifest['quantization'] = extend_quantized_vectors(index_path, tmp_path, kept, new_vectors)
+        if PCAProjection.exists(index_path):
+            manifest['pca'] = extend_pca_index(index_path, tmp_path, kept, new_vectors)
+        if IVFPartitions.exists(index_path):
+            manifest['ivf'] = extend_ivf_partitions(index_path, tmp_path, kept, new_vectors)
+    except Exception:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        raise
+    finally:
+        store.close()
+
+    swap_index_dir(tmp_path, index_path)
+    print(f"   🔄 Índice flat atualizado: {manifest['count']} vetores "
+          f"({manifest['replaced_rows']} linha(s) substituída(s) por {len(new_vectors)})")
+
+    if manifest.get('ivf') and manifest['count'] and needs_retraining(manifest['ivf']):
+        centroids, ivf_manifest = load_previous_centroids(index_path)
+        manifest['ivf'] = build_ivf_partitions(
+            index_path, np.load(os.path.join(index_path, VECTORS_FILE), mmap_mode='r'),
+            nprobe=ivf_manifest.get('nprobe', DEFAULT_NPROBE),
+            init_centroids=centroids,
+            trained_count=ivf_manifest.get('trained_count')
+        )
+    return manifest
@@ -1,19 +1,24 @@
 import os
-from langchain_community.document_loaders import TextLoader
-from langchain_text_splitters import CharacterTextSplitter
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
-from langchain_core.prompts import PromptTemplate
-from langchain_core.runnables import RunnablePassthrough, RunnableLambda
-from langchain_chroma import Chroma
+import re
+from typing import TYPE_CHECKING
 from dotenv import load_dotenv
 
+if TYPE_CHECKING:
+    from langchain_chroma import Chroma
+
+try:
+    from .parent_store import ParentStore, PARENT_STORE_FILE
+    from .clients import get_chat_model, get_embeddings
+    from .symbol_index import source_key
+except ImportError:
+    # Execução direta (src/core no sys.path)
+    from parent_store import ParentStore, PARENT_STORE_FILE
+    from clients import get_chat_model, get_embeddings
+    from symbol_index import source_key
+
 # Carrega variáveis de ambiente (incluindo OPENAI_API_KEY)
 load_dotenv()
 
-# Configuração do LLM para tradução de código
-# Usamos um modelo de alta capacidade para entender o código e extrair regras
-llm_translator = ChatOpenAI(model="gpt-4o-mini", temperature=0.1)
-
 # Prompt para a tradução de código para regra de negócio
 CODE_TO_RULE_PROMPT = """
 Você é um analista de negócios e um especialista em engenharia de software.
@@ -35,18 +40,88 @@ TRECHO DE CÓDIGO:
 REGRAS DE NEGÓCIO EXTRAÍDAS:
 """
 
-code_to_rule_chain = (
-    PromptTemplate.from_template(CODE_TO_RULE_PROMPT)
-    | llm_translator
-)
 
-def process_documents(file_path: str, doc_type: str) -> list[str]:
+def build_code_to_rule_chain():
+    """
+    Cadeia de tradução de código em regras.
+
+    Usamos um modelo de alta capacidade para entender o código e extrair
+    regras; o cliente é o compartilhado do processo (clients.py).
+    """
+    from langchain_core.prompts import PromptTemplate
+    return PromptTemplate.from_template(CODE_TO_RULE_PROMPT) | get_chat_model(temperature=0.1)
+
+# Tamanho máximo (caracteres) de um vetor-filho: regras consecutivas do
+# mesmo documento-pai são agrupadas até este limite
+CHILD_CHUNK_SIZE = 300
+
+# Linhas sem conteúdo de regra: títulos markdown, separadores e rótulos ("Regras:")
+_HEADING_PATTERN = re.compile(r"^(#+\s.*|[-=*_]{3,}|[^.:]{0,60}:)$")
+
+
+def split_rules(text: str) -> list[str]:
+    """Linhas de regra do texto, sem linhas em branco e títulos."""
+    return [
+        line.strip() for line in text.split('\n')
+        if line.strip() and not _HEADING_PATTERN.match(line.strip())
+    ]
+
+
+def group_children(rules: list[str], max_chars: int = CHILD_CHUNK_SIZE) -> list[str]:
+    """Agrupa regras consecutivas em vetores-filho de até max_chars caracteres."""
+    children, current = [], []
+    for rule in rules:
+        if current and len('\n'.join(current + [rule])) > max_chars:
+            children.append('\n'.join(current))
+            current = []
+        current.append(rule)
+    if current:
+        children.append('\n'.join(current))
+    return children
+
+
+def parent_id_for(metadata: dict) -> str:
+    """Identificador do documento-pai: arquivo de origem e posição do trecho."""
+    return f"{metadata['source']}#{metadata['chunk_index']}"
+
+
+def index_parent(parent_store: ParentStore, text: str, rules: list[str], metadata: dict) -> tuple:
+    """
+    Registra um documento-pai e monta os seus vetores-filho.
+
+    Usado pela ingestão completa e pela ingestão delta, para que o banco
+    tenha sempre o mesmo formato small-to-big.
+
+    Returns:
+        Tupla (textos dos filhos, metadados dos filhos)
+    """
+    parent_id = parent_id_for(metadata)
+    parent_store.add(parent_id, text, metadata)
+    # chunk_index e símbolo seguem nos filhos: a ingestão delta remove por eles
+    shared = {key: metadata[key] for key in ('chunk_index', 'symbol') if key in metadata}
+    children = group_children(rules)
+    return children, [
+        {'source': metadata['source'], 'type': metadata['type'], 'parent_id': parent_id, 'child_index': j, **shared}
+        for j in range(len(children))
+    ]
+
+
+def process_documents(file_path: str, doc_type: str) -> list[dict]:
     """
     Carrega, divide e processa um arquivo.
     Se for código, usa o LLM para traduzir trechos em regras de negócio.
     Se for documentação, apenas divide o texto.
+    
+    Cada trecho de origem gera um documento-pai com todas as suas regras.
+    
+    Returns:
+        Lista de documentos-pai: {'text', 'rules', 'metadata'}
     """
     print(f"Processando arquivo: {file_path} como {doc_type}...")
+    # Imports pesados apenas quando há ingestão (inicialização rápida da CLI/app)
+    from langchain_community.document_loaders import TextLoader
+    from langchain_text_splitters import CharacterTextSplitter
+
     loader = TextLoader(file_path)
     documents = loader.load()
 
@@ -61,57 +136,88 @@ def process_documents(file_path: str, doc_type: str) -> list[str]:
     
     chunks = text_splitter.split_documents(documents)
     
-    processed_rules = []
+    units = []
     
     if doc_type == "code":
         print(f"Traduzindo {len(chunks)} trechos de código para regras de negócio...")
+        code_to_rule_chain = build_code_to_rule_chain()
         for i, chunk in enumerate(chunks):
             print(f"  -> Traduzindo trecho {i+1}/{len(chunks)}...")
             try:
                 # Chama o LLM para traduzir o trecho de código
                 result = code_to_rule_chain.invoke({"code_snippet": chunk.page_content})
-                rules_text = result.content.strip()
+                rules = split_rules(result.content)
                 
-                # Adiciona as regras extraídas
-                if rules_text:
-                    processed_rules.extend(rules_text.split('\n'))
+                # Adiciona as regras extraídas do trecho (um documento-pai)
+                if rules:
+                    units.append(('\n'.join(rules), rules))
             except Exception as e:
                 print(f"Erro ao processar chunk de código: {e}")
                 
     elif doc_type == "doc":
         print(f"Processando {len(chunks)} trechos de documentação...")
         for chunk in chunks:
-            # Para documentação, apenas adicionamos um prefixo para identificação
-            processed_rules.append(f"- [TIPO: DOC] Regra Documentada: {chunk.page_content.strip()}")
-            
-    return processed_rules
+            # Para documentação, apenas adicionamos um prefixo para identificação;
+            # o pai mantém o trecho completo (com títulos), os filhos só as regras
+            rules = split_rules(chunk.page_content)
+            if rules:
+                units.append((f"- [TIPO: DOC] Regra Documentada: {chunk.page_content.strip()}", rules))
+    
+    filename = os.path.basename(file_path)
+    parents = []
+    for i, (text, rules) in enumerate(units):
+        header = f"[Fonte: {filename} | Tipo: {doc_type} | Chunk: {i+1}]\n"
+        parents.append({
+            'text': header + text,
+            'rules': rules,
+            'metadata': {
+                # Mesma chave de arquivo da ingestão delta e do bootstrap
+                'source': source_key(file_path),
+                'filename': filename,
+                'type': doc_type,
+                'chunk_index': i,
+                'total_chunks': len(units)
+            }
+        })
+    return parents
 
-def create_vector_store(code_path: str, doc_path: str, db_path: str = "chroma_db") -> Chroma:
+def create_vector_store(code_path: str, doc_path: str, db_path: str = "chroma_db") -> "Chroma":
     """
     Cria e popula o Banco de Dados Vetorial (ChromaDB) com as regras de negócio.
     """
     # 1. Processar Código e Documentação
-    code_rules = process_documents(code_path, "code")
-    doc_rules = process_documents(doc_path, "doc")
-    
-    all_rules = code_rules + doc_rules
+    parents = process_documents(code_path, "code") + process_documents(doc_path, "doc")
     
-    if not all_rules:
+    if not parents:
         raise ValueError("Nenhuma regra de negócio foi extraída. Verifique os arquivos de entrada.")
 
-    # 2. Criar Embeddings
-    print(f"\nTotal de {len(all_rules)} regras extraídas. Criando embeddings...")
+    # 2. Documentos-pai (contexto devolvido) e vetores-filho compactos (indexados)
+    parent_store = ParentStore(os.path.join(db_path, PARENT_STORE_FILE))
+    child_texts = []
+    child_metadatas = []
+    for parent in parents:
+        texts, metadatas = index_parent(parent_store, parent['text'], parent['rules'], parent['metadata'])
+        child_texts.extend(texts)
+        child_metadatas.extend(metadatas)
+    
+    # 3. Criar Embeddings
+    total_rules = sum(len(parent['rules']) for parent in parents)
+    print(f"\nTotal de {total_rules} regras extraídas em {len(parents)} documentos-pai "
+          f"({len(child_texts)} vetores-filho). Criando embeddings...")
     # Usamos o modelo de embeddings do OpenAI (ou outro compatível)
-    embeddings = OpenAIEmbeddings(model="text-embedding-ada-002")
+    embeddings = get_embeddings()
 
-    # 3. Armazenar no ChromaDB
+    # 4. Armazenar no ChromaDB (filhos) e os documentos-pai ao lado
     print(f"Armazenando no ChromaDB em: {db_path}")
+    from langchain_chroma import Chroma
     vector_store = Chroma.from_texts(
-        texts=all_rules,
+        texts=child_texts,
         embedding=embeddings,
+        metadatas=child_metadatas,
         persist_directory=db_path
     )
     # O ChromaDB agora persiste automaticamente quando persist_directory é fornecido
+    parent_store.save()
     print("Ingestão concluída com sucesso!")
     
     return vector_store
@@ -0,0 +1,366 @@
+"""
+Módulo de Índice IVF - Partições k-means sobre o Índice Flat
+============================================================
+
+Com bootstraps de vários repositórios o corpus chega a milhões de
+chunks e a busca exata (um produto com a matriz inteira) fica cara.
+O índice IVF (inverted file) agrupa os vetores em partições com
+k-means; cada consulta compara-se primeiro aos centróides e só pontua
+os vetores das `nprobe` partições mais próximas.
+
+Arquivos gravados no diretório do índice flat:
+- ivf_centroids.npy: centróides normalizados (n_partitions, dim)
+- ivf_rows.npy: linhas do índice flat ordenadas por partição
+- ivf_bounds.npy: início/fim de cada partição em ivf_rows.npy
+- ivf.json: parâmetros, modo da última construção e relatório de recall
+
+Após a ingestão delta, as partições são reconstruídas de forma
+incremental: os centróides existentes são reaproveitados (vetores
+novos são atribuídos ao centróide mais próximo e os centróides são
+refinados com poucas iterações), em vez de treinar o k-means do zero.
+"""
+
+import os
+import json
+import time
+from datetime import datetime
+from typing import Dict, Any, Optional
+
+import numpy as np
+
+try:
+    from .retrieval import normalize_rows, top_k_indices
+except ImportError:
+    # Execução direta (src/core no sys.path)
+    from retrieval import normalize_rows, top_k_indices
+
+# ================================
+# CONFIGURAÇÕES
+# ================================
+DEFAULT_NPROBE = 8
+KMEANS_ITERATIONS = 20
+REFINE_ITERATIONS = 3
+# Máximo de vetores usados no treino do k-means (amostra aleatória)
+MAX_TRAINING_VECTORS = 100_000
+# Linhas por bloco na atribuição (limita a matriz temporária n x partições)
+ASSIGN_BLOCK_SIZE = 65_536
+# Retreina do zero quando o corpus cresce/encolhe além deste fator desde o último treino
+RETRAIN_GROWTH_FACTOR = 2.0
+RECALL_SAMPLE_QUERIES = 100
+RECALL_K = 10
+
+CENTROIDS_FILE = "ivf_centroids.npy"
+ROWS_FILE = "ivf_rows.npy"
+BOUNDS_FILE = "ivf_bounds.npy"
+IVF_MANIFEST_FILE = "ivf.json"
+
+
+# ================================
+# K-MEANS VETORIZADO
+# ================================
+def default_partitions(n_vectors: int) -> int:
+    """Número de partições padrão: ~sqrt(n), no mínimo 1."""
+    return max(1, int(round(np.sqrt(n_vectors))))
+
+
+def assign_partitions(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Atribui cada vetor ao centróide mais próximo (produto interno), em blocos."""
+    assignments = np.empty(vectors.shape[0], dtype=np.int32)
+    for start in range(0, vectors.shape[0], ASSIGN_BLOCK_SIZE):
+        block = np.asarray(vectors[start:start + ASSIGN_BLOCK_SIZE], dtype=np.float32)
+        assignments[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+    return assignments
+
+
+def accumulate_partitions(vectors: np.ndarray, centroids: np.ndarray) -> tuple:
+    """
+    Atribui os vetores aos centróides e soma os vetores de cada grupo, em blocos.
+
+    Cada bloco de ASSIGN_BLOCK_SIZE linhas é lido uma vez (memmap incluso)
+    e somado no acumulador com np.add.at; nenhuma cópia da matriz inteira
+    é feita.
+
+    Returns:
+        Tupla (somas (partições, dim), quantidade de vetores por partição)
+    """
+    sums = np.zeros(centroids.shape, dtype=np.float32)
+    counts = np.zeros(len(centroids), dtype=np.int64)
+    for start in range(0, vectors.shape[0], ASSIGN_BLOCK_SIZE):
+        block = np.asarray(vectors[start:start + ASSIGN_BLOCK_SIZE], dtype=np.float32)
+        block_assignments = np.argmax(block @ centroids.T, axis=1)
+        np.add.at(sums, block_assignments, block)
+        counts += np.bincount(block_assignments, minlength=len(centroids))
+    return sums, counts
+
+
+def kmeans(
+    vectors: np.ndarray,
+    n_clusters: int,
+    iterations: int = KMEANS_ITERATIONS,
+    init_centroids: Optional[np.ndarray] = None,
+    seed: int = 42
+) -> np.ndarray:
+    """
+    K-means esférico (vetores normalizados) totalmente vetorizado.
+
+    Cada iteração faz uma atribuição matricial e soma os vetores de cada
+    grupo no mesmo passe em blocos (accumulate_partitions), sem copiar a
+    matriz inteira. Grupos vazios são re-semeados com vetores aleatórios.
+
+    Args:
+        vectors: Matriz (n, dim) de vetores normalizados
+        n_clusters: Quantidade de grupos
+        iterations: Iterações de Lloyd
+        init_centroids: Centróides iniciais (ex.: do treino anterior)
+
+    Returns:
+        Centróides normalizados (n_clusters, dim)
+    """
+    rng = np.random.default_rng(seed)
+    n = vectors.shape[0]
+    n_clusters = min(n_clusters, n)
+
+    if init_centroids is not None and len(init_centroids) == n_clusters:
+        centroids = np.array(init_centroids, dtype=np.float32)
+    else:
+        centroids = np.array(vectors[rng.choice(n, n_clusters, replace=False)], dtype=np.float32)
+
+    for _ in range(iterations):
+        sums, counts = accumulate_partitions(vectors, centroids)
+        clusters = np.flatnonzero(counts)
+        centroids[clusters] = normalize_rows(sums[clusters])
+
+        empty = np.flatnonzero(counts == 0)
+        if len(empty):
+            centroids[empty] = vectors[rng.choice(n, len(empty), replace=False)]
+
+    return centroids
+
+
+# ================================
+# PARTIÇÕES
+# ================================
+class IVFPartitions:
+    """Partições IVF carregadas do diretório do índice flat."""
+
+    def __init__(self, index_path: str):
+        self.centroids = np.load(os.path.join(index_path, CENTROIDS_FILE))
+        self.rows = np.load(os.path.join(index_path, ROWS_FILE), mmap_mode='r')
+        self.bounds = np.load(os.path.join(index_path, BOUNDS_FILE))
+        with open(os.path.join(index_path, IVF_MANIFEST_FILE), 'r', encoding='utf-8') as f:
+            self.manifest = json.load(f)
+
+    @staticmethod
+    def exists(index_path: str) -> bool:
+        return os.path.exists(os.path.join(index_path, IVF_MANIFEST_FILE))
+
+    def probe(self, query: np.ndarray, nprobe: int = DEFAULT_NPROBE) -> np.ndarray:
+        """Linhas do índice flat nas nprobe partições mais próximas da consulta."""
+        nearest = top_k_indices(self.centroids @ query, nprobe)
+        return np.concatenate([
+            self.rows[self.bounds[p]:self.bounds[p + 1]] for p in nearest
+        ]) if len(nearest) else np.empty(0, dtype=np.int64)
+
+    def search(self, vectors: np.ndarray, query: np.ndarray, n_results: int, nprobe: int = DEFAULT_NPROBE) -> np.ndarray:
+        """
+        Busca aproximada: pontua apenas os vetores das partições sondadas.
+
+        Returns:
+            Linhas do índice flat dos n_results melhores, em ordem decrescente
+        """
+        rows = np.sort(self.probe(query, nprobe))
+        scores = np.asarray(vectors[rows], dtype=np.float32) @ query
+        return rows[top_k_indices(scores, n_results)]
+
+
+def evaluate_ivf(
+    vectors: np.ndarray,
+    partitions: IVFPartitions,
+    queries: np.ndarray,
+    k: int = RECALL_K,
+    nprobe: int = DEFAULT_NPROBE
+) -> Dict[str, float]:
+    """
+    Compara a busca IVF com a busca exata.
+
+    Returns:
+        Dicionário com recall@k e latência média (ms) das duas buscas
+    """
+    start = time.perf_counter()
+    exact = [set(top_k_indices(vectors @ q, k).tolist()) for q in queries]
+    exact_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+    start = time.perf_counter()
+    approximate = [set(partitions.search(vectors, q, k, nprobe).tolist()) for q in queries]
+    ivf_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+    recall = np.mean([len(e & a) / max(len(e), 1) for e, a in zip(exact, approximate)])
+    return {
+        'k': k,
+        'nprobe': nprobe,
+        'recall_at_k': round(float(recall), 4),
+        'exact_ms': round(exact_ms, 3),
+        'ivf_ms': round(ivf_ms, 3)
+    }
+
+
+def sample_queries(vectors: np.ndarray, n_queries: int = RECALL_SAMPLE_QUERIES, seed: int = 7) -> np.ndarray:
+    """
+    Consultas sintéticas para o relatório de recall.
+
+    Usa o ponto médio de pares aleatórios de vetores do índice: consultas
+    na distribuição do corpus que não coincidem com nenhum vetor armazenado.
+    """
+    rng = np.random.default_rng(seed)
+    n = vectors.shape[0]
+    pairs = rng.integers(0, n, size=(n_queries, 2))
+    return normalize_rows(np.asarray(vectors[pairs[:, 0]]) + np.asarray(vectors[pairs[:, 1]]))
+
+
+def build_ivf_partitions(
+    index_path: str,
+    vectors: np.ndarray,
+    n_partitions: Optional[int] = None,
+    nprobe: int = DEFAULT_NPROBE,
+    init_centroids: Optional[np.ndarray] = None,
+    trained_count: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Treina (ou atualiza) as partições IVF e grava no diretório do índice.
+
+    Com init_centroids (partições anteriores), faz a reconstrução
+    incremental: poucos passos de refinamento a partir dos centróides
+    existentes. O treino completo é feito quando não há centróides
+    anteriores ou quando o corpus mudou mais que RETRAIN_GROWTH_FACTOR
+    desde o último treino.
+
+    Args:
+        index_path: Diretório do índice flat
+        vectors: Matriz (n, dim) normalizada do índice flat
+        n_partitions: Quantidade de partições (padrão: ~sqrt(n))
+        nprobe: nprobe usado no relatório de recall
+        init_centroids: Centróides da construção anterior
+        trained_count: Tamanho do corpus no último treino completo
+
+    Returns:
+        Manifesto IVF (inclui modo de construção e relatório de recall)
+    """
+    n = vectors.shape[0]
+    if n == 0:
+        raise ValueError("Índice flat vazio: não há vetores para particionar")
+
+    rng = np.random.default_rng(42)
+    training = vectors
+    if n > MAX_TRAINING_VECTORS:
+        training = vectors[np.sort(rng.choice(n, MAX_TRAINING_VECTORS, replace=False))]
+
+    growth = n / trained_count if trained_count else None
+    incremental = (
+        init_centroids is not None
+        and growth is not None
+        and 1 / RETRAIN_GROWTH_FACTOR <= growth <= RETRAIN_GROWTH_FACTOR
+        and len(init_centroids) <= n
+    )
+
+    start = time.perf_counter()
+    if incremental:
+        centroids = kmeans(training, len(init_centroids), REFINE_ITERATIONS, init_centroids)
+        mode = 'incremental'
+    else:
+        n_partitions = min(n_partitions or default_partitions(n), n)
+        centroids = kmeans(training, n_partitions)
+        mode = 'full'
+        trained_count = n
+
+    assignments = assign_partitions(vectors, centroids)
+    rows = np.argsort(assignments, kind='stable').astype(np.int64)
+    counts = np.bincount(assignments, minlength=len(centroids))
+    bounds = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+    build_s = time.perf_counter() - start
+
+    np.save(os.path.join(index_path, CENTROIDS_FILE), centroids)
+    np.save(os.path.join(index_path, ROWS_FILE), rows)
+    np.save(os.path.join(index_path, BOUNDS_FILE), bounds)
+
+    manifest = {
+        'n_partitions': int(len(centroids)),
+        'count': int(n),
+        'trained_count': int(trained_count),
+        'nprobe': int(nprobe),
+        'mode': mode,
+        'build_time_s': round(build_s, 3),
+        'largest_partition': int(counts.max()),
+        'built_at': datetime.now().isoformat()
+    }
+    with open(os.path.join(index_path, IVF_MANIFEST_FILE), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+
+    report = evaluate_ivf(
+        vectors, IVFPartitions(index_path), sample_queries(vectors),
+        min(RECALL_K, n), nprobe
+    )
+    manifest['recall'] = report
+    with open(os.path.join(index_path, IVF_MANIFEST_FILE), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+
+    print(f"   🧭 Partições IVF ({mode}): {manifest['n_partitions']} partições, "
+          f"{n} vetores em {manifest['build_time_s']}s | recall@{report['k']} "
+          f"(nprobe={nprobe}): {report['recall_at_k']} | "
+          f"exata: {report['exact_ms']}ms, IVF: {report['ivf_ms']}ms")
+    return manifest
+
+
+def extend_ivf_partitions(index_path: str, target_path: str, kept: np.ndarray, new_vectors: np.ndarray) -> Dict[str, Any]:
+    """
+    Grava em target_path as partições de index_path só com as linhas
+    mantidas (kept) seguidas das novas, atribuídas aos centróides atuais.
+
+    Não há refinamento dos centróides nem novo relatório de recall; quem
+    chama deve usar needs_retraining para decidir por build_ivf_partitions.
+
+    Returns:
+        Manifesto IVF com a contagem atualizada (modo 'append')
+    """
+    partitions = IVFPartitions(index_path)
+    n_partitions = len(partitions.centroids)
+    previous = np.empty(len(partitions.rows), dtype=np.int32)
+    previous[np.asarray(partitions.rows)] = np.repeat(np.arange(n_partitions), np.diff(partitions.bounds))
+
+    assignments = np.concatenate([previous[kept], assign_partitions(new_vectors, partitions.centroids)])
+    rows = np.argsort(assignments, kind='stable').astype(np.int64)
+    counts = np.bincount(assignments, minlength=n_partitions)
+    bounds = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+
+    np.save(os.path.join(target_path, CENTROIDS_FILE), partitions.centroids)
+    np.save(os.path.join(target_path, ROWS_FILE), rows)
+    np.save(os.path.join(target_path, BOUNDS_FILE), bounds)
+
+    manifest = dict(partitions.manifest, count=int(len(assignments)), mode='append',
+                    largest_partition=int(counts.max()) if len(counts) else 0,
+                    updated_at=datetime.now().isoformat())
+    with open(os.path.join(target_path, IVF_MANIFEST_FILE), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def needs_retraining(manifest: Dict[str, Any]) -> bool:
+    """O corpus mudou mais que RETRAIN_GROWTH_FACTOR desde o último treino?"""
+    trained_count = manifest.get('trained_count')
+    if not trained_count or not manifest['count']:
+        return True
+    growth = manifest['count'] / trained_count
+    return not 1 / RETRAIN_GROWTH_FACTOR <= growth <= RETRAIN_GROWTH_FACTOR
+
+
+def load_previous_centroids(index_path: str) -> tuple:
+    """
+    Lê os centróides e o manifesto IVF antes de regravar o índice flat.
+
+    Returns:
+        Tupla (centróides, manifesto) ou (None, None) se não houver partições
+    """
+    if not IVFPartitions.exists(index_path):
+        return None, None
+    with open(os.path.join(index_path, IVF_MANIFEST_FILE), 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    return np.load(os.path.join(index_path, CENTROIDS_FILE)), manifest
@@ -0,0 +1,334 @@
+"""
+Módulo de Geração Map-Reduce - Planos de Teste Grandes em Paralelo
+==================================================================
+
+Em pedidos amplos, uma única chamada ao LLM escreve todos os cenários
+(caminho feliz e exceções) em sequência, e a latência cresce com o
+tamanho do plano. Neste modo:
+
+1. Map: as regras recuperadas são agrupadas por tópico (metadado
+   'topic' da divisão de consultas) ou, na falta dele, por arquivo de
+   origem; cada grupo gera os seus cenários Gherkin em uma chamada
+   própria, todas concorrentes
+2. Reduce: uma passada local (sem LLM) junta os cenários em uma única
+   Feature, com uma seção Rule por grupo, e remove cenários repetidos
+   (mesmos passos, mesmo com títulos diferentes)
+
+O tempo total fica limitado pelo grupo mais lento, não pela soma.
+Pedidos cujas regras formam um único grupo usam a geração comum. Se a
+geração de algum grupo falha, o plano sai só com os demais: as regras do
+grupo que falhou não entram em source_rules/rule_ids e o resultado é
+marcado como parcial (metrics['partial']).
+"""
+
+import re
+import time
+from typing import List, Dict, Any, Optional
+
+try:
+    from .rag_pipeline import token_metrics, build_plan_result
+    from .retrieval import score_distribution, rule_ids
+    from .context_packing import pack_context, CONTEXT_TOKEN_BUDGET
+except ImportError:
+    # Execução direta (src/core no sys.path)
+    from rag_pipeline import token_metrics, build_plan_result
+    from retrieval import score_distribution, rule_ids
+    from context_packing import pack_context, CONTEXT_TOKEN_BUDGET
+
+# ================================
+# CONFIGURAÇÕES
+# ================================
+# Máximo de grupos (chamadas concorrentes ao LLM); os excedentes são
+# reunidos no último grupo
+MAX_GROUPS = 6
+# Cenários com sobreposição de passos acima deste limite (Jaccard) são duplicados
+DUPLICATE_SIMILARITY = 0.85
+OTHER_GROUP_LABEL = "Outras regras"
+
+# Palavras-chave Gherkin (inglês e português)
+_FEATURE = re.compile(r"^\s*(Feature|Funcionalidade|Característica)\s*:\s*(.*)$", re.IGNORECASE)
+_BACKGROUND = re.compile(r"^\s*(Background|Contexto|Cenário de Fundo)\s*:", re.IGNORECASE)
+_SCENARIO = re.compile(
+    r"^\s*(Scenario Outline|Scenario Template|Scenario|Example|"
+    r"Esquema do Cenário|Esquema do Cenario|Cenário|Cenario|Exemplo)\s*:\s*(.*)$",
+    re.IGNORECASE
+)
+_RULE = re.compile(r"^\s*(Rule|Regra)\s*:", re.IGNORECASE)
+_FENCE = re.compile(r"^\s*```")
+# Diretiva de idioma: só vale na primeira linha do arquivo
+_LANGUAGE = re.compile(r"^\s*#\s*language\s*:", re.IGNORECASE)
+
+
+# ================================
+# MAP: GRUPOS DE REGRAS
+# ================================
+def group_label(doc) -> str:
+    """Tópico da sub-consulta ou arquivo de origem do documento."""
+    metadata = doc.metadata
+    return metadata.get('topic') or metadata.get('filename') or metadata.get('source') or OTHER_GROUP_LABEL
+
+
+def group_rules(docs: List, max_groups: int = MAX_GROUPS) -> List[tuple]:
+    """
+    Agrupa os documentos recuperados por tópico/arquivo.
+
+    Os grupos seguem a ordem do primeiro documento de cada um (melhor
+    score primeiro); além de max_groups, os demais vão para o último.
+
+    Returns:
+        Lista de tuplas (rótulo, documentos)
+    """
+    groups: Dict[str, List] = {}
+    for doc in docs:
+        groups.setdefault(group_label(doc), []).append(doc)
+
+    items = list(groups.items())
+    if len(items) > max_groups:
+        overflow = [doc for _, group_docs in items[max_groups - 1:] for doc in group_docs]
+        items = items[:max_groups - 1] + [(OTHER_GROUP_LABEL, overflow)]
+    return items
+
+
+def group_question(query: str, label: str) -> str:
+    """Pergunta de um grupo: a solicitação original restrita ao tópico."""
+    return (f"{query}\n\nGere apenas os cenários das regras do CONTEXTO acima "
+            f"(parte do plano: {label}); as demais partes são geradas separadamente.")
+
+
+# ================================
+# REDUCE: JUNÇÃO E DEDUPLICAÇÃO
+# ================================
+def parse_gherkin(text: str) -> Dict[str, Any]:
+    """
+    Separa um plano Gherkin em título da Feature, Background e cenários.
+
+    Tags (@...) e comentários imediatamente antes de um cenário fazem
+    parte dele; os que vêm antes da Feature (ex.: "# language: pt") e a
+    diretiva de idioma ficam no cabeçalho. Cercas de código (```gherkin)
+    são ignoradas.
+
+    Returns:
+        Dicionário com 'header' (linhas acima da Feature), 'feature'
+        (título ou None), 'keyword' (palavra da Feature), 'background'
+        (linhas) e 'scenarios' (lista de linhas)
+    """
+    parsed = {'header': [], 'feature': None, 'keyword': None, 'background': [], 'scenarios': []}
+    current: Optional[List[str]] = None
+    pending: List[str] = []
+    blank = False
+
+    for line in text.splitlines():
+        stripped = line.strip()
+        if not stripped:
+            blank = True
+            continue
+        if _FENCE.match(line) or _RULE.match(line):
+            continue
+        if _LANGUAGE.match(line):
+            parsed['header'].append(stripped)
+            continue
+        feature = _FEATURE.match(line)
+        if feature:
+            if parsed['feature'] is None:
+                parsed['keyword'], parsed['feature'] = feature.group(1), feature.group(2).strip()
+                if current is None and not parsed['scenarios']:
+                    # Tags e comentários acima da Feature são dela, não do primeiro cenário
+                    parsed['header'].extend(pending)
+                    pending = []
+            current = None
+        elif _BACKGROUND.match(line):
+            current = parsed['background'] = [stripped]
+        elif _SCENARIO.match(line):
+            current = pending + [stripped]
+            pending = []
+            parsed['scenarios'].append(current)
+        elif stripped.startswith('@') or (stripped.startswith('#') and (current is None or blank)):
+            # Tags, e comentários separados por linha em branco, abrem o próximo cenário
+            pending.append(stripped)
+        elif current is not None:
+            current.extend(pending)
+            pending = []
+            current.append(stripped)
+        blank = False
+    return parsed
+
+
+def _step_lines(scenario: List[str]) -> List[str]:
+    """Passos normalizados do cenário (sem título, tags e comentários)."""
+    lines = [
+        " ".join(line.lower().split()) for line in scenario
+        if not line.startswith(('@', '#')) and not _SCENARIO.match(line)
+    ]
+    return lines or [" ".join(scenario[-1].lower().split())]
+
+
+def _similarity(a: set, b: set) -> float:
+    return len(a & b) / len(a | b) if a | b else 1.0
+
+
+def merge_plans(
+    query: str,
+    group_plans: List[tuple],
+    similarity: float = DUPLICATE_SIMILARITY
+) -> Dict[str, Any]:
+    """
+    Junta os planos dos grupos em uma única Feature, sem cenários repetidos.
+
+    Cada grupo vira uma seção Rule (com o seu Background, se houver),
+    o que mantém o Gherkin válido mesmo com Backgrounds diferentes.
+
+    Args:
+        query: Solicitação original (título da Feature se nenhum grupo gerou um)
+        group_plans: Lista de tuplas (rótulo, texto Gherkin do grupo)
+        similarity: Sobreposição mínima de passos para considerar duplicado
+
+    Returns:
+        Dicionário com 'text', 'scenarios' (mantidos) e 'duplicates' (removidos)
+    """
+    parsed = [(label, parse_gherkin(text)) for label, text in group_plans]
+    first = next((p for _, p in parsed if p['feature']), None)
+    portuguese = first is not None and first['keyword'].lower() != 'feature'
+    feature_keyword = first['keyword'] if first else "Feature"
+    rule_keyword = "Regra" if portuguese else "Rule"
+    title = first['feature'] if first else query.strip()
+
+    header = []
+    for _, plan in parsed:
+        header += [line for line in plan['header'] if line not in header]
+    # A diretiva de idioma precisa ser a primeira linha
+    header.sort(key=lambda line: not _LANGUAGE.match(line))
+    lines = header + [f"{feature_keyword}: {title}"]
+    kept_steps: List[set] = []
+    kept, duplicates = 0, 0
+    for label, plan in parsed:
+        section = []
+        for scenario in plan['scenarios']:
+            steps = set(_step_lines(scenario))
+            if any(_similarity(steps, other) >= similarity for other in kept_steps):
+                duplicates += 1
+                continue
+            kept_steps.append(steps)
+            section.append(scenario)
+        if not section:
+            continue
+        kept += len(section)
+        lines += ["", f"  {rule_keyword}: {label}"]
+        if plan['background']:
+            lines += [""] + _indent(plan['background'], 4)
+        for scenario in section:
+            lines += [""] + _indent(scenario, 4)
+    return {'text': "\n".join(lines) + "\n", 'scenarios': kept, 'duplicates': duplicates}
+
+
+def _indent(block: List[str], level: int) -> List[str]:
+    """Reindenta um bloco: título/tags no nível dado, passos e tabelas dois espaços adiante."""
+    pad = " " * level
+    out = []
+    titled = False
+    for line in block:
+        is_title = bool(_SCENARIO.match(line) or _BACKGROUND.match(line))
+        is_header = is_title or (not titled and line.startswith(('@', '#')))
+        titled = titled or is_title
+        out.append(pad + line if is_header else pad + "  " + line)
+    return out
+
+
+# ================================
+# GERAÇÃO MAP-REDUCE
+# ================================
+def generate_test_plan_map_reduce(
+    query: str,
+    qa_chain,
+    retriever,
+    context_token_budget: int = CONTEXT_TOKEN_BUDGET,
+    max_groups: int = MAX_GROUPS
+) -> dict:
+    """
+    Gera o plano em paralelo por grupo de regras e junta o resultado.
+
+    Args:
+        query: Pergunta/solicitação do usuário
+        qa_chain: Cadeia de geração retornada por setup_rag_chain
+        retriever: Retriever retornado por setup_rag_chain
+        context_token_budget: Máximo de tokens do CONTEXTO de cada grupo
+        max_groups: Máximo de grupos (chamadas concorrentes ao LLM)
+
+    Returns:
+        Resultado no formato de generate_test_plan; metrics traz também
+        'groups' (rótulo, regras, tempo e tokens de cada grupo, ou
+        'error'), 'partial' (algum grupo falhou), 'scenarios',
+        'duplicates_removed', 'map_time_s' e 'reduce_time_s'
+    """
+    print(f"\nExecutando consulta (map-reduce): '{query}'")
+    start = time.perf_counter()
+
+    source_docs = retriever.invoke(query)
+    retrieval_time = round(time.perf_counter() - start, 3)
+    groups = group_rules(source_docs, max_groups)
+    if len(groups) < 2:
+        # Um único grupo: não há o que paralelizar (geração comum)
+        packed = pack_context(source_docs, token_budget=context_token_budget)
+        result = qa_chain.invoke({"context": packed['text'], "question": query})
+        metrics = token_metrics(query, packed, result)
+        metrics["groups"] = [{'label': label, 'rules': len(docs)} for label, docs in groups]
+        metrics["total_time_s"] = round(time.perf_counter() - start, 3)
+        return build_plan_result(query, source_docs, result, metrics)
+
+    # Map: uma geração por grupo, todas concorrentes
+    packed = [pack_context(docs, token_budget=context_token_budget) for _, docs in groups]
+    inputs = [
+        {"context": p['text'], "question": group_question(query, label)}
+        for (label, _), p in zip(groups, packed)
+    ]
+    map_start = time.perf_counter()
+    responses = qa_chain.batch(inputs, config={"max_concurrency": len(inputs)}, return_exceptions=True)
+    map_time = round(time.perf_counter() - map_start, 3)
+
+    group_plans, group_metrics, used_docs = [], [], []
+    for (label, docs), p, question, response in zip(groups, packed, inputs, responses):
+        entry = {'label': label, 'rules': len(docs)}
+        if isinstance(response, Exception):
+            entry['error'] = f"{type(response).__name__}: {response}"
+            print(f"   ⚠️  Grupo '{label}' falhou ({entry['error']}); o plano sai sem as suas regras")
+        else:
+            group_plans.append((label, response.content))
+            used_docs.extend(docs)
+            entry.update(token_metrics(question['question'], p, response))
+        group_metrics.append(entry)
+    if not group_plans:
+        raise RuntimeError(f"Todas as gerações por grupo falharam: {group_metrics[0].get('error')}")
+    # Só as regras dos grupos gerados sustentam o plano (proveniência e planos desatualizados)
+    used_ids = {id(doc) for doc in used_docs}
+    used_docs = [doc for doc in source_docs if id(doc) in used_ids]
+
+    # Reduce: junção local, sem LLM
+    reduce_start = time.perf_counter()
+    merged = merge_plans(query, group_plans)
+    reduce_time = round(time.perf_counter() - reduce_start, 4)
+
+    completion = [g['completion_tokens'] for g in group_metrics if g.get('completion_tokens') is not None]
+    metrics = {
+        "context_tokens": sum(g.get('context_tokens', 0) for g in group_metrics),
+        "context_tokens_raw": sum(g.get('context_tokens_raw', 0) for g in group_metrics),
+        "prompt_tokens": sum(g.get('prompt_tokens', 0) for g in group_metrics),
+        "completion_tokens": sum(completion) if completion else None,
+        "groups": group_metrics,
+        "partial": len(group_plans) < len(groups),
+        "scenarios": merged['scenarios'],
+        "duplicates_removed": merged['duplicates'],
+        "retrieval_time_s": retrieval_time,
+        "map_time_s": map_time,
+        "reduce_time_s": reduce_time,
+        "total_time_s": round(time.perf_counter() - start, 3)
+    }
+    print(f"Grupos: {len(groups)} | cenários: {merged['scenarios']} "
+          f"(duplicados removidos: {merged['duplicates']}) | map: {map_time}s")
+
+    return {
+        "query": query,
+        "test_plan": merged['text'],
+        "source_rules": [doc.page_content for doc in used_docs],
+        "rule_ids": rule_ids(used_docs),
+        "retrieval": score_distribution(used_docs),
+        "metrics": metrics
+    }
@@ -0,0 +1,276 @@
+"""
+Módulo de Roteamento de Modelos - Nível e Orçamento de Saída por Complexidade
+=============================================================================
+
+Sem roteamento, toda geração usa o mesmo modelo e nenhum limite de
+tokens de saída: uma pergunta sobre uma única regra de cupom paga o mesmo
+que o fluxo inteiro de checkout. Aqui a complexidade de cada requisição é
+estimada a partir da pergunta e do CONTEXTO já empacotado:
+
+- Tokens do contexto e quantidade de fontes ([Fonte: ...]) distintas
+- Tópicos da pergunta (mesmos conectivos da divisão de consultas)
+- Termos de pedidos amplos ("fluxo completo", "todos os cenários"...)
+
+O score escolhe um nível (ROUTING_TIERS) com modelo, max_tokens e um
+limite de cenários informado ao LLM, para que o plano caiba no orçamento
+em vez de ser cortado no meio. Cada decisão é registrada (impressa e
+anexada a ROUTING_LOG_FILE no diretório do banco) com latência, tokens
+reais da resposta (usage_metadata) e se a resposta foi cortada pelo
+limite (finish_reason == 'length').
+
+Os modelos de cada nível vêm de variáveis de ambiente:
+
+    ROUTER_LIGHT_MODEL      nível 'light'
+    ROUTER_STANDARD_MODEL   nível 'standard'
+    ROUTER_HEAVY_MODEL      nível 'heavy'
+
+Sem elas, todos os níveis usam CHAT_MODEL (gpt-4o-mini) e o roteamento
+só limita a saída (max_tokens e número de cenários); a troca de modelo
+por complexidade exige configurar pelo menos um dos níveis.
+
+O módulo importa o Runnable do LangChain; o rag_pipeline só o importa
+quando o roteamento é ativado (setup_rag_chain(routing=True)).
+"""
+
+import os
+import re
+import json
+import time
+import threading
+from typing import Dict, Any, Iterator, Optional
+
+from langchain_core.runnables import Runnable
+
+try:
+    from .clients import get_chat_model, CHAT_MODEL
+    from .context_packing import count_tokens
+    from .query_splitting import split_query_heuristic
+except ImportError:
+    # Execução direta (src/core no sys.path)
+    from clients import get_chat_model, CHAT_MODEL
+    from context_packing import count_tokens
+    from query_splitting import split_query_heuristic
+
+# ================================
+# CONFIGURAÇÕES
+# ================================
+# Níveis em ordem crescente; o primeiro cujo max_score supera o score é escolhido.
+# max_scenarios é informado ao LLM junto da pergunta (None = sem limite)
+ROUTING_TIERS = (
+    {'name': 'light', 'model_env': 'ROUTER_LIGHT_MODEL', 'max_score': 2.5,
+     'max_tokens': 1200, 'max_scenarios': 4},
+    {'name': 'standard', 'model_env': 'ROUTER_STANDARD_MODEL', 'max_score': 5.0,
+     'max_tokens': 1600, 'max_scenarios': 8},
+    {'name': 'heavy', 'model_env': 'ROUTER_HEAVY_MODEL', 'max_score': float('inf'),
+     'max_tokens': 3200, 'max_scenarios': None}
+)
+
+# Pesos do score de complexidade
+TOKENS_PER_POINT = 500          # cada 500 tokens de contexto somam 1 ponto
+SOURCE_WEIGHT = 1.0             # cada fonte além da primeira
+TOPIC_WEIGHT = 1.0              # cada tópico da pergunta além do primeiro
+BROAD_REQUEST_WEIGHT = 2.0      # pedido amplo ("fluxo completo", "todos"...)
+
+BROAD_REQUEST = re.compile(
+    r"\b(?:fluxo\s+(?:completo|inteiro)|ponta\s+a\s+ponta|end[-\s]to[-\s]end|"
+    r"todos?\s+os|todas?\s+as|completo|completa|regress[ãa]o|cobertura\s+total)\b",
+    re.IGNORECASE
+)
+SOURCE_HEADER = re.compile(r"^\[Fonte:\s*(.+?)\]\s*$", re.MULTILINE)
+
+ROUTING_LOG_FILE = "routing_log.jsonl"
+
+
+# ================================
+# ESTIMATIVA DE COMPLEXIDADE
+# ================================
+def estimate_complexity(question: str, context: str) -> Dict[str, Any]:
+    """
+    Estima a complexidade de uma requisição (sem chamadas ao LLM).
+
+    Args:
+        question: Pergunta/solicitação do usuário
+        context: CONTEXTO empacotado (saída de pack_context)
+
+    Returns:
+        Dicionário com 'score' e os sinais usados ('context_tokens',
+        'sources', 'topics', 'broad')
+    """
+    context_tokens = count_tokens(context) if context else 0
+    sources = len(set(SOURCE_HEADER.findall(context or ""))) or (1 if context else 0)
+    topics = len(split_query_heuristic(question)) or 1
+    broad = bool(BROAD_REQUEST.search(question))
+
+    score = (
+        context_tokens / TOKENS_PER_POINT
+        + SOURCE_WEIGHT * max(0, sources - 1)
+        + TOPIC_WEIGHT * (topics - 1)
+        + (BROAD_REQUEST_WEIGHT if broad else 0.0)
+    )
+    return {
+        'score': round(score, 2),
+        'context_tokens': context_tokens,
+        'sources': sources,
+        'topics': topics,
+        'broad': broad
+    }
+
+
+def tier_model(tier: Dict[str, Any]) -> str:
+    """Modelo do nível (variável de ambiente; sem ela, CHAT_MODEL)."""
+    return os.getenv(tier['model_env']) or CHAT_MODEL
+
+
+def route(question: str, context: str, tiers=ROUTING_TIERS) -> Dict[str, Any]:
+    """
+    Escolhe o nível de modelo e o orçamento de saída da requisição.
+
+    Returns:
+        Dicionário com 'tier', 'model', 'max_tokens', 'max_scenarios',
+        'score' e 'features'
+    """
+    features = estimate_complexity(question, context)
+    tier = next((t for t in tiers if features['score'] < t['max_score']), tiers[-1])
+    return {
+        'tier': tier['name'],
+        'model': tier_model(tier),
+        'max_tokens': tier['max_tokens'],
+        'max_scenarios': tier['max_scenarios'],
+        'score': features.pop('score'),
+        'features': features
+    }
+
+
+def budget_hint(max_scenarios: Optional[int]) -> str:
+    """Instrução acrescentada à pergunta para o plano caber no orçamento de saída."""
+    if not max_scenarios:
+        return ""
+    return (f"\n\n(Plano objetivo: no máximo {max_scenarios} cenários, "
+            f"priorizando o caminho feliz e as exceções explícitas nas regras.)")
+
+
+# ================================
+# CADEIA ROTEADA
+# ================================
+class RoutedChain(Runnable):
+    """
+    Cadeia de geração ({"context", "question"} -> AIMessage) com roteamento.
+
+    Substitui `prompt | llm` em setup_rag_chain: cada chamada escolhe o
+    nível pela complexidade, usa o cliente compartilhado do nível
+    (clients.get_chat_model, com max_tokens) e registra a decisão. A
+    decisão também segue em response_metadata['routing'] da resposta
+    (ver token_metrics no rag_pipeline).
+    """
+
+    def __init__(self, prompt, model_options: Dict[str, Any] = None,
+                 log_path: Optional[str] = None, tiers=ROUTING_TIERS):
+        self._prompt = prompt
+        self._model_options = dict(model_options or {})
+        self._log_path = log_path
+        self._tiers = tiers
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, float]] = {}
+
+    def _prepare(self, input: Dict[str, Any]) -> tuple:
+        decision = route(input['question'], input.get('context', ""), self._tiers)
+        llm = get_chat_model(
+            model=decision['model'], max_tokens=decision['max_tokens'], **self._model_options
+        )
+        routed_input = dict(input, question=input['question'] + budget_hint(decision['max_scenarios']))
+        return decision, self._prompt | llm, routed_input
+
+    def invoke(self, input: Dict[str, Any], config=None, **kwargs):
+        decision, chain, routed_input = self._prepare(input)
+        start = time.perf_counter()
+        result = chain.invoke(routed_input, config, **kwargs)
+        self._finish(decision, start, result)
+        return result
+
+    async def ainvoke(self, input: Dict[str, Any], config=None, **kwargs):
+        decision, chain, routed_input = self._prepare(input)
+        start = time.perf_counter()
+        result = await chain.ainvoke(routed_input, config, **kwargs)
+        self._finish(decision, start, result)
+        return result
+
+    def stream(self, input: Dict[str, Any], config=None, **kwargs) -> Iterator:
+        decision, chain, routed_input = self._prepare(input)
+        start = time.perf_counter()
+        full_message = None
+        for chunk in chain.stream(routed_input, config, **kwargs):
+            full_message = chunk if full_message is None else full_message + chunk
+            if 'time_to_first_token_s' not in decision:
+                decision['time_to_first_token_s'] = round(time.perf_counter() - start, 3)
+                # A decisão segue no primeiro chunk; a soma dos chunks a preserva
+                chunk.response_metadata['routing'] = decision
+            yield chunk
+        self._finish(decision, start, full_message, attach=False)
+
+    def _finish(self, decision: Dict[str, Any], start: float, result, attach: bool = True) -> None:
+        """Completa a decisão com latência e tokens, anexa à resposta e registra."""
+        usage = getattr(result, 'usage_metadata', None) or {}
+        decision['latency_s'] = round(time.perf_counter() - start, 3)
+        decision['completion_tokens'] = usage.get('output_tokens')
+        metadata = getattr(result, 'response_metadata', None) or {}
+        decision['truncated'] = metadata.get('finish_reason') == 'length'
+        if attach and result is not None:
+            result.response_metadata['routing'] = decision
+        self.record(decision)
+
+    def record(self, decision: Dict[str, Any]) -> None:
+        """Acumula estatísticas por nível, imprime e anexa a decisão ao log."""
+        with self._lock:
+            entry = self._stats.setdefault(decision['tier'], {
+                'requests': 0, 'latency_s': 0.0, 'measured': 0, 'completion_tokens': 0,
+                'truncated': 0
+            })
+            entry['requests'] += 1
+            entry['latency_s'] += decision['latency_s']
+            if decision['completion_tokens'] is not None:
+                entry['measured'] += 1
+                entry['completion_tokens'] += decision['completion_tokens']
+            entry['truncated'] += int(decision['truncated'])
+
+            if self._log_path:
+                record = dict(decision, timestamp=time.strftime('%Y-%m-%dT%H:%M:%S'))
+                with open(self._log_path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+        print(f"🧭 Roteamento: {decision['tier']} ({decision['model']}, max_tokens={decision['max_tokens']}) | "
+              f"score={decision['score']} | {decision['latency_s']}s | "
+              f"resposta: {decision['completion_tokens']} tokens"
+              + (" | ⚠️  cortada pelo limite de saída" if decision['truncated'] else ""))
+
+    def stats(self) -> Dict[str, Any]:
+        """Por nível: requisições, latência média, tokens de resposta (total e média) e respostas cortadas."""
+        with self._lock:
+            return {
+                tier: {
+                    'requests': entry['requests'],
+                    'latency_mean_s': round(entry['latency_s'] / entry['requests'], 3),
+                    'completion_tokens': entry['completion_tokens'] if entry['measured'] else None,
+                    'completion_tokens_mean': (
+                        round(entry['completion_tokens'] / entry['measured'], 1) if entry['measured'] else None
+                    ),
+                    'truncated': entry['truncated']
+                }
+                for tier, entry in self._stats.items()
+            }
+
+
+def build_routed_chain(prompt, model_options: Dict[str, Any] = None, db_path: Optional[str] = None) -> RoutedChain:
+    """
+    Cria a cadeia roteada com o log de decisões em db_path.
+
+    Args:
+        prompt: PromptTemplate da geração
+        model_options: Opções comuns a todos os níveis (temperatura, stream_usage...)
+        db_path: Diretório do banco; None desativa o log em arquivo
+    """
+    log_path = os.path.join(db_path, ROUTING_LOG_FILE) if db_path and os.path.isdir(db_path) else None
+    models = {tier_model(tier) for tier in ROUTING_TIERS}
+    if len(models) == 1:
+        print(f"ℹ️  Roteamento: todos os níveis usam {models.pop()}; só o limite de saída varia "
+              f"(configure ROUTER_*_MODEL para trocar de modelo por nível)")
+    return RoutedChain(prompt, model_options, log_path)
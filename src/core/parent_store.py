@@ -0,0 +1,84 @@
+"""
+Módulo de Documentos-Pai - Retrieval Small-to-Big
+=================================================
+
+A ingestão indexa vetores-filho compactos (poucas regras cada) que
+apontam para um documento-pai: o conjunto de regras extraído de uma
+mesma unidade de origem (um trecho de código traduzido ou um trecho da
+documentação). A busca encontra os filhos mais próximos e devolve os
+pais correspondentes, sem repetição, como contexto coerente.
+
+Os pais ficam em PARENT_STORE_FILE (JSON), no diretório do ChromaDB;
+os filhos guardam apenas o metadado 'parent_id'.
+"""
+
+import os
+import json
+from datetime import datetime
+from typing import Dict, Any, Iterable, Optional
+
+# ================================
+# CONFIGURAÇÕES
+# ================================
+PARENT_STORE_FILE = "parent_docs.json"
+
+
+class ParentStore:
+    """
+    Armazena os documentos-pai por parent_id.
+
+    Args:
+        path: Arquivo JSON do armazenamento
+        parents: {parent_id: {'text': ..., 'metadata': {...}}}
+    """
+
+    def __init__(self, path: str, parents: Optional[Dict[str, Any]] = None):
+        self.path = path
+        self.parents: Dict[str, Any] = parents or {}
+
+    @classmethod
+    def load(cls, db_path: str) -> Optional["ParentStore"]:
+        """Carrega os documentos-pai do banco (None se a ingestão não os gerou)."""
+        path = os.path.join(db_path, PARENT_STORE_FILE)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(path, json.load(f).get('parents', {}))
+
+    def __len__(self) -> int:
+        return len(self.parents)
+
+    def add(self, parent_id: str, text: str, metadata: Dict[str, Any]):
+        self.parents[parent_id] = {'text': text, 'metadata': metadata}
+
+    def get(self, parent_id: str) -> Optional[Dict[str, Any]]:
+        return self.parents.get(parent_id)
+
+    def remove(self, source: str, chunk_indices: Optional[Iterable[int]] = None) -> int:
+        """
+        Remove os pais de um arquivo (metadado 'source').
+
+        Args:
+            source: Arquivo de origem
+            chunk_indices: Apenas os pais com estes chunk_index (None = todos)
+
+        Returns:
+            Quantidade de pais removidos
+        """
+        indices = None if chunk_indices is None else {int(i) for i in chunk_indices}
+        stale = [
+            parent_id for parent_id, parent in self.parents.items()
+            if parent['metadata'].get('source') == source
+            and (indices is None or parent['metadata'].get('chunk_index') in indices)
+        ]
+        for parent_id in stale:
+            del self.parents[parent_id]
+        return len(stale)
+
+    def save(self):
+        """Grava os documentos-pai (substituição atômica do arquivo)."""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'built_at': datetime.now().isoformat(), 'parents': self.parents}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
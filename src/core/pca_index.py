@@ -0,0 +1,320 @@
+"""
+Módulo de Redução de Dimensionalidade (PCA) do Índice Flat
+==========================================================
+
+As regras são textos curtos de um domínio estreito; as 1536 dimensões
+do ada-002 são mais do que o necessário para ordená-las. Este passo
+offline ajusta um PCA sobre os embeddings da coleção, grava os vetores
+reduzidos e, na consulta, projeta o vetor da consulta no mesmo espaço.
+
+A busca pontua os vetores reduzidos e re-pontua os melhores candidatos
+com os vetores completos. O ajuste inclui uma verificação de recall
+frente à ordenação em dimensão completa para várias dimensões
+candidatas, para escolher a dimensão com perda de qualidade medida.
+
+Arquivos gravados no diretório do índice flat:
+- pca_mean.npy, pca_components.npy: projeção (média e componentes)
+- vectors_pca.npy: vetores reduzidos e normalizados (n, n_components)
+- pca.json: dimensão, variância explicada e curva de recall
+
+Uso (passo offline):
+    python src/core/pca_index.py --components 256
+"""
+
+import os
+import sys
+import json
+import time
+from datetime import datetime
+from typing import List, Dict, Any, Optional
+
+import numpy as np
+
+try:
+    from .retrieval import normalize_rows, top_k_indices
+except ImportError:
+    # Execução direta (src/core no sys.path)
+    from retrieval import normalize_rows, top_k_indices
+
+# ================================
+# CONFIGURAÇÕES
+# ================================
+DEFAULT_PCA_COMPONENTS = 256
+CANDIDATE_DIMENSIONS = (64, 128, 256, 384, 512)
+# Máximo de vetores usados no ajuste (amostra aleatória)
+MAX_FIT_VECTORS = 50_000
+# Candidatos da busca reduzida re-pontuados, em múltiplos de n_results
+PCA_RESCORE_FACTOR = 4
+PROJECT_BLOCK_SIZE = 65_536
+RECALL_K = 10
+
+PCA_MEAN_FILE = "pca_mean.npy"
+PCA_COMPONENTS_FILE = "pca_components.npy"
+PCA_VECTORS_FILE = "vectors_pca.npy"
+PCA_MANIFEST_FILE = "pca.json"
+
+
+# ================================
+# AJUSTE E PROJEÇÃO
+# ================================
+def fit_pca(vectors: np.ndarray, n_components: int, seed: int = 42) -> tuple:
+    """
+    Ajusta o PCA via SVD sobre (uma amostra de) os vetores centralizados.
+
+    Returns:
+        Tupla (média (dim,), componentes (n_components, dim),
+        variância explicada acumulada por componente)
+    """
+    n = vectors.shape[0]
+    if n > MAX_FIT_VECTORS:
+        rng = np.random.default_rng(seed)
+        vectors = vectors[np.sort(rng.choice(n, MAX_FIT_VECTORS, replace=False))]
+    sample = np.asarray(vectors, dtype=np.float32)
+
+    mean = sample.mean(axis=0)
+    _, singular_values, components = np.linalg.svd(sample - mean, full_matrices=False)
+    variance = singular_values ** 2
+    explained = np.cumsum(variance) / variance.sum()
+
+    n_components = min(n_components, components.shape[0])
+    return mean.astype(np.float32), components[:n_components].astype(np.float32), explained[:n_components]
+
+
+def project(vectors: np.ndarray, mean: np.ndarray, components: np.ndarray) -> np.ndarray:
+    """Projeta vetores (ou uma consulta) no espaço reduzido, normalizados."""
+    if vectors.ndim == 1:
+        return normalize_rows(((vectors - mean) @ components.T).reshape(1, -1))[0]
+    return np.concatenate([
+        normalize_rows((np.asarray(vectors[start:start + PROJECT_BLOCK_SIZE]) - mean) @ components.T)
+        for start in range(0, vectors.shape[0], PROJECT_BLOCK_SIZE)
+    ])
+
+
+# ================================
+# BUSCA REDUZIDA
+# ================================
+class PCAProjection:
+    """
+    Busca no espaço reduzido + re-pontuação com os vetores completos.
+
+    Args:
+        index_path: Diretório do índice flat
+        full_vectors: Matriz float32 (memory-mapped) do índice flat
+    """
+
+    def __init__(self, index_path: str, full_vectors: np.ndarray):
+        self.mean = np.load(os.path.join(index_path, PCA_MEAN_FILE))
+        self.components = np.load(os.path.join(index_path, PCA_COMPONENTS_FILE))
+        self.reduced = np.load(os.path.join(index_path, PCA_VECTORS_FILE), mmap_mode='r')
+        self.rescore_vectors = full_vectors
+        self.mode = f"pca{self.components.shape[0]}"
+
+    @staticmethod
+    def exists(index_path: str) -> bool:
+        return os.path.exists(os.path.join(index_path, PCA_MANIFEST_FILE))
+
+    def search(
+        self,
+        query: np.ndarray,
+        n_results: int,
+        rows: Optional[np.ndarray] = None,
+        rescore_factor: int = PCA_RESCORE_FACTOR
+    ) -> np.ndarray:
+        """
+        Busca top-k no espaço reduzido, re-pontuando os melhores candidatos.
+
+        Args:
+            query: Vetor normalizado da consulta (dimensão completa)
+            n_results: Quantidade de resultados
+            rows: Subconjunto de linhas a pontuar (ex.: partições IVF)
+            rescore_factor: Candidatos re-pontuados (x n_results); 0 desativa
+
+        Returns:
+            Linhas do índice flat dos n_results melhores, em ordem decrescente
+        """
+        reduced_query = project(query, self.mean, self.components)
+        if rows is not None:
+            rows = np.sort(rows)
+            scores = np.asarray(self.reduced[rows]) @ reduced_query
+        else:
+            scores = self.reduced @ reduced_query
+
+        if not rescore_factor:
+            top = top_k_indices(scores, n_results)
+            return rows[top] if rows is not None else top
+
+        shortlist = top_k_indices(scores, n_results * rescore_factor)
+        if rows is not None:
+            shortlist = rows[shortlist]
+        shortlist = np.sort(shortlist)
+        exact = np.asarray(self.rescore_vectors[shortlist], dtype=np.float32) @ query
+        return shortlist[top_k_indices(exact, n_results)]
+
+
+def recall_curve(
+    full_vectors: np.ndarray,
+    queries: np.ndarray,
+    mean: np.ndarray,
+    components: np.ndarray,
+    dimensions: List[int],
+    k: int = RECALL_K
+) -> List[Dict[str, Any]]:
+    """
+    Recall@k da ordenação reduzida frente à ordenação em dimensão completa.
+
+    Os componentes do PCA são aninhados: as primeiras d linhas de um
+    ajuste com mais componentes formam o PCA de dimensão d, então um
+    único ajuste avalia todas as dimensões candidatas.
+
+    Returns:
+        Uma entrada por dimensão com recall@k (sem e com re-pontuação) e latência
+    """
+    start = time.perf_counter()
+    exact = [set(top_k_indices(full_vectors @ q, k).tolist()) for q in queries]
+    exact_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+    curve = []
+    for dim in dimensions:
+        reduced = project(full_vectors, mean, components[:dim])
+        reduced_queries = [project(q, mean, components[:dim]) for q in queries]
+
+        start = time.perf_counter()
+        found = [set(top_k_indices(reduced @ rq, k).tolist()) for rq in reduced_queries]
+        reduced_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+        rescored = []
+        for q, rq in zip(queries, reduced_queries):
+            shortlist = top_k_indices(reduced @ rq, k * PCA_RESCORE_FACTOR)
+            rescored.append(set(shortlist[top_k_indices(np.asarray(full_vectors[shortlist]) @ q, k)].tolist()))
+
+        def recall(results):
+            return round(float(np.mean([len(e & r) / max(len(e), 1) for e, r in zip(exact, results)])), 4)
+
+        curve.append({
+            'dim': int(dim),
+            'recall_at_k': recall(found),
+            'recall_at_k_rescored': recall(rescored),
+            'reduced_ms': round(reduced_ms, 3),
+            'exact_ms': round(exact_ms, 3)
+        })
+    return curve
+
+
+def build_pca_index(
+    index_path: str,
+    full_vectors: np.ndarray,
+    queries: np.ndarray,
+    n_components: int = DEFAULT_PCA_COMPONENTS,
+    candidate_dimensions: Optional[List[int]] = None
+) -> Dict[str, Any]:
+    """
+    Ajusta o PCA, grava os vetores reduzidos e a verificação de recall.
+
+    Args:
+        index_path: Diretório do índice flat
+        full_vectors: Matriz float32 normalizada do índice flat
+        queries: Consultas usadas na verificação de recall
+        n_components: Dimensão dos vetores reduzidos gravados
+        candidate_dimensions: Dimensões avaliadas na curva de recall
+
+    Returns:
+        Manifesto do PCA (dimensão, variância explicada e curva de recall)
+    """
+    dim = full_vectors.shape[1]
+    n_components = min(n_components, dim, full_vectors.shape[0])
+    dimensions = sorted({
+        d for d in (candidate_dimensions or CANDIDATE_DIMENSIONS) if d < dim
+    } | {n_components})
+
+    mean, components, explained = fit_pca(full_vectors, max(dimensions))
+    dimensions = [d for d in dimensions if d <= components.shape[0]]
+    n_components = min(n_components, components.shape[0])
+
+    np.save(os.path.join(index_path, PCA_MEAN_FILE), mean)
+    np.save(os.path.join(index_path, PCA_COMPONENTS_FILE), components[:n_components])
+    np.save(os.path.join(index_path, PCA_VECTORS_FILE), project(full_vectors, mean, components[:n_components]))
+
+    k = min(RECALL_K, full_vectors.shape[0])
+    curve = recall_curve(full_vectors, queries, mean, components, dimensions, k)
+    for entry in curve:
+        entry['explained_variance'] = round(float(explained[entry['dim'] - 1]), 4)
+
+    manifest = {
+        'n_components': int(n_components),
+        'original_dim': int(dim),
+        'count': int(full_vectors.shape[0]),
+        'k': k,
+        'recall_curve': curve,
+        'built_at': datetime.now().isoformat()
+    }
+    with open(os.path.join(index_path, PCA_MANIFEST_FILE), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+
+    print(f"   📉 PCA: {dim} -> {n_components} dimensões | recall@{k} frente à dimensão completa:")
+    for entry in curve:
+        marker = "➡️ " if entry['dim'] == n_components else "   "
+        print(f"      {marker}dim={entry['dim']:>4}: recall {entry['recall_at_k']} "
+              f"({entry['recall_at_k_rescored']} re-pontuado) | variância {entry['explained_variance']} | "
+              f"{entry['reduced_ms']}ms (completa: {entry['exact_ms']}ms)")
+    return manifest
+
+
+def extend_pca_index(index_path: str, target_path: str, kept: np.ndarray, new_vectors: np.ndarray) -> Dict[str, Any]:
+    """
+    Grava em target_path os vetores reduzidos de index_path só com as
+    linhas mantidas (kept) seguidas das novas, projetadas com a média e os
+    componentes já ajustados (sem novo ajuste; a curva de recall é a do ajuste).
+
+    Returns:
+        Manifesto do PCA com a contagem atualizada
+    """
+    manifest = load_pca_manifest(index_path)
+    mean = np.load(os.path.join(index_path, PCA_MEAN_FILE))
+    components = np.load(os.path.join(index_path, PCA_COMPONENTS_FILE))
+    reduced = np.load(os.path.join(index_path, PCA_VECTORS_FILE), mmap_mode='r')
+
+    parts = [np.asarray(reduced[kept])]
+    if len(new_vectors):
+        parts.append(project(new_vectors, mean, components))
+    np.save(os.path.join(target_path, PCA_MEAN_FILE), mean)
+    np.save(os.path.join(target_path, PCA_COMPONENTS_FILE), components)
+    np.save(os.path.join(target_path, PCA_VECTORS_FILE), np.concatenate(parts))
+
+    manifest.update(count=int(len(kept) + len(new_vectors)), updated_at=datetime.now().isoformat())
+    with open(os.path.join(target_path, PCA_MANIFEST_FILE), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def load_pca_manifest(index_path: str) -> Optional[Dict[str, Any]]:
+    """Manifesto do PCA do índice (None se não houver)."""
+    if not PCAProjection.exists(index_path):
+        return None
+    with open(os.path.join(index_path, PCA_MANIFEST_FILE), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from flat_index import load_flat_index
+    from ivf_index import sample_queries
+
+    parser = argparse.ArgumentParser(description="PCA - Reduz a dimensão dos embeddings do índice flat")
+    parser.add_argument('--db-path', default=os.path.join(".", "chroma_db"), help='Caminho do banco ChromaDB')
+    parser.add_argument('--components', type=int, default=DEFAULT_PCA_COMPONENTS,
+                        help=f'Dimensão dos vetores reduzidos (padrão: {DEFAULT_PCA_COMPONENTS})')
+    parser.add_argument('--candidates', type=int, nargs='+', default=list(CANDIDATE_DIMENSIONS),
+                        help='Dimensões avaliadas na verificação de recall')
+
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db_path):
+        print(f"❌ Banco de dados não encontrado: {args.db_path}")
+        sys.exit(1)
+
+    store = load_flat_index(args.db_path)
+    if len(store) == 0:
+        print("⚠️  Índice vazio: nada para reduzir")
+        sys.exit(0)
+    build_pca_index(store.index_path, store.vectors, sample_queries(store.vectors), args.components, args.candidates)
@@ -0,0 +1,219 @@
+"""
+Módulo de Cache de Planos - Planos Gerados por Consulta e Versão do Índice
+==========================================================================
+
+Guarda o último plano gerado para cada consulta (normalizada) e perfil
+de geração, junto da versão do índice em que foi gerado
+(admission.index_version). O perfil (rag_pipeline.generation_profile) reúne o
+orçamento de contexto e as opções de retrieval (modo, k, MMR,
+hierárquico...): um plano gerado com outro orçamento ou outro retriever
+não é servido como acerto exato, assim como não é coalescido
+(admission.coalescing_key usa o mesmo perfil). Serve a dois usos:
+
+1. Acerto exato: mesma consulta, mesmo perfil e mesma versão do índice,
+   o plano pode ser devolvido sem retrieval nem LLM
+2. Correspondência lexical (lexical_match): quando o prazo de uma
+   requisição se esgota (ver deadline.py), o plano da consulta com mais
+   termos em comum (Jaccard dos termos, sem embeddings nem chamada de
+   rede), mesmo de outro perfil ou de uma versão anterior do índice, é
+   melhor que nenhum. Consultas com as mesmas palavras e sentido
+   diferente também casam; paráfrases sem termos em comum, não
+
+O cache é um JSON no diretório do banco (PLAN_CACHE_FILE), regravado de
+forma atômica a cada inclusão e limitado a MAX_ENTRIES (as consultas mais
+antigas saem primeiro). Vários processos (CLI, Streamlit, serviço HTTP)
+podem compartilhar o mesmo banco: cada inclusão relê o arquivo sob um
+lock de arquivo (PLAN_CACHE_FILE + ".lock") e grava a versão mesclada, e
+as leituras recarregam o arquivo quando ele muda no disco. Planos de
+outros modos de geração (ex.: 'map_reduce') ficam em chaves próprias
+("<modo>:<perfil>:<consulta>") e não são servidos às gerações comuns, nem
+na correspondência lexical.
+"""
+
+import os
+import re
+import json
+import time
+import threading
+import unicodedata
+from contextlib import contextmanager
+from typing import Dict, Any, List, Optional
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: lock de arquivo pelo msvcrt
+    fcntl = None
+    import msvcrt
+
+# ================================
+# CONFIGURAÇÕES
+# ================================
+PLAN_CACHE_FILE = "plan_cache.json"
+MAX_ENTRIES = 500
+# Sobreposição mínima de termos (Jaccard) da correspondência lexical
+LEXICAL_MATCH_THRESHOLD = 0.6
+
+# Palavras sem valor para comparar consultas
+STOPWORDS = {
+    'a', 'o', 'as', 'os', 'um', 'uma', 'de', 'do', 'da', 'dos', 'das', 'e', 'em', 'no', 'na',
+    'nos', 'nas', 'para', 'por', 'com', 'sem', 'que', 'ao', 'aos', 'incluindo', 'gere', 'crie',
+    'cenarios', 'cenario', 'teste', 'testes', 'bdd', 'plano', 'planos', 'sobre'
+}
+_WORD = re.compile(r"\w+")
+
+
+def normalize_query(query: str) -> str:
+    """Consulta em minúsculas, sem espaços repetidos (chave do cache)."""
+    return " ".join(query.lower().split())
+
+
+def query_terms(query: str) -> List[str]:
+    """Termos relevantes da consulta (sem acentos e sem stopwords)."""
+    text = unicodedata.normalize('NFKD', query.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return sorted({w for w in _WORD.findall(text) if w not in STOPWORDS and len(w) > 1})
+
+
+def cache_key(query: str, mode: Optional[str] = None, profile: Optional[str] = None) -> str:
+    """Chave do cache: consulta normalizada, prefixada pelo modo e pelo perfil de geração, se houver."""
+    return "".join(f"{part}:" for part in (mode, profile) if part) + normalize_query(query)
+
+
+def _jaccard(a: set, b: set) -> float:
+    return len(a & b) / len(a | b) if a | b else 0.0
+
+
+@contextmanager
+def file_lock(path: str):
+    """Lock exclusivo entre processos sobre `path` (bloqueia até obtê-lo)."""
+    with open(path, 'a+') as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class PlanCache:
+    """
+    Cache de planos persistido em db_path/PLAN_CACHE_FILE.
+
+    Args:
+        db_path: Diretório do banco de dados
+        max_entries: Máximo de consultas mantidas
+    """
+
+    def __init__(self, db_path: str, max_entries: int = MAX_ENTRIES):
+        self.path = os.path.join(db_path, PLAN_CACHE_FILE)
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: Optional[Dict[str, Dict[str, Any]]] = None
+        # (mtime, tamanho) do arquivo na última leitura/gravação
+        self._stamp: Optional[tuple] = None
+
+    def _file_stamp(self) -> Optional[tuple]:
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        """Entradas do cache (relidas quando o arquivo muda no disco). Chamar com _lock."""
+        stamp = self._file_stamp()
+        if self._entries is None or (stamp is not None and stamp != self._stamp):
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self._entries = json.load(f)
+            except (OSError, ValueError):
+                self._entries = {} if self._entries is None else self._entries
+            self._stamp = stamp
+        return self._entries
+
+    def _save(self) -> None:
+        """Grava o cache (arquivo temporário + os.replace). Chamar com _lock e o lock de arquivo."""
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._entries, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+        self._stamp = self._file_stamp()
+
+    def get(self, query: str, version: str, mode: Optional[str] = None,
+            profile: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Plano da mesma consulta (modo e perfil) gerado na versão atual do índice, se houver."""
+        with self._lock:
+            entry = self._load().get(cache_key(query, mode, profile))
+        if entry and entry['version'] == version:
+            return entry
+        return None
+
+    def lexical_match(self, query: str, version: Optional[str] = None,
+                      threshold: float = LEXICAL_MATCH_THRESHOLD) -> Optional[Dict[str, Any]]:
+        """
+        Plano comum (sem modo) da consulta com mais termos em comum, de
+        qualquer perfil e versão do índice.
+
+        A comparação é lexical (Jaccard dos termos de query_terms), não
+        semântica: não há chamada ao modelo de embeddings.
+
+        Returns:
+            Entrada do cache com 'term_overlap' e 'stale' (gerada em outra
+            versão do índice), ou None abaixo do limite
+        """
+        terms = set(query_terms(query))
+        with self._lock:
+            entries = [entry for entry in self._load().values() if not entry.get('mode')]
+        # Empate de sobreposição: a versão atual do índice vence
+        scored = [
+            (_jaccard(terms, set(entry.get('terms', []))), entry['version'] == version, entry)
+            for entry in entries
+        ]
+        scored = [item for item in scored if item[0] >= threshold]
+        if not scored:
+            return None
+        score, current, best = max(scored, key=lambda item: item[:2])
+        return {**best, 'term_overlap': round(score, 3), 'stale': not current}
+
+    def put(self, query: str, version: str, result: Dict[str, Any], mode: Optional[str] = None,
+            profile: Optional[str] = None) -> None:
+        """Guarda o plano de um resultado completo (generate_test_plan ou do modo informado)."""
+        entry = {
+            'query': query,
+            'mode': mode,
+            'profile': profile,
+            'terms': query_terms(query),
+            'version': version,
+            'test_plan': result['test_plan'],
+            'source_rules': result['source_rules'],
+            'rule_ids': result.get('rule_ids', []),
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S')
+        }
+        with self._lock:
+            if not os.path.isdir(os.path.dirname(self.path) or "."):
+                self._store(self._load(), cache_key(query, mode, profile), entry)
+                return
+            # Relê sob o lock de arquivo: inclusões de outros processos são mantidas
+            with file_lock(self.path + ".lock"):
+                self._stamp = None
+                self._store(self._load(), cache_key(query, mode, profile), entry)
+                self._save()
+
+    def _store(self, entries: Dict[str, Dict[str, Any]], key: str, entry: Dict[str, Any]) -> None:
+        """Inclui a entrada no fim (mais recente) e descarta as mais antigas acima do limite."""
+        entries.pop(key, None)
+        entries[key] = entry
+        while len(entries) > self.max_entries:
+            entries.pop(next(iter(entries)))
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._load())
@@ -0,0 +1,271 @@
+"""
+Módulo de Planos Persistidos - Arquivos .feature e Dependência das Regras
+=========================================================================
+
+Os planos gerados são gravados como arquivos .feature (um por consulta)
+com um cabeçalho de comentários Gherkin que registra a consulta e, para
+cada regra usada no contexto, o identificador estável (retrieval.rule_ids)
+e o hash do conteúdo atual dessa regra no índice:
+
+    # cerebro-qa: query = Gere cenários de teste BDD para cupons
+    # cerebro-qa: generated_at = 2025-01-01T12:00:00
+    # cerebro-qa: rule = parent:code_example.py#3 1f0c2a9b7d41e8c5
+
+    Funcionalidade: ...
+
+Depois de uma ingestão (completa ou delta), um plano está desatualizado
+se alguma das suas regras mudou de conteúdo ou saiu do índice. Apenas
+esses planos são gerados de novo (refresh_plans), em lote.
+"""
+
+import os
+import re
+import glob
+import hashlib
+import unicodedata
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+from langchain_core.documents import Document
+
+try:
+    from .parent_store import ParentStore
+    from .rag_pipeline import generate_test_plans_batch, DEFAULT_MAX_CONCURRENCY
+    from .context_packing import CONTEXT_TOKEN_BUDGET
+except ImportError:
+    # Execução direta (src/core no sys.path)
+    from parent_store import ParentStore
+    from rag_pipeline import generate_test_plans_batch, DEFAULT_MAX_CONCURRENCY
+    from context_packing import CONTEXT_TOKEN_BUDGET
+
+# ================================
+# CONFIGURAÇÕES
+# ================================
+PLAN_EXTENSION = ".feature"
+HEADER_PREFIX = "# cerebro-qa:"
+SLUG_MAX_LENGTH = 60
+
+_HEADER = re.compile(r"^#\s*cerebro-qa:\s*(\w+)\s*=\s*(.*)$")
+_FENCE = re.compile(r"^\s*```")
+
+
+# ================================
+# HASHES DAS REGRAS
+# ================================
+def content_hash(text: str) -> str:
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:16]
+
+
+def load_rules(db_path: str, ids: List[str]) -> Dict[str, Optional[Document]]:
+    """
+    Conteúdo atual de cada regra no índice.
+
+    'parent:<id>' é lido do armazenamento de documentos-pai;
+    'chunk:<source>#<i>' do ChromaDB (um único get por lote de arquivos).
+    Os metadados permitem recalcular os ids (retrieval.rule_ids).
+
+    Returns:
+        Dicionário id -> Document, ou None para regras que não existem mais
+    """
+    rules: Dict[str, Optional[Document]] = {rule_id: None for rule_id in ids}
+
+    parent_ids = [rule_id for rule_id in ids if rule_id.startswith("parent:")]
+    if parent_ids:
+        parent_store = ParentStore.load(db_path)
+        for rule_id in parent_ids:
+            parent_id = rule_id[len("parent:"):]
+            parent = parent_store.get(parent_id) if parent_store else None
+            if parent is not None:
+                rules[rule_id] = Document(
+                    page_content=parent['text'], metadata={**parent['metadata'], 'parent_id': parent_id}
+                )
+
+    chunk_ids = [rule_id for rule_id in ids if rule_id.startswith("chunk:")]
+    if chunk_ids:
+        sources = sorted({rule_id[len("chunk:"):].rsplit("#", 1)[0] for rule_id in chunk_ids})
+        # Import pesado apenas quando há chunks a verificar
+        from langchain_chroma import Chroma
+        found = Chroma(persist_directory=db_path)._collection.get(
+            where={"source": {"$in": sources}}, include=["documents", "metadatas"]
+        )
+        for text, metadata in zip(found['documents'], found['metadatas']):
+            if metadata.get('chunk_index') is None:
+                continue
+            rule_id = f"chunk:{metadata['source']}#{int(metadata['chunk_index'])}"
+            if rule_id in rules:
+                rules[rule_id] = Document(page_content=text, metadata=metadata)
+    return rules
+
+
+def current_rule_hashes(db_path: str, ids: List[str]) -> Dict[str, Optional[str]]:
+    """
+    Hash do conteúdo atual de cada regra no índice (ver load_rules).
+
+    Returns:
+        Dicionário id -> hash, ou None para regras que não existem mais
+    """
+    return {
+        rule_id: content_hash(doc.page_content) if doc is not None else None
+        for rule_id, doc in load_rules(db_path, ids).items()
+    }
+
+
+# ================================
+# ARQUIVOS .feature
+# ================================
+def plan_filename(query: str) -> str:
+    """Nome do arquivo do plano: slug da consulta + hash curto (estável por consulta)."""
+    normalized = " ".join(query.lower().split())
+    text = unicodedata.normalize('NFKD', normalized)
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    slug = re.sub(r"[^a-z0-9]+", "-", text).strip("-")[:SLUG_MAX_LENGTH].rstrip("-") or "plano"
+    return f"{slug}-{hashlib.sha1(normalized.encode('utf-8')).hexdigest()[:8]}{PLAN_EXTENSION}"
+
+
+def save_plan(plans_dir: str, result: Dict[str, Any], db_path: str,
+              rule_hashes: Optional[Dict[str, Optional[str]]] = None) -> str:
+    """
+    Grava o plano de um resultado de geração como .feature.
+
+    Args:
+        plans_dir: Diretório dos planos (criado se não existir)
+        result: Resultado de generate_test_plan (usa 'query', 'test_plan' e 'rule_ids')
+        db_path: Caminho do banco (hash atual das regras)
+        rule_hashes: Hashes já calculados (evita nova leitura do índice)
+
+    Returns:
+        Caminho do arquivo gravado
+    """
+    ids = result.get('rule_ids', [])
+    if rule_hashes is None:
+        rule_hashes = current_rule_hashes(db_path, ids)
+
+    lines = [
+        f"{HEADER_PREFIX} query = {' '.join(result['query'].split())}",
+        f"{HEADER_PREFIX} generated_at = {datetime.now().isoformat(timespec='seconds')}"
+    ]
+    lines += [f"{HEADER_PREFIX} rule = {rule_id} {rule_hashes.get(rule_id) or '-'}" for rule_id in ids]
+    body = "\n".join(line for line in result['test_plan'].strip().splitlines() if not _FENCE.match(line))
+
+    os.makedirs(plans_dir, exist_ok=True)
+    path = os.path.join(plans_dir, plan_filename(result['query']))
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("\n".join(lines) + "\n\n" + body.strip() + "\n")
+    return path
+
+
+def read_plan(path: str) -> Optional[Dict[str, Any]]:
+    """
+    Lê o cabeçalho e o corpo de um .feature gravado por save_plan.
+
+    Returns:
+        Dicionário com 'path', 'query', 'generated_at', 'rules' (id -> hash)
+        e 'test_plan', ou None se o arquivo não tiver o cabeçalho
+    """
+    plan = {'path': path, 'query': None, 'generated_at': None, 'rules': {}}
+    body = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            header = _HEADER.match(line.strip()) if not body else None
+            if header is None:
+                body.append(line)
+                continue
+            key, value = header.group(1), header.group(2).strip()
+            if key == 'rule':
+                rule_id, _, rule_hash = value.rpartition(" ")
+                plan['rules'][rule_id] = None if rule_hash == '-' else rule_hash
+            else:
+                plan[key] = value
+    if not plan['query']:
+        return None
+    plan['test_plan'] = "".join(body).strip() + "\n"
+    return plan
+
+
+def list_plans(plans_dir: str) -> List[Dict[str, Any]]:
+    """Planos gravados no diretório (arquivos sem cabeçalho são ignorados)."""
+    plans = []
+    for path in sorted(glob.glob(os.path.join(plans_dir, f"*{PLAN_EXTENSION}"))):
+        plan = read_plan(path)
+        if plan is not None:
+            plans.append(plan)
+    return plans
+
+
+# ================================
+# PLANOS DESATUALIZADOS
+# ================================
+def find_stale_plans(plans_dir: str, db_path: str) -> Dict[str, Any]:
+    """
+    Compara as regras de cada plano com o conteúdo atual do índice.
+
+    Returns:
+        Dicionário com 'plans' (todos), 'stale' (planos com 'changed' e
+        'removed': ids alterados/removidos) e 'hashes' (hash atual de cada regra)
+    """
+    plans = list_plans(plans_dir)
+    ids = sorted({rule_id for plan in plans for rule_id in plan['rules']})
+    hashes = current_rule_hashes(db_path, ids) if ids else {}
+
+    stale = []
+    for plan in plans:
+        removed = [rule_id for rule_id in plan['rules'] if hashes.get(rule_id) is None]
+        changed = [
+            rule_id for rule_id, rule_hash in plan['rules'].items()
+            if rule_id not in removed and hashes[rule_id] != rule_hash
+        ]
+        if changed or removed:
+            stale.append({**plan, 'changed': changed, 'removed': removed})
+    return {'plans': plans, 'stale': stale, 'hashes': hashes}
+
+
+def refresh_plans(
+    plans_dir: str,
+    db_path: str,
+    qa_chain,
+    retriever,
+    max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+    context_token_budget: int = CONTEXT_TOKEN_BUDGET
+) -> Dict[str, int]:
+    """
+    Gera de novo apenas os planos cujas regras mudaram desde a última geração.
+
+    Args:
+        plans_dir: Diretório dos planos .feature
+        db_path: Caminho do banco de dados (já atualizado pela ingestão)
+        qa_chain: Cadeia de geração retornada por setup_rag_chain
+        retriever: Retriever retornado por setup_rag_chain
+        max_concurrency: Máximo de gerações simultâneas
+        context_token_budget: Máximo de tokens do CONTEXTO de cada plano
+
+    Returns:
+        Dicionário com estatísticas ('plans', 'stale', 'regenerated', 'errors')
+    """
+    found = find_stale_plans(plans_dir, db_path)
+    stats = {'plans': len(found['plans']), 'stale': len(found['stale']), 'regenerated': 0, 'errors': 0}
+    print(f"📂 Planos: {stats['plans']} | desatualizados: {stats['stale']} "
+          f"| atuais: {stats['plans'] - stats['stale']}")
+    for plan in found['stale']:
+        print(f"   🔄 {os.path.basename(plan['path'])}: {len(plan['changed'])} regra(s) alterada(s), "
+              f"{len(plan['removed'])} removida(s)")
+    if not found['stale']:
+        return stats
+
+    queries = [plan['query'] for plan in found['stale']]
+    results = generate_test_plans_batch(queries, qa_chain, retriever, max_concurrency, context_token_budget)
+
+    # Regras novas (não vistas em nenhum plano) são lidas do índice de uma vez
+    new_ids = sorted({
+        rule_id for result in results if 'error' not in result
+        for rule_id in result['rule_ids'] if rule_id not in found['hashes']
+    })
+    hashes = {**found['hashes'], **(current_rule_hashes(db_path, new_ids) if new_ids else {})}
+    for plan, result in zip(found['stale'], results):
+        if 'error' in result:
+            print(f"   ❌ {os.path.basename(plan['path'])}: {result['error']}")
+            stats['errors'] += 1
+            continue
+        save_plan(plans_dir, result, db_path, hashes)
+        stats['regenerated'] += 1
+    print(f"✅ {stats['regenerated']}/{stats['stale']} plano(s) gerado(s) novamente")
+    return stats
@@ -0,0 +1,376 @@
+"""
+Módulo de Quantização - Embeddings Int8 e Binários com Re-pontuação
+===================================================================
+
+Os vetores do ada-002 têm 1536 dimensões float32 (6 KB por regra), e o
+índice cresce rápido com vários projetos. Este módulo grava uma cópia
+quantizada da matriz do índice flat, na representação escolhida:
+
+- int8: quantização escalar simétrica por dimensão (1 byte/dimensão);
+  o score aproximado é codes @ (scale * query)
+- binary: 1 bit por dimensão (sinal); o score aproximado é a distância
+  de Hamming (popcount do XOR)
+
+A primeira passada pontua apenas a representação quantizada e seleciona
+RESCORE_FACTOR x n_results candidatos, re-pontuados com os vetores de
+precisão total (float32, memory-mapped) ou com uma cópia float16. Assim
+só as páginas dos candidatos re-pontuados da matriz completa são lidas.
+
+A quantização reduz a memória lida por consulta, não o disco: a matriz
+float32 (vectors.npy) continua gravada, pois é a fonte das reconstruções
+(nova quantização, IVF, PCA e relatório de recall) e das linhas mantidas
+na ingestão delta. Com re-pontuação em float16, as consultas não leem
+vectors.npy; em disco, a cópia float16 se soma à matriz float32.
+
+Arquivos gravados no diretório do índice flat (só os da representação
+selecionada por --quantization / --rescore-dtype):
+- vectors_int8.npy + int8_scale.npy (int8) ou vectors_binary.npy (binary)
+- vectors_f16.npy (apenas com re-pontuação em float16)
+- quantization.json: representação gravada, memória por vetor e recall@k
+  de todas as combinações (as não gravadas são avaliadas em memória)
+"""
+
+import os
+import json
+import time
+from datetime import datetime
+from typing import Dict, Any, Optional
+
+import numpy as np
+
+try:
+    from .retrieval import top_k_indices
+except ImportError:
+    # Execução direta (src/core no sys.path)
+    from retrieval import top_k_indices
+
+# ================================
+# CONFIGURAÇÕES
+# ================================
+QUANTIZATION_MODES = ("int8", "binary")
+RESCORE_DTYPES = ("float32", "float16")
+# Candidatos da primeira passada re-pontuados, em múltiplos de n_results
+RESCORE_FACTOR = {"int8": 4, "binary": 10}
+# Blocos pequenos mantêm a conversão int8 -> float32 dentro do cache da CPU
+SCORE_BLOCK_SIZE = 1024
+RECALL_K = 10
+
+INT8_FILE = "vectors_int8.npy"
+INT8_SCALE_FILE = "int8_scale.npy"
+BINARY_FILE = "vectors_binary.npy"
+FLOAT16_FILE = "vectors_f16.npy"
+QUANTIZATION_MANIFEST_FILE = "quantization.json"
+
+# Bits ligados de cada byte (fallback para NumPy < 2.0, sem np.bitwise_count)
+_POPCOUNT_TABLE = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+# ================================
+# QUANTIZAÇÃO
+# ================================
+def quantize_int8(vectors: np.ndarray) -> tuple:
+    """
+    Quantização escalar simétrica por dimensão.
+
+    Returns:
+        Tupla (códigos int8 (n, dim), escala float32 (dim,))
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    scale = np.abs(vectors).max(axis=0) / 127.0
+    scale[scale == 0] = 1.0
+    codes = np.clip(np.rint(vectors / scale), -127, 127).astype(np.int8)
+    return codes, scale.astype(np.float32)
+
+
+def quantize_binary(vectors: np.ndarray) -> np.ndarray:
+    """Quantização de 1 bit por dimensão (sinal), empacotada em bytes."""
+    return np.packbits(np.asarray(vectors) > 0, axis=-1)
+
+
+def hamming_similarity(codes: np.ndarray, query_bits: np.ndarray) -> np.ndarray:
+    """Similaridade de Hamming (bits iguais) entre os códigos e a consulta."""
+    xor = np.bitwise_xor(codes, query_bits)
+    bits = np.bitwise_count(xor) if hasattr(np, "bitwise_count") else _POPCOUNT_TABLE[xor]
+    differing = bits.sum(axis=1, dtype=np.int32)
+    return codes.shape[1] * 8 - differing
+
+
+def representation_files(mode: str, rescore_dtype: str) -> tuple:
+    """Arquivos gravados para uma representação (quantização + re-pontuação)."""
+    files = (INT8_FILE, INT8_SCALE_FILE) if mode == "int8" else (BINARY_FILE,)
+    return files + ((FLOAT16_FILE,) if rescore_dtype == "float16" else ())
+
+
+# ================================
+# BUSCA QUANTIZADA
+# ================================
+class QuantizedVectors:
+    """
+    Primeira passada quantizada + re-pontuação em precisão maior.
+
+    Args:
+        index_path: Diretório do índice flat
+        full_vectors: Matriz float32 (memory-mapped) do índice flat
+        mode: 'int8' ou 'binary'
+        rescore_dtype: 'float32' (matriz original) ou 'float16' (cópia)
+    """
+
+    def __init__(self, index_path: str, full_vectors: np.ndarray, mode: str = "int8", rescore_dtype: str = "float32"):
+        if mode not in QUANTIZATION_MODES:
+            raise ValueError(f"Quantização inválida: {mode}. Use uma de {QUANTIZATION_MODES}")
+        if rescore_dtype not in RESCORE_DTYPES:
+            raise ValueError(f"Precisão de re-pontuação inválida: {rescore_dtype}. Use uma de {RESCORE_DTYPES}")
+
+        self.mode = mode
+        self.rescore_factor = RESCORE_FACTOR[mode]
+        if mode == "int8":
+            self.codes = np.load(os.path.join(index_path, INT8_FILE), mmap_mode='r')
+            self.scale = np.load(os.path.join(index_path, INT8_SCALE_FILE))
+        else:
+            self.codes = np.load(os.path.join(index_path, BINARY_FILE), mmap_mode='r')
+            self.scale = None
+
+        if rescore_dtype == "float16":
+            self.rescore_vectors = np.load(os.path.join(index_path, FLOAT16_FILE), mmap_mode='r')
+        else:
+            self.rescore_vectors = full_vectors
+
+    @classmethod
+    def in_memory(cls, full_vectors: np.ndarray, mode: str, rescore_dtype: str) -> "QuantizedVectors":
+        """Representação calculada em memória, sem arquivos (relatório de recall)."""
+        quantized = cls.__new__(cls)
+        quantized.mode = mode
+        quantized.rescore_factor = RESCORE_FACTOR[mode]
+        if mode == "int8":
+            quantized.codes, quantized.scale = quantize_int8(full_vectors)
+        else:
+            quantized.codes, quantized.scale = quantize_binary(full_vectors), None
+        quantized.rescore_vectors = (
+            np.asarray(full_vectors, dtype=np.float16) if rescore_dtype == "float16" else full_vectors
+        )
+        return quantized
+
+    @staticmethod
+    def exists(index_path: str, mode: Optional[str] = None, rescore_dtype: str = "float32") -> bool:
+        """Há vetores quantizados no índice (e, se `mode` for informado, os arquivos dessa representação)?"""
+        if not os.path.exists(os.path.join(index_path, QUANTIZATION_MANIFEST_FILE)):
+            return False
+        return mode is None or all(
+            os.path.exists(os.path.join(index_path, name)) for name in representation_files(mode, rescore_dtype)
+        )
+
+    @staticmethod
+    def stored_representation(index_path: str) -> Optional[tuple]:
+        """(mode, rescore_dtype) gravados no índice, ou None se não houver vetores quantizados."""
+        stats = load_quantization_stats(index_path)
+        if stats is None:
+            return None
+        if 'mode' in stats:
+            return stats['mode'], stats['rescore_dtype']
+        # Manifesto anterior à gravação seletiva: todas as representações existem
+        return "int8", "float32"
+
+    def approximate_scores(self, query: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Scores da primeira passada (todas as linhas ou apenas `rows`)."""
+        if self.mode == "int8":
+            weighted_query = self.scale * query
+            score = lambda codes: np.asarray(codes, dtype=np.float32) @ weighted_query
+        else:
+            query_bits = quantize_binary(query)
+            score = lambda codes: hamming_similarity(np.asarray(codes), query_bits)
+
+        if rows is not None:
+            return score(self.codes[rows])
+        return np.concatenate([
+            score(self.codes[start:start + SCORE_BLOCK_SIZE])
+            for start in range(0, self.codes.shape[0], SCORE_BLOCK_SIZE)
+        ])
+
+    def search(self, query: np.ndarray, n_results: int, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Busca top-k: primeira passada quantizada e re-pontuação dos melhores.
+
+        Args:
+            query: Vetor normalizado da consulta
+            n_results: Quantidade de resultados
+            rows: Subconjunto de linhas a pontuar (ex.: partições IVF)
+
+        Returns:
+            Linhas do índice flat dos n_results melhores, em ordem decrescente
+        """
+        if rows is not None:
+            rows = np.sort(rows)
+        shortlist = top_k_indices(self.approximate_scores(query, rows), n_results * self.rescore_factor)
+        if rows is not None:
+            shortlist = rows[shortlist]
+        shortlist = np.sort(shortlist)
+
+        exact = np.asarray(self.rescore_vectors[shortlist], dtype=np.float32) @ query
+        return shortlist[top_k_indices(exact, n_results)]
+
+
+def evaluate_quantization(
+    full_vectors: np.ndarray,
+    quantized: QuantizedVectors,
+    queries: np.ndarray,
+    k: int = RECALL_K
+) -> Dict[str, float]:
+    """
+    Compara a busca quantizada com a busca exata em float32.
+
+    Returns:
+        Recall@k da primeira passada, recall@k após re-pontuação e latências (ms)
+    """
+    start = time.perf_counter()
+    exact = [set(top_k_indices(full_vectors @ q, k).tolist()) for q in queries]
+    exact_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+    first_pass = [set(top_k_indices(quantized.approximate_scores(q), k).tolist()) for q in queries]
+
+    start = time.perf_counter()
+    rescored = [set(quantized.search(q, k).tolist()) for q in queries]
+    quantized_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+    def recall(found):
+        return round(float(np.mean([len(e & f) / max(len(e), 1) for e, f in zip(exact, found)])), 4)
+
+    return {
+        'recall_at_k_first_pass': recall(first_pass),
+        'recall_at_k_rescored': recall(rescored),
+        'exact_ms': round(exact_ms, 3),
+        'quantized_ms': round(quantized_ms, 3)
+    }
+
+
+def build_quantized_vectors(
+    index_path: str,
+    full_vectors: np.ndarray,
+    queries: np.ndarray,
+    mode: str = "int8",
+    rescore_dtype: str = "float32"
+) -> Dict[str, Any]:
+    """
+    Grava a representação selecionada da matriz do índice.
+
+    Apenas os arquivos de `mode` (e a cópia float16, se rescore_dtype for
+    'float16') vão para o disco; arquivos de outras representações de
+    construções anteriores são removidos. As demais combinações entram
+    no relatório de recall, calculadas em memória.
+
+    Args:
+        index_path: Diretório do índice flat
+        full_vectors: Matriz float32 normalizada do índice flat
+        queries: Consultas usadas no relatório de recall
+        mode: 'int8' ou 'binary'
+        rescore_dtype: 'float32' ou 'float16'
+
+    Returns:
+        Estatísticas (representação gravada, bytes por vetor e recall@k de
+        cada combinação)
+    """
+    if mode not in QUANTIZATION_MODES:
+        raise ValueError(f"Quantização inválida: {mode}. Use uma de {QUANTIZATION_MODES}")
+    if rescore_dtype not in RESCORE_DTYPES:
+        raise ValueError(f"Precisão de re-pontuação inválida: {rescore_dtype}. Use uma de {RESCORE_DTYPES}")
+
+    dim = full_vectors.shape[1]
+    selected = QuantizedVectors.in_memory(full_vectors, mode, rescore_dtype)
+    if mode == "int8":
+        np.save(os.path.join(index_path, INT8_FILE), selected.codes)
+        np.save(os.path.join(index_path, INT8_SCALE_FILE), selected.scale)
+    else:
+        np.save(os.path.join(index_path, BINARY_FILE), selected.codes)
+    if rescore_dtype == "float16":
+        np.save(os.path.join(index_path, FLOAT16_FILE), selected.rescore_vectors)
+    kept = set(representation_files(mode, rescore_dtype))
+    for name in (INT8_FILE, INT8_SCALE_FILE, BINARY_FILE, FLOAT16_FILE):
+        path = os.path.join(index_path, name)
+        if name not in kept and os.path.exists(path):
+            os.remove(path)
+
+    k = min(RECALL_K, full_vectors.shape[0])
+    stats = {
+        'mode': mode,
+        'rescore_dtype': rescore_dtype,
+        'count': int(full_vectors.shape[0]),
+        'dim': int(dim),
+        'k': k,
+        'bytes_per_vector': {
+            'float32': dim * 4,
+            'float16': dim * 2,
+            'int8': dim,
+            'binary': (dim + 7) // 8
+        },
+        'recall': {},
+        'built_at': datetime.now().isoformat()
+    }
+    # A primeira passada varre só a representação quantizada; o disco guarda
+    # também vectors.npy (fonte das reconstruções) e a cópia float16, se houver
+    stats['scan_bytes_per_vector'] = stats['bytes_per_vector'][mode]
+    stats['disk_bytes_per_vector'] = (
+        stats['bytes_per_vector']['float32'] + stats['bytes_per_vector'][mode]
+        + (stats['bytes_per_vector']['float16'] if rescore_dtype == "float16" else 0)
+    )
+    for candidate_mode in QUANTIZATION_MODES:
+        for candidate_dtype in RESCORE_DTYPES:
+            quantized = (
+                selected if (candidate_mode, candidate_dtype) == (mode, rescore_dtype)
+                else QuantizedVectors.in_memory(full_vectors, candidate_mode, candidate_dtype)
+            )
+            stats['recall'][f"{candidate_mode}+{candidate_dtype}"] = evaluate_quantization(
+                full_vectors, quantized, queries, k
+            )
+
+    with open(os.path.join(index_path, QUANTIZATION_MANIFEST_FILE), 'w', encoding='utf-8') as f:
+        json.dump(stats, f, indent=2)
+
+    print(f"   🗜️  Quantização ({mode}+{rescore_dtype} em disco): bytes/vetor float32={stats['bytes_per_vector']['float32']} | "
+          f"int8={stats['bytes_per_vector']['int8']} | binary={stats['bytes_per_vector']['binary']} | "
+          f"varridos por consulta={stats['scan_bytes_per_vector']} | "
+          f"em disco={stats['disk_bytes_per_vector']} (inclui vectors.npy, mantido para reconstruções)")
+    for name, report in stats['recall'].items():
+        print(f"      {name}: recall@{k} {report['recall_at_k_first_pass']} -> "
+              f"{report['recall_at_k_rescored']} (re-pontuado) | {report['quantized_ms']}ms "
+              f"(exata: {report['exact_ms']}ms)")
+    return stats
+
+
+def extend_quantized_vectors(index_path: str, target_path: str, kept: np.ndarray, new_vectors: np.ndarray) -> Dict[str, Any]:
+    """
+    Grava em target_path a representação de index_path só com as linhas
+    mantidas (kept) seguidas das novas, sem requantizar o corpus.
+
+    As linhas novas usam a escala int8 da última construção (valores fora
+    dela são saturados em ±127); o relatório de recall é o da construção.
+
+    Returns:
+        Estatísticas com a contagem atualizada
+    """
+    stats = load_quantization_stats(index_path)
+    mode, rescore_dtype = QuantizedVectors.stored_representation(index_path)
+    old = QuantizedVectors(index_path, None, mode, rescore_dtype)
+
+    if mode == "int8":
+        new_codes = np.clip(np.rint(new_vectors / old.scale), -127, 127).astype(np.int8)
+        np.save(os.path.join(target_path, INT8_FILE), np.concatenate([old.codes[kept], new_codes]))
+        np.save(os.path.join(target_path, INT8_SCALE_FILE), old.scale)
+    else:
+        np.save(os.path.join(target_path, BINARY_FILE),
+                np.concatenate([old.codes[kept], quantize_binary(new_vectors)]))
+    if rescore_dtype == "float16":
+        np.save(os.path.join(target_path, FLOAT16_FILE),
+                np.concatenate([old.rescore_vectors[kept], np.asarray(new_vectors, dtype=np.float16)]))
+
+    stats.update(mode=mode, rescore_dtype=rescore_dtype, count=int(len(kept) + len(new_vectors)),
+                 updated_at=datetime.now().isoformat())
+    with open(os.path.join(target_path, QUANTIZATION_MANIFEST_FILE), 'w', encoding='utf-8') as f:
+        json.dump(stats, f, indent=2)
+    return stats
+
+
+def load_quantization_stats(index_path: str) -> Optional[Dict[str, Any]]:
+    """Estatísticas de quantização do índice (None se não houver)."""
+    if not QuantizedVectors.exists(index_path):
+        return None
+    with open(os.path.join(index_path, QUANTIZATION_MANIFEST_FILE), 'r', encoding='utf-8') as f:
+        return json.load(f)
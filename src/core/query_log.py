@@ -0,0 +1,148 @@
+"""
+Módulo de Log de Consultas - Consultas Anonimizadas e Mais Frequentes
+=====================================================================
+
+A maior parte do tráfego é um conjunto pequeno de pedidos recorrentes.
+Cada consulta recebida pelo GenerationGate (Streamlit e serviço HTTP) é
+anexada a QUERY_LOG_FILE, anonimizada:
+
+- Dados pessoais citados na consulta (e-mail, CPF, CNPJ, telefone,
+  números longos) são trocados por marcadores (<email>, <cpf>...)
+- Nenhum identificador de usuário, sessão ou endereço é gravado, e o
+  horário é truncado na hora
+
+As consultas mais frequentes das últimas QUERY_LOG_WINDOW entradas
+(top_queries) são as que o gate gera de novo em segundo plano depois de
+cada ingestão (GenerationGate.prefetch), para que sejam servidas do cache
+de planos logo após o deploy. Consultas com dados mascarados não são
+pré-geradas: o texto com marcadores não é o pedido que o usuário fez.
+
+O log fica ao lado do diretório do banco (query_log_path), e não dentro
+dele, porque a ingestão completa apaga o banco.
+"""
+
+import os
+import re
+import json
+import time
+import threading
+from collections import Counter, deque
+from typing import Dict, Any, List
+
+try:
+    from .plan_cache import normalize_query
+except ImportError:
+    # Execução direta (src/core no sys.path)
+    from plan_cache import normalize_query
+
+# ================================
+# CONFIGURAÇÕES
+# ================================
+QUERY_LOG_FILE = "query_log.jsonl"
+# Entradas recentes consideradas no ranking; o arquivo é compactado acima do dobro
+QUERY_LOG_WINDOW = 5000
+PREFETCH_TOP_N = 10
+# Consultas vistas uma única vez não são pré-geradas
+PREFETCH_MIN_COUNT = 2
+
+# Dados pessoais mascarados (ordem importa: CNPJ antes de CPF, CPF antes de telefone)
+PII_PATTERNS = (
+    (re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+"), "<email>"),
+    (re.compile(r"\b\d{2}\.?\d{3}\.?\d{3}/?\d{4}-?\d{2}\b"), "<cnpj>"),
+    (re.compile(r"\b\d{3}\.?\d{3}\.?\d{3}-?\d{2}\b"), "<cpf>"),
+    (re.compile(r"(?:\(?\b\d{2}\)?\s?)?\b9?\d{4}-\d{4}\b"), "<telefone>"),
+    (re.compile(r"\b\d{6,}\b"), "<numero>")
+)
+
+
+def anonymize_query(query: str) -> str:
+    """Consulta com espaços normalizados e dados pessoais mascarados."""
+    text = " ".join(query.split())
+    for pattern, placeholder in PII_PATTERNS:
+        text = pattern.sub(placeholder, text)
+    return text
+
+
+def has_masked_pii(query: str) -> bool:
+    """Se a consulta (anonimizada) contém algum marcador de dado pessoal."""
+    return any(placeholder in query for _, placeholder in PII_PATTERNS)
+
+
+def query_log_path(db_path: str) -> str:
+    """Caminho do log: ao lado do diretório do banco (preservado na reingestão)."""
+    return os.path.join(os.path.dirname(os.path.abspath(db_path)), QUERY_LOG_FILE)
+
+
+class QueryLog:
+    """
+    Log de consultas anonimizadas (JSONL, uma linha por consulta recebida).
+
+    Args:
+        path: Caminho do arquivo (ver query_log_path)
+        window: Entradas recentes consideradas em top_queries
+    """
+
+    def __init__(self, path: str, window: int = QUERY_LOG_WINDOW):
+        self.path = path
+        self.window = window
+        self._lock = threading.Lock()
+
+    def record(self, query: str) -> None:
+        """Anexa a consulta anonimizada (falhas de escrita não afetam a requisição)."""
+        entry = {'query': anonymize_query(query), 'hour': time.strftime('%Y-%m-%dT%H')}
+        try:
+            with self._lock, open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        except OSError:
+            pass
+
+    def _recent(self) -> List[Dict[str, Any]]:
+        """Últimas `window` entradas; compacta o arquivo quando passa do dobro. Chamar com _lock."""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                lines = f.readlines()
+        except OSError:
+            return []
+        recent = deque(lines, maxlen=self.window)
+        if len(lines) > 2 * self.window:
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.writelines(recent)
+            os.replace(tmp_path, self.path)
+
+        entries = []
+        for line in recent:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                continue
+        return entries
+
+    def top_queries(self, n: int = PREFETCH_TOP_N, min_count: int = PREFETCH_MIN_COUNT,
+                    skip_masked: bool = False) -> List[Dict[str, Any]]:
+        """
+        Consultas mais frequentes entre as entradas recentes.
+
+        Args:
+            n: Quantidade de consultas
+            min_count: Ocorrências mínimas de uma consulta
+            skip_masked: Ignora consultas com dados pessoais mascarados (has_masked_pii)
+
+        Returns:
+            Lista de {'query', 'count'} em ordem decrescente de frequência;
+            a consulta é a forma mais recente entre as equivalentes
+        """
+        with self._lock:
+            entries = self._recent()
+        counts = Counter()
+        latest: Dict[str, str] = {}
+        for entry in entries:
+            if skip_masked and has_masked_pii(entry['query']):
+                continue
+            key = normalize_query(entry['query'])
+            counts[key] += 1
+            latest[key] = entry['query']
+        return [
+            {'query': latest[key], 'count': count}
+            for key, count in counts.most_common(n) if count >= min_count
+        ]
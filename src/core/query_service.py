@@ -0,0 +1,333 @@
+"""
+Módulo do Serviço de Consultas - Servidor HTTP Local de Longa Duração
+=====================================================================
+
+Cada `python src/main.py --skip-ingestion --query ...` paga a
+inicialização do Python, os imports do LangChain, a carga do ChromaDB e
+clientes HTTP novos para responder uma única pergunta. Este serviço
+carrega a cadeia RAG uma vez (índice aberto e clientes do LLM e de
+embeddings com conexões keep-alive reutilizadas entre requisições) e
+atende as consultas por HTTP:
+
+- GET  /health            estado do serviço e contadores
+- POST /retrieve          {"query"} -> regras recuperadas (sem LLM)
+- POST /generate          {"query"} -> plano de testes completo (JSON)
+- POST /generate/stream   {"query"} -> plano token a token (NDJSON)
+
+O corpo aceita "context_budget" opcional; em /generate, "map_reduce":
+true gera o plano em paralelo por grupo de regras (map_reduce.py), e
+"deadline_s" define o prazo da requisição (deadline.py; esgotado o prazo,
+a resposta vem do cache de planos ou é parcial, ver metrics.served_by). As gerações passam pelo
+controle de admissão (admission.py): consultas idênticas em voo são
+coalescidas em uma única chamada ao LLM, e requisições além da fila
+recebem 503 com Retry-After. Os modelos usam a mesma
+configuração do pipeline (variáveis OPENAI_API_KEY / OPENAI_BASE_URL),
+então o serviço pode ser testado contra endpoints stub compatíveis com
+a API da OpenAI apontando OPENAI_BASE_URL para o stub.
+
+Uso:
+    python src/main.py --skip-ingestion --serve --port 8765
+"""
+
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, Optional
+
+try:
+    from .rag_pipeline import setup_rag_chain, build_context
+    from .retrieval import score_distribution
+    from .context_packing import CONTEXT_TOKEN_BUDGET
+    from .admission import (
+        GenerationGate, AdmissionRejected, DEFAULT_MAX_INFLIGHT, DEFAULT_MAX_QUEUE
+    )
+except ImportError:
+    # Execução direta (src/core no sys.path)
+    from rag_pipeline import setup_rag_chain, build_context
+    from retrieval import score_distribution
+    from context_packing import CONTEXT_TOKEN_BUDGET
+    from admission import (
+        GenerationGate, AdmissionRejected, DEFAULT_MAX_INFLIGHT, DEFAULT_MAX_QUEUE
+    )
+
+# ================================
+# CONFIGURAÇÕES
+# ================================
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+# Tamanho máximo do corpo JSON de uma requisição
+MAX_BODY_BYTES = 1_000_000
+# Sugestão de nova tentativa (segundos) quando a fila de admissão rejeita
+RETRY_AFTER_S = 5
+
+
+def _json_default(value):
+    """Serializa tipos NumPy (scores) e demais valores não-JSON."""
+    return value.item() if hasattr(value, 'item') else str(value)
+
+
+# ================================
+# SERVIÇO
+# ================================
+class QueryService:
+    """
+    Cadeia RAG carregada uma única vez e compartilhada pelas requisições.
+
+    Args:
+        db_path: Caminho do banco de dados ChromaDB
+        rag_options: Opções de retrieval repassadas ao setup_rag_chain
+        context_budget: Orçamento de tokens padrão do contexto
+        max_inflight: Máximo de chamadas simultâneas ao LLM
+        max_queue: Máximo de gerações aguardando na fila de admissão
+        deadline_s: Prazo padrão de cada geração (None = sem prazo)
+    """
+
+    def __init__(self, db_path: str, rag_options: Optional[Dict[str, Any]] = None,
+                 context_budget: int = CONTEXT_TOKEN_BUDGET,
+                 max_inflight: int = DEFAULT_MAX_INFLIGHT,
+                 max_queue: int = DEFAULT_MAX_QUEUE,
+                 deadline_s: Optional[float] = None):
+        start = time.perf_counter()
+        self.db_path = db_path
+        self.context_budget = context_budget
+        self.deadline_s = deadline_s
+        self.qa_chain, self.retriever = setup_rag_chain(db_path, **(rag_options or {}))
+        self.gate = GenerationGate(db_path, max_inflight, max_queue, rag_options=rag_options)
+        self.load_time_s = round(time.perf_counter() - start, 3)
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+        self.counters = {'retrieve': 0, 'generate': 0, 'generate_stream': 0, 'rejected': 0, 'errors': 0}
+
+    def count(self, name: str):
+        with self._lock:
+            self.counters[name] += 1
+
+    def _budget(self, payload: Dict[str, Any]) -> int:
+        return int(payload.get('context_budget') or self.context_budget)
+
+    def health(self) -> Dict[str, Any]:
+        health = {
+            'status': 'ok',
+            'db_path': self.db_path,
+            'load_time_s': self.load_time_s,
+            'uptime_s': round(time.time() - self.started_at, 1),
+            'requests': dict(self.counters),
+            'admission': self.gate.stats()
+        }
+        if hasattr(self.qa_chain, 'stats'):
+            # Cadeia roteada (--route): decisões por nível de modelo
+            health['routing'] = self.qa_chain.stats()
+        return health
+
+    def retrieve(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Regras recuperadas e contexto empacotado, sem chamada ao LLM."""
+        self.count('retrieve')
+        query = payload['query']
+        start = time.perf_counter()
+        source_docs, packed = build_context(query, self.retriever, self._budget(payload))
+        return {
+            'query': query,
+            'rules': [{'content': doc.page_content, 'metadata': doc.metadata} for doc in source_docs],
+            'retrieval': score_distribution(source_docs),
+            'context': packed['text'],
+            'context_tokens': packed['tokens'],
+            'retrieval_time_s': round(time.perf_counter() - start, 3)
+        }
+
+    def _deadline(self, payload: Dict[str, Any]) -> Optional[float]:
+        value = payload.get('deadline_s', self.deadline_s)
+        return float(value) if value else None
+
+    def generate(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        self.count('generate')
+        return self.gate.generate(payload['query'], self.qa_chain, self.retriever, self._budget(payload),
+                                  map_reduce=bool(payload.get('map_reduce')),
+                                  deadline_s=self._deadline(payload))
+
+    def generate_stream(self, payload: Dict[str, Any]) -> tuple:
+        self.count('generate_stream')
+        return self.gate.stream(payload['query'], self.qa_chain, self.retriever, self._budget(payload),
+                                deadline_s=self._deadline(payload))
+
+
+# ================================
+# SERVIDOR HTTP
+# ================================
+class QueryServiceHandler(BaseHTTPRequestHandler):
+    """Rotas HTTP do serviço (uma thread por conexão; keep-alive HTTP/1.1)."""
+
+    protocol_version = "HTTP/1.1"
+    service: QueryService = None
+
+    def log_message(self, format, *args):
+        print(f"🌐 {self.address_string()} {format % args}")
+
+    # ---------- Respostas ----------
+    def _send_json(self, status: int, body: Dict[str, Any]):
+        data = json.dumps(body, ensure_ascii=False, default=_json_default).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_rejected(self, error: AdmissionRejected):
+        """503 com Retry-After: fila de admissão cheia ou espera esgotada."""
+        self.service.count('rejected')
+        data = json.dumps({'error': str(error)}, ensure_ascii=False).encode('utf-8')
+        self.send_response(503)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("Retry-After", str(RETRY_AFTER_S))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_chunk(self, event: Dict[str, Any]):
+        """Escreve um evento NDJSON como chunk HTTP (Transfer-Encoding: chunked)."""
+        data = json.dumps(event, ensure_ascii=False, default=_json_default).encode('utf-8') + b"\n"
+        self.wfile.write(f"{len(data):X}\r\n".encode('ascii') + data + b"\r\n")
+        self.wfile.flush()
+
+    def _read_payload(self) -> Optional[Dict[str, Any]]:
+        """Lê o corpo JSON; responde 400 e retorna None se for inválido."""
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_BODY_BYTES:
+            # O corpo não é lido: a conexão não pode ser reaproveitada
+            self.close_connection = True
+            self._send_json(413, {'error': f"Corpo maior que {MAX_BODY_BYTES} bytes"})
+            return None
+        try:
+            payload = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError as e:
+            self._send_json(400, {'error': f"JSON inválido: {e}"})
+            return None
+        if not isinstance(payload, dict) or not str(payload.get('query') or '').strip():
+            self._send_json(400, {'error': "Campo 'query' obrigatório"})
+            return None
+        return payload
+
+    # ---------- Rotas ----------
+    def do_GET(self):
+        if self.path == "/health":
+            self._send_json(200, self.service.health())
+        else:
+            self._send_json(404, {'error': f"Rota não encontrada: {self.path}"})
+
+    def do_POST(self):
+        routes = {
+            "/retrieve": self.service.retrieve,
+            "/generate": self.service.generate,
+            "/generate/stream": None
+        }
+        if self.path not in routes:
+            self.close_connection = True
+            self._send_json(404, {'error': f"Rota não encontrada: {self.path}"})
+            return
+        payload = self._read_payload()
+        if payload is None:
+            return
+
+        if self.path == "/generate/stream":
+            self._stream(payload)
+            return
+        try:
+            self._send_json(200, routes[self.path](payload))
+        except AdmissionRejected as e:
+            self._send_rejected(e)
+        except Exception as e:
+            self.service.count('errors')
+            self._send_json(500, {'error': f"{type(e).__name__}: {e}"})
+
+    def _stream(self, payload: Dict[str, Any]):
+        """
+        Plano token a token em NDJSON: um evento 'retrieval' (regras usadas),
+        eventos 'token' e um evento final 'done' (plano completo e métricas)
+        ou 'error'.
+        """
+        try:
+            plan_result, tokens = self.service.generate_stream(payload)
+        except AdmissionRejected as e:
+            self._send_rejected(e)
+            return
+        except Exception as e:
+            self.service.count('errors')
+            self._send_json(500, {'error': f"{type(e).__name__}: {e}"})
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson; charset=utf-8")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            self._send_chunk({
+                'event': 'retrieval',
+                'query': plan_result['query'],
+                'source_rules': plan_result['source_rules'],
+                'retrieval': plan_result['retrieval']
+            })
+            for token in tokens:
+                self._send_chunk({'event': 'token', 'text': token})
+            self._send_chunk({'event': 'done', **plan_result})
+        except (BrokenPipeError, ConnectionResetError):
+            # Cliente desconectou no meio do stream
+            self.close_connection = True
+            return
+        except Exception as e:
+            self.service.count('errors')
+            self._send_chunk({'event': 'error', 'error': f"{type(e).__name__}: {e}"})
+        self.wfile.write(b"0\r\n\r\n")
+
+
+def create_server(service: QueryService, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT) -> ThreadingHTTPServer:
+    """Cria o servidor HTTP (multi-thread) ligado ao serviço."""
+    handler = type("BoundQueryServiceHandler", (QueryServiceHandler,), {'service': service})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def serve(
+    db_path: str,
+    host: str = DEFAULT_HOST,
+    port: int = DEFAULT_PORT,
+    rag_options: Optional[Dict[str, Any]] = None,
+    context_budget: int = CONTEXT_TOKEN_BUDGET,
+    max_inflight: int = DEFAULT_MAX_INFLIGHT,
+    max_queue: int = DEFAULT_MAX_QUEUE,
+    deadline_s: Optional[float] = None,
+    prefetch_top: int = 0
+):
+    """
+    Carrega a cadeia RAG e atende consultas até Ctrl+C.
+
+    Args:
+        db_path: Caminho do banco de dados ChromaDB
+        host: Endereço de escuta (padrão: apenas local)
+        port: Porta HTTP
+        rag_options: Opções de retrieval repassadas ao setup_rag_chain
+        context_budget: Orçamento de tokens padrão do contexto
+        max_inflight: Máximo de chamadas simultâneas ao LLM
+        max_queue: Máximo de gerações aguardando na fila de admissão
+        deadline_s: Prazo padrão de cada geração (None = sem prazo)
+        prefetch_top: Consultas populares pré-geradas em segundo plano ao
+            iniciar (após uma ingestão); 0 desativa
+    """
+    print("🚀 Iniciando serviço de consultas...")
+    service = QueryService(db_path, rag_options, context_budget, max_inflight, max_queue, deadline_s)
+    server = create_server(service, host, port)
+    print(f"✅ Cadeia RAG carregada em {service.load_time_s}s")
+    print(f"🌐 Ouvindo em http://{host}:{server.server_port} "
+          f"(/health, /retrieve, /generate, /generate/stream)")
+    print(f"🚦 Admissão: {max_inflight} gerações simultâneas, fila de {max_queue}")
+    if deadline_s:
+        print(f"⏳ Prazo padrão por geração: {deadline_s}s")
+    if prefetch_top:
+        service.gate.prefetch(service.qa_chain, service.retriever, top_n=prefetch_top,
+                              context_token_budget=context_budget)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n🛑 Encerrando serviço...")
+    finally:
+        server.server_close()
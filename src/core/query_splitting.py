@@ -0,0 +1,132 @@
+"""
+Módulo de Divisão de Consultas - Fan-out de Sub-consultas por Tópico
+====================================================================
+
+Pedidos típicos cobrem vários tópicos ("cálculo de frete e aplicação de
+cupons, incluindo o caso de cliente Prime"). Uma única busca top-k dá
+poucas vagas a cada tópico; dividindo o pedido em sub-consultas, cada
+tópico é buscado separadamente e os resultados são combinados com cotas.
+
+Dois divisores estão disponíveis:
+- Heurístico (local, sem custo): separa por vírgulas, "e", "incluindo"...
+- LLM (opcional): pede ao modelo uma sub-consulta por linha
+"""
+
+import re
+from typing import List, Callable
+
+# ================================
+# CONFIGURAÇÕES
+# ================================
+MAX_SUBQUERIES = 5
+MIN_FRAGMENT_WORDS = 3
+
+# Prefixo imperativo das solicitações ("Gere cenários de teste BDD para ...")
+REQUEST_PREFIX = re.compile(
+    r"^\s*(?:gere|crie|escreva|elabore|liste|monte)\b.*?\b(?:para|sobre)\s+",
+    re.IGNORECASE
+)
+
+# Conectivos que separam tópicos
+TOPIC_SEPARATORS = re.compile(
+    r"\s*[,;]\s*|\s+e\s+|\s+incluindo\s+|\s+considerando\s+|\s+além\s+de\s+|\s+bem\s+como\s+",
+    re.IGNORECASE
+)
+
+# Conectivos, artigos e expressões vazias no início dos fragmentos
+LEADING_FILLER = re.compile(
+    r"^(?:(?:o|a|os|as|um|uma|e|de|do|da|para|incluindo|considerando|além\s+de|bem\s+como)\s+)*"
+    r"(?:(?:o\s+)?caso\s+(?:de|do|da)\s+)?",
+    re.IGNORECASE
+)
+
+QUERY_SPLIT_PROMPT = """Divida a solicitação de testes abaixo nos tópicos de regras de negócio independentes que ela cobre.
+Retorne uma busca curta por linha (no máximo {max_subqueries}), sem numeração e sem comentários.
+Se houver um único tópico, retorne apenas uma linha.
+
+Solicitação: {query}
+
+Tópicos:"""
+
+
+# ================================
+# DIVISOR HEURÍSTICO
+# ================================
+def split_query_heuristic(query: str, max_subqueries: int = MAX_SUBQUERIES) -> List[str]:
+    """
+    Divide a consulta em tópicos usando conectivos e pontuação.
+
+    Conteúdo entre parênteses não é dividido. Fragmentos curtos (ex.:
+    "CPF", "idade") são prefixados com o primeiro tópico para manterem
+    o contexto da busca.
+
+    Returns:
+        Lista de sub-consultas; [query] se houver um único tópico
+    """
+    body = REQUEST_PREFIX.sub("", query.strip()).rstrip(" .?!")
+
+    # Protege parênteses (ex.: "(BLACKFRIDAY, NEWUSER, VIP10)")
+    groups = re.findall(r"\([^)]*\)", body)
+    for i, group in enumerate(groups):
+        body = body.replace(group, f"\x00{i}\x00", 1)
+
+    fragments = []
+    for fragment in TOPIC_SEPARATORS.split(body):
+        for i, group in enumerate(groups):
+            fragment = fragment.replace(f"\x00{i}\x00", group)
+        fragment = LEADING_FILLER.sub("", fragment.strip()).strip()
+        if fragment and fragment.lower() not in (f.lower() for f in fragments):
+            fragments.append(fragment)
+
+    if len(fragments) <= 1:
+        return [query]
+
+    head = fragments[0]
+    subqueries = [head] + [
+        f if len(f.split()) >= MIN_FRAGMENT_WORDS else f"{head}: {f}"
+        for f in fragments[1:]
+    ]
+    return subqueries[:max_subqueries]
+
+
+# ================================
+# DIVISOR VIA LLM
+# ================================
+def build_llm_query_splitter(llm, max_subqueries: int = MAX_SUBQUERIES) -> Callable[[List[str]], List[List[str]]]:
+    """
+    Cria um divisor de consultas baseado em LLM.
+
+    As consultas de um lote são divididas com uma única chamada batch;
+    se o LLM falhar, usa o divisor heurístico.
+    """
+    from langchain_core.prompts import PromptTemplate
+    chain = PromptTemplate.from_template(QUERY_SPLIT_PROMPT) | llm
+
+    def split_queries(queries: List[str]) -> List[List[str]]:
+        try:
+            responses = chain.batch([
+                {"query": query, "max_subqueries": max_subqueries} for query in queries
+            ])
+        except Exception as e:
+            print(f"⚠️  Erro ao dividir consultas via LLM: {e}. Usando divisor heurístico.")
+            return [split_query_heuristic(query, max_subqueries) for query in queries]
+
+        results = []
+        for query, response in zip(queries, responses):
+            lines = [
+                re.sub(r"^\s*(?:[-*•]|\d+[.)])\s*", "", line).strip()
+                for line in response.content.splitlines()
+            ]
+            subqueries = [line for line in lines if line][:max_subqueries]
+            results.append(subqueries or [query])
+        return results
+
+    return split_queries
+
+
+def build_heuristic_query_splitter(max_subqueries: int = MAX_SUBQUERIES) -> Callable[[List[str]], List[List[str]]]:
+    """Cria um divisor de consultas heurístico (mesma interface do divisor via LLM)."""
+    def split_queries(queries: List[str]) -> List[List[str]]:
+        return [split_query_heuristic(query, max_subqueries) for query in queries]
+
+    return split_queries
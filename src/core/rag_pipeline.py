@@ -1,16 +1,45 @@
 import os
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
-from langchain_chroma import Chroma
-from langchain_core.prompts import PromptTemplate
-from langchain_core.runnables import RunnablePassthrough
+import json
+import time
+import asyncio
+import hashlib
+import inspect
+from typing import Iterator, List
 from dotenv import load_dotenv
 
+try:
+    from .retrieval import build_retriever, score_distribution, rule_ids, DEFAULT_K, DEFAULT_FETCH_K, DEFAULT_LAMBDA_MULT, DEFAULT_N_FILES
+    from .context_packing import pack_context, count_tokens, CONTEXT_TOKEN_BUDGET
+    from .query_splitting import build_heuristic_query_splitter, build_llm_query_splitter
+    from .flat_index import load_flat_index
+    from .ivf_index import DEFAULT_NPROBE
+    from .file_index import load_file_index
+    from .symbol_index import SymbolIndex
+    from .parent_store import ParentStore
+    from .clients import get_chat_model, get_embeddings
+except ImportError:
+    # Execução direta do módulo (python rag_pipeline.py)
+    from retrieval import build_retriever, score_distribution, rule_ids, DEFAULT_K, DEFAULT_FETCH_K, DEFAULT_LAMBDA_MULT, DEFAULT_N_FILES
+    from context_packing import pack_context, count_tokens, CONTEXT_TOKEN_BUDGET
+    from query_splitting import build_heuristic_query_splitter, build_llm_query_splitter
+    from flat_index import load_flat_index
+    from ivf_index import DEFAULT_NPROBE
+    from file_index import load_file_index
+    from symbol_index import SymbolIndex
+    from parent_store import ParentStore
+    from clients import get_chat_model, get_embeddings
+
 # Carrega variáveis de ambiente
 load_dotenv()
 
 # Configuração do LLM para Geração de Testes
 # Usamos um modelo de alta capacidade para raciocínio e geração de texto estruturado (BDD)
-llm_generator = ChatOpenAI(model="gpt-4o-mini", temperature=0.2)
+# stream_usage=True faz o último chunk do streaming trazer a contagem de tokens
+# O cliente é criado no setup_rag_chain e compartilhado pelo processo (clients.py)
+GENERATION_MODEL_OPTIONS = {'temperature': 0.2, 'stream_usage': True}
+
+# Máximo de gerações simultâneas no modo em lote
+DEFAULT_MAX_CONCURRENCY = 4
 
 # Prompt para a Geração Aumentada (RAG)
 # O prompt instrui o LLM a agir como um especialista em QA e usar o contexto fornecido
@@ -32,58 +61,375 @@ PERGUNTA DO USUÁRIO:
 PLANO DE TESTES BDD (Formato Gherkin):
 """
 
-def setup_rag_chain(db_path: str = "chroma_db"):
+def setup_rag_chain(
+    db_path: str = "chroma_db",
+    search_type: str = "similarity",
+    k: int = DEFAULT_K,
+    fetch_k: int = DEFAULT_FETCH_K,
+    lambda_mult: float = DEFAULT_LAMBDA_MULT,
+    stitch: bool = True,
+    max_neighbors: int = 0,
+    query_split: str = "none",
+    min_k: int = None,
+    max_k: int = None,
+    score_threshold: float = None,
+    elbow: bool = False,
+    backend: str = "chroma",
+    nprobe: int = DEFAULT_NPROBE,
+    quantization: str = None,
+    rescore_dtype: str = "float32",
+    pca: bool = False,
+    hierarchical: bool = False,
+    n_files: int = DEFAULT_N_FILES,
+    symbol_lookup: bool = True,
+    routing: bool = False
+):
     """
     Configura a cadeia RAG (Retrieval-Augmented Generation) para consultas.
+
+    Args:
+        db_path: Caminho do banco de dados ChromaDB
+        search_type: 'similarity' (top-k) ou 'mmr' (re-ranqueamento por diversidade)
+        k: Quantidade de regras enviadas ao LLM
+        fetch_k: Candidatos buscados antes do re-ranqueamento MMR
+        lambda_mult: Peso da relevância frente à diversidade no MMR (0 a 1)
+        stitch: Une chunks consecutivos do mesmo arquivo em uma única passagem
+        max_neighbors: Máximo de chunks vizinhos acrescentados aos acertos (0 = desativado)
+        query_split: Divisão de pedidos com vários tópicos em sub-consultas:
+            'none', 'heuristic' (local, sem custo) ou 'llm'
+        min_k: Mínimo de regras no modo de k adaptativo
+        max_k: Máximo de regras no modo de k adaptativo
+        score_threshold: Score mínimo (cosseno) das regras; ativa o k adaptativo
+        elbow: Corta no cotovelo da curva de scores; ativa o k adaptativo
+        backend: 'chroma', 'flat' (matriz memory-mapped exportada do
+            ChromaDB; busca exata sem o cliente persistente do Chroma) ou
+            'ivf' (índice flat particionado por k-means; busca aproximada)
+        nprobe: Partições sondadas por consulta no backend 'ivf'
+        quantization: 'int8' ou 'binary' para a primeira passada dos backends
+            'flat'/'ivf', com re-pontuação em rescore_dtype ('float32'/'float16')
+        pca: Primeira passada dos backends 'flat'/'ivf' com vetores reduzidos por PCA
+        hierarchical: Busca em dois estágios: escolhe os n_files arquivos mais
+            próximos pelos vetores-resumo e busca os chunks apenas neles
+        n_files: Arquivos escolhidos no primeiro estágio do modo hierárquico
+        symbol_lookup: Os chunks dos símbolos (função/classe) ou arquivos
+            citados na consulta entram direto pelo índice de símbolos,
+            combinados com a busca vetorial
+        routing: Escolhe modelo e orçamento de tokens de saída pela
+            complexidade de cada requisição (ver model_routing.py)
     """
     # 1. Configurar Embeddings e Vector Store
-    embeddings = OpenAIEmbeddings(model="text-embedding-ada-002")
+    embeddings = get_embeddings()
     
     # 2. Carregar o Banco de Dados Vetorial persistido
     print(f"Carregando Banco de Dados Vetorial de: {db_path}")
-    vector_store = Chroma(
-        persist_directory=db_path,
-        embedding_function=embeddings
-    )
+    if backend in ("flat", "ivf"):
+        vector_store = load_flat_index(
+            db_path,
+            embeddings=embeddings,
+            nprobe=nprobe if backend == "ivf" else 0,
+            quantization=quantization,
+            rescore_dtype=rescore_dtype,
+            pca=pca
+        )
+    else:
+        from langchain_chroma import Chroma
+        vector_store = Chroma(
+            persist_directory=db_path,
+            embedding_function=embeddings
+        )
     
-    # 3. Configurar o Retriever
-    # O retriever busca as regras mais relevantes (k=5)
-    retriever = vector_store.as_retriever(search_kwargs={"k": 5})
+    # 3. Configurar a divisão de consultas (fan-out por tópico)
+    if query_split == "llm":
+        query_splitter = build_llm_query_splitter(get_chat_model(temperature=0))
+    elif query_split == "heuristic":
+        query_splitter = build_heuristic_query_splitter()
+    else:
+        query_splitter = None
     
-    # 4. Configurar a Cadeia RAG (LCEL)
-    prompt = PromptTemplate.from_template(QA_GENERATION_PROMPT)
+    # 4. Índice de arquivos (primeiro estágio do modo hierárquico)
+    file_index = load_file_index(vector_store, db_path) if hierarchical else None
+    symbol_index = SymbolIndex.load(db_path) if symbol_lookup else None
+    # Documentos-pai (small-to-big), quando a ingestão indexou vetores-filho
+    parent_store = ParentStore.load(db_path)
     
-    def format_docs(docs):
-        return "\n\n".join(doc.page_content for doc in docs)
-
-    qa_chain = (
-        {"context": retriever | format_docs, "question": RunnablePassthrough()}
-        | prompt
-        | llm_generator
+    # 5. Configurar o Retriever
+    # O retriever busca as k regras mais relevantes; no modo MMR busca fetch_k
+    # candidatos e seleciona k regras diversas (evita trechos quase idênticos).
+    # Chunks vizinhos do mesmo arquivo são costurados em uma única passagem.
+    # Com score_threshold/elbow, o k varia entre min_k e max_k conforme os scores.
+    retriever = build_retriever(
+        vector_store,
+        embeddings,
+        search_type=search_type,
+        k=k,
+        fetch_k=fetch_k,
+        lambda_mult=lambda_mult,
+        stitch=stitch,
+        max_neighbors=max_neighbors,
+        query_splitter=query_splitter,
+        min_k=min_k,
+        max_k=max_k,
+        score_threshold=score_threshold,
+        elbow=elbow,
+        file_index=file_index,
+        n_files=n_files,
+        symbol_index=symbol_index,
+        parent_store=parent_store
     )
     
+    # 6. Configurar a Cadeia de Geração (LCEL)
+    # Recebe {"context", "question"}; o contexto é montado por build_context
+    # dentro do orçamento de tokens (ver generate_test_plan)
+    from langchain_core.prompts import PromptTemplate
+    prompt = PromptTemplate.from_template(QA_GENERATION_PROMPT)
+    if routing:
+        # Runnable do LangChain importado apenas quando o roteamento é ativado
+        try:
+            from .model_routing import build_routed_chain
+        except ImportError:
+            # Execução direta (src/core no sys.path)
+            from model_routing import build_routed_chain
+        qa_chain = build_routed_chain(prompt, GENERATION_MODEL_OPTIONS, db_path)
+    else:
+        qa_chain = prompt | get_chat_model(**GENERATION_MODEL_OPTIONS)
+    
     return qa_chain, retriever
 
-def generate_test_plan(query: str, qa_chain, retriever) -> dict:
+def build_context(query: str, retriever, context_token_budget: int = CONTEXT_TOKEN_BUDGET) -> tuple:
+    """
+    Recupera as regras e empacota o contexto dentro do orçamento de tokens.
+
+    Returns:
+        Tupla (documentos recuperados, contexto empacotado)
+    """
+    source_docs = retriever.invoke(query)
+    packed = pack_context(source_docs, token_budget=context_token_budget)
+    return source_docs, packed
+
+def generation_profile(context_token_budget: int = CONTEXT_TOKEN_BUDGET, rag_options: dict = None) -> str:
+    """
+    Perfil de geração: orçamento de contexto + opções de retrieval.
+
+    Planos de perfis diferentes não são trocados entre si: o perfil entra
+    na chave do cache de planos e na de coalescência (admission.py).
+    Opções iguais ao padrão do setup_rag_chain são ignoradas, para que a
+    mesma configuração tenha o mesmo perfil na CLI, no Streamlit e no serviço.
+
+    Returns:
+        "<orçamento>-<hash das opções>" (ex.: "1500-bf21a9e8")
+    """
+    defaults = {name: param.default for name, param in inspect.signature(setup_rag_chain).parameters.items()}
+    options = {name: value for name, value in (rag_options or {}).items()
+               if name not in defaults or defaults[name] != value}
+    digest = hashlib.sha1(json.dumps(options, sort_keys=True, default=repr).encode('utf-8')).hexdigest()[:8]
+    return f"{context_token_budget}-{digest}"
+
+def token_metrics(query: str, packed: dict, result=None) -> dict:
+    """
+    Métricas de tokens de uma requisição.
+
+    Usa o usage_metadata retornado pela API quando disponível; caso
+    contrário, a contagem local do prompt formatado.
+    """
+    metrics = {
+        "context_tokens": packed['tokens'],
+        "context_tokens_raw": packed['raw_tokens'],
+        "prompt_tokens": count_tokens(QA_GENERATION_PROMPT.format(context=packed['text'], question=query)),
+        "completion_tokens": None
+    }
+    usage = getattr(result, "usage_metadata", None)
+    if usage:
+        metrics["prompt_tokens"] = usage.get("input_tokens", metrics["prompt_tokens"])
+        metrics["completion_tokens"] = usage.get("output_tokens")
+    routing = getattr(result, "response_metadata", {}).get("routing")
+    if routing:
+        metrics["routing"] = routing
+    return metrics
+
+def build_plan_result(query: str, source_docs, result, metrics: dict) -> dict:
+    """Formata o resultado de uma geração (formato comum a todos os modos)."""
+    return {
+        "query": query,
+        "test_plan": result.content,
+        "source_rules": [doc.page_content for doc in source_docs],
+        "rule_ids": rule_ids(source_docs),
+        "retrieval": score_distribution(source_docs),
+        "metrics": metrics
+    }
+
+def generate_test_plan(
+    query: str,
+    qa_chain,
+    retriever,
+    context_token_budget: int = CONTEXT_TOKEN_BUDGET
+) -> dict:
     """
     Executa a consulta e gera o plano de testes.
+
+    Args:
+        query: Pergunta/solicitação do usuário
+        qa_chain: Cadeia de geração retornada por setup_rag_chain
+        retriever: Retriever retornado por setup_rag_chain
+        context_token_budget: Máximo de tokens do CONTEXTO enviado ao LLM
     """
     print(f"\nExecutando consulta: '{query}'")
+    start = time.perf_counter()
     
-    # Executa a cadeia RAG
-    result = qa_chain.invoke(query)
+    # Recupera as regras uma única vez e empacota o contexto
+    source_docs, packed = build_context(query, retriever, context_token_budget)
     
-    # Recupera os documentos de origem separadamente para o relatório
-    source_docs = retriever.invoke(query)
+    # Executa a geração
+    result = qa_chain.invoke({"context": packed['text'], "question": query})
+    
+    metrics = token_metrics(query, packed, result)
+    metrics["total_time_s"] = round(time.perf_counter() - start, 3)
+    print(f"Tokens do prompt: {metrics['prompt_tokens']} "
+          f"(contexto: {metrics['context_tokens']}/{context_token_budget}, "
+          f"antes do empacotamento: {metrics['context_tokens_raw']})")
     
     # Formata o resultado
+    return build_plan_result(query, source_docs, result, metrics)
+
+async def agenerate_test_plan(
+    query: str,
+    qa_chain,
+    retriever,
+    context_token_budget: int = CONTEXT_TOKEN_BUDGET
+) -> dict:
+    """
+    Versão assíncrona de generate_test_plan (ainvoke do retriever e do LLM).
+    """
+    start = time.perf_counter()
+
+    source_docs = await retriever.ainvoke(query)
+    packed = pack_context(source_docs, token_budget=context_token_budget)
+    result = await qa_chain.ainvoke({"context": packed['text'], "question": query})
+
+    metrics = token_metrics(query, packed, result)
+    metrics["total_time_s"] = round(time.perf_counter() - start, 3)
+    return build_plan_result(query, source_docs, result, metrics)
+
+async def agenerate_test_plans_batch(
+    queries: List[str],
+    qa_chain,
+    retriever,
+    max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+    context_token_budget: int = CONTEXT_TOKEN_BUDGET
+) -> List[dict]:
+    """
+    Gera planos de teste para várias consultas concorrentemente.
+
+    As regras de todas as consultas são recuperadas em um único lote
+    (uma requisição de embeddings e uma busca multi-consulta); em seguida
+    as gerações rodam via abatch com no máximo max_concurrency em voo.
+    Falhas não interrompem o lote: a consulta correspondente retorna
+    {"query", "error"}.
+
+    Returns:
+        Resultados na mesma ordem das consultas
+    """
+    start = time.perf_counter()
+    docs_per_query = await retriever.abatch(queries, return_exceptions=True)
+    retrieval_time = round(time.perf_counter() - start, 3)
+
+    async def generate_one(item: tuple) -> dict:
+        query, source_docs = item
+        if isinstance(source_docs, Exception):
+            raise source_docs
+        packed = pack_context(source_docs, token_budget=context_token_budget)
+        result = await qa_chain.ainvoke({"context": packed['text'], "question": query})
+
+        metrics = token_metrics(query, packed, result)
+        metrics["retrieval_time_s"] = retrieval_time
+        metrics["total_time_s"] = round(time.perf_counter() - start, 3)
+        return build_plan_result(query, source_docs, result, metrics)
+
+    from langchain_core.runnables import RunnableLambda
+    results = await RunnableLambda(generate_one).abatch(
+        list(zip(queries, docs_per_query)),
+        config={"max_concurrency": max_concurrency},
+        return_exceptions=True
+    )
+
+    return [
+        {"query": query, "error": f"{type(result).__name__}: {result}"}
+        if isinstance(result, Exception) else result
+        for query, result in zip(queries, results)
+    ]
+
+def generate_test_plans_batch(
+    queries: List[str],
+    qa_chain,
+    retriever,
+    max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+    context_token_budget: int = CONTEXT_TOKEN_BUDGET
+) -> List[dict]:
+    """
+    Gera planos de teste para várias consultas (wrapper síncrono).
+
+    Args:
+        queries: Lista de perguntas/solicitações
+        qa_chain: Cadeia de geração retornada por setup_rag_chain
+        retriever: Retriever retornado por setup_rag_chain
+        max_concurrency: Máximo de consultas processadas simultaneamente
+        context_token_budget: Máximo de tokens do CONTEXTO de cada consulta
+
+    Returns:
+        Resultados na mesma ordem das consultas
+    """
+    print(f"\nExecutando {len(queries)} consulta(s) em lote (concorrência: {max_concurrency})")
+    return asyncio.run(agenerate_test_plans_batch(
+        queries, qa_chain, retriever, max_concurrency, context_token_budget
+    ))
+
+def stream_test_plan(
+    query: str,
+    qa_chain,
+    retriever,
+    context_token_budget: int = CONTEXT_TOKEN_BUDGET
+) -> tuple:
+    """
+    Variante de generate_test_plan que entrega o plano token a token.
+
+    A recuperação é feita antes do retorno, então 'source_rules' já está
+    disponível enquanto o plano é gerado. O dicionário do resultado é
+    completado ('test_plan' e métricas, incluindo o tempo até o primeiro
+    token) quando o iterador é consumido até o fim.
+
+    Returns:
+        Tupla (dicionário do resultado, iterador de trechos de texto)
+    """
+    print(f"\nExecutando consulta (streaming): '{query}'")
+    start = time.perf_counter()
+
+    source_docs, packed = build_context(query, retriever, context_token_budget)
     test_plan = {
         "query": query,
-        "test_plan": result.content,
-        "source_rules": [doc.page_content for doc in source_docs]
+        "test_plan": "",
+        "source_rules": [doc.page_content for doc in source_docs],
+        "rule_ids": rule_ids(source_docs),
+        "retrieval": score_distribution(source_docs),
+        "metrics": token_metrics(query, packed)
     }
-    
-    return test_plan
+    test_plan["metrics"]["retrieval_time_s"] = round(time.perf_counter() - start, 3)
+
+    def tokens() -> Iterator[str]:
+        full_message = None
+        parts = []
+        for chunk in qa_chain.stream({"context": packed['text'], "question": query}):
+            full_message = chunk if full_message is None else full_message + chunk
+            if not chunk.content:
+                continue
+            if "time_to_first_token_s" not in test_plan["metrics"]:
+                test_plan["metrics"]["time_to_first_token_s"] = round(time.perf_counter() - start, 3)
+            parts.append(chunk.content)
+            yield chunk.content
+
+        test_plan["test_plan"] = "".join(parts)
+        test_plan["metrics"].update(token_metrics(query, packed, full_message))
+        test_plan["metrics"]["total_time_s"] = round(time.perf_counter() - start, 3)
+
+    return test_plan, tokens()
 
 if __name__ == "__main__":
     # Exemplo de uso (requer que o ingestion.py tenha sido executado antes)
@@ -0,0 +1,812 @@
+"""
+Módulo de Retrieval - Estratégias de Busca sobre o Banco Vetorial
+=================================================================
+
+Este módulo concentra as estratégias de recuperação usadas pela
+cadeia RAG. Além da busca por similaridade (top-k), oferece o modo
+MMR (Maximal Marginal Relevance), que busca um conjunto maior de
+candidatos e os re-ranqueia equilibrando relevância e diversidade.
+
+Opcionalmente, o k é adaptativo: entre min_k e max_k, mantém apenas
+os documentos acima de um score mínimo e corta no "cotovelo" da curva
+de scores, de modo que consultas estreitas geram prompts menores.
+
+Após a busca, chunks vizinhos do mesmo arquivo (metadados source +
+chunk_index) são costurados em uma única passagem sem a sobreposição
+do splitter, opcionalmente expandindo os acertos para seus vizinhos.
+
+No modo hierárquico, a consulta primeiro escolhe os arquivos mais
+próximos pelos vetores-resumo (ver file_index.py) e só então busca
+os chunks, restrita a esses arquivos.
+
+Todo o cálculo de similaridade é feito com operações matriciais
+NumPy sobre os embeddings dos candidatos. Em lote, as N consultas
+são embedadas em uma única requisição e buscadas em uma única
+chamada multi-consulta ao ChromaDB; o mesmo mecanismo executa, em
+uma única rodada, as sub-consultas de pedidos com vários tópicos.
+"""
+
+import os
+from typing import List, Dict, Any, Optional
+
+import numpy as np
+from langchain_core.documents import Document
+
+try:
+    from .context_packing import split_header, overlap_length
+except ImportError:
+    # Execução direta (src/core no sys.path)
+    from context_packing import split_header, overlap_length
+
+# ================================
+# CONFIGURAÇÕES
+# ================================
+SEARCH_TYPES = ("similarity", "mmr")
+DEFAULT_K = 5
+DEFAULT_FETCH_K = 20
+DEFAULT_LAMBDA_MULT = 0.5
+DEFAULT_NEIGHBOR_WINDOW = 1
+DEFAULT_MIN_K = 1
+DEFAULT_MAX_K = 10
+# Corta no cotovelo quando a maior queda de score supera N vezes a queda média
+DEFAULT_ELBOW_FACTOR = 2.0
+# Arquivos escolhidos no primeiro estágio do retrieval hierárquico
+DEFAULT_N_FILES = 3
+# Filhos buscados por pai desejado (small-to-big): vários filhos do mesmo
+# pai colapsam em um único documento
+PARENT_FETCH_FACTOR = 3
+
+
+# ================================
+# FUNÇÕES VETORIAIS
+# ================================
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """Normaliza cada linha da matriz para norma L2 unitária."""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Índices dos k maiores scores, em ordem decrescente.
+
+    Usa argpartition (O(n)) e ordena apenas os k selecionados.
+    """
+    n = scores.shape[0]
+    k = min(k, n)
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    top = np.argpartition(-scores, k - 1)[:k] if k < n else np.arange(n)
+    return top[np.argsort(-scores[top], kind='stable')]
+
+
+def mmr_rerank(
+    query_embedding: np.ndarray,
+    candidate_embeddings: np.ndarray,
+    k: int = DEFAULT_K,
+    lambda_mult: float = DEFAULT_LAMBDA_MULT
+) -> np.ndarray:
+    """
+    Re-ranqueia candidatos usando Maximal Marginal Relevance.
+
+    A matriz de similaridade candidato x candidato é calculada uma única
+    vez; a cada seleção apenas o vetor de "máxima similaridade com os já
+    selecionados" é atualizado com np.maximum, sem laços sobre candidatos.
+
+    Args:
+        query_embedding: Vetor da consulta (dim,)
+        candidate_embeddings: Matriz de candidatos (n, dim)
+        k: Quantidade de documentos a selecionar
+        lambda_mult: 1.0 = apenas relevância, 0.0 = apenas diversidade
+
+    Returns:
+        Índices dos candidatos selecionados, na ordem de seleção
+    """
+    candidates = normalize_rows(candidate_embeddings)
+    n = candidates.shape[0]
+    k = min(k, n)
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+
+    query = normalize_rows(np.asarray(query_embedding).reshape(1, -1))[0]
+    relevance = candidates @ query
+    pairwise = candidates @ candidates.T
+
+    selected = np.empty(k, dtype=np.int64)
+    max_similarity = np.full(n, -np.inf, dtype=np.float32)
+    available = np.ones(n, dtype=bool)
+
+    for step in range(k):
+        if step == 0:
+            scores = relevance.copy()
+        else:
+            scores = lambda_mult * relevance - (1.0 - lambda_mult) * max_similarity
+        scores[~available] = -np.inf
+
+        best = int(np.argmax(scores))
+        selected[step] = best
+        available[best] = False
+        max_similarity = np.maximum(max_similarity, pairwise[best])
+
+    return selected
+
+
+# ================================
+# K ADAPTATIVO
+# ================================
+def select_adaptive_k(
+    scores: np.ndarray,
+    min_k: int = DEFAULT_MIN_K,
+    max_k: int = DEFAULT_MAX_K,
+    score_threshold: float = None,
+    elbow: bool = True,
+    elbow_factor: float = DEFAULT_ELBOW_FACTOR
+) -> int:
+    """
+    Escolhe quantos documentos manter a partir da curva de scores.
+
+    1. Mantém os documentos com score >= score_threshold (se definido)
+    2. Limita o resultado ao intervalo [min_k, max_k]
+    3. Se elbow=True, corta na maior queda entre scores consecutivos
+       quando ela for maior que elbow_factor vezes a queda média
+
+    Args:
+        scores: Scores de similaridade dos candidatos (qualquer ordem)
+
+    Returns:
+        Quantidade de documentos a manter
+    """
+    curve = np.sort(np.asarray(scores, dtype=np.float32))[::-1][:max_k]
+    if curve.size == 0:
+        return 0
+    min_k = min(max(min_k, 1), curve.size)
+
+    k = curve.size
+    if score_threshold is not None:
+        k = max(int(np.count_nonzero(curve >= score_threshold)), min_k)
+
+    if elbow and k - min_k >= 1 and k >= 3:
+        drops = curve[:k - 1] - curve[1:k]
+        mean_drop = (curve[0] - curve[k - 1]) / (k - 1)
+        # Só considera cortes que mantêm pelo menos min_k documentos
+        position = int(np.argmax(drops[min_k - 1:])) + min_k - 1
+        if mean_drop > 0 and drops[position] > elbow_factor * mean_drop:
+            k = position + 1
+
+    return k
+
+
+def score_distribution(docs: List[Document]) -> Dict[str, Any]:
+    """
+    Resume os scores dos documentos recuperados.
+
+    Returns:
+        Dicionário com k escolhido pelo retriever, quantidade de passagens,
+        estatísticas (min/max/média) dos scores e, se a consulta foi
+        resolvida sem busca vetorial, 'resolved_by'
+    """
+    scores = [doc.metadata['score'] for doc in docs if doc.metadata.get('score') is not None]
+    retrieval_k = next(
+        (doc.metadata['retrieval_k'] for doc in docs if 'retrieval_k' in doc.metadata), len(docs)
+    )
+    distribution = {
+        'retrieval_k': retrieval_k,
+        'passages': len(docs),
+        'scores': [round(score, 4) for score in scores]
+    }
+    resolved_by = next((doc.metadata['resolved_by'] for doc in docs if doc.metadata.get('resolved_by')), None)
+    if resolved_by:
+        distribution['resolved_by'] = resolved_by
+    if scores:
+        distribution.update({
+            'score_min': round(min(scores), 4),
+            'score_max': round(max(scores), 4),
+            'score_mean': round(sum(scores) / len(scores), 4)
+        })
+    return distribution
+
+
+def rule_ids(docs: List[Document]) -> List[str]:
+    """
+    Identificadores estáveis das regras usadas (proveniência dos planos).
+
+    Documentos-pai viram 'parent:<parent_id>'; chunks viram
+    'chunk:<source>#<índice>', um por chunk costurado (chunk_index até
+    chunk_end). Documentos sem esses metadados não têm identificador.
+    """
+    ids = []
+    for doc in docs:
+        metadata = doc.metadata or {}
+        if metadata.get('parent_id') is not None:
+            ids.append(f"parent:{metadata['parent_id']}")
+        elif _chunk_position(doc) is not None:
+            source, first = _chunk_position(doc)
+            last = int(metadata.get('chunk_end', first))
+            ids.extend(f"chunk:{source}#{i}" for i in range(first, last + 1))
+    return list(dict.fromkeys(ids))
+
+
+# ================================
+# BUSCA NO CHROMADB
+# ================================
+def fetch_candidates_batch(
+    vector_store,
+    query_embeddings: List[List[float]],
+    n_results: int,
+    sources: Optional[List[Optional[List[str]]]] = None
+) -> List[Dict[str, Any]]:
+    """
+    Busca candidatos para várias consultas em uma única chamada ao ChromaDB.
+
+    Backends alternativos (ex.: FlatVectorStore) implementam o próprio
+    query_candidates com a mesma assinatura e formato de retorno.
+
+    Args:
+        vector_store: Instância Chroma ou backend alternativo
+        query_embeddings: Embeddings das consultas
+        n_results: Quantidade de candidatos por consulta
+        sources: Arquivos de origem permitidos por consulta (retrieval
+            hierárquico). Como o filtro muda por consulta, o ChromaDB recebe
+            uma chamada por consulta nesse modo.
+
+    Returns:
+        Um dicionário por consulta com 'documents', 'metadatas' e
+        'embeddings' (np.ndarray)
+    """
+    if hasattr(vector_store, 'query_candidates'):
+        if sources is not None:
+            return vector_store.query_candidates(query_embeddings, n_results, sources=sources)
+        return vector_store.query_candidates(query_embeddings, n_results)
+
+    if sources is not None:
+        return [
+            _query_collection(
+                vector_store, [query_embedding], n_results,
+                _where_sources(allowed) if allowed else None
+            )[0]
+            for query_embedding, allowed in zip(query_embeddings, sources)
+        ]
+    return _query_collection(vector_store, query_embeddings, n_results)
+
+
+def _where_sources(allowed: List[str]) -> Dict[str, Any]:
+    """Filtro 'where' do ChromaDB restrito aos arquivos de origem."""
+    return {"source": {"$in": list(allowed)}} if len(allowed) > 1 else {"source": allowed[0]}
+
+
+def _query_collection(vector_store, query_embeddings: List[List[float]], n_results: int, where=None) -> List[Dict[str, Any]]:
+    """Consulta direta à coleção do ChromaDB (com filtro opcional)."""
+    result = vector_store._collection.query(
+        query_embeddings=list(query_embeddings),
+        n_results=n_results,
+        where=where,
+        include=['documents', 'metadatas', 'embeddings']
+    )
+    return [
+        {
+            'documents': documents,
+            'metadatas': [m or {} for m in metadatas],
+            'embeddings': np.asarray(embeddings, dtype=np.float32)
+        }
+        for documents, metadatas, embeddings in zip(
+            result['documents'], result['metadatas'], result['embeddings']
+        )
+    ]
+
+
+def fetch_candidates(vector_store, query_embedding: List[float], n_results: int) -> Dict[str, Any]:
+    """
+    Busca candidatos no ChromaDB incluindo seus embeddings.
+
+    Returns:
+        Dicionário com 'documents', 'metadatas' e 'embeddings' (np.ndarray)
+    """
+    return fetch_candidates_batch(vector_store, [query_embedding], n_results)[0]
+
+
+def embed_queries(embeddings, queries: List[str]) -> List[List[float]]:
+    """Gera os embeddings de todas as consultas em uma única requisição."""
+    if len(queries) == 1:
+        return [embeddings.embed_query(queries[0])]
+    return embeddings.embed_documents(list(queries))
+
+
+def _to_documents(candidates: Dict[str, Any], indices, scores) -> List[Document]:
+    """Monta Documents a partir dos candidatos, anexando o score aos metadados."""
+    return [
+        Document(
+            page_content=candidates['documents'][i],
+            metadata={**candidates['metadatas'][i], 'score': float(score)}
+        )
+        for i, score in zip(indices, scores)
+    ]
+
+
+def cosine_scores(query_embedding: List[float], candidate_embeddings: np.ndarray) -> np.ndarray:
+    """Similaridade de cosseno entre a consulta e cada candidato."""
+    query = normalize_rows(np.asarray(query_embedding).reshape(1, -1))[0]
+    return normalize_rows(candidate_embeddings) @ query
+
+
+def rank_candidates(
+    query_embedding: List[float],
+    candidates: Dict[str, Any],
+    search_type: str = "similarity",
+    k: int = DEFAULT_K,
+    lambda_mult: float = DEFAULT_LAMBDA_MULT
+) -> List[Document]:
+    """
+    Seleciona k documentos entre os candidatos de uma consulta.
+
+    O score anexado aos metadados é a similaridade de cosseno com a consulta.
+    """
+    if not candidates['documents']:
+        return []
+
+    if search_type == "mmr":
+        selected = mmr_rerank(query_embedding, candidates['embeddings'], k, lambda_mult)
+    else:
+        selected = np.arange(min(k, len(candidates['documents'])))
+    scores = cosine_scores(query_embedding, candidates['embeddings'][selected])
+    return _to_documents(candidates, selected, scores)
+
+
+def similarity_search(vector_store, embeddings, query: str, k: int = DEFAULT_K) -> List[Document]:
+    """Busca top-k por similaridade."""
+    query_embedding = embeddings.embed_query(query)
+    candidates = fetch_candidates(vector_store, query_embedding, k)
+    return rank_candidates(query_embedding, candidates, "similarity", k)
+
+
+def mmr_search(
+    vector_store,
+    embeddings,
+    query: str,
+    k: int = DEFAULT_K,
+    fetch_k: int = DEFAULT_FETCH_K,
+    lambda_mult: float = DEFAULT_LAMBDA_MULT
+) -> List[Document]:
+    """Busca fetch_k candidatos e seleciona k documentos diversos via MMR."""
+    query_embedding = embeddings.embed_query(query)
+    candidates = fetch_candidates(vector_store, query_embedding, max(fetch_k, k))
+    return rank_candidates(query_embedding, candidates, "mmr", k, lambda_mult)
+
+
+# ================================
+# COSTURA DE CHUNKS ADJACENTES
+# ================================
+def _chunk_position(doc: Document):
+    """
+    Retorna (source, chunk_index) do documento ou None sem esses metadados.
+
+    Documentos-pai (com 'parent_id') também guardam source e chunk_index,
+    mas não são chunks: não são costurados nem expandidos com vizinhos, o
+    que apagaria o parent_id (e a proveniência) dos pais seguintes.
+    """
+    metadata = doc.metadata or {}
+    if metadata.get('parent_id') is not None:
+        return None
+    if metadata.get('source') is None or metadata.get('chunk_index') is None:
+        return None
+    return metadata['source'], int(metadata['chunk_index'])
+
+
+def _merge_run(run: List[Document]) -> Document:
+    """Une uma sequência de chunks consecutivos em uma passagem sem sobreposição."""
+    first, last = run[0].metadata, run[-1].metadata
+    merged = ""
+    for doc in run:
+        _, text = split_header(doc.page_content, doc.metadata)
+        cut = overlap_length(merged, text) if merged else 0
+        if cut:
+            merged += text[cut:]
+        else:
+            merged = f"{merged}\n{text}" if merged else text
+
+    filename = first.get('filename') or os.path.basename(str(first['source']))
+    chunk_range = f"{first['chunk_index'] + 1}-{last['chunk_index'] + 1}"
+    if first.get('total_chunks'):
+        chunk_range += f"/{first['total_chunks']}"
+    header = f"[Arquivo: {filename} | Tipo: {first.get('type', 'desconhecido')} | Chunk: {chunk_range}]\n"
+
+    scores = [d.metadata['score'] for d in run if d.metadata.get('score') is not None]
+    metadata = {**first, 'chunk_end': last['chunk_index'], 'stitched_chunks': len(run)}
+    metadata.pop('neighbor', None)
+    if scores:
+        metadata['score'] = max(scores)
+    # Um acerto do índice de símbolos na sequência marca a passagem inteira
+    resolved_by = next((d.metadata['resolved_by'] for d in run if d.metadata.get('resolved_by')), None)
+    if resolved_by:
+        metadata['resolved_by'] = resolved_by
+    return Document(page_content=header + merged, metadata=metadata)
+
+
+def _close_run(run: List[tuple]) -> tuple:
+    """Converte uma sequência de (rank, doc) em um único item (melhor rank, doc)."""
+    if len(run) == 1:
+        return run[0]
+    best_rank = min(rank for rank, _ in run)
+    return best_rank, _merge_run([doc for _, doc in run])
+
+
+def stitch_adjacent_chunks(docs: List[Document]) -> List[Document]:
+    """
+    Une chunks consecutivos do mesmo arquivo em uma única passagem.
+
+    Chunks duplicados são descartados. Cada passagem costurada ocupa a
+    posição do seu chunk mais bem ranqueado; documentos sem source ou
+    chunk_index são mantidos como estão.
+
+    Args:
+        docs: Documentos na ordem de relevância do retriever
+
+    Returns:
+        Documentos costurados, na ordem de relevância
+    """
+    by_source: Dict[Any, Dict[int, tuple]] = {}
+    ranked: List[tuple] = []
+
+    for rank, doc in enumerate(docs):
+        position = _chunk_position(doc)
+        if position is None:
+            ranked.append((rank, doc))
+            continue
+        source, index = position
+        # Mantém a primeira ocorrência (melhor rank) de cada chunk
+        by_source.setdefault(source, {}).setdefault(index, (rank, doc))
+
+    for chunks in by_source.values():
+        run: List[tuple] = []
+        previous = None
+        for index in sorted(chunks):
+            if run and index != previous + 1:
+                ranked.append(_close_run(run))
+                run = []
+            run.append(chunks[index])
+            previous = index
+        ranked.append(_close_run(run))
+
+    return [doc for _, doc in sorted(ranked, key=lambda item: item[0])]
+
+
+def fetch_chunks(vector_store, positions: List[tuple]) -> List[tuple]:
+    """
+    Busca chunks por (source, chunk_index) em uma única consulta por metadados.
+
+    Returns:
+        Lista de tuplas (documento, metadados), na ordem de positions
+    """
+    if not positions:
+        return []
+    if hasattr(vector_store, 'get_chunks'):
+        found = vector_store.get_chunks(positions)
+    else:
+        conditions = [
+            {"$and": [{"source": {"$eq": source}}, {"chunk_index": {"$eq": index}}]}
+            for source, index in positions
+        ]
+        where = conditions[0] if len(conditions) == 1 else {"$or": conditions}
+        result = vector_store._collection.get(where=where, include=['documents', 'metadatas'])
+        found = [(content, metadata or {}) for content, metadata in zip(result['documents'], result['metadatas'])]
+
+    order = {position: i for i, position in enumerate(positions)}
+    return sorted(
+        found,
+        key=lambda item: order.get((item[1].get('source'), item[1].get('chunk_index')), len(order))
+    )
+
+
+def resolve_parents(docs: List[Document], parent_store) -> List[Document]:
+    """
+    Troca os vetores-filho pelos documentos-pai (retrieval small-to-big).
+
+    Cada pai aparece uma única vez, na posição e com o score do seu
+    melhor filho (e o 'resolved_by', se o filho veio do índice de
+    símbolos); documentos sem 'parent_id' são mantidos como estão.
+    """
+    parents: Dict[str, Document] = {}
+    resolved = []
+    for doc in docs:
+        parent_id = doc.metadata.get('parent_id')
+        parent = parent_store.get(parent_id) if parent_id is not None else None
+        if parent is None:
+            resolved.append(doc)
+            continue
+        if parent_id in parents:
+            parents[parent_id].metadata['matched_children'] += 1
+            continue
+        parents[parent_id] = Document(
+            page_content=parent['text'],
+            metadata={
+                **parent['metadata'],
+                'parent_id': parent_id,
+                'score': doc.metadata.get('score'),
+                'matched_children': 1,
+                **({'resolved_by': doc.metadata['resolved_by']} if doc.metadata.get('resolved_by') else {})
+            }
+        )
+        resolved.append(parents[parent_id])
+    return resolved
+
+
+def expand_neighbors(
+    vector_store,
+    docs: List[Document],
+    window: int = DEFAULT_NEIGHBOR_WINDOW,
+    max_neighbors: int = 0
+) -> List[Document]:
+    """
+    Acrescenta aos acertos os chunks vizinhos (chunk_index ± window).
+
+    Os vizinhos são buscados em uma única consulta por metadados e herdam
+    o score do acerto que os trouxe. Adiciona no máximo max_neighbors
+    chunks, priorizando os vizinhos dos acertos mais relevantes.
+    """
+    if max_neighbors <= 0:
+        return docs
+
+    retrieved = {p for p in (_chunk_position(d) for d in docs) if p is not None}
+    wanted: Dict[tuple, Any] = {}
+    for doc in docs:
+        position = _chunk_position(doc)
+        if position is None:
+            continue
+        source, index = position
+        total = doc.metadata.get('total_chunks')
+        for offset in range(1, window + 1):
+            for neighbor in (index - offset, index + offset):
+                key = (source, neighbor)
+                if neighbor < 0 or (total and neighbor >= total) or key in retrieved or key in wanted:
+                    continue
+                if len(wanted) < max_neighbors:
+                    wanted[key] = doc.metadata.get('score')
+
+    if not wanted:
+        return docs
+
+    neighbors = []
+    for content, metadata in fetch_chunks(vector_store, list(wanted)):
+        score = wanted.get((metadata.get('source'), metadata.get('chunk_index')))
+        neighbors.append(Document(
+            page_content=content,
+            metadata={**metadata, 'score': score, 'neighbor': True}
+        ))
+    return docs + neighbors
+
+
+# ================================
+# FAN-OUT DE SUB-CONSULTAS
+# ================================
+def merge_with_quotas(
+    topics: List[str],
+    results_per_topic: List[List[Document]],
+    k: int = DEFAULT_K
+) -> List[Document]:
+    """
+    Combina os resultados das sub-consultas reservando vagas por tópico.
+
+    As k vagas são divididas igualmente entre os tópicos (o resto vai para
+    os primeiros); vagas não usadas (ex.: duplicatas entre tópicos) são
+    preenchidas pelos melhores documentos restantes, por score.
+    """
+    base, extra = divmod(k, len(topics))
+    quotas = [base + (1 if i < extra else 0) for i in range(len(topics))]
+
+    merged: List[Document] = []
+    leftovers: List[Document] = []
+    seen = set()
+
+    for topic, quota, docs in zip(topics, quotas, results_per_topic):
+        taken = 0
+        for doc in docs:
+            if doc.page_content in seen:
+                continue
+            doc.metadata['topic'] = topic
+            if taken < quota:
+                merged.append(doc)
+                seen.add(doc.page_content)
+                taken += 1
+            else:
+                leftovers.append(doc)
+
+    for doc in sorted(leftovers, key=lambda d: d.metadata.get('score') or 0.0, reverse=True):
+        if len(merged) >= k:
+            break
+        if doc.page_content not in seen:
+            merged.append(doc)
+            seen.add(doc.page_content)
+
+    return merged
+
+
+def merge_symbol_hits(
+    symbol_docs: List[Document],
+    ranked_docs: List[Document],
+    k: int = DEFAULT_K
+) -> List[Document]:
+    """
+    Combina os chunks dos símbolos citados com a busca vetorial da consulta.
+
+    Os símbolos ocupam até metade das k vagas (ao menos uma) e vêm primeiro;
+    as demais vão para a busca vetorial, para que os outros tópicos do
+    pedido (ex.: "`apply_discount` e regras de frete") não sejam
+    descartados. Vagas não usadas por um lado ficam para o outro; chunks
+    repetidos entram uma única vez.
+    """
+    quota = max(1, (k + 1) // 2)
+    merged: List[Document] = []
+    seen = set()
+
+    def take(docs: List[Document], limit: int):
+        for doc in docs:
+            if len(merged) >= limit:
+                break
+            key = _chunk_position(doc) or doc.page_content
+            if key not in seen:
+                merged.append(doc)
+                seen.add(key)
+
+    take(symbol_docs, min(quota, k))
+    take(ranked_docs, k)
+    take(symbol_docs, k)
+    return merged
+
+
+def build_retriever(
+    vector_store,
+    embeddings,
+    search_type: str = "similarity",
+    k: int = DEFAULT_K,
+    fetch_k: int = DEFAULT_FETCH_K,
+    lambda_mult: float = DEFAULT_LAMBDA_MULT,
+    stitch: bool = True,
+    max_neighbors: int = 0,
+    neighbor_window: int = DEFAULT_NEIGHBOR_WINDOW,
+    query_splitter=None,
+    min_k: int = None,
+    max_k: int = None,
+    score_threshold: float = None,
+    elbow: bool = False,
+    file_index=None,
+    n_files: int = DEFAULT_N_FILES,
+    symbol_index=None,
+    parent_store=None
+) -> "BatchRetriever":
+    """
+    Cria o retriever (Runnable: query -> List[Document]) para o modo escolhido.
+
+    Args:
+        vector_store: Instância Chroma carregada ou backend alternativo
+            (ex.: FlatVectorStore)
+        embeddings: Modelo de embeddings usado na consulta
+        search_type: 'similarity' (top-k) ou 'mmr' (diversidade)
+        k: Documentos retornados
+        fetch_k: Tamanho do conjunto de candidatos no modo MMR
+        lambda_mult: Peso da relevância frente à diversidade no modo MMR
+        stitch: Une chunks consecutivos do mesmo arquivo em uma passagem
+        max_neighbors: Máximo de chunks vizinhos acrescentados aos acertos (0 = desativado)
+        neighbor_window: Distância máxima (em chunks) dos vizinhos acrescentados
+        query_splitter: Função List[str] -> List[List[str]] que divide cada consulta
+            em sub-consultas por tópico (None = sem divisão). Todas as
+            sub-consultas são buscadas em um único lote e combinadas com cotas.
+        min_k: Mínimo de documentos no modo adaptativo (padrão: 1)
+        max_k: Máximo de documentos no modo adaptativo (padrão: max(k, 10))
+        score_threshold: Score mínimo (cosseno) para manter um documento;
+            ativa o k adaptativo
+        elbow: Corta no cotovelo da curva de scores; ativa o k adaptativo
+        file_index: FileIndex com os vetores-resumo por arquivo; ativa o
+            retrieval hierárquico (None = busca em todos os chunks)
+        n_files: Arquivos escolhidos no primeiro estágio do modo hierárquico
+        symbol_index: SymbolIndex; os chunks dos símbolos ou arquivos citados
+            na consulta entram diretamente no resultado (metadata['resolved_by']),
+            combinados com a busca vetorial (merge_symbol_hits)
+        parent_store: ParentStore; os vetores-filho encontrados são trocados
+            pelos documentos-pai, sem repetição. São buscados
+            PARENT_FETCH_FACTOR vezes mais filhos, e o resultado é cortado
+            em k pais distintos
+
+    O k efetivamente usado é anotado em metadata['retrieval_k'] de cada documento.
+    """
+    if search_type not in SEARCH_TYPES:
+        raise ValueError(f"search_type inválido: {search_type}. Use um de {SEARCH_TYPES}")
+
+    adaptive = score_threshold is not None or elbow
+    if adaptive:
+        min_k = DEFAULT_MIN_K if min_k is None else min_k
+        max_k = max(k, DEFAULT_MAX_K) if max_k is None else max_k
+        if not 1 <= min_k <= max_k:
+            raise ValueError(f"Intervalo de k inválido: min_k={min_k}, max_k={max_k}")
+    limit_k = max_k if adaptive else k
+    child_factor = PARENT_FETCH_FACTOR if parent_store is not None else 1
+    n_results = max(fetch_k, limit_k * child_factor) if search_type == "mmr" else limit_k * child_factor
+
+    def choose_k(query_embedding, candidates) -> int:
+        if not adaptive or not candidates['documents']:
+            return k
+        scores = cosine_scores(query_embedding, candidates['embeddings'])
+        return select_adaptive_k(scores, min_k, max_k, score_threshold, elbow)
+
+    def search(queries: List[str]) -> List[tuple]:
+        """(documentos, k) de cada consulta; com parent_store, até k * child_factor filhos."""
+        query_embeddings = embed_queries(embeddings, queries)
+        if file_index is not None and len(file_index) > 0:
+            # Estágio 1: arquivos mais próximos; estágio 2: chunks desses arquivos
+            sources = [file_index.top_files(q, n_files) for q in query_embeddings]
+            candidates_per_query = fetch_candidates_batch(vector_store, query_embeddings, n_results, sources)
+        else:
+            candidates_per_query = fetch_candidates_batch(vector_store, query_embeddings, n_results)
+        ranked = []
+        for query_embedding, candidates in zip(query_embeddings, candidates_per_query):
+            query_k = choose_k(query_embedding, candidates)
+            ranked.append((
+                rank_candidates(query_embedding, candidates, search_type, query_k * child_factor, lambda_mult),
+                query_k
+            ))
+        return ranked
+
+    def rank(queries: List[str]) -> List[tuple]:
+        if not queries:
+            return []
+        if query_splitter is None:
+            return search(queries)
+        # Uma única rodada de busca para todas as sub-consultas de todas as consultas
+        topics_per_query = [topics[:limit_k] for topics in query_splitter(queries)]
+        flat_results = iter(search([t for topics in topics_per_query for t in topics]))
+        return [
+            (merge_with_quotas(topics, [next(flat_results)[0] for _ in topics], limit_k * child_factor), limit_k)
+            for topics in topics_per_query
+        ]
+
+    def resolve(queries: List[str]) -> Dict[int, List[Document]]:
+        """Consultas resolvidas pelo índice de símbolos (posição -> documentos)."""
+        if symbol_index is None or len(symbol_index) == 0:
+            return {}
+        positions = {}
+        for i, query in enumerate(queries):
+            wanted = symbol_index.resolve_positions(query)[:limit_k]
+            if wanted:
+                positions[i] = wanted
+        found = {
+            (metadata.get('source'), metadata.get('chunk_index')): (content, metadata)
+            for content, metadata in fetch_chunks(vector_store, [p for ps in positions.values() for p in ps])
+        }
+        resolved = {}
+        for i, wanted in positions.items():
+            docs = [
+                Document(page_content=found[p][0], metadata={**found[p][1], 'score': None, 'resolved_by': 'symbol_index'})
+                for p in wanted if p in found
+            ]
+            if docs:
+                resolved[i] = docs
+        return resolved
+
+    def retrieve_many(queries: List[str]) -> List[List[Document]]:
+        resolved = resolve(queries)
+        results = []
+        for i, (docs, query_k) in enumerate(rank(queries)):
+            symbol_docs = resolved.get(i)
+            if parent_store is not None:
+                # Os filhos excedentes colapsam nos pais; o corte é em pais distintos
+                docs = resolve_parents(docs, parent_store)[:query_k]
+                if symbol_docs:
+                    symbol_docs = resolve_parents(symbol_docs, parent_store)
+            if symbol_docs:
+                docs = merge_symbol_hits(symbol_docs, docs, limit_k)
+            for doc in docs:
+                doc.metadata['retrieval_k'] = len(docs)
+            if max_neighbors > 0:
+                docs = expand_neighbors(vector_store, docs, neighbor_window, max_neighbors)
+            if stitch:
+                docs = stitch_adjacent_chunks(docs)
+            results.append(docs)
+        return results
+
+    # Runnable do LangChain importado apenas aqui (inicialização rápida da CLI)
+    try:
+        from .batch_retriever import BatchRetriever
+    except ImportError:
+        # Execução direta (src/core no sys.path)
+        from batch_retriever import BatchRetriever
+    return BatchRetriever(retrieve_many)
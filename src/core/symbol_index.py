@@ -0,0 +1,327 @@
+"""
+Módulo de Índice de Símbolos - Proveniência das Regras por Função/Classe
+========================================================================
+
+A tradução de código em regras é feita por símbolo (função ou classe de
+nível superior), e este índice lateral registra de onde veio cada regra:
+
+    arquivo -> símbolo -> tipo, linhas, hash do código, chunks gerados
+
+Com ele:
+- Consultas que citam um símbolo (`calculate_installments`,
+  `PaymentService.refund`) ou um arquivo (`payment_service.py`) são
+  resolvidas por busca em dicionário, sem embedding nem busca vetorial
+- A ingestão delta compara o hash de cada símbolo: apenas os símbolos
+  alterados são retraduzidos, e apenas os chunks deles são removidos
+
+O índice é um JSON compacto gravado em SYMBOL_INDEX_FILE, dentro do
+diretório do ChromaDB. Os chunks são referenciados por (source,
+chunk_index), a mesma chave usada na expansão de vizinhos do retrieval.
+O source é sempre o caminho relativo à raiz do repositório (source_key),
+tanto no bootstrap quanto na ingestão delta.
+"""
+
+import os
+import re
+import ast
+import json
+import hashlib
+import subprocess
+from functools import lru_cache
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Iterable
+
+# ================================
+# CONFIGURAÇÕES
+# ================================
+SYMBOL_INDEX_FILE = "symbol_index.json"
+# Código de nível de módulo fora de funções/classes (constantes, scripts)
+MODULE_SYMBOL = "<module>"
+
+# Identificadores e nomes de arquivo citados na consulta
+_TOKEN_PATTERN = re.compile(r"[A-Za-z_][\w./-]*")
+
+
+# ================================
+# CHAVE DOS ARQUIVOS (METADADO 'source')
+# ================================
+@lru_cache(maxsize=None)
+def project_root(path: str = ".") -> str:
+    """Raiz do repositório git que contém path (ou o próprio path fora de um repositório)."""
+    path = os.path.abspath(path)
+    try:
+        result = subprocess.run(
+            ['git', 'rev-parse', '--show-toplevel'], cwd=path, capture_output=True, text=True, check=True
+        )
+        return os.path.abspath(result.stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return path
+
+
+def source_key(path: str, root: Optional[str] = None) -> str:
+    """
+    Forma única do metadado 'source' de um arquivo.
+
+    Caminho relativo à raiz (padrão: raiz do repositório do diretório
+    atual), com '/'; arquivos fora da raiz ficam com o caminho absoluto.
+    Assim o bootstrap (caminhos absolutos do os.walk) e a ingestão delta
+    (caminhos do git diff) geram a mesma chave para o mesmo arquivo.
+    """
+    absolute = os.path.abspath(path)
+    try:
+        relative = os.path.relpath(absolute, root or project_root())
+    except ValueError:
+        # Outra unidade de disco (Windows)
+        relative = os.pardir
+    if relative == os.pardir or relative.startswith(os.pardir + os.sep):
+        return absolute.replace('\\', '/')
+    return relative.replace('\\', '/')
+
+
+# ================================
+# EXTRAÇÃO DE SÍMBOLOS
+# ================================
+def _hash(code: str) -> str:
+    return hashlib.sha1(code.encode('utf-8')).hexdigest()[:16]
+
+
+def _module_symbol(code: str, start_line: int = 1, end_line: Optional[int] = None) -> Dict[str, Any]:
+    return {
+        'name': MODULE_SYMBOL,
+        'kind': 'module',
+        'start_line': start_line,
+        'end_line': end_line or max(code.count('\n') + 1, 1),
+        'code': code,
+        'hash': _hash(code),
+        'members': {}
+    }
+
+
+def _is_trivial(node: ast.stmt) -> bool:
+    """Imports e docstrings não geram regras de negócio."""
+    if isinstance(node, (ast.Import, ast.ImportFrom, ast.Pass)):
+        return True
+    return isinstance(node, ast.Expr) and isinstance(node.value, ast.Constant) and isinstance(node.value.value, str)
+
+
+def extract_symbols(code: str, source: str) -> List[Dict[str, Any]]:
+    """
+    Divide um arquivo de código em símbolos de nível superior.
+
+    Arquivos Python são analisados com ast: cada função/classe vira um
+    símbolo (classes registram os métodos em 'members'); o restante do
+    módulo (exceto imports e docstrings) vira o símbolo MODULE_SYMBOL.
+    Outras linguagens, ou código com erro de sintaxe, formam um único
+    símbolo MODULE_SYMBOL com o arquivo inteiro.
+
+    Args:
+        code: Conteúdo do arquivo
+        source: Caminho do arquivo (a extensão define o parser)
+
+    Returns:
+        Lista de símbolos com name, kind, start_line, end_line, code,
+        hash e members, na ordem do arquivo
+    """
+    if not source.endswith('.py'):
+        return [_module_symbol(code)]
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return [_module_symbol(code)]
+
+    lines = code.splitlines(keepends=True)
+    symbols = []
+    module_nodes = []
+    for node in tree.body:
+        start = min([d.lineno for d in getattr(node, 'decorator_list', [])] + [node.lineno])
+        end = node.end_lineno
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            segment = ''.join(lines[start - 1:end])
+            members = {}
+            if isinstance(node, ast.ClassDef):
+                members = {
+                    f"{node.name}.{child.name}": [child.lineno, child.end_lineno]
+                    for child in node.body
+                    if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef))
+                }
+            symbols.append({
+                'name': node.name,
+                'kind': 'class' if isinstance(node, ast.ClassDef) else 'function',
+                'start_line': start,
+                'end_line': end,
+                'code': segment,
+                'hash': _hash(segment),
+                'members': members
+            })
+        elif not _is_trivial(node):
+            module_nodes.append((start, end))
+
+    if module_nodes:
+        segment = ''.join(''.join(lines[start - 1:end]) for start, end in module_nodes)
+        symbols.append(_module_symbol(segment, module_nodes[0][0], module_nodes[-1][1]))
+    return symbols or [_module_symbol(code)]
+
+
+# ================================
+# ÍNDICE LATERAL
+# ================================
+class SymbolIndex:
+    """
+    Índice arquivo -> símbolo -> chunks, com tabelas de busca em memória.
+
+    Args:
+        path: Arquivo JSON do índice
+        files: Conteúdo do índice ({source: {'next_chunk', 'symbols'}})
+    """
+
+    def __init__(self, path: str, files: Optional[Dict[str, Any]] = None):
+        self.path = path
+        self.files: Dict[str, Any] = files or {}
+        self._build_lookup()
+
+    @classmethod
+    def load(cls, db_path: str) -> "SymbolIndex":
+        """Carrega o índice do banco (vazio se ainda não existir)."""
+        path = os.path.join(db_path, SYMBOL_INDEX_FILE)
+        if not os.path.exists(path):
+            return cls(path)
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(path, json.load(f).get('files', {}))
+
+    def save(self):
+        """Grava o índice (substituição atômica do arquivo)."""
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'updated_at': datetime.now().isoformat(), 'files': self.files}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def __len__(self) -> int:
+        return sum(len(entry['symbols']) for entry in self.files.values())
+
+    def _build_lookup(self):
+        """Tabelas nome -> [(source, símbolo)] e arquivo -> source."""
+        self._by_name: Dict[str, List[tuple]] = {}
+        self._by_file: Dict[str, List[str]] = {}
+        for source, entry in self.files.items():
+            for key in {source.lower(), os.path.basename(source).lower()}:
+                self._by_file.setdefault(key, []).append(source)
+            for name, symbol in entry['symbols'].items():
+                if name == MODULE_SYMBOL:
+                    continue
+                aliases = {name}
+                for member in symbol.get('members', {}):
+                    aliases.update({member, member.split('.', 1)[1]})
+                for alias in aliases:
+                    self._by_name.setdefault(alias.lower(), []).append((source, name))
+
+    # ---------- Consulta ----------
+    def file_symbols(self, source: str) -> Dict[str, Any]:
+        """Símbolos registrados para o arquivo (vazio se desconhecido)."""
+        return self.files.get(source, {}).get('symbols', {})
+
+    def resolve(self, query: str) -> List[Dict[str, Any]]:
+        """
+        Símbolos e arquivos citados na consulta (busca O(1) por token).
+
+        Returns:
+            Lista de correspondências com source, symbol (None para o
+            arquivo inteiro), start_line, end_line e chunks (chunk_index)
+        """
+        matches, seen = [], set()
+        for token in _TOKEN_PATTERN.findall(query):
+            token = token.rstrip('./-').lower()
+            for source, name in self._by_name.get(token, []):
+                if (source, name) in seen:
+                    continue
+                seen.add((source, name))
+                symbol = self.files[source]['symbols'][name]
+                start, end = symbol['start_line'], symbol['end_line']
+                member = next((m for m in symbol.get('members', {}) if token in (m.lower(), m.split('.', 1)[1].lower())), None)
+                if member is not None:
+                    start, end = symbol['members'][member]
+                matches.append({
+                    'source': source, 'symbol': member or name,
+                    'start_line': start, 'end_line': end, 'chunks': symbol['chunks']
+                })
+            for source in self._by_file.get(token, []):
+                if (source, None) in seen:
+                    continue
+                seen.add((source, None))
+                symbols = self.files[source]['symbols'].values()
+                matches.append({
+                    'source': source, 'symbol': None,
+                    'start_line': min((s['start_line'] for s in symbols), default=1),
+                    'end_line': max((s['end_line'] for s in symbols), default=1),
+                    'chunks': sorted(i for s in symbols for i in s['chunks'])
+                })
+        return matches
+
+    def resolve_positions(self, query: str) -> List[tuple]:
+        """Chunks (source, chunk_index) dos símbolos/arquivos citados, sem repetição."""
+        positions = []
+        for match in self.resolve(query):
+            positions.extend((match['source'], i) for i in match['chunks'])
+        return list(dict.fromkeys(positions))
+
+    # ---------- Atualização ----------
+    def diff_file(self, source: str, symbols: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Compara os símbolos atuais do arquivo com os registrados.
+
+        Returns:
+            Dicionário com 'changed' (símbolos novos ou com hash diferente),
+            'unchanged' (nomes mantidos) e 'stale_chunks' (chunk_index dos
+            símbolos alterados ou removidos)
+        """
+        previous = self.file_symbols(source)
+        current = {s['name']: s for s in symbols}
+        unchanged = [
+            name for name, symbol in current.items()
+            if name in previous and previous[name]['hash'] == symbol['hash']
+        ]
+        stale_chunks = sorted(
+            i for name, symbol in previous.items() if name not in unchanged for i in symbol['chunks']
+        )
+        return {
+            'changed': [s for s in symbols if s['name'] not in unchanged],
+            'unchanged': unchanged,
+            'stale_chunks': stale_chunks
+        }
+
+    def next_chunk(self, source: str) -> int:
+        """Próximo chunk_index livre do arquivo (índices não são reutilizados)."""
+        return self.files.get(source, {}).get('next_chunk', 0)
+
+    def update_file(self, source: str, symbols: List[Dict[str, Any]], chunks: Dict[str, List[int]], next_chunk: int):
+        """
+        Registra os símbolos do arquivo e os chunks gerados por cada um.
+
+        Args:
+            source: Caminho do arquivo (metadado 'source')
+            symbols: Símbolos atuais (extract_symbols)
+            chunks: chunk_index por símbolo; símbolos ausentes mantêm os
+                chunks registrados (não alterados)
+            next_chunk: Próximo chunk_index livre do arquivo
+        """
+        previous = self.file_symbols(source)
+        self.files[source] = {
+            'next_chunk': next_chunk,
+            'symbols': {
+                s['name']: {
+                    'kind': s['kind'],
+                    'start_line': s['start_line'],
+                    'end_line': s['end_line'],
+                    'hash': s['hash'],
+                    'members': s['members'],
+                    'chunks': chunks[s['name']] if s['name'] in chunks else previous.get(s['name'], {}).get('chunks', [])
+                }
+                for s in symbols
+            }
+        }
+        self._build_lookup()
+
+    def remove_files(self, sources: Iterable[str]):
+        """Remove os arquivos do índice (ex.: deletados)."""
+        for source in sources:
+            self.files.pop(source, None)
+        self._build_lookup()
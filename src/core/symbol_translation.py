@@ -0,0 +1,142 @@
+"""
+Módulo de Tradução de Símbolos - Código em Regras de Negócio, em Lote
+=====================================================================
+
+Usado pelo bootstrap (bootstrap_project.py) e pela ingestão delta: o
+código de cada arquivo é traduzido por símbolo (função/classe de nível
+superior, ver symbol_index.extract_symbols), para que cada regra saiba o
+símbolo de origem.
+
+Uma chamada ao LLM por símbolo multiplicaria o custo da ingestão pelo
+número de funções do projeto. Os símbolos de um arquivo são agrupados em
+poucas chamadas (até SYMBOLS_PER_PROMPT símbolos e MAX_PROMPT_CODE_CHARS
+caracteres de código por chamada); o LLM responde uma seção por trecho
+("### TRECHO <n>") e a resposta é dividida de volta por símbolo. Um arquivo
+pequeno continua custando uma única chamada.
+
+Custo: ceil(símbolos / SYMBOLS_PER_PROMPT) chamadas por arquivo de código,
+mais uma chamada por símbolo cuja seção não veio na resposta. O tamanho
+do grupo pode ser ajustado pela variável de ambiente
+TRANSLATION_SYMBOLS_PER_PROMPT (1 = uma chamada por símbolo).
+"""
+
+import os
+import re
+from typing import Dict, List
+
+# ================================
+# CONFIGURAÇÕES
+# ================================
+SYMBOLS_PER_PROMPT = max(1, int(os.getenv("TRANSLATION_SYMBOLS_PER_PROMPT", "8")))
+# Símbolos maiores que o limite vão sozinhos em uma chamada
+MAX_PROMPT_CODE_CHARS = 12000
+
+SYMBOLS_TO_RULES_PROMPT = """Você é um analista de negócios especializado em extrair regras de negócio de código-fonte.
+
+Analise cada trecho de código abaixo e extraia TODAS as regras de negócio (explícitas e implícitas) de cada um.
+
+Arquivo: {filename}
+Tipo: {filetype}
+
+{symbols}
+
+Responda com uma seção por trecho, na mesma ordem, começando cada seção exatamente
+com a linha "### TRECHO <número>". Em cada seção, para cada regra identificada, use o formato:
+"Regra [N]: [Descrição clara da regra em português]"
+
+Regras:"""
+
+_SECTION = re.compile(r"^\s*#+\s*TRECHO\s+(\d+)\b.*$", re.MULTILINE | re.IGNORECASE)
+
+
+def group_symbols(symbols: List[Dict], per_prompt: int = SYMBOLS_PER_PROMPT,
+                  max_chars: int = MAX_PROMPT_CODE_CHARS) -> List[List[int]]:
+    """Agrupa os símbolos (posições) em chamadas, na ordem do arquivo."""
+    groups: List[List[int]] = []
+    size = 0
+    for i, symbol in enumerate(symbols):
+        length = len(symbol['code'])
+        if not groups or len(groups[-1]) >= per_prompt or size + length > max_chars:
+            groups.append([])
+            size = 0
+        groups[-1].append(i)
+        size += length
+    return groups
+
+
+def format_symbols(symbols: List[Dict]) -> str:
+    """Trechos numerados do prompt (a numeração é a chave das seções da resposta)."""
+    return "\n\n".join(
+        f"### TRECHO {n}: {symbol['name']}\n```\n{symbol['code']}\n```"
+        for n, symbol in enumerate(symbols, 1)
+    )
+
+
+def split_sections(text: str, count: int) -> Dict[int, str]:
+    """
+    Divide a resposta do LLM por trecho.
+
+    Returns:
+        Dicionário posição no grupo (0..count-1) -> regras; seções vazias
+        ou fora do intervalo são descartadas. Em um grupo de um único
+        símbolo, uma resposta sem marcadores vale inteira.
+    """
+    markers = list(_SECTION.finditer(text))
+    if not markers:
+        return {0: text.strip()} if count == 1 and text.strip() else {}
+    sections = {}
+    for marker, following in zip(markers, markers[1:] + [None]):
+        position = int(marker.group(1)) - 1
+        body = text[marker.end():following.start() if following else len(text)].strip()
+        if 0 <= position < count and body and position not in sections:
+            sections[position] = body
+    return sections
+
+
+def translate_symbols(symbols: List[Dict], filename: str, filetype: str, llm,
+                      per_prompt: int = SYMBOLS_PER_PROMPT) -> List[str]:
+    """
+    Traduz os símbolos de um arquivo em regras de negócio, vários por chamada.
+
+    As chamadas rodam concorrentemente (batch). Símbolos sem seção na
+    resposta são traduzidos de novo, um por chamada; se ainda assim
+    falharem, o código do símbolo é usado como fallback.
+
+    Args:
+        symbols: Símbolos do arquivo (extract_symbols)
+        filename: Nome do arquivo (contexto do prompt)
+        filetype: Extensão do arquivo (contexto do prompt)
+        llm: Modelo de chat usado na tradução
+        per_prompt: Máximo de símbolos por chamada
+
+    Returns:
+        Regras de cada símbolo, na ordem de symbols
+    """
+    from langchain_core.prompts import PromptTemplate
+    chain = PromptTemplate.from_template(SYMBOLS_TO_RULES_PROMPT) | llm
+    rules: List[str] = [None] * len(symbols)
+
+    def run(groups: List[List[int]]) -> int:
+        responses = chain.batch([
+            {"symbols": format_symbols([symbols[i] for i in group]), "filename": filename, "filetype": filetype}
+            for group in groups
+        ], return_exceptions=True)
+        for group, response in zip(groups, responses):
+            if isinstance(response, Exception):
+                print(f"  ⚠️  Erro na tradução de {filename} ({len(group)} símbolo(s)): {response}")
+                continue
+            for position, text in split_sections(response.content, len(group)).items():
+                rules[group[position]] = text
+        return len(groups)
+
+    calls = run(group_symbols(symbols, per_prompt))
+    missing = [i for i, text in enumerate(rules) if text is None]
+    if missing and per_prompt > 1:
+        calls += run([[i] for i in missing])
+    print(f"    🔄 {filename}: {len(symbols)} símbolo(s) traduzido(s) em {calls} chamada(s)")
+
+    for i, symbol in enumerate(symbols):
+        if rules[i] is None:
+            print(f"  ⚠️  Sem tradução para {filename}:{symbol['name']}; usando o código original")
+            rules[i] = symbol['code']
+    return rules
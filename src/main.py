@@ -1,9 +1,24 @@
 import os
+import json
 import shutil
 import sys
 from core.ingestion import create_vector_store
 from core.delta_ingestion import process_changed_files, get_changed_files_from_git
-from core.rag_pipeline import setup_rag_chain, generate_test_plan
+from core.rag_pipeline import (
+    setup_rag_chain, generate_test_plan, stream_test_plan,
+    generate_test_plans_batch, generation_profile, DEFAULT_MAX_CONCURRENCY
+)
+from core.context_packing import CONTEXT_TOKEN_BUDGET
+from core.ivf_index import DEFAULT_NPROBE
+from core.retrieval import DEFAULT_N_FILES
+from core.query_service import serve, DEFAULT_HOST, DEFAULT_PORT
+from core.admission import GenerationGate, DEFAULT_MAX_INFLIGHT, DEFAULT_MAX_QUEUE, index_version
+from core.query_log import PREFETCH_TOP_N
+from core.deadline import generate_with_deadline, stream_with_deadline
+from core.plan_cache import PlanCache
+from core.plan_store import save_plan, refresh_plans
+from core.coverage_sweep import run_sweep
+from core.map_reduce import generate_test_plan_map_reduce
 from dotenv import load_dotenv
 
 # Carrega variáveis de ambiente
@@ -15,6 +30,32 @@ DATA_DIR = os.path.join(PROJECT_ROOT, "data")
 CODE_FILE = os.path.join(DATA_DIR, "code_example.py")
 DOC_FILE = os.path.join(DATA_DIR, "doc_example.md")
 DB_DIR = os.path.join(PROJECT_ROOT, "chroma_db")
+# Planos .feature persistidos (--save-plans / --refresh-plans)
+PLANS_DIR = os.path.join(PROJECT_ROOT, "features")
+
+# Cenários de validação usados por --multi-scenario
+SCENARIOS = [
+    {
+        "name": "Cálculo de Frete Regional",
+        "query": "Gere cenários de teste BDD para o cálculo de frete considerando diferentes regiões do Brasil e clientes Prime."
+    },
+    {
+        "name": "Validação de Cupons",
+        "query": "Gere cenários de teste BDD para validação de cupons promocionais (BLACKFRIDAY, NEWUSER, VIP10)."
+    },
+    {
+        "name": "Parcelamento de Pedidos",
+        "query": "Gere cenários de teste BDD para o sistema de parcelamento, incluindo regras de juros e parcela mínima."
+    },
+    {
+        "name": "Cadastro de Cliente",
+        "query": "Gere cenários de teste BDD para validação de cadastro de novos clientes, incluindo CPF, idade, email e telefone."
+    },
+    {
+        "name": "Programa de Fidelidade",
+        "query": "Gere cenários de teste BDD para o acúmulo de pontos no programa de fidelidade considerando diferentes tiers de clientes."
+    }
+]
 
 def run_ingestion(force_clean: bool = True):
     """
@@ -50,12 +91,87 @@ def run_ingestion(force_clean: bool = True):
         traceback.print_exc()
         return False
 
-def run_generation(query: str):
+def print_plan_result(plan_result: dict, tokens=None):
+    """
+    Imprime as regras utilizadas, o plano gerado e as métricas.
+    
+    Args:
+        plan_result: Resultado de generate_test_plan/stream_test_plan
+        tokens: Iterador de tokens (modo streaming); o plano é impresso
+                conforme os tokens chegam
+    """
+    print("=" * 80)
+    print("RESULTADO DA GERAÇÃO")
+    print("=" * 80)
+    
+    print(f"\n📌 Consulta: {plan_result['query']}")
+    
+    print("\n🔗 REGRAS DE NEGÓCIO UTILIZADAS (CONTEXTO RAG):")
+    retrieval = plan_result.get('retrieval', {})
+    if retrieval.get('scores'):
+        print(f"   k={retrieval['retrieval_k']} | scores: "
+              f"min={retrieval['score_min']} máx={retrieval['score_max']} média={retrieval['score_mean']}")
+    elif retrieval.get('resolved_by'):
+        print(f"   k={retrieval['retrieval_k']} | resolvido por: {retrieval['resolved_by']} ")
+    print("-" * 80)
+    for i, rule in enumerate(plan_result['source_rules'], 1):
+        print(f"\n{i}. {rule}")
+        
+    print("\n\n📋 PLANO DE TESTES BDD GERADO:")
+    print("=" * 80)
+    if tokens is not None:
+        for token in tokens:
+            print(token, end="", flush=True)
+        print()
+    else:
+        print(plan_result['test_plan'])
+    print("=" * 80)
+    
+    metrics = plan_result['metrics']
+    if 'prompt_tokens' in metrics:
+        print(f"\n🔢 Tokens: prompt={metrics['prompt_tokens']} | "
+              f"contexto={metrics['context_tokens']} (bruto: {metrics['context_tokens_raw']}) | "
+              f"resposta={metrics['completion_tokens']}")
+    if 'served_by' in metrics:
+        print(f"⏳ Servido por: {metrics['served_by']} | total: {metrics['total_time_s']}s "
+              f"(prazo: {metrics['deadline_s']}s)")
+        if metrics['served_by'] == 'lexical_match':
+            print(f"   Plano da consulta com termos em comum: \"{metrics['matched_query']}\" "
+                  f"(sobreposição de termos: {metrics['term_overlap']}{', índice anterior' if metrics['stale'] else ''})")
+    if 'time_to_first_token_s' in metrics:
+        print(f"⏱️  Primeiro token: {metrics['time_to_first_token_s']}s | "
+              f"Total: {metrics['total_time_s']}s")
+    if metrics.get('routing'):
+        routing = metrics['routing']
+        print(f"🧭 Roteamento: {routing['tier']} ({routing['model']}, max_tokens={routing['max_tokens']}) | "
+              f"score={routing['score']} | resposta: {routing.get('completion_tokens')} tokens"
+              + (" | ⚠️  cortada pelo limite de saída" if routing.get('truncated') else ""))
+    if 'map_time_s' in metrics:
+        print(f"🧩 Map-reduce: {len(metrics['groups'])} grupos | cenários: {metrics['scenarios']} "
+              f"(duplicados removidos: {metrics['duplicates_removed']}) | "
+              f"map: {metrics['map_time_s']}s | total: {metrics['total_time_s']}s")
+        for group in metrics['groups']:
+            status = f"❌ {group['error']}" if 'error' in group else f"{group.get('completion_tokens')} tokens"
+            print(f"   - {group['label']}: {group['rules']} regras | {status}")
+
+def run_generation(query: str, rag_options: dict = None,
+                   context_budget: int = CONTEXT_TOKEN_BUDGET, stream: bool = False,
+                   map_reduce: bool = False, deadline_s: float = None,
+                   plans_dir: str = None):
     """
     Executa a fase de Geração Aumentada (RAG).
     
     Args:
         query: Pergunta/solicitação para gerar o plano de testes
+        rag_options: Opções de retrieval repassadas ao setup_rag_chain
+                     (ex.: search_type, query_split)
+        context_budget: Orçamento de tokens do contexto enviado ao LLM
+        stream: Se True, imprime o plano token a token conforme é gerado
+        map_reduce: Se True, gera o plano em paralelo por grupo de regras
+                    (tópico/arquivo) e junta os cenários (sem streaming)
+        deadline_s: Prazo total da geração; esgotado, serve um plano do
+                    cache ou o plano parcial (ignorado no map-reduce)
+        plans_dir: Se informado, grava o plano como .feature com as regras usadas
     """
     print("\n" + "=" * 80)
     print("FASE 2: GERAÇÃO DE TESTES (RAG)")
@@ -69,24 +185,30 @@ def run_generation(query: str):
     try:
         print(f"\n🔍 Query: {query}\n")
         
-        qa_chain, retriever = setup_rag_chain(DB_DIR)
-        plan_result = generate_test_plan(query, qa_chain, retriever)
+        qa_chain, retriever = setup_rag_chain(DB_DIR, **(rag_options or {}))
+        tokens = None
+        if map_reduce:
+            plan_result = generate_test_plan_map_reduce(query, qa_chain, retriever, context_budget)
+        elif deadline_s:
+            cache, version = PlanCache(DB_DIR), index_version(DB_DIR)
+            profile = generation_profile(context_budget, rag_options)
+            if stream:
+                plan_result, tokens = stream_with_deadline(
+                    query, qa_chain, retriever, deadline_s, context_budget, cache, version, profile
+                )
+            else:
+                plan_result = generate_with_deadline(
+                    query, qa_chain, retriever, deadline_s, context_budget, cache, version, profile
+                )
+        elif stream:
+            plan_result, tokens = stream_test_plan(query, qa_chain, retriever, context_budget)
+        else:
+            plan_result = generate_test_plan(query, qa_chain, retriever, context_budget)
         
-        print("=" * 80)
-        print("RESULTADO DA GERAÇÃO")
-        print("=" * 80)
+        print_plan_result(plan_result, tokens)
         
-        print(f"\n📌 Consulta: {plan_result['query']}")
-        
-        print("\n🔗 REGRAS DE NEGÓCIO UTILIZADAS (CONTEXTO RAG):")
-        print("-" * 80)
-        for i, rule in enumerate(plan_result['source_rules'], 1):
-            print(f"\n{i}. {rule}")
-            
-        print("\n\n📋 PLANO DE TESTES BDD GERADO:")
-        print("=" * 80)
-        print(plan_result['test_plan'])
-        print("=" * 80)
+        if plans_dir and plan_result['metrics'].get('served_by', 'generated') == 'generated':
+            print(f"\n💾 Plano gravado em: {save_plan(plans_dir, plan_result, DB_DIR)}")
         
         return True
         
@@ -96,48 +218,217 @@ def run_generation(query: str):
         traceback.print_exc()
         return False
 
-def run_multiple_scenarios():
+def run_multiple_scenarios(rag_options: dict = None,
+                           context_budget: int = CONTEXT_TOKEN_BUDGET, stream: bool = False,
+                           max_concurrency: int = DEFAULT_MAX_CONCURRENCY):
     """
     Roda múltiplos cenários de teste para validar o sistema.
+    
+    Em terminais interativos, pausa entre os cenários; em CI (stdin
+    não-TTY) os cenários são gerados concorrentemente, sem pausas, com
+    no máximo max_concurrency gerações simultâneas.
     """
     print("\n" + "=" * 80)
     print("TESTE DE MÚLTIPLOS CENÁRIOS")
     print("=" * 80)
     
-    scenarios = [
-        {
-            "name": "Cálculo de Frete Regional",
-            "query": "Gere cenários de teste BDD para o cálculo de frete considerando diferentes regiões do Brasil e clientes Prime."
-        },
-        {
-            "name": "Validação de Cupons",
-            "query": "Gere cenários de teste BDD para validação de cupons promocionais (BLACKFRIDAY, NEWUSER, VIP10)."
-        },
-        {
-            "name": "Parcelamento de Pedidos",
-            "query": "Gere cenários de teste BDD para o sistema de parcelamento, incluindo regras de juros e parcela mínima."
-        },
-        {
-            "name": "Cadastro de Cliente",
-            "query": "Gere cenários de teste BDD para validação de cadastro de novos clientes, incluindo CPF, idade, email e telefone."
-        },
-        {
-            "name": "Programa de Fidelidade",
-            "query": "Gere cenários de teste BDD para o acúmulo de pontos no programa de fidelidade considerando diferentes tiers de clientes."
-        }
-    ]
-    
-    for i, scenario in enumerate(scenarios, 1):
+    if not sys.stdin.isatty():
+        # Sem terminal (CI): todos os cenários em lote, com retrieval em uma única chamada
+        if not os.path.exists(DB_DIR):
+            print("\n❌ ERRO: Banco de Dados Vetorial não encontrado.")
+            print("Execute a ingestão primeiro.")
+            return
+        
+        qa_chain, retriever = setup_rag_chain(DB_DIR, **(rag_options or {}))
+        results = generate_test_plans_batch(
+            [scenario['query'] for scenario in SCENARIOS], qa_chain, retriever,
+            max_concurrency=max_concurrency, context_token_budget=context_budget
+        )
+        for i, (scenario, plan_result) in enumerate(zip(SCENARIOS, results), 1):
+            print(f"\n{'=' * 80}")
+            print(f"CENÁRIO {i}/{len(SCENARIOS)}: {scenario['name']}")
+            print(f"{'=' * 80}")
+            if 'error' in plan_result:
+                print(f"\n❌ ERRO durante a geração de testes: {plan_result['error']}")
+            else:
+                print_plan_result(plan_result)
+        return
+    
+    for i, scenario in enumerate(SCENARIOS, 1):
         print(f"\n{'=' * 80}")
-        print(f"CENÁRIO {i}/{len(scenarios)}: {scenario['name']}")
+        print(f"CENÁRIO {i}/{len(SCENARIOS)}: {scenario['name']}")
         print(f"{'=' * 80}")
         
-        run_generation(scenario['query'])
+        run_generation(scenario['query'], rag_options, context_budget, stream)
         
-        if i < len(scenarios):
+        if i < len(SCENARIOS):
             print("\n\n⏸️  Pressione Enter para continuar para o próximo cenário...")
             input()
 
+def load_batch_queries(input_path: str) -> list:
+    """
+    Lê as consultas do modo lote (JSONL).
+    
+    Cada linha é um objeto com o campo "query" (demais campos, como "id",
+    são repassados ao resultado) ou apenas uma string JSON.
+    
+    Args:
+        input_path: Caminho do arquivo JSONL ou '-' para stdin
+    """
+    stream = sys.stdin if input_path == '-' else open(input_path, 'r', encoding='utf-8')
+    items = []
+    try:
+        for line_number, line in enumerate(stream, 1):
+            line = line.strip()
+            if not line:
+                continue
+            item = json.loads(line)
+            if isinstance(item, str):
+                item = {"query": item}
+            if not isinstance(item, dict) or not item.get("query"):
+                raise ValueError(f"Linha {line_number}: campo 'query' ausente")
+            items.append(item)
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+    return items
+
+def run_batch(input_path: str, output, rag_options: dict = None,
+              context_budget: int = CONTEXT_TOKEN_BUDGET,
+              max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+              plans_dir: str = None) -> int:
+    """
+    Gera planos de teste em lote, sem interação, escrevendo JSONL.
+    
+    Args:
+        input_path: Arquivo JSONL com as consultas ou '-' para stdin
+        output: Stream de saída dos resultados (uma linha JSON por consulta)
+        rag_options: Opções de retrieval repassadas ao setup_rag_chain
+        context_budget: Orçamento de tokens do contexto de cada consulta
+        max_concurrency: Máximo de gerações simultâneas
+        plans_dir: Se informado, grava cada plano como .feature com as regras usadas
+        
+    Returns:
+        Quantidade de consultas que falharam
+    """
+    print("\n" + "=" * 80)
+    print("GERAÇÃO EM LOTE (JSONL)")
+    print("=" * 80)
+    
+    if not os.path.exists(DB_DIR):
+        print("\n❌ ERRO: Banco de Dados Vetorial não encontrado.")
+        print("Execute a ingestão primeiro.")
+        return 1
+    
+    items = load_batch_queries(input_path)
+    print(f"\n📥 {len(items)} consulta(s) carregada(s) de: {input_path}")
+    if not items:
+        return 0
+    
+    qa_chain, retriever = setup_rag_chain(DB_DIR, **(rag_options or {}))
+    results = generate_test_plans_batch(
+        [item["query"] for item in items], qa_chain, retriever,
+        max_concurrency=max_concurrency, context_token_budget=context_budget
+    )
+    
+    errors = 0
+    for item, result in zip(items, results):
+        if "error" in result:
+            errors += 1
+        elif plans_dir:
+            save_plan(plans_dir, result, DB_DIR)
+        output.write(json.dumps({**item, **result}, ensure_ascii=False) + "\n")
+    output.flush()
+    
+    print(f"\n✅ {len(results) - errors}/{len(results)} plano(s) gerado(s)")
+    if errors:
+        print(f"❌ Falhas: {errors}")
+    return errors
+
+def run_refresh_plans(plans_dir: str, rag_options: dict = None,
+                      context_budget: int = CONTEXT_TOKEN_BUDGET,
+                      max_concurrency: int = DEFAULT_MAX_CONCURRENCY) -> int:
+    """
+    Gera de novo apenas os planos .feature cujas regras mudaram no índice.
+    
+    Args:
+        plans_dir: Diretório dos planos gravados com --save-plans
+        rag_options: Opções de retrieval repassadas ao setup_rag_chain
+        context_budget: Orçamento de tokens do contexto de cada plano
+        max_concurrency: Máximo de gerações simultâneas
+        
+    Returns:
+        Quantidade de planos que falharam
+    """
+    print("\n" + "=" * 80)
+    print("ATUALIZAÇÃO INCREMENTAL DOS PLANOS")
+    print("=" * 80)
+    
+    if not os.path.exists(DB_DIR):
+        print("\n❌ ERRO: Banco de Dados Vetorial não encontrado.")
+        print("Execute a ingestão primeiro.")
+        return 1
+    if not os.path.isdir(plans_dir):
+        print(f"\n⚠️  Nenhum plano gravado em: {plans_dir}")
+        return 0
+    
+    qa_chain, retriever = setup_rag_chain(DB_DIR, **(rag_options or {}))
+    stats = refresh_plans(plans_dir, DB_DIR, qa_chain, retriever, max_concurrency, context_budget)
+    return stats['errors']
+
+def run_coverage_sweep(output, rag_options: dict = None,
+                       context_budget: int = CONTEXT_TOKEN_BUDGET,
+                       max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+                       plans_dir: str = None) -> int:
+    """
+    Gera um plano BDD para cada símbolo/grupo de regras do índice (JSONL).
+    
+    Retoma uma varredura interrompida e pula as unidades cujo plano está atual.
+    
+    Args:
+        output: Stream de saída dos resultados (uma linha JSON por unidade)
+        rag_options: Opções repassadas ao setup_rag_chain
+        context_budget: Orçamento de tokens do contexto de cada unidade
+        max_concurrency: Máximo de gerações simultâneas
+        plans_dir: Se informado, grava cada plano como .feature com as regras usadas
+        
+    Returns:
+        Quantidade de unidades que falharam
+    """
+    print("\n" + "=" * 80)
+    print("VARREDURA DE COBERTURA (UM PLANO POR UNIDADE)")
+    print("=" * 80)
+    
+    if not os.path.exists(DB_DIR):
+        print("\n❌ ERRO: Banco de Dados Vetorial não encontrado.")
+        print("Execute a ingestão primeiro.")
+        return 1
+    
+    qa_chain, _ = setup_rag_chain(DB_DIR, **(rag_options or {}))
+    stats = run_sweep(DB_DIR, qa_chain, output, plans_dir, max_concurrency, context_budget)
+    return stats['errors']
+
+def start_prefetch(rag_options: dict = None, context_budget: int = CONTEXT_TOKEN_BUDGET,
+                   top_n: int = PREFETCH_TOP_N):
+    """
+    Pré-gera em segundo plano, no cache de planos, as consultas mais frequentes.
+    
+    Args:
+        rag_options: Opções de retrieval repassadas ao setup_rag_chain
+        context_budget: Orçamento de tokens do contexto de cada plano
+        top_n: Quantidade de consultas populares (log de consultas anonimizadas)
+        
+    Returns:
+        Thread da pré-geração ou None se não houver o que pré-gerar
+    """
+    gate = GenerationGate(DB_DIR, rag_options=rag_options)
+    queries = [item['query'] for item in gate.query_log.top_queries(top_n, skip_masked=True)]
+    if not queries:
+        print("\n🔥 Pré-geração: nenhuma consulta recorrente no log")
+        return None
+    qa_chain, retriever = setup_rag_chain(DB_DIR, **(rag_options or {}))
+    return gate.prefetch(qa_chain, retriever, queries, context_token_budget=context_budget)
+
 if __name__ == "__main__":
     import argparse
     
@@ -152,10 +443,102 @@ if __name__ == "__main__":
                         help='Executa múltiplos cenários de teste')
     parser.add_argument('--query', type=str,
                         help='Query personalizada para geração de testes')
+    parser.add_argument('--search-type', choices=['similarity', 'mmr'], default='similarity',
+                        help='Modo de retrieval: similarity (top-k) ou mmr (diversidade)')
+    parser.add_argument('--query-split', choices=['none', 'heuristic', 'llm'], default='none',
+                        help='Divide pedidos com vários tópicos em sub-consultas (heurística local ou LLM)')
+    parser.add_argument('--backend', choices=['chroma', 'flat', 'ivf'], default='chroma',
+                        help='Backend vetorial: chroma, flat (matriz memory-mapped, busca exata) '
+                             'ou ivf (partições k-means, busca aproximada)')
+    parser.add_argument('--nprobe', type=int, default=DEFAULT_NPROBE,
+                        help=f'Partições sondadas por consulta no backend ivf (padrão: {DEFAULT_NPROBE})')
+    parser.add_argument('--quantization', choices=['none', 'int8', 'binary'], default='none',
+                        help='Primeira passada com vetores quantizados nos backends flat/ivf')
+    parser.add_argument('--rescore-dtype', choices=['float32', 'float16'], default='float32',
+                        help='Precisão da re-pontuação dos candidatos quantizados')
+    parser.add_argument('--pca', action='store_true',
+                        help='Primeira passada com vetores reduzidos por PCA nos backends flat/ivf')
+    parser.add_argument('--hierarchical', action='store_true',
+                        help='Busca em dois estágios: escolhe os arquivos mais próximos e busca os chunks neles')
+    parser.add_argument('--n-files', type=int, default=DEFAULT_N_FILES,
+                        help=f'Arquivos escolhidos no primeiro estágio do modo hierárquico (padrão: {DEFAULT_N_FILES})')
+    parser.add_argument('--no-symbol-lookup', action='store_true',
+                        help='Desativa a inclusão direta dos chunks de símbolos/arquivos citados na consulta (apenas busca vetorial)')
+    parser.add_argument('--score-threshold', type=float,
+                        help='Score mínimo (cosseno) das regras recuperadas; ativa o k adaptativo')
+    parser.add_argument('--elbow', action='store_true',
+                        help='Corta as regras no cotovelo da curva de scores; ativa o k adaptativo')
+    parser.add_argument('--min-k', type=int,
+                        help='Mínimo de regras no modo de k adaptativo (padrão: 1)')
+    parser.add_argument('--max-k', type=int,
+                        help='Máximo de regras no modo de k adaptativo (padrão: 10)')
+    parser.add_argument('--context-budget', type=int, default=CONTEXT_TOKEN_BUDGET,
+                        help=f'Orçamento de tokens do contexto RAG (padrão: {CONTEXT_TOKEN_BUDGET})')
+    parser.add_argument('--stream', action='store_true',
+                        help='Exibe o plano de testes token a token conforme é gerado')
+    parser.add_argument('--map-reduce', action='store_true',
+                        help='Gera o plano em paralelo por grupo de regras (tópico/arquivo) e junta os cenários')
+    parser.add_argument('--deadline', type=float, metavar='SEGUNDOS',
+                        help='Prazo total de cada geração; esgotado, serve um plano do cache ou o plano parcial')
+    parser.add_argument('--save-plans', action='store_true',
+                        help='Grava os planos gerados como .feature, com as regras usadas (ver --plans-dir)')
+    parser.add_argument('--refresh-plans', action='store_true',
+                        help='Após a ingestão, gera de novo apenas os planos .feature cujas regras mudaram')
+    parser.add_argument('--plans-dir', default=PLANS_DIR,
+                        help=f'Diretório dos planos .feature (padrão: {PLANS_DIR})')
+    parser.add_argument('--route', action='store_true',
+                        help='Escolhe modelo e limite de tokens de saída pela complexidade de cada requisição')
+    parser.add_argument('--batch', type=str, metavar='ARQUIVO',
+                        help="Modo lote: lê consultas de um JSONL ('-' para stdin) e escreve resultados JSONL")
+    parser.add_argument('--sweep', action='store_true',
+                        help='Gera um plano por símbolo/grupo de regras do índice (JSONL, retomável; '
+                             'pula unidades com plano atual)')
+    parser.add_argument('--output', type=str, default='-',
+                        help="Arquivo de saída do modo lote ou da varredura ('-' para stdout)")
+    parser.add_argument('--serve', action='store_true',
+                        help='Inicia o serviço HTTP local de consultas (cadeia RAG carregada uma única vez)')
+    parser.add_argument('--host', default=DEFAULT_HOST,
+                        help=f'Endereço do serviço HTTP (padrão: {DEFAULT_HOST})')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT,
+                        help=f'Porta do serviço HTTP (padrão: {DEFAULT_PORT})')
+    parser.add_argument('--prefetch-top', type=int, default=PREFETCH_TOP_N, metavar='N',
+                        help=f'Após a ingestão, pré-gera no cache os planos das N consultas mais frequentes '
+                             f'(padrão: {PREFETCH_TOP_N}; 0 desativa)')
+    parser.add_argument('--max-concurrency', type=int, default=DEFAULT_MAX_CONCURRENCY,
+                        help=f'Máximo de gerações simultâneas no modo lote, na varredura e nos múltiplos cenários sem terminal (padrão: {DEFAULT_MAX_CONCURRENCY})')
+    parser.add_argument('--max-inflight', type=int, default=DEFAULT_MAX_INFLIGHT,
+                        help=f'Máximo de chamadas simultâneas ao LLM no serviço (padrão: {DEFAULT_MAX_INFLIGHT})')
+    parser.add_argument('--max-queue', type=int, default=DEFAULT_MAX_QUEUE,
+                        help=f'Máximo de gerações aguardando na fila de admissão do serviço (padrão: {DEFAULT_MAX_QUEUE})')
     
     args = parser.parse_args()
+    rag_options = {
+        'search_type': args.search_type,
+        'query_split': args.query_split,
+        'min_k': args.min_k,
+        'max_k': args.max_k,
+        'score_threshold': args.score_threshold,
+        'elbow': args.elbow,
+        'backend': args.backend,
+        'nprobe': args.nprobe,
+        'quantization': None if args.quantization == 'none' else args.quantization,
+        'rescore_dtype': args.rescore_dtype,
+        'pca': args.pca,
+        'hierarchical': args.hierarchical,
+        'n_files': args.n_files,
+        'symbol_lookup': not args.no_symbol_lookup,
+        'routing': args.route
+    }
+    
+    plans_dir = args.plans_dir if args.save_plans else None
+    
+    # Em modo lote/varredura, stdout fica reservado aos resultados JSONL; os logs vão para stderr
+    results_output = sys.stdout
+    if args.batch or args.sweep:
+        sys.stdout = sys.stderr
     
     # 1. Executa a Ingestão (se não for pulada)
+    prefetch_thread = None
     if not args.skip_ingestion:
         if args.delta:
             # Modo delta: processa apenas alterações
@@ -180,20 +563,69 @@ if __name__ == "__main__":
             if not run_ingestion():
                 print("\n❌ Falha na ingestão. Encerrando.")
                 sys.exit(1)
+        
+        # Índice novo: consultas populares são pré-geradas em segundo plano
+        # (no serviço, pelo próprio gate do serviço)
+        if args.prefetch_top > 0 and not args.serve and os.path.exists(DB_DIR):
+            prefetch_thread = start_prefetch(rag_options, args.context_budget, args.prefetch_top)
     else:
         print("\n⏭️  Pulando ingestão (usando DB existente)")
     
     # 2. Executa a Geração de Testes
-    if args.multi_scenario:
+    if args.serve:
+        # Serviço de longa duração: atende /retrieve, /generate e /generate/stream
+        if not os.path.exists(DB_DIR):
+            print("\n❌ ERRO: Banco de Dados Vetorial não encontrado.")
+            print("Execute a ingestão primeiro.")
+            sys.exit(1)
+        prefetch_top = 0 if args.skip_ingestion else args.prefetch_top
+        serve(DB_DIR, args.host, args.port, rag_options, args.context_budget,
+              args.max_inflight, args.max_queue, args.deadline, prefetch_top)
+        sys.exit(0)
+    elif args.batch:
+        # Lote não-interativo (CI)
+        if args.output != '-':
+            results_output = open(args.output, 'w', encoding='utf-8')
+        try:
+            batch_errors = run_batch(args.batch, results_output, rag_options,
+                                     args.context_budget, args.max_concurrency, plans_dir)
+        finally:
+            if args.output != '-':
+                results_output.close()
+        if batch_errors:
+            sys.exit(1)
+    elif args.sweep:
+        # Varredura de cobertura; o arquivo de saída é continuado ao retomar
+        if args.output != '-':
+            results_output = open(args.output, 'a', encoding='utf-8')
+        try:
+            sweep_errors = run_coverage_sweep(results_output, rag_options, args.context_budget,
+                                              args.max_concurrency, plans_dir)
+        finally:
+            if args.output != '-':
+                results_output.close()
+        if sweep_errors:
+            sys.exit(1)
+    elif args.refresh_plans:
+        # Regeneração incremental: apenas planos com regras alteradas
+        if run_refresh_plans(args.plans_dir, rag_options, args.context_budget, args.max_concurrency):
+            sys.exit(1)
+    elif args.multi_scenario:
         # Múltiplos cenários
-        run_multiple_scenarios()
+        run_multiple_scenarios(rag_options, args.context_budget, args.stream, args.max_concurrency)
     elif args.query:
         # Query personalizada
-        run_generation(args.query)
+        run_generation(args.query, rag_options, args.context_budget, args.stream, args.map_reduce, args.deadline,
+                       plans_dir)
     else:
         # Query padrão
         test_query = "Gere cenários de teste BDD para o cálculo de frete e aplicação de cupons, incluindo o caso de cliente Prime e diferentes regiões."
-        run_generation(test_query)
+        run_generation(test_query, rag_options, args.context_budget, args.stream, args.map_reduce, args.deadline,
+                       plans_dir)
+    
+    if prefetch_thread is not None:
+        print("\n⏳ Aguardando a pré-geração das consultas populares...")
+        prefetch_thread.join()
     
     print("\n" + "=" * 80)
     print("✅ EXECUÇÃO CONCLUÍDA!")
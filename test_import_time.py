@@ -0,0 +1,120 @@
+"""
+Teste de Tempo de Importação - Inicialização da CLI e do App
+============================================================
+
+Comandos como `python src/main.py --help` ou `bootstrap_project.py --help`
+não devem carregar o SDK da OpenAI, o ChromaDB nem os loaders/splitters do
+LangChain: esses módulos são importados apenas no primeiro uso (ingestão,
+carga do banco, criação dos clientes).
+
+Para cada ponto de entrada, o script executa um processo Python novo com
+`-X importtime` e verifica:
+1. Nenhum módulo pesado (HEAVY_MODULES) foi importado
+2. O tempo total (melhor de N execuções) cabe no orçamento
+
+Uso:
+    python test_import_time.py
+    python test_import_time.py --budget 2.0 --runs 5
+"""
+
+import os
+import sys
+import time
+import argparse
+import subprocess
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Módulos que só devem ser importados no primeiro uso
+HEAVY_MODULES = (
+    'openai',
+    'langchain_openai',
+    'httpx',
+    'chromadb',
+    'langchain_chroma',
+    'langchain_community',
+    'langchain_text_splitters',
+    'pandas'
+)
+
+# Orçamento padrão (segundos) por ponto de entrada, incluindo a
+# inicialização do interpretador
+DEFAULT_BUDGET_S = 1.0
+DEFAULT_RUNS = 3
+
+ENTRY_POINTS = {
+    'src/main.py --help': ['src/main.py', '--help'],
+    'bootstrap_project.py --help': ['bootstrap_project.py', '--help'],
+    # Módulos importados pelo app.py antes da primeira interação
+    'app.py (módulos do core)': [
+        '-c', 'import src.core.ingestion, src.core.rag_pipeline, src.core.admission'
+    ]
+}
+
+
+def measure(args: list) -> dict:
+    """
+    Executa o comando com -X importtime e coleta os módulos importados.
+
+    Returns:
+        Dicionário com 'elapsed_s', 'modules' e 'returncode'
+    """
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', *args],
+        cwd=PROJECT_ROOT,
+        capture_output=True,
+        text=True
+    )
+    elapsed = time.perf_counter() - start
+    modules = set()
+    for line in result.stderr.splitlines():
+        if line.startswith('import time:') and '|' in line:
+            name = line.rsplit('|', 1)[1].strip()
+            if name != 'package':
+                modules.add(name)
+    return {'elapsed_s': elapsed, 'modules': modules, 'returncode': result.returncode}
+
+
+def check_entry_point(label: str, args: list, budget_s: float, runs: int) -> bool:
+    """Verifica módulos pesados e orçamento de tempo de um ponto de entrada."""
+    measurements = [measure(args) for _ in range(runs)]
+    best = min(m['elapsed_s'] for m in measurements)
+    modules = measurements[0]['modules']
+    heavy = sorted(name for name in modules if name in HEAVY_MODULES)
+
+    ok = measurements[0]['returncode'] == 0 and not heavy and best <= budget_s
+    status = "✅" if ok else "❌"
+    print(f"{status} {label}: {best:.2f}s (orçamento: {budget_s:.2f}s), {len(modules)} módulos")
+    if measurements[0]['returncode'] != 0:
+        print(f"   ⚠️  Processo terminou com código {measurements[0]['returncode']}")
+    if heavy:
+        print(f"   ⚠️  Módulos pesados importados na inicialização: {', '.join(heavy)}")
+    return ok
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Orçamento de tempo de importação dos pontos de entrada')
+    parser.add_argument('--budget', type=float, default=DEFAULT_BUDGET_S,
+                        help=f'Tempo máximo por ponto de entrada em segundos (padrão: {DEFAULT_BUDGET_S})')
+    parser.add_argument('--runs', type=int, default=DEFAULT_RUNS,
+                        help=f'Execuções por ponto de entrada; vale a melhor (padrão: {DEFAULT_RUNS})')
+    args = parser.parse_args()
+
+    print("=" * 70)
+    print("  TEMPO DE IMPORTAÇÃO DOS PONTOS DE ENTRADA")
+    print("=" * 70 + "\n")
+    results = [
+        check_entry_point(label, entry_args, args.budget, args.runs)
+        for label, entry_args in ENTRY_POINTS.items()
+    ]
+    print()
+    if all(results):
+        print("✅ Todos os pontos de entrada dentro do orçamento")
+        return 0
+    print("❌ Pontos de entrada fora do orçamento")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
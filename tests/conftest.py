@@ -0,0 +1,49 @@
+"""
+Configuração dos testes unitários (pytest).
+
+Os módulos do core são importados como `core.<módulo>`, como em
+src/main.py; por isso src/ entra no sys.path.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+import itertools
+
+import pytest
+
+
+@pytest.fixture
+def fake_models(monkeypatch):
+    """LLM e embeddings falsos (sem rede) na ingestão completa e na delta."""
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+    from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+    from langchain_core.messages import AIMessage
+    from core import ingestion, delta_ingestion
+
+    def chat_model(*args, **kwargs):
+        rules = AIMessage(content="- [TIPO: CÓDIGO] Regra de Negócio: Pedidos acima de R$ 100 têm frete grátis.")
+        return GenericFakeChatModel(messages=itertools.repeat(rules))
+
+    def embeddings(*args, **kwargs):
+        return DeterministicFakeEmbedding(size=16)
+
+    for module in (ingestion, delta_ingestion):
+        monkeypatch.setattr(module, 'get_chat_model', chat_model)
+        monkeypatch.setattr(module, 'get_embeddings', embeddings)
+
+
+@pytest.fixture
+def ingested_db(tmp_path, fake_models):
+    """Banco da ingestão completa (small-to-big) com um arquivo de código e um de documentação."""
+    from core.ingestion import create_vector_store
+
+    code = tmp_path / "pedido.py"
+    code.write_text("def frete(total):\n    return 0 if total > 100 else 15\n", encoding='utf-8')
+    doc = tmp_path / "cupom.md"
+    doc.write_text("# Cupons\n\nO cupom expira em 30 dias.\nUm cupom por pedido.\n", encoding='utf-8')
+    db_path = str(tmp_path / "chroma_db")
+    create_vector_store(str(code), str(doc), db_path)
+    return {'db_path': db_path, 'code': str(code), 'doc': str(doc)}
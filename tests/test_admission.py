@@ -0,0 +1,143 @@
+"""Testes do GenerationGate: coalescência, fila de admissão e cache de planos (modos, perfis e planos parciais)."""
+
+import threading
+import time
+
+import pytest
+
+from core import admission
+
+
+def plan(query, text, **metrics):
+    return {'query': query, 'test_plan': text, 'source_rules': [], 'rule_ids': [], 'retrieval': {},
+            'metrics': dict(metrics)}
+
+
+def gate(tmp_path, monkeypatch, calls):
+    db = tmp_path / "chroma_db"
+    db.mkdir()
+    (db / "chroma.sqlite3").write_text("v1")
+
+    def generate(query, qa_chain, retriever, budget):
+        calls.append('generate')
+        return plan(query, "Funcionalidade: comum")
+
+    def map_reduce(query, qa_chain, retriever, budget):
+        calls.append('map_reduce')
+        return plan(query, "Funcionalidade: parcial",
+                    groups=[{'label': 'frete', 'rules': 2}, {'label': 'cupom', 'rules': 1, 'error': 'boom'}])
+
+    monkeypatch.setattr(admission, 'generate_test_plan', generate)
+    monkeypatch.setattr(admission, 'generate_test_plan_map_reduce', map_reduce)
+    return admission.GenerationGate(str(db))
+
+
+def test_map_reduce_parcial_nao_e_servido_as_geracoes_comuns(tmp_path, monkeypatch):
+    calls = []
+    g = gate(tmp_path, monkeypatch, calls)
+
+    g.generate("cupons", None, None, map_reduce=True)
+    g.generate("cupons", None, None, map_reduce=True)
+    common = g.generate("cupons", None, None)
+
+    # O plano parcial não foi guardado: o map-reduce roda de novo e a geração comum não o recebe
+    assert calls == ['map_reduce', 'map_reduce', 'generate']
+    assert common['test_plan'] == "Funcionalidade: comum"
+
+
+def test_plano_gerado_e_servido_do_cache_na_mesma_versao(tmp_path, monkeypatch):
+    calls = []
+    g = gate(tmp_path, monkeypatch, calls)
+
+    g.generate("Cupons", None, None)
+    warm = g.generate("cupons", None, None)
+
+    assert calls == ['generate']
+    assert warm['metrics']['served_by'] == 'cache'
+
+
+def test_orcamento_e_opcoes_de_retrieval_separam_cache_e_coalescencia(tmp_path, monkeypatch):
+    calls = []
+    g = gate(tmp_path, monkeypatch, calls)
+    version = admission.index_version(g.db_path)
+
+    g.generate("cupons", None, None, context_token_budget=1500)
+    g.generate("cupons", None, None, context_token_budget=1500)
+    g.generate("cupons", None, None, context_token_budget=800)
+    mmr = admission.GenerationGate(g.db_path, rag_options={'search_type': 'mmr'})
+    mmr.generate("cupons", None, None, context_token_budget=1500)
+    # Opções iguais ao padrão do setup_rag_chain têm o mesmo perfil
+    default = admission.GenerationGate(g.db_path, rag_options={'search_type': 'similarity'})
+    warm = default.generate("cupons", None, None, context_token_budget=1500)
+
+    assert calls == ['generate', 'generate', 'generate']
+    assert warm['metrics']['served_by'] == 'cache'
+    profile = admission.generation_profile(1500, {'search_type': 'mmr'})
+    assert admission.coalescing_key("Cupons", version, profile).endswith(f":{profile}:cupons")
+    assert g.cache.get("cupons", version, profile=profile) is not None
+
+
+def test_correspondencia_lexical_por_termos_em_comum(tmp_path):
+    from core.plan_cache import PlanCache
+    cache = PlanCache(str(tmp_path))
+    cache.put("Gere cenários para cupons de desconto expirados", "v1",
+              plan("cupons", "Funcionalidade: cupons"), profile="1500-x")
+
+    match = cache.lexical_match("cupons de desconto expirados no checkout", "v2")
+
+    assert match['test_plan'] == "Funcionalidade: cupons"
+    assert match['term_overlap'] == 0.75 and match['stale'] is True
+    # Paráfrase sem termos em comum não casa: a comparação não é semântica
+    assert cache.lexical_match("vouchers vencidos", "v1") is None
+
+
+def test_requisicoes_identicas_em_voo_fazem_uma_unica_geracao(tmp_path, monkeypatch):
+    calls = []
+    g = gate(tmp_path, monkeypatch, calls)
+    started, release = threading.Event(), threading.Event()
+
+    def slow_generate(query, qa_chain, retriever, budget):
+        calls.append('generate')
+        started.set()
+        release.wait(5)
+        return plan(query, "Funcionalidade: comum")
+
+    monkeypatch.setattr(admission, 'generate_test_plan', slow_generate)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(g.generate("cupons", None, None))) for _ in range(2)]
+    threads[0].start()
+    started.wait(5)
+    threads[1].start()
+    # Libera a geração só depois que a segunda requisição entrou no mesmo voo
+    deadline = time.monotonic() + 5
+    while g.flights.coalesced < 1 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert calls == ['generate']
+    assert [r['test_plan'] for r in results] == ["Funcionalidade: comum"] * 2
+    assert sorted(bool(r['metrics'].get('coalesced')) for r in results) == [False, True]
+
+
+def test_admissao_limita_geracoes_simultaneas_e_o_tamanho_da_fila():
+    controller = admission.AdmissionController(max_inflight=1, max_queue=1, queue_timeout_s=5)
+
+    controller.acquire()
+    # Vaga ocupada: a requisição espera na fila até o tempo limite
+    with pytest.raises(admission.AdmissionRejected, match="espera"):
+        controller.acquire(timeout=0.05)
+    waiting = threading.Thread(target=controller.acquire)
+    waiting.start()
+    deadline = time.monotonic() + 5
+    while controller.stats()['queued'] < 1 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    # Fila cheia: rejeitada sem esperar
+    with pytest.raises(admission.AdmissionRejected, match="Fila"):
+        controller.acquire()
+    controller.release()
+    waiting.join(5)
+
+    stats = controller.stats()
+    assert (stats['inflight'], stats['queued'], stats['admitted'], stats['rejected']) == (1, 0, 2, 2)
@@ -0,0 +1,70 @@
+"""Testes do cliente HTTP assíncrono compartilhado (um pool por event loop)."""
+
+import asyncio
+
+import httpx
+
+from core import clients
+
+
+def test_cliente_assincrono_usa_um_pool_por_event_loop(monkeypatch):
+    monkeypatch.setattr(clients, '_http_clients', {})
+    shared = clients._http_client('async')
+    transport = httpx.MockTransport(lambda request: httpx.Response(200, json={'ok': True}))
+    pools = []
+
+    async def call():
+        pool = shared.for_loop()
+        pool._transport = transport
+        pools.append(pool)
+        first = await shared.get("https://api.example.test/a")
+        second = await shared.get("https://api.example.test/b")
+        assert shared.for_loop() is pool
+        return first.json(), second.status_code
+
+    # Cada asyncio.run cria e fecha um loop, como generate_test_plans_batch
+    assert asyncio.run(call()) == ({'ok': True}, 200)
+    assert asyncio.run(call()) == ({'ok': True}, 200)
+    assert isinstance(shared, httpx.AsyncClient)
+    assert pools[0] is not pools[1]
+    # O pool de cada loop é fechado no encerramento do loop e o loop morto sai do mapa
+    assert pools[0].is_closed and pools[1].is_closed
+    assert len(shared._loop_clients) == 1
+
+
+def test_cliente_assincrono_nao_abre_pool_proprio(monkeypatch):
+    monkeypatch.setattr(clients, '_http_clients', {})
+    shared = clients._http_client('async')
+
+    async def call():
+        return await shared._transport.handle_async_request(httpx.Request('GET', "https://x.test"))
+
+    assert not isinstance(shared._transport, httpx.AsyncHTTPTransport)
+    assert not shared._mounts
+    try:
+        asyncio.run(call())
+    except RuntimeError as exc:
+        assert 'for_loop' in str(exc)
+    else:
+        raise AssertionError("o transporte base não deveria enviar requisições")
+
+
+def test_chave_do_modelo_aceita_opcoes_nao_hashable(monkeypatch):
+    monkeypatch.setattr(clients, '_models', {})
+    created = []
+
+    class FakeChat:
+        def __init__(self, **kwargs):
+            created.append(kwargs)
+
+    monkeypatch.setattr(clients, '_http_client', lambda kind: None)
+    import langchain_openai
+    monkeypatch.setattr(langchain_openai, 'ChatOpenAI', FakeChat)
+
+    first = clients.get_chat_model(model_kwargs={'top_p': 0.9, 'seed': 1})
+    second = clients.get_chat_model(model_kwargs={'seed': 1, 'top_p': 0.9})
+    third = clients.get_chat_model(model_kwargs={'seed': 2, 'top_p': 0.9})
+
+    assert first is second
+    assert third is not first
+    assert len(created) == 2
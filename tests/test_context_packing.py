@@ -0,0 +1,70 @@
+"""Testes do empacotamento de contexto (cabeçalhos, sobreposição e orçamento)."""
+
+from langchain_core.documents import Document
+
+from core.context_packing import pack_context, count_tokens
+
+
+def doc(filename, text, score=None, chunk=1):
+    return Document(
+        page_content=f"[Fonte: {filename} | Tipo: doc | Chunk: {chunk}/3]\n{text}",
+        metadata={'source': filename, 'score': score}
+    )
+
+
+def test_um_cabecalho_por_fonte_e_fontes_pela_melhor_regra():
+    docs = [
+        doc('cupom.md', "Regra 1: cupom expira em 30 dias.", 0.7),
+        doc('frete.md', "Regra 1: frete grátis acima de R$ 200.", 0.9),
+        doc('cupom.md', "Regra 2: um cupom por pedido.", 0.8, chunk=2)
+    ]
+
+    packed = pack_context(docs, token_budget=1000)
+
+    assert packed['text'] == (
+        "[Fonte: frete.md | Tipo: doc]\nRegra 1: frete grátis acima de R$ 200.\n\n"
+        "[Fonte: cupom.md | Tipo: doc]\nRegra 2: um cupom por pedido.\nRegra 1: cupom expira em 30 dias."
+    )
+    assert packed['passages'] == 3
+    assert packed['dropped'] == 0
+    assert not packed['truncated']
+
+
+def test_sobreposicao_do_splitter_e_duplicatas_sao_removidas():
+    shared = "Regra 3: o desconto máximo é de 50% do valor do carrinho."
+    docs = [
+        doc('cupom.md', "Regra 2: cupons não são cumulativos.\n" + shared, 0.9),
+        doc('cupom.md', shared + "\nRegra 4: cupom exige cadastro.", 0.8, chunk=2),
+        doc('cupom.md', "Regra 2: cupons não são cumulativos.", 0.7)
+    ]
+
+    packed = pack_context(docs, token_budget=1000)
+
+    assert packed['text'].count(shared) == 1
+    assert packed['text'].endswith("Regra 4: cupom exige cadastro.")
+    assert packed['passages'] == 2
+    assert packed['dropped'] == 1
+
+
+def test_contexto_respeita_o_orcamento_de_tokens():
+    docs = [doc(f"regra{i}.md", "Regra: " + "texto longo da regra " * 40, 1.0 - i / 10) for i in range(5)]
+
+    packed = pack_context(docs, token_budget=150)
+
+    assert packed['tokens'] <= 150
+    assert packed['truncated']
+    assert packed['dropped'] >= 3
+    assert packed['raw_tokens'] > count_tokens(packed['text'])
+    assert packed['text'].startswith("[Fonte: regra0.md | Tipo: doc]")
+
+
+def test_acerto_de_simbolo_sem_score_sobrevive_ao_orcamento_apertado():
+    symbol_hit = doc('svc.py', "Regra: apply_discount limita o desconto a 30% do pedido.")
+    symbol_hit.metadata['resolved_by'] = 'symbol_index'
+    docs = [doc(f'regra{i}.md', f"Regra {i}: texto longo sobre frete e prazos de entrega " * 3, 0.9 - i / 10)
+            for i in range(4)] + [symbol_hit]
+
+    packed = pack_context(docs, token_budget=count_tokens(symbol_hit.page_content) + 20)
+
+    assert packed['text'].startswith("[Fonte: svc.py | Tipo: doc]\nRegra: apply_discount limita")
+    assert packed['dropped'] >= 3
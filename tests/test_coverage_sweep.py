@@ -0,0 +1,71 @@
+"""Testes da varredura de cobertura (ciclo de vida do pool de gerações)."""
+
+import io
+
+import pytest
+from langchain_core.documents import Document
+
+from core import coverage_sweep
+
+
+class FailingExecutor:
+    instances = []
+
+    def __init__(self, max_workers):
+        self.shutdown_calls = []
+        FailingExecutor.instances.append(self)
+
+    def submit(self, *args):
+        raise RuntimeError("pool cheio")
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        self.shutdown_calls.append((wait, cancel_futures))
+
+
+def test_falha_no_submit_encerra_o_pool(tmp_path, monkeypatch):
+    unit = {'unit': 'symbol:a.py::f', 'label': 'f', 'source': 'a.py',
+            'query': coverage_sweep.unit_query('f'), 'rule_ids': ['chunk:a.py#0']}
+    monkeypatch.setattr(coverage_sweep, 'enumerate_units', lambda db_path: [unit])
+    monkeypatch.setattr(coverage_sweep, 'load_rules',
+                        lambda db_path, ids: {'chunk:a.py#0': Document(page_content="Regra 1")})
+    monkeypatch.setattr(coverage_sweep, 'ThreadPoolExecutor', FailingExecutor)
+
+    with pytest.raises(RuntimeError, match="pool cheio"):
+        coverage_sweep.run_sweep(str(tmp_path), qa_chain=None, output=io.StringIO())
+
+    assert FailingExecutor.instances[-1].shutdown_calls == [(True, True)]
+
+
+def test_arquivo_com_simbolos_nao_repete_os_pais_como_unidades(ingested_db):
+    from core.delta_ingestion import process_changed_files
+    from core.symbol_index import source_key
+
+    code = ingested_db['code']
+    with open(code, 'a', encoding='utf-8') as f:
+        f.write("\n\ndef cupom(valor):\n    return valor * 0.9\n")
+    process_changed_files([code], ingested_db['db_path'])
+
+    units = coverage_sweep.enumerate_units(ingested_db['db_path'])
+
+    code_units = [u for u in units if u['source'] == source_key(code)]
+    assert code_units and all(u['unit'].startswith('symbol:') for u in code_units)
+    assert all(rule_id.startswith('parent:') for u in code_units for rule_id in u['rule_ids'])
+    # A documentação (sem símbolos) continua coberta pelos seus pais
+    assert [u['unit'].split(':')[0] for u in units if u['source'] == source_key(ingested_db['doc'])] == ['parent']
+
+
+def test_unidade_sem_regras_no_banco_e_pulada_sem_chamar_o_llm(tmp_path, monkeypatch):
+    class NoLLM:
+        def invoke(self, *args, **kwargs):
+            raise AssertionError("o LLM não deveria ser chamado")
+
+    unit = {'unit': 'symbol:a.py::f', 'label': 'f', 'source': 'a.py',
+            'query': coverage_sweep.unit_query('f'), 'rule_ids': ['chunk:a.py#0']}
+    monkeypatch.setattr(coverage_sweep, 'enumerate_units', lambda db_path: [unit])
+    monkeypatch.setattr(coverage_sweep, 'load_rules', lambda db_path, ids: {'chunk:a.py#0': None})
+    output = io.StringIO()
+
+    stats = coverage_sweep.run_sweep(str(tmp_path), NoLLM(), output)
+
+    assert stats['empty'] == 1 and stats['generated'] == 0 and stats['errors'] == 0
+    assert output.getvalue() == ""
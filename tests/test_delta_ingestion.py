@@ -0,0 +1,46 @@
+"""Testes da ingestão delta sobre um banco da ingestão completa (small-to-big)."""
+
+from langchain_chroma import Chroma
+
+from core.delta_ingestion import process_changed_files
+from core.parent_store import ParentStore
+from core.symbol_index import source_key
+
+
+def children(db_path, source):
+    found = Chroma(persist_directory=db_path)._collection.get(where={"source": source}, include=['metadatas'])
+    return found['metadatas']
+
+
+def test_delta_mantem_pais_e_filhos_do_arquivo_alterado(ingested_db):
+    db_path, doc = ingested_db['db_path'], ingested_db['doc']
+    source = source_key(doc)
+    before = [pid for pid, p in ParentStore.load(db_path).parents.items() if p['metadata']['source'] == source]
+    assert before
+
+    with open(doc, 'w', encoding='utf-8') as f:
+        f.write("# Cupons\n\nO cupom expira em 10 dias.\nCupons não são cumulativos.\n")
+    stats = process_changed_files([doc], db_path)
+
+    assert stats['errors'] == 0
+    parents = {pid: p for pid, p in ParentStore.load(db_path).parents.items() if p['metadata']['source'] == source}
+    assert len(parents) == 1
+    (parent_id, parent), = parents.items()
+    assert "10 dias" in parent['text'] and "30 dias" not in parent['text']
+    metadatas = children(db_path, source)
+    assert metadatas and all(m['parent_id'] == parent_id for m in metadatas)
+    # O outro arquivo continua intacto
+    code_source = source_key(ingested_db['code'])
+    assert any(p['metadata']['source'] == code_source for p in ParentStore.load(db_path).parents.values())
+
+
+def test_delta_remove_os_pais_de_arquivo_deletado(ingested_db):
+    import os
+    db_path, doc = ingested_db['db_path'], ingested_db['doc']
+    os.remove(doc)
+
+    process_changed_files([doc], db_path)
+
+    source = source_key(doc)
+    assert not any(p['metadata']['source'] == source for p in ParentStore.load(db_path).parents.values())
+    assert children(db_path, source) == []
@@ -0,0 +1,55 @@
+"""Testes do índice de arquivos (vetores-resumo do retrieval hierárquico)."""
+
+import numpy as np
+
+from core import file_index
+
+
+class FakeCollection:
+    """Coleção mínima do Chroma: get(where={'source': {'$in': [...]}})."""
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def get(self, where=None, include=None):
+        allowed = where['source']['$in'] if where else None
+        rows = [r for r in self.rows if allowed is None or r[0]['source'] in allowed]
+        return {
+            'metadatas': [r[0] for r in rows],
+            'embeddings': np.asarray([r[1] for r in rows], dtype=np.float32).reshape(len(rows), 2)
+        }
+
+
+class FakeStore:
+    def __init__(self, rows):
+        self._collection = FakeCollection(rows)
+
+
+def test_resumo_e_a_media_normalizada_dos_chunks_de_cada_arquivo():
+    embeddings = np.array([[1.0, 0.0], [0.0, 2.0], [3.0, 0.0], [5.0, 5.0]], dtype=np.float32)
+    metadatas = [{'source': 'a.py'}, {'source': 'a.py'}, {'source': 'b.md'}, {}]
+
+    summaries = file_index.summarize_sources(embeddings, metadatas)
+
+    assert set(summaries) == {'a.py', 'b.md'}
+    vector, count = summaries['a.py']
+    assert count == 2
+    np.testing.assert_allclose(vector, [np.sqrt(0.5), np.sqrt(0.5)], rtol=1e-6)
+    np.testing.assert_allclose(summaries['b.md'][0], [1.0, 0.0])
+
+
+def test_atualizacao_recalcula_alterados_e_remove_arquivos_deletados(tmp_path):
+    db_path = str(tmp_path)
+    before = [({'source': 'a.py'}, [1.0, 0.0]), ({'source': 'b.py'}, [0.0, 1.0]),
+              ({'source': 'c.py'}, [1.0, 1.0])]
+    file_index.build_file_index(FakeStore(before), db_path)
+
+    # b.py mudou de assunto e c.py foi deletado
+    after = [({'source': 'a.py'}, [1.0, 0.0]), ({'source': 'b.py'}, [-1.0, 0.0]), ({'source': 'b.py'}, [-1.0, 0.0])]
+    stats = file_index.update_file_index(FakeStore(after), db_path, ['b.py', 'c.py'])
+
+    assert stats == {'files': 2, 'chunks': 3}
+    index = file_index.FileIndex.load(db_path)
+    assert index.sources == ['a.py', 'b.py']
+    assert index.top_files([-1.0, 0.1], n_files=1) == ['b.py']
+    assert index.top_files([1.0, 0.1], n_files=1) == ['a.py']
@@ -0,0 +1,111 @@
+"""Testes da atualização incremental do índice flat (ingestão delta)."""
+
+import os
+
+import numpy as np
+
+from core import flat_index
+from core.ivf_index import IVFPartitions, build_ivf_partitions
+from core.quantization import QUANTIZATION_MANIFEST_FILE, build_quantized_vectors
+
+
+class FakeCollection:
+    """Coleção mínima do Chroma: get(where={'source': {'$in': [...]}})."""
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def get(self, where=None, include=None):
+        allowed = where['source']['$in'] if where else None
+        rows = [r for r in self.rows if allowed is None or r[2]['source'] in allowed]
+        return {
+            'ids': [r[0] for r in rows],
+            'documents': [r[1] for r in rows],
+            'metadatas': [r[2] for r in rows],
+            'embeddings': np.asarray([r[3] for r in rows], dtype=np.float32)
+        }
+
+
+class FakeStore:
+    def __init__(self, rows):
+        self._collection = FakeCollection(rows)
+
+
+def rows_for(source, count, seed, dim=16):
+    rng = np.random.default_rng(seed)
+    return [(f"{source}-{seed}-{i}", f"{source} regra {i}", {'source': source, 'chunk_index': i},
+             rng.normal(size=dim)) for i in range(count)]
+
+
+def test_delta_troca_apenas_as_linhas_dos_arquivos_alterados(tmp_path):
+    db_path = str(tmp_path)
+    index_path = flat_index.flat_index_path(db_path)
+    before = rows_for('a.py', 30, 1) + rows_for('b.py', 20, 2) + rows_for('c.py', 30, 3)
+    data = FakeCollection(before).get()
+    flat_index.write_flat_index(index_path, data['ids'], data['documents'], data['metadatas'], data['embeddings'])
+    vectors = np.load(os.path.join(index_path, flat_index.VECTORS_FILE))
+    build_ivf_partitions(index_path, vectors, n_partitions=4, nprobe=2)
+    build_quantized_vectors(index_path, vectors, vectors[:3], "binary", "float16")
+
+    after = rows_for('a.py', 30, 1) + rows_for('c.py', 30, 3) + rows_for('b.py', 5, 9)
+    manifest = flat_index.update_flat_index(FakeStore(after), db_path, ['b.py', 'removido.py'])
+
+    assert manifest['count'] == 65
+    assert manifest['replaced_rows'] == 20
+    assert manifest['ivf']['mode'] == 'append'
+    store = flat_index.FlatVectorStore(index_path, nprobe=2, quantization="binary", rescore_dtype="float16")
+    try:
+        assert [store.record(row)['id'] for row in range(len(store))] == [r[0] for r in after]
+        expected = flat_index.normalize_rows(np.asarray([r[3] for r in after], dtype=np.float32))
+        np.testing.assert_allclose(store.vectors, expected, rtol=1e-6)
+        assert sorted(np.asarray(store.partitions.rows).tolist()) == list(range(65))
+        assert store.first_pass.codes.shape[0] == 65
+        hit = store.query_candidates([after[-1][3]], 1)[0]
+        assert hit['documents'] == ["b.py regra 4"]
+    finally:
+        store.close()
+    assert os.path.exists(os.path.join(index_path, QUANTIZATION_MANIFEST_FILE))
+    assert IVFPartitions.exists(index_path)
+
+
+def test_troca_do_indice_nao_derruba_leitor_aberto(tmp_path):
+    db_path = str(tmp_path)
+    index_path = flat_index.flat_index_path(db_path)
+    before = rows_for('a.py', 10, 1) + rows_for('b.py', 10, 2)
+    data = FakeCollection(before).get()
+    flat_index.write_flat_index(index_path, data['ids'], data['documents'], data['metadatas'], data['embeddings'])
+    reader = flat_index.FlatVectorStore(index_path)
+
+    try:
+        after = rows_for('a.py', 10, 1) + rows_for('b.py', 3, 7)
+        flat_index.update_flat_index(FakeStore(after), db_path, ['b.py'])
+
+        # O leitor aberto antes da troca continua consultando o índice anterior
+        assert reader.query_candidates([before[-1][3]], 1)[0]['documents'] == ["b.py regra 9"]
+    finally:
+        reader.close()
+    assert sorted(os.listdir(db_path)) == [os.path.basename(index_path)]
+    store = flat_index.FlatVectorStore(index_path)
+    try:
+        assert len(store) == 13
+    finally:
+        store.close()
+
+
+def test_busca_quantizada_em_float16_nao_le_vectors_npy(tmp_path):
+    index_path = flat_index.flat_index_path(str(tmp_path))
+    rows = rows_for('a.py', 20, 1) + rows_for('b.py', 20, 2)
+    data = FakeCollection(rows).get()
+    flat_index.write_flat_index(index_path, data['ids'], data['documents'], data['metadatas'], data['embeddings'])
+    vectors = np.load(os.path.join(index_path, flat_index.VECTORS_FILE))
+    build_quantized_vectors(index_path, vectors, vectors[:3], "int8", "float16")
+
+    store = flat_index.FlatVectorStore(index_path, quantization="int8", rescore_dtype="float16")
+    try:
+        # Matriz float32 zerada: se a busca a lesse, todas as linhas empatariam
+        store.vectors = np.zeros(store.vectors.shape, dtype=np.float32)
+        for sources in (None, [None], [['b.py']]):
+            hit = store.query_candidates([rows[25][3]], 1, sources)[0]
+            assert hit['documents'] == ["b.py regra 5"]
+    finally:
+        store.close()
@@ -0,0 +1,39 @@
+"""Testes do k-means do índice IVF (somas por grupo em blocos sobre o memmap)."""
+
+import numpy as np
+
+from core import ivf_index
+from core.retrieval import normalize_rows
+
+
+def test_somas_em_blocos_sobre_memmap_igualam_a_referencia(tmp_path, monkeypatch):
+    monkeypatch.setattr(ivf_index, 'ASSIGN_BLOCK_SIZE', 7)
+    rng = np.random.default_rng(0)
+    data = normalize_rows(rng.normal(size=(50, 8)).astype(np.float32))
+    path = tmp_path / "vectors.npy"
+    np.save(path, data)
+    vectors = np.load(path, mmap_mode='r')
+    centroids = data[:4].copy()
+
+    sums, counts = ivf_index.accumulate_partitions(vectors, centroids)
+
+    assignments = np.argmax(data @ centroids.T, axis=1)
+    for cluster in range(4):
+        members = data[assignments == cluster]
+        assert counts[cluster] == len(members)
+        np.testing.assert_allclose(sums[cluster], members.sum(axis=0), rtol=1e-5, atol=1e-5)
+
+
+def test_kmeans_separa_grupos_bem_definidos_no_memmap(tmp_path, monkeypatch):
+    monkeypatch.setattr(ivf_index, 'ASSIGN_BLOCK_SIZE', 16)
+    rng = np.random.default_rng(1)
+    axes = np.eye(8, dtype=np.float32)[:3]
+    data = normalize_rows(np.repeat(axes, 20, axis=0) + 0.05 * rng.normal(size=(60, 8)).astype(np.float32))
+    path = tmp_path / "vectors.npy"
+    np.save(path, data)
+
+    centroids = ivf_index.kmeans(np.load(path, mmap_mode='r'), 3, iterations=5)
+
+    assignments = ivf_index.assign_partitions(data, centroids)
+    assert sorted(np.bincount(assignments, minlength=3)) == [20, 20, 20]
+    np.testing.assert_allclose(np.linalg.norm(centroids, axis=1), 1.0, rtol=1e-5)
@@ -0,0 +1,82 @@
+"""Testes da geração map-reduce (grupos de regras, leitura do Gherkin e junção)."""
+
+from langchain_core.documents import Document
+from langchain_core.messages import AIMessage
+
+from core.map_reduce import (
+    OTHER_GROUP_LABEL, generate_test_plan_map_reduce, group_rules, merge_plans, parse_gherkin
+)
+
+
+def rule(text, **metadata):
+    return Document(page_content=text, metadata=metadata)
+
+
+def test_grupos_por_topico_ou_arquivo_e_excedentes_no_ultimo():
+    docs = [rule("r1", topic='frete', source='a.py'), rule("r2", source='b.py'),
+            rule("r3", topic='frete', source='c.py'), rule("r4", source='d.py'), rule("r5", source='e.py')]
+
+    groups = group_rules(docs, max_groups=3)
+
+    assert [label for label, _ in groups] == ['frete', 'b.py', OTHER_GROUP_LABEL]
+    assert [[d.page_content for d in group] for _, group in groups] == [["r1", "r3"], ["r2"], ["r4", "r5"]]
+
+
+def test_cabecalho_fica_acima_da_feature_e_tags_abrem_o_cenario():
+    text = """```gherkin
+# language: pt
+@checkout
+Funcionalidade: Cupons
+
+  Contexto:
+    Dado um carrinho com R$ 150
+
+  # Regra 2
+  @expirado
+  Cenário: cupom expirado
+    Quando aplico o cupom VENCIDO
+    Então vejo "cupom expirado"
+```"""
+
+    parsed = parse_gherkin(text)
+
+    assert parsed['header'] == ["# language: pt", "@checkout"]
+    assert parsed['feature'] == "Cupons" and parsed['keyword'] == "Funcionalidade"
+    assert parsed['background'] == ["Contexto:", "Dado um carrinho com R$ 150"]
+    assert parsed['scenarios'] == [["# Regra 2", "@expirado", "Cenário: cupom expirado",
+                                    "Quando aplico o cupom VENCIDO", 'Então vejo "cupom expirado"']]
+
+
+def test_juncao_remove_cenarios_com_os_mesmos_passos():
+    frete = ("# language: pt\nFuncionalidade: Checkout\n"
+             "Cenário: frete grátis\n  Dado um pedido de R$ 200\n  Então o frete é grátis\n")
+    cupom = ("# language: pt\nFuncionalidade: Checkout\n"
+             "Cenário: pedido grande sem frete\n  Dado um pedido de R$ 200\n  Então o frete é grátis\n"
+             "Cenário: cupom\n  Dado o cupom VIP10\n  Então o desconto é 10%\n")
+
+    merged = merge_plans("checkout", [('frete', frete), ('cupom', cupom)])
+
+    assert merged['scenarios'] == 2 and merged['duplicates'] == 1
+    assert merged['text'].splitlines()[:4] == ["# language: pt", "Funcionalidade: Checkout", "", "  Regra: frete"]
+    assert "pedido grande sem frete" not in merged['text']
+
+
+def test_grupo_que_falhou_nao_entra_na_proveniencia(monkeypatch):
+    docs = [rule("Regra de frete", source='frete.md', chunk_index=0, score=0.9),
+            rule("Regra de cupom", source='cupom.md', chunk_index=0, score=0.8)]
+
+    class Retriever:
+        def invoke(self, query):
+            return docs
+
+    class Chain:
+        def batch(self, inputs, config=None, return_exceptions=False):
+            return [AIMessage(content="Funcionalidade: Frete\nCenário: grátis\n  Então o frete é 0\n"),
+                    TimeoutError("sem resposta")]
+
+    result = generate_test_plan_map_reduce("checkout", Chain(), Retriever())
+
+    assert result['source_rules'] == ["Regra de frete"]
+    assert result['rule_ids'] == ["chunk:frete.md#0"]
+    assert result['metrics']['partial'] is True
+    assert 'error' in result['metrics']['groups'][1]
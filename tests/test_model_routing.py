@@ -0,0 +1,67 @@
+"""Testes do roteamento de modelos (nível por complexidade e tokens reais da resposta)."""
+
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.prompts import PromptTemplate
+
+from core import model_routing
+
+
+def test_complexidade_soma_contexto_fontes_topicos_e_pedido_amplo(monkeypatch):
+    monkeypatch.setattr(model_routing, 'count_tokens', lambda text: 1000)
+    context = "[Fonte: frete.py]\nRegra 1\n[Fonte: cupom.py]\nRegra 2\n[Fonte: frete.py]\nRegra 3"
+
+    simple = model_routing.estimate_complexity("Regra do cupom", "")
+    broad = model_routing.estimate_complexity("Gere todos os cenários de frete e de cupons", context)
+
+    assert simple == {'score': 0.0, 'context_tokens': 0, 'sources': 0, 'topics': 1, 'broad': False}
+    assert broad['sources'] == 2 and broad['topics'] == 2 and broad['broad'] is True
+    # 1000 / TOKENS_PER_POINT + 1 fonte extra + 1 tópico extra + pedido amplo
+    assert broad['score'] == 2.0 + 1.0 + 1.0 + 2.0
+
+
+def test_nivel_e_o_primeiro_cujo_limite_supera_o_score(monkeypatch):
+    scores = iter([2.49, 2.5, 4.99, 99.0])
+    monkeypatch.setattr(model_routing, 'estimate_complexity',
+                        lambda question, context: {'score': next(scores), 'broad': False})
+    monkeypatch.setenv('ROUTER_HEAVY_MODEL', 'modelo-pesado')
+    monkeypatch.delenv('ROUTER_LIGHT_MODEL', raising=False)
+
+    tiers = [model_routing.route("q", "") for _ in range(4)]
+
+    assert [t['tier'] for t in tiers] == ['light', 'standard', 'standard', 'heavy']
+    assert [t['max_tokens'] for t in tiers] == [1200, 1600, 1600, 3200]
+    assert tiers[-1]['model'] == 'modelo-pesado'
+    assert tiers[0]['model'] == model_routing.CHAT_MODEL
+
+
+def test_pergunta_simples_vai_para_o_nivel_leve_e_pedido_amplo_sobe():
+    light = model_routing.route("Regra do cupom de desconto", "[Fonte: cupom.py]\nRegra 1: cupom expira.")
+    heavy = model_routing.route(
+        "Gere todos os cenários do fluxo completo de checkout e frete e pagamento",
+        "\n".join(f"[Fonte: arquivo{i}.py]\nRegra: texto" for i in range(4))
+    )
+    assert light['tier'] == 'light'
+    assert heavy['tier'] == 'heavy'
+    assert heavy['max_scenarios'] is None
+
+
+def test_decisao_registra_tokens_reais_e_resposta_cortada(monkeypatch):
+    message = AIMessage(
+        content="Funcionalidade: cupom",
+        usage_metadata={'input_tokens': 50, 'output_tokens': 42, 'total_tokens': 92},
+        response_metadata={'finish_reason': 'length'}
+    )
+    monkeypatch.setattr(model_routing, 'get_chat_model',
+                        lambda **kwargs: GenericFakeChatModel(messages=iter([message])))
+    chain = model_routing.RoutedChain(PromptTemplate.from_template("{context}\n{question}"))
+
+    result = chain.invoke({'context': "Regra 1: cupom expira.", 'question': "Regra do cupom"})
+
+    decision = result.response_metadata['routing']
+    assert decision['completion_tokens'] == 42
+    assert decision['truncated'] is True
+    assert 'budget_saved_tokens' not in decision
+    stats = chain.stats()['light']
+    assert stats['completion_tokens'] == 42
+    assert stats['truncated'] == 1
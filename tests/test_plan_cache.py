@@ -0,0 +1,30 @@
+"""Testes do cache de planos compartilhado por vários processos."""
+
+from core.plan_cache import PlanCache
+
+
+def result(text):
+    return {'test_plan': text, 'source_rules': [], 'rule_ids': []}
+
+
+def test_inclusoes_de_outro_processo_nao_sao_sobrescritas(tmp_path):
+    # Duas instâncias sobre o mesmo banco fazem o papel de dois processos
+    cli, service = PlanCache(str(tmp_path)), PlanCache(str(tmp_path))
+    assert len(cli) == 0 and len(service) == 0
+
+    cli.put("cupons", "v1", result("Funcionalidade: cupons"))
+    service.put("frete", "v1", result("Funcionalidade: frete"))
+
+    assert len(PlanCache(str(tmp_path))) == 2
+    # A instância que leu o arquivo antes vê a inclusão da outra
+    assert cli.get("frete", "v1")['test_plan'] == "Funcionalidade: frete"
+    assert service.get("cupons", "v1")['test_plan'] == "Funcionalidade: cupons"
+
+
+def test_limite_de_entradas_descarta_as_mais_antigas(tmp_path):
+    cache = PlanCache(str(tmp_path), max_entries=2)
+    for query in ("a", "b", "c"):
+        cache.put(query, "v1", result(query))
+
+    assert cache.get("a", "v1") is None
+    assert [PlanCache(str(tmp_path)).get(q, "v1")['test_plan'] for q in ("b", "c")] == ["b", "c"]
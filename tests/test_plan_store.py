@@ -0,0 +1,85 @@
+"""Testes dos planos persistidos (.feature com cabeçalho de regras)."""
+
+import os
+
+from core.parent_store import ParentStore
+from core.plan_store import content_hash, find_stale_plans, plan_filename, read_plan, save_plan
+
+
+def result(query, rule_ids, text="```gherkin\nFuncionalidade: Cupom\n  Cenário: expirado\n```"):
+    return {'query': query, 'test_plan': text, 'rule_ids': rule_ids}
+
+
+def parent_db(tmp_path, parents):
+    db = tmp_path / "chroma_db"
+    store = ParentStore(str(db / "parent_docs.json"))
+    for parent_id, text in parents.items():
+        store.add(parent_id, text, {'source': parent_id.split('#')[0]})
+    store.save()
+    return str(db)
+
+
+def test_plano_gravado_e_lido_de_volta(tmp_path):
+    plans_dir = str(tmp_path / "planos")
+    hashes = {'parent:cupom.md#0': 'abc123', 'chunk:svc.py#2': None}
+
+    path = save_plan(plans_dir, result("Gere  cenários para  cupons", list(hashes)), "sem-banco", hashes)
+
+    assert os.path.basename(path) == plan_filename("gere cenários para cupons")
+    plan = read_plan(path)
+    assert plan['query'] == "Gere cenários para cupons"
+    assert plan['rules'] == hashes
+    assert plan['generated_at']
+    assert plan['test_plan'] == "Funcionalidade: Cupom\n  Cenário: expirado\n"
+
+
+def test_arquivo_sem_cabecalho_nao_e_plano(tmp_path):
+    path = tmp_path / "manual.feature"
+    path.write_text("Funcionalidade: escrita à mão\n", encoding='utf-8')
+
+    assert read_plan(str(path)) is None
+
+
+def test_planos_desatualizados_por_regra_alterada_ou_removida(tmp_path):
+    plans_dir = str(tmp_path / "planos")
+    db = parent_db(tmp_path, {'cupom.md#0': "Regra 1: cupom expira.", 'frete.md#0': "Regra 1: frete grátis."})
+    ids = ['parent:cupom.md#0', 'parent:frete.md#0']
+    hashes = {'parent:cupom.md#0': content_hash("Regra 1: cupom expira."),
+              'parent:frete.md#0': content_hash("Regra 1: frete grátis.")}
+    save_plan(plans_dir, result("cupons", ids[:1]), db, hashes)
+    save_plan(plans_dir, result("frete", ids[1:]), db, hashes)
+    save_plan(plans_dir, result("tudo", ids), db, hashes)
+    assert find_stale_plans(plans_dir, db)['stale'] == []
+
+    parent_db(tmp_path, {'cupom.md#0': "Regra 1: cupom expira em 10 dias."})
+    found = find_stale_plans(plans_dir, db)
+
+    stale = {plan['query']: (plan['changed'], plan['removed']) for plan in found['stale']}
+    assert stale == {
+        'cupons': (['parent:cupom.md#0'], []),
+        'frete': ([], ['parent:frete.md#0']),
+        'tudo': (['parent:cupom.md#0'], ['parent:frete.md#0'])
+    }
+    assert len(found['plans']) == 3
+
+
+def test_delta_em_arquivo_alterado_desatualiza_o_plano(tmp_path, ingested_db):
+    from core.delta_ingestion import process_changed_files
+    from core.plan_store import current_rule_hashes
+    from core.symbol_index import source_key
+
+    db_path, doc = ingested_db['db_path'], ingested_db['doc']
+    source = source_key(doc)
+    parent_ids = [f"parent:{pid}" for pid, p in ParentStore.load(db_path).parents.items()
+                  if p['metadata']['source'] == source]
+    plans_dir = str(tmp_path / "planos")
+    save_plan(plans_dir, result("cupons", parent_ids), db_path, current_rule_hashes(db_path, parent_ids))
+    assert find_stale_plans(plans_dir, db_path)['stale'] == []
+
+    with open(doc, 'w', encoding='utf-8') as f:
+        f.write("# Cupons\n\nO cupom expira em 10 dias.\nUm cupom por pedido.\n")
+    process_changed_files([doc], db_path)
+
+    stale = find_stale_plans(plans_dir, db_path)['stale']
+    assert [plan['query'] for plan in stale] == ["cupons"]
+    assert stale[0]['changed'] == parent_ids
@@ -0,0 +1,56 @@
+"""Testes da quantização (gravação só da representação escolhida)."""
+
+import os
+
+import numpy as np
+
+from core import quantization
+from core.retrieval import normalize_rows
+
+
+def vectors(n=200, dim=32, seed=0):
+    return normalize_rows(np.random.default_rng(seed).normal(size=(n, dim)).astype(np.float32))
+
+
+def test_grava_apenas_a_representacao_escolhida_e_avalia_as_demais(tmp_path):
+    full = vectors()
+    stats = quantization.build_quantized_vectors(str(tmp_path), full, full[:5], "binary", "float32")
+
+    assert sorted(os.listdir(tmp_path)) == [quantization.QUANTIZATION_MANIFEST_FILE, quantization.BINARY_FILE]
+    assert set(stats['recall']) == {"int8+float32", "int8+float16", "binary+float32", "binary+float16"}
+    assert quantization.QuantizedVectors.stored_representation(str(tmp_path)) == ("binary", "float32")
+    assert not quantization.QuantizedVectors.exists(str(tmp_path), "int8")
+
+
+def test_troca_de_representacao_remove_os_arquivos_anteriores(tmp_path):
+    full = vectors()
+    quantization.build_quantized_vectors(str(tmp_path), full, full[:5], "binary", "float16")
+    quantization.build_quantized_vectors(str(tmp_path), full, full[:5], "int8", "float32")
+
+    assert not (tmp_path / quantization.BINARY_FILE).exists()
+    assert not (tmp_path / quantization.FLOAT16_FILE).exists()
+    quantized = quantization.QuantizedVectors(str(tmp_path), full, "int8", "float32")
+    assert quantized.search(full[3], 5)[0] == 3
+
+
+class Unreadable:
+    """Matriz float32 que falha se a busca tentar lê-la."""
+
+    shape = (200, 32)
+
+    def __getitem__(self, rows):
+        raise AssertionError("a busca não deveria ler vectors.npy")
+
+    def __matmul__(self, other):
+        raise AssertionError("a busca não deveria ler vectors.npy")
+
+
+def test_reescore_float16_nao_le_a_matriz_float32(tmp_path):
+    full = vectors()
+    stats = quantization.build_quantized_vectors(str(tmp_path), full, full[:5], "int8", "float16")
+    quantized = quantization.QuantizedVectors(str(tmp_path), Unreadable(), "int8", "float16")
+
+    assert quantized.search(full[7], 5)[0] == 7
+    assert stats['scan_bytes_per_vector'] == 32
+    # vectors.npy segue em disco: float32 + int8 + cópia float16
+    assert stats['disk_bytes_per_vector'] == 32 * 4 + 32 + 32 * 2
@@ -0,0 +1,27 @@
+"""Testes do log de consultas anonimizadas e do ranking das mais frequentes."""
+
+from core.query_log import QueryLog, anonymize_query, has_masked_pii
+
+
+def test_dados_pessoais_sao_mascarados():
+    query = "Cenários  de cadastro para joao.silva@exemplo.com.br com CPF 123.456.789-09"
+
+    assert anonymize_query(query) == "Cenários de cadastro para <email> com CPF <cpf>"
+    assert anonymize_query("cupom para o CPF 12345678909") == "cupom para o CPF <cpf>"
+    assert has_masked_pii(anonymize_query(query))
+    assert not has_masked_pii(anonymize_query("Regras de frete para clientes Prime"))
+
+
+def test_consultas_mais_frequentes_e_sem_dados_mascarados(tmp_path):
+    log = QueryLog(str(tmp_path / "query_log.jsonl"))
+    for query in ["Frete Prime", "frete  prime", "cupons", "cupons", "cupons", "parcelamento",
+                  "cadastro de ana@exemplo.com", "cadastro de bia@exemplo.com"]:
+        log.record(query)
+
+    assert log.top_queries() == [
+        {'query': "cupons", 'count': 3},
+        {'query': "frete prime", 'count': 2},
+        {'query': "cadastro de <email>", 'count': 2}
+    ]
+    assert [item['query'] for item in log.top_queries(n=1)] == ["cupons"]
+    assert [item['query'] for item in log.top_queries(skip_masked=True)] == ["cupons", "frete prime"]
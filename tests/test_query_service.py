@@ -0,0 +1,75 @@
+"""Testes das rotas HTTP do serviço de consultas (LLM e embeddings falsos)."""
+
+import itertools
+import json
+import threading
+import http.client
+
+import pytest
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+
+from core import rag_pipeline
+from core.query_service import QueryService, create_server
+
+PLAN = "Funcionalidade: Frete\n  Cenário: pedido acima de R$ 100\n    Então o frete é grátis"
+
+
+@pytest.fixture
+def service_url(ingested_db, monkeypatch):
+    monkeypatch.setattr(rag_pipeline, 'get_embeddings', lambda *args, **kwargs: DeterministicFakeEmbedding(size=16))
+    monkeypatch.setattr(rag_pipeline, 'get_chat_model',
+                        lambda *args, **kwargs: GenericFakeChatModel(messages=itertools.repeat(AIMessage(content=PLAN))))
+    server = create_server(QueryService(ingested_db['db_path']), port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server.server_address
+    server.shutdown()
+    server.server_close()
+
+
+def post(address, path, body):
+    connection = http.client.HTTPConnection(*address, timeout=10)
+    connection.request("POST", path, json.dumps(body), {"Content-Type": "application/json"})
+    response = connection.getresponse()
+    data = response.read().decode('utf-8')
+    connection.close()
+    return response.status, response.getheader("Content-Type"), data
+
+
+def test_retrieve_devolve_regras_e_contexto_sem_llm(service_url):
+    status, content_type, data = post(service_url, "/retrieve", {"query": "frete grátis"})
+
+    assert status == 200 and content_type.startswith("application/json")
+    body = json.loads(data)
+    assert body['query'] == "frete grátis"
+    assert body['rules'] and {'content', 'metadata'} <= set(body['rules'][0])
+    assert body['context'] and body['context_tokens'] > 0
+    assert 'retrieval_k' in body['retrieval']
+
+
+def test_generate_devolve_o_plano_completo(service_url):
+    status, _, data = post(service_url, "/generate", {"query": "frete grátis", "context_budget": 500})
+
+    assert status == 200
+    body = json.loads(data)
+    assert body['test_plan'] == PLAN
+    assert body['source_rules'] and isinstance(body['rule_ids'], list)
+    assert body['metrics']['served_by'] == 'generated'
+
+
+def test_generate_stream_emite_regras_tokens_e_plano_final(service_url):
+    status, content_type, data = post(service_url, "/generate/stream", {"query": "frete grátis"})
+
+    assert status == 200 and content_type.startswith("application/x-ndjson")
+    events = [json.loads(line) for line in data.splitlines()]
+    assert events[0]['event'] == 'retrieval' and events[0]['source_rules']
+    tokens = [e['text'] for e in events if e['event'] == 'token']
+    assert tokens and "".join(tokens) == PLAN
+    assert events[-1]['event'] == 'done' and events[-1]['test_plan'] == PLAN
+
+
+def test_corpo_sem_query_e_rota_desconhecida(service_url):
+    assert post(service_url, "/generate", {"context_budget": 500})[0] == 400
+    assert post(service_url, "/planos", {"query": "frete"})[0] == 404
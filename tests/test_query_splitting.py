@@ -0,0 +1,34 @@
+"""Testes da divisão heurística de solicitações em sub-consultas por tópico."""
+
+from core.query_splitting import split_query_heuristic
+
+
+def test_pedido_com_varios_topicos_vira_sub_consultas_com_o_assunto():
+    query = ("Gere cenários de teste BDD para o cálculo de frete e aplicação de cupons, "
+             "incluindo o caso de cliente Prime e diferentes regiões.")
+
+    assert split_query_heuristic(query) == [
+        'cálculo de frete',
+        'aplicação de cupons',
+        'cálculo de frete: cliente Prime',
+        'cálculo de frete: diferentes regiões'
+    ]
+
+
+def test_listas_entre_parenteses_nao_sao_divididas():
+    query = "Gere cenários de teste BDD para validação de cupons promocionais (BLACKFRIDAY, NEWUSER, VIP10)."
+
+    assert split_query_heuristic(query) == [query]
+
+
+def test_fragmentos_curtos_herdam_o_assunto_e_respeitam_o_limite():
+    query = ("Gere cenários de teste BDD para validação de cadastro de novos clientes, "
+             "incluindo CPF, idade, email e telefone.")
+
+    subqueries = split_query_heuristic(query, max_subqueries=3)
+
+    assert subqueries == [
+        'validação de cadastro de novos clientes',
+        'validação de cadastro de novos clientes: CPF',
+        'validação de cadastro de novos clientes: idade'
+    ]
@@ -0,0 +1,38 @@
+"""Testes da geração com streaming (montagem dos trechos e métricas finais)."""
+
+from langchain_core.documents import Document
+from langchain_core.messages import AIMessageChunk
+from langchain_core.runnables import RunnableLambda
+
+from core import rag_pipeline
+
+
+class StreamingChain:
+    """Cadeia falsa: o texto chega em trechos e o uso de tokens só no último (vazio), como na OpenAI."""
+
+    def __init__(self, parts):
+        self.parts = parts
+
+    def stream(self, input):
+        for part in self.parts:
+            yield AIMessageChunk(content=part)
+        yield AIMessageChunk(content="", usage_metadata={'input_tokens': 120, 'output_tokens': 9, 'total_tokens': 129})
+
+
+def test_stream_monta_o_plano_a_partir_dos_trechos():
+    docs = [Document(page_content="Regra 1: pedidos acima de R$ 100 têm frete grátis.",
+                     metadata={'source': 'pedido.py', 'chunk_index': 0, 'score': 0.9})]
+    retriever = RunnableLambda(lambda query: docs)
+    parts = ["Funcionalidade: Frete\n", "  Cenário: pedido", " acima de R$ 100\n"]
+
+    result, tokens = rag_pipeline.stream_test_plan("frete grátis", StreamingChain(parts), retriever)
+
+    # As regras já estão disponíveis antes do primeiro trecho
+    assert result['source_rules'] == [docs[0].page_content]
+    assert result['test_plan'] == ""
+    # O trecho final vazio (só com o uso de tokens) não é repassado
+    assert list(tokens) == parts
+    assert result['test_plan'] == "".join(parts)
+    metrics = result['metrics']
+    assert metrics['completion_tokens'] == 9 and metrics['prompt_tokens'] == 120
+    assert 0 <= metrics['time_to_first_token_s'] <= metrics['total_time_s']
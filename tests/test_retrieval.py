@@ -0,0 +1,247 @@
+"""Testes das funções puras de retrieval (costura de chunks, vizinhos e proveniência)."""
+
+import numpy as np
+from langchain_core.documents import Document
+
+from core.retrieval import stitch_adjacent_chunks, rule_ids
+
+
+def chunk(source, index, text, score=None, **extra):
+    return Document(page_content=text, metadata={'source': source, 'chunk_index': index, 'score': score, **extra})
+
+
+def parent(parent_id, index, text):
+    return Document(
+        page_content=f"[Fonte: a.txt | Tipo: doc | Chunk: {index + 1}]\n{text}",
+        metadata={'source': 'a.txt', 'filename': 'a.txt', 'chunk_index': index, 'parent_id': parent_id}
+    )
+
+
+def test_documentos_pai_adjacentes_nao_sao_costurados():
+    docs = [parent('a.txt#0', 0, "Regra A"), parent('a.txt#1', 1, "Regra B")]
+
+    stitched = stitch_adjacent_chunks(docs)
+
+    assert [d.metadata['parent_id'] for d in stitched] == ['a.txt#0', 'a.txt#1']
+    assert stitched[1].page_content.startswith("[Fonte: a.txt | Tipo: doc | Chunk: 2]")
+    assert rule_ids(stitched) == ['parent:a.txt#0', 'parent:a.txt#1']
+
+
+def test_documentos_pai_nao_buscam_vizinhos():
+    from core.retrieval import expand_neighbors
+    docs = [parent('a.txt#0', 0, "Regra A")]
+
+    # Sem chunks a expandir, o banco não é consultado (vector_store=None)
+    assert expand_neighbors(None, docs, window=1, max_neighbors=4) == docs
+
+
+def test_simbolos_citados_nao_descartam_a_busca_vetorial():
+    from core.retrieval import merge_symbol_hits
+    symbol_docs = [chunk('svc.py', i, f"apply_discount {i}") for i in range(4)]
+    ranked = [chunk('frete.md', 0, "frete", 0.9), chunk('svc.py', 0, "apply_discount 0", 0.8),
+              chunk('frete.md', 3, "frete prime", 0.7)]
+
+    merged = merge_symbol_hits(symbol_docs, ranked, k=5)
+
+    assert [d.page_content for d in merged] == [
+        "apply_discount 0", "apply_discount 1", "apply_discount 2", "frete", "frete prime"
+    ]
+
+
+def test_chunks_consecutivos_sao_costurados_na_posicao_do_melhor():
+    docs = [
+        chunk('b.py', 5, "Regra B5", 0.95),
+        chunk('a.py', 1, "Regra A1", 0.9),
+        chunk('a.py', 0, "Regra A0", 0.8),
+        chunk('a.py', 3, "Regra A3", 0.7),
+        chunk('a.py', 1, "Regra A1 duplicada", 0.6)
+    ]
+
+    stitched = stitch_adjacent_chunks(docs)
+
+    assert [d.metadata['chunk_index'] for d in stitched] == [5, 0, 3]
+    merged = stitched[1]
+    assert merged.page_content.endswith("Regra A0\nRegra A1")
+    assert merged.metadata['chunk_end'] == 1
+    assert merged.metadata['score'] == 0.9
+    assert rule_ids(stitched) == ['chunk:b.py#5', 'chunk:a.py#0', 'chunk:a.py#1', 'chunk:a.py#3']
+
+
+def test_rule_ids_ignora_documentos_sem_proveniencia():
+    docs = [Document(page_content="solta"), parent('a.txt#0', 0, "Regra"), parent('a.txt#0', 0, "Regra")]
+
+    assert rule_ids(docs) == ['parent:a.txt#0']
+
+
+
+def test_sobreposicao_do_splitter_aparece_uma_unica_vez_na_passagem_costurada():
+    shared = "Regra 3: o desconto máximo é de 50% do valor do carrinho, exceto em promoções."
+    docs = [
+        chunk('a.py', 1, "Regra 2: cupons não são cumulativos.\n" + shared, 0.9, total_chunks=4),
+        chunk('a.py', 2, shared + "\nRegra 4: cupom exige cadastro.", 0.7, total_chunks=4)
+    ]
+
+    stitched, = stitch_adjacent_chunks(docs)
+
+    assert stitched.page_content.count(shared) == 1
+    assert stitched.page_content.startswith("[Arquivo: a.py | Tipo: desconhecido | Chunk: 2-3/4]\n")
+    assert stitched.page_content.endswith("Regra 4: cupom exige cadastro.")
+    assert stitched.metadata['stitched_chunks'] == 2
+
+
+def test_chunks_nao_consecutivos_e_sem_posicao_ficam_separados():
+    loose = Document(page_content="sem metadados", metadata={'score': 0.95})
+    docs = [loose, chunk('a.py', 0, "Regra A0", 0.9), chunk('a.py', 2, "Regra A2", 0.8),
+            chunk('b.py', 1, "Regra B1", 0.7)]
+
+    stitched = stitch_adjacent_chunks(docs)
+
+    assert [d.page_content for d in stitched] == ["sem metadados", "Regra A0", "Regra A2", "Regra B1"]
+    assert all('chunk_end' not in d.metadata for d in stitched)
+
+
+class ChunkStore:
+    """Backend mínimo com get_chunks (busca por source + chunk_index)."""
+
+    def __init__(self, docs):
+        self.docs = {(d.metadata['source'], d.metadata['chunk_index']): d for d in docs}
+        self.requested = []
+
+    def get_chunks(self, positions):
+        self.requested.append(list(positions))
+        return [(self.docs[p].page_content, dict(self.docs[p].metadata)) for p in positions if p in self.docs]
+
+
+def test_vizinhos_respeitam_o_limite_e_sao_costurados_ao_acerto():
+    from core.retrieval import expand_neighbors
+    store = ChunkStore([chunk('a.py', i, f"Regra A{i}", total_chunks=5) for i in range(5)])
+    hit = chunk('a.py', 2, "Regra A2", 0.9, total_chunks=5)
+
+    expanded = expand_neighbors(store, [hit], window=2, max_neighbors=2)
+
+    assert store.requested == [[('a.py', 1), ('a.py', 3)]]
+    assert all(d.metadata['score'] == 0.9 for d in expanded)
+    stitched, = stitch_adjacent_chunks(expanded)
+    assert stitched.page_content.endswith("Regra A1\nRegra A2\nRegra A3")
+    assert rule_ids([stitched]) == ['chunk:a.py#1', 'chunk:a.py#2', 'chunk:a.py#3']
+
+
+def test_mmr_troca_candidato_redundante_por_um_diverso():
+    from core.retrieval import mmr_rerank
+    query = np.array([1.0, 0.0, 0.0])
+    candidates = np.array([
+        [1.0, 0.0, 0.0],      # mais relevante
+        [0.99, 0.01, 0.0],    # quase idêntico ao primeiro
+        [0.7, 0.7, 0.0]       # menos relevante, mas diferente
+    ])
+
+    assert mmr_rerank(query, candidates, k=2, lambda_mult=1.0).tolist() == [0, 1]
+    assert mmr_rerank(query, candidates, k=2, lambda_mult=0.3).tolist() == [0, 2]
+    assert mmr_rerank(query, candidates, k=10).shape == (3,)
+    assert mmr_rerank(query, np.empty((0, 3)), k=2).size == 0
+
+
+def test_cotas_por_topico_e_vagas_livres_pelo_score():
+    from core.retrieval import merge_with_quotas
+    frete = [chunk('frete.md', i, f"frete {i}", score) for i, score in enumerate([0.9, 0.8, 0.7])]
+    cupom = [chunk('cupom.md', 0, "cupom 0", 0.6), chunk('frete.md', 0, "frete 0", 0.9)]
+
+    merged = merge_with_quotas(['frete', 'cupom'], [frete, cupom], k=4)
+
+    assert [d.page_content for d in merged] == ["frete 0", "frete 1", "cupom 0", "frete 2"]
+    assert [d.metadata['topic'] for d in merged] == ['frete', 'frete', 'cupom', 'frete']
+
+
+def test_k_adaptativo_respeita_limiar_minimo_maximo_e_cotovelo():
+    from core.retrieval import select_adaptive_k
+    scores = np.array([0.60, 0.91, 0.90, 0.89, 0.58, 0.57])
+
+    assert select_adaptive_k(scores, min_k=1, max_k=6, elbow=False) == 6
+    assert select_adaptive_k(scores, min_k=1, max_k=4, elbow=False) == 4
+    assert select_adaptive_k(scores, min_k=1, max_k=6, score_threshold=0.8, elbow=False) == 3
+    assert select_adaptive_k(scores, min_k=5, max_k=6, score_threshold=0.8, elbow=False) == 5
+    # Maior queda (0.89 -> 0.60) bem acima da média: corta depois do terceiro
+    assert select_adaptive_k(scores, min_k=1, max_k=6, elbow=True) == 3
+    assert select_adaptive_k(np.array([]), min_k=2, max_k=6) == 0
+
+
+def test_pai_e_costura_preservam_o_acerto_do_indice_de_simbolos():
+    from core.retrieval import resolve_parents
+
+    class Parents:
+        def get(self, parent_id):
+            return {'text': "Regra A", 'metadata': {'source': 'a.txt'}} if parent_id == 'a.txt#0' else None
+
+    hit = chunk('a.txt', 0, "filho", parent_id='a.txt#0', resolved_by='symbol_index')
+    assert resolve_parents([hit], Parents())[0].metadata['resolved_by'] == 'symbol_index'
+
+    run = [chunk('b.py', 0, "def a(): pass", 0.8), chunk('b.py', 1, "def b(): pass", resolved_by='symbol_index')]
+    stitched = stitch_adjacent_chunks(run)
+    assert len(stitched) == 1 and stitched[0].metadata['resolved_by'] == 'symbol_index'
+
+
+def test_small_to_big_busca_filhos_extras_e_corta_em_k_pais_distintos():
+    from core.retrieval import PARENT_FETCH_FACTOR, build_retriever
+
+    # Filhos em ordem de similaridade: os três primeiros são do mesmo pai
+    owners = ['a.txt#0', 'a.txt#0', 'a.txt#0', 'a.txt#1', 'a.txt#1', 'a.txt#2']
+    requested = []
+
+    class Children:
+        def query_candidates(self, query_embeddings, n_results):
+            requested.append(n_results)
+            n = min(n_results, len(owners))
+            return [{
+                'documents': [f"filho {i}" for i in range(n)],
+                'metadatas': [{'parent_id': owners[i]} for i in range(n)],
+                'embeddings': np.array([[1.0, i / 10] for i in range(n)], dtype=np.float32)
+            } for _ in query_embeddings]
+
+    class Parents:
+        def get(self, parent_id):
+            return {'text': f"Regra {parent_id}", 'metadata': {'source': 'a.txt'}}
+
+    class Embeddings:
+        def embed_query(self, query):
+            return [1.0, 0.0]
+
+    retriever = build_retriever(Children(), Embeddings(), k=2, parent_store=Parents())
+    docs = retriever.invoke("regras")
+
+    assert requested == [2 * PARENT_FETCH_FACTOR]
+    assert [d.metadata['parent_id'] for d in docs] == ['a.txt#0', 'a.txt#1']
+    assert docs[0].metadata['matched_children'] == 3
+
+
+def test_batch_faz_uma_chamada_de_embeddings_e_uma_busca_para_todas_as_consultas():
+    from core.retrieval import build_retriever
+
+    calls = {'embed_documents': [], 'embed_query': 0, 'query_candidates': []}
+
+    class Store:
+        def query_candidates(self, query_embeddings, n_results):
+            calls['query_candidates'].append(len(query_embeddings))
+            return [{
+                'documents': [f"regra da consulta {int(e[0])}"],
+                'metadatas': [{'source': f"arquivo{int(e[0])}.py", 'chunk_index': 0}],
+                'embeddings': np.array([e], dtype=np.float32)
+            } for e in query_embeddings]
+
+    class Embeddings:
+        def embed_documents(self, texts):
+            calls['embed_documents'].append(list(texts))
+            return [[float(i), 1.0] for i in range(len(texts))]
+
+        def embed_query(self, query):
+            calls['embed_query'] += 1
+            return [0.0, 1.0]
+
+    retriever = build_retriever(Store(), Embeddings(), k=1)
+    results = retriever.batch(["frete", "cupom", "estoque"])
+
+    assert calls['embed_documents'] == [["frete", "cupom", "estoque"]]
+    assert calls['embed_query'] == 0
+    assert calls['query_candidates'] == [3]
+    assert [[d.page_content for d in docs] for docs in results] == [
+        ["regra da consulta 0"], ["regra da consulta 1"], ["regra da consulta 2"]
+    ]
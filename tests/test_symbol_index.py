@@ -0,0 +1,23 @@
+"""Testes da chave de arquivo (metadado 'source') compartilhada pelas ingestões."""
+
+import os
+
+from core.symbol_index import source_key
+
+
+def test_caminho_absoluto_e_relativo_geram_a_mesma_chave(tmp_path, monkeypatch):
+    (tmp_path / "src").mkdir()
+    monkeypatch.chdir(tmp_path)
+
+    absolute = source_key(str(tmp_path / "src" / "svc.py"), str(tmp_path))
+    relative = source_key(os.path.join("src", "svc.py"), str(tmp_path))
+
+    assert absolute == relative == "src/svc.py"
+
+
+def test_arquivo_fora_da_raiz_mantem_o_caminho_absoluto(tmp_path):
+    root = tmp_path / "repo"
+    root.mkdir()
+    outside = tmp_path / "outro" / "svc.py"
+
+    assert source_key(str(outside), str(root)) == str(outside).replace('\\', '/')
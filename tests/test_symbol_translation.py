@@ -0,0 +1,36 @@
+"""Testes da tradução de símbolos em lote (agrupamento e divisão da resposta)."""
+
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+
+from core.symbol_translation import group_symbols, split_sections, translate_symbols
+
+
+def symbol(name, code="x = 1"):
+    return {'name': name, 'code': code}
+
+
+def test_agrupa_por_quantidade_e_por_tamanho():
+    symbols = [symbol('a'), symbol('b'), symbol('c', "y" * 50), symbol('d')]
+
+    assert group_symbols(symbols, per_prompt=2, max_chars=1000) == [[0, 1], [2, 3]]
+    assert group_symbols(symbols, per_prompt=8, max_chars=40) == [[0, 1], [2], [3]]
+
+
+def test_divide_a_resposta_por_trecho():
+    text = "### TRECHO 1: a\nRegra 1: A\n\n### TRECHO 2\nRegra 1: B\n### TRECHO 9\nRegra fora"
+
+    assert split_sections(text, 2) == {0: "Regra 1: A", 1: "Regra 1: B"}
+    assert split_sections("Regra 1: única", 1) == {0: "Regra 1: única"}
+    assert split_sections("Regra 1: sem marcador", 2) == {}
+
+
+def test_traduz_em_uma_chamada_e_refaz_apenas_o_trecho_ausente():
+    llm = GenericFakeChatModel(messages=iter([
+        AIMessage(content="### TRECHO 1\nRegra 1: frete"),
+        AIMessage(content="Regra 1: cupom")
+    ]))
+
+    rules = translate_symbols([symbol('frete'), symbol('cupom')], 'svc.py', '.py', llm)
+
+    assert rules == ["Regra 1: frete", "Regra 1: cupom"]
@@ -6,8 +6,12 @@ Este script testa se os chunks estão sendo salvos corretamente e exibe estatís
 import os
 import sys
 from dotenv import load_dotenv
-from langchain_chroma import Chroma
-from langchain_openai import OpenAIEmbeddings
+
+# Adiciona o diretório src ao path
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src'))
+
+from core.retrieval import build_retriever
+from core.clients import get_embeddings
 
 # Carrega variáveis de ambiente
 load_dotenv()
@@ -36,7 +40,8 @@ def validate_vector_store():
     try:
         # Carrega o vector store
         print("\n📂 Carregando o vector store...")
-        embeddings = OpenAIEmbeddings(model="text-embedding-ada-002")
+        from langchain_chroma import Chroma
+        embeddings = get_embeddings()
         vector_store = Chroma(
             persist_directory=DB_DIR,
             embedding_function=embeddings
@@ -115,9 +120,12 @@ def validate_vector_store():
             "Programa de fidelidade"
         ]
         
-        for query in test_queries:
+        # Todas as queries em lote: uma requisição de embeddings e uma busca no ChromaDB
+        search_retriever = build_retriever(vector_store, embeddings, k=3, stitch=False)
+        results_per_query = search_retriever.batch(test_queries)
+        
+        for query, results in zip(test_queries, results_per_query):
             print(f"\n📌 Query: '{query}'")
-            results = vector_store.similarity_search(query, k=3)
             print(f"   Resultados encontrados: {len(results)}")
             for i, result in enumerate(results, 1):
                 content_preview = result.page_content[:150].replace('\n', ' ')
@@ -156,13 +164,14 @@ def test_rag_retrieval():
     print("=" * 80)
     
     try:
-        embeddings = OpenAIEmbeddings(model="text-embedding-ada-002")
+        from langchain_chroma import Chroma
+        embeddings = get_embeddings()
         vector_store = Chroma(
             persist_directory=DB_DIR,
             embedding_function=embeddings
         )
         
-        retriever = vector_store.as_retriever(search_kwargs={"k": 5})
+        retriever = build_retriever(vector_store, embeddings, k=5)
         
         test_scenarios = [
             {
@@ -187,12 +196,14 @@ def test_rag_retrieval():
             }
         ]
         
-        for scenario in test_scenarios:
+        # Recupera todos os cenários em lote (uma única chamada de embeddings)
+        docs_per_scenario = retriever.batch([scenario['query'] for scenario in test_scenarios])
+        
+        for scenario, docs in zip(test_scenarios, docs_per_scenario):
             print(f"\n🎯 {scenario['name']}")
             print(f"Query: {scenario['query']}")
             print("-" * 80)
             
-            docs = retriever.invoke(scenario['query'])
             print(f"Documentos recuperados: {len(docs)}\n")
             
             for i, doc in enumerate(docs, 1):
@@ -4,10 +4,13 @@ Permite explorar todos os documentos, embeddings e metadados salvos.
 """
 
 import os
+import sys
 from dotenv import load_dotenv
-from langchain_chroma import Chroma
-from langchain_openai import OpenAIEmbeddings
-import pandas as pd
+
+# Adiciona o diretório src ao path
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src'))
+
+from core.clients import get_embeddings
 
 # Carrega variáveis de ambiente
 load_dotenv()
@@ -32,7 +35,10 @@ def view_all_documents():
     try:
         # Carrega o vector store
         print(f"\n📂 Carregando banco de dados de: {DB_DIR}\n")
-        embeddings = OpenAIEmbeddings(model="text-embedding-ada-002")
+        # Imports pesados apenas depois de confirmar que o banco existe
+        import pandas as pd
+        from langchain_chroma import Chroma
+        embeddings = get_embeddings()
         vector_store = Chroma(
             persist_directory=DB_DIR,
             embedding_function=embeddings